@@ -1,12 +1,34 @@
-from psychopy import visual, core, event
-import os, random, time
+# Importing this module has no side effects: PsychoPy, the window and the TTL hardware are only brought up by
+# Session.open() and Session.run() (see SESSION), so stimulus and data code can be imported without a display.
+import os, sys, random, time
 import csv
 from datetime import datetime
-import sys
 import traceback
 import platform
+import threading
+from collections import deque, OrderedDict
+import json
+import shutil
 
-# Set up exception hook to catch all unhandled exceptions
+# PsychoPy modules, bound by _import_psychopy() when a Session opens
+visual = core = event = None
+
+def _import_psychopy():
+    """Import PsychoPy once, switching pyglet to headless first when benchmarking."""
+    global visual, core, event
+    if visual is not None:
+        return
+    # RENDER_BENCHMARK=1 (see RENDER BENCHMARK section): without a display (CI) pyglet must be switched to a
+    # headless context before PsychoPy creates any window. RENDER_BENCHMARK_HEADLESS=0 keeps the normal display.
+    if os.environ.get('RENDER_BENCHMARK', '0') == '1' and os.environ.get('RENDER_BENCHMARK_HEADLESS', '1') != '0':
+        try:
+            import pyglet
+            pyglet.options['headless'] = True
+        except Exception as e:
+            print(f"Warning: Could not enable headless rendering: {e}", file=sys.stderr)
+    from psychopy import visual, core, event
+
+# Exception hook for all unhandled exceptions (installed by Session.open)
 def exception_handler(exc_type, exc_value, exc_traceback):
     """Handle unhandled exceptions"""
     if issubclass(exc_type, KeyboardInterrupt):
@@ -23,8 +45,6 @@ def exception_handler(exc_type, exc_value, exc_traceback):
     except:
         pass
 
-sys.excepthook = exception_handler
-
 # =========================
 #  SETUP
 # =========================
@@ -38,15 +58,38 @@ EXIT_HIT_MARGIN = 0.05  # Larger margin for reliable touch registration
 # Photodiode detector: black rectangle in bottom-left (0.5" x 1"), drawn on each flip except input/name screens
 PHOTODIODE_ACTIVE = True  # Set False during get_input_method (temp_win) and get_participant_id
 photodiode_patch = None  # Created after main window exists
+win = None  # Main window, created by Session.run()
+fixation = None
+_blank_rect = None  # Full-screen gray rect for blank frames (fixation offset)
 _last_photodiode_ttl_timestamp = [None]  # Set at exact moment of photodiode flash + TTL (for CSV alignment)
+_ttl_events = []  # Log every TTL: [{"timestamp": t, "event_type": str}, ...]
+_ttl_file_ref = [None]  # Open file handle for incremental TTL writes (set when CSV is created)
+_ttl_writer_ref = [None]  # csv.DictWriter for incremental TTL writes
 
 # TTL trigger: Cedrus pyxid2 (StimTracker, c-pod, Lumina, etc.) or parallel port fallback
 # See https://github.com/cedrus-opensource/pyxid
 # NOTE: Parallel port works on Windows/Linux only. On macOS, Cedrus pyxid2 (USB) is required for Blackrock.
-_ttl_backend = None  # Lazy-init: pyxid device, psychopy parallel, or False
+_ttl_backend = None  # Set by background discovery: ('cedrus', dev), ('parallel', parallel), or False
 _ttl_line = int(os.environ.get('CEDRUS_TTL_LINE', '1'))  # Output line for Cedrus (default 1)
 _ttl_pulse_ms = int(os.environ.get('CEDRUS_TTL_PULSE_MS', '10'))  # Pulse duration in ms (default 10)
 _ttl_status_logged = [False]  # One-time diagnostic print
+_TTL_TIME_COLUMNS = ['timestamp', 'ttl_timestamp', 'photon_timestamp']  # Raw flip-callback time + station-calibrated times
+_TTL_FIELDNAMES = ['timestamp', 'event_type', 'ttl_timestamp', 'photon_timestamp']
+_ttl_watchdog_interval_s = float(os.environ.get('CEDRUS_WATCHDOG_INTERVAL_S', '2.0'))  # Re-scan period after a device loss
+_ttl_watchdog_max_interval_s = float(os.environ.get('CEDRUS_WATCHDOG_MAX_INTERVAL_S', '60.0'))  # Backoff cap while no device was ever found
+_ttl_discovery_wait_s = float(os.environ.get('CEDRUS_DISCOVERY_WAIT_S', '5.0'))  # Max wait in _probe_ttl_at_startup
+_ttl_lock = threading.Lock()  # Guards backend swaps between the render thread and the watchdog thread
+_ttl_log_lock = threading.Lock()  # Serializes TTL CSV writes (flip callback + watchdog thread)
+_ttl_discovery_done = threading.Event()  # Set once the startup enumeration has finished
+_ttl_watchdog_thread_ref = [None]
+_ttl_disconnected_at = [None]  # time.time() when the Cedrus device was lost (None while connected)
+_ttl_missed_during_gap = [0]  # Triggers dropped while disconnected (reset on reconnect)
+_ttl_reconnect_gaps = []  # [{"lost": t0, "restored": t1, "missed": n}, ...] for end-of-session report
+_ttl_train_gap_ms = int(os.environ.get('CEDRUS_TTL_TRAIN_GAP_MS', '10'))  # Low time between pulses of a coalesced-event train
+_ttl_coalesced_flips = [0]  # Flips that carried more than one TTL event
+_ttl_coalesced_events = [0]  # Extra events (beyond the first) sharing a flip with another event
+_ttl_device_lock = threading.Lock()  # One writer at a time on the Cedrus/parallel device (render thread + pulse-train thread)
+_ttl_train_queue = [None]  # queue.Queue of pulse-train thread jobs (train or parallel-port release); None until first job
 
 def _log_ttl_status():
     """Print TTL backend status once (for Blackrock/debugging)."""
@@ -59,6 +102,7 @@ def _log_ttl_status():
         print("  - On macOS: Cedrus pyxid2 (StimTracker/c-pod/Lumina) via USB is required.", file=sys.stderr)
         print("  - Parallel port is Windows/Linux only.", file=sys.stderr)
         print("  - Ensure Cedrus device is connected and pyxid2 is installed.", file=sys.stderr)
+        print(f"  - Watchdog keeps scanning for a Cedrus device (hot-plug), backing off from {_ttl_watchdog_interval_s:g}s to {_ttl_watchdog_max_interval_s:g}s.", file=sys.stderr)
         print("=" * 60, file=sys.stderr)
         sys.stderr.flush()
     elif _ttl_backend is not None:
@@ -66,163 +110,1389 @@ def _log_ttl_status():
         print(f"TTL OK: Using {bt} backend, line {_ttl_line}, {_ttl_pulse_ms}ms pulse. If Blackrock still misses triggers: check m-pod output mapping (Xidon 2), wiring to Blackrock DIN, and Blackrock digital input channel.", file=sys.stderr)
         sys.stderr.flush()
 
-def _probe_ttl_at_startup():
-    """Initialize TTL backend and log status. Call when photodiode is first enabled. No pulse sent."""
-    global _ttl_backend
-    if _ttl_backend is not None:
-        _log_ttl_status()
-        return
-    try:
+_cedrus_scan_lock = threading.Lock()  # One pyxid2 enumeration at a time; response-pad I/O never overlaps a scan
+_cedrus_pad_found = [None]  # Response pad seen by TTL discovery (RESPONSE_PAD=cedrus), handed to _start_response_pad
+
+def _scan_cedrus_devices():
+    """One pyxid2 enumeration shared by TTL discovery and the response pad. Returns (trigger_devices, response_pads)."""
+    with _cedrus_scan_lock:
         import pyxid2
         devices = pyxid2.get_xid_devices()
-        if devices:
-            dev = devices[0]
+    triggers, pads = [], []
+    for dev in devices:
+        try:
+            is_pad = dev.is_response_device()
+        except Exception:
+            is_pad = False
+        (pads if is_pad else triggers).append(dev)
+    return triggers, pads
+
+def _find_cedrus_device():
+    """First Cedrus trigger device (StimTracker, c-pod, ...; response pads excluded), pulse duration set, or None. Slow (USB scan) - never call on the render thread."""
+    try:
+        triggers, pads = _scan_cedrus_devices()
+        if pads and _response_pad_mode == 'cedrus' and _response_pad_ref[0] is None and _cedrus_pad_found[0] is None:
+            _cedrus_pad_found[0] = pads[0]
+        if triggers:
+            dev = triggers[0]
             dev.set_pulse_duration(_ttl_pulse_ms)
-            _ttl_backend = ('cedrus', dev)
+            return dev
     except Exception:
         pass
-    if _ttl_backend is None:
-        try:
-            from psychopy import parallel
-            addr = int(os.environ.get('PARALLEL_PORT_ADDRESS', '0x0378'), 16)
-            parallel.setPortAddress(addr)
-            _ttl_backend = ('parallel', parallel)
-        except Exception:
-            _ttl_backend = False
-    _log_ttl_status()
+    return None
 
-def _send_ttl_trigger():
-    """Send a brief TTL pulse via Cedrus pyxid2 (preferred) or parallel port. Fails silently if unavailable."""
-    global _ttl_backend
+def _discover_ttl_backend():
+    """Try Cedrus pyxid2 first (works on macOS), then parallel port (Windows/Linux only). Returns backend tuple or False."""
+    dev = _find_cedrus_device()
+    if dev is not None:
+        return ('cedrus', dev)
     try:
-        if _ttl_backend is False:
-            _log_ttl_status()
-            return
-        if _ttl_backend is None:
-            # Try Cedrus pyxid2 first (StimTracker, c-pod, Lumina, etc.) - works on macOS
+        from psychopy import parallel
+        addr = int(os.environ.get('PARALLEL_PORT_ADDRESS', '0x0378'), 16)
+        parallel.setPortAddress(addr)
+        return ('parallel', parallel)
+    except Exception:
+        return False
+
+def _write_ttl_rows(evs):
+    """Append TTL rows to the incremental TTL CSV (one flush + fsync per call). Safe to call from the watchdog thread."""
+    if _ttl_writer_ref[0] is None or _ttl_file_ref[0] is None:
+        return
+    with _ttl_log_lock:
+        try:
+            for ev in evs:
+                row = dict(ev)
+                for col in _TTL_TIME_COLUMNS:
+                    if isinstance(row.get(col), (int, float)):
+                        row[col] = f"{row[col]:.9f}"
+                _ttl_writer_ref[0].writerow(row)
+            _ttl_file_ref[0].flush()
             try:
-                import pyxid2
-                devices = pyxid2.get_xid_devices()
-                if devices:
-                    dev = devices[0]
-                    dev.set_pulse_duration(_ttl_pulse_ms)
-                    _ttl_backend = ('cedrus', dev)
-            except Exception:
+                os.fsync(_ttl_file_ref[0].fileno())
+            except (AttributeError, OSError):
                 pass
-            # Fallback to parallel port (Windows/Linux only - not supported on macOS)
-            if _ttl_backend is None:
-                try:
-                    from psychopy import parallel
-                    addr = int(os.environ.get('PARALLEL_PORT_ADDRESS', '0x0378'), 16)
-                    parallel.setPortAddress(addr)
-                    _ttl_backend = ('parallel', parallel)
-                except Exception:
-                    _ttl_backend = False
-            if _ttl_backend is False:
-                _log_ttl_status()
-                return
-            _log_ttl_status()
-        backend_type, backend = _ttl_backend
+        except Exception as e:
+            print(f"Warning: Could not write TTL event incrementally: {e}", file=sys.stderr)
+
+def _log_ttl_backend_event(event_type, ts):
+    """Record a TTL backend state change (device lost/reconnected) as a row in the TTL log."""
+    ev = {"timestamp": ts, "event_type": event_type}
+    _ttl_events.append(ev)
+    _write_ttl_rows([ev])
+
+def _mark_ttl_disconnected():
+    """Called on the render thread when a Cedrus pulse fails. Hands reconnection to the watchdog."""
+    with _ttl_lock:
+        if _ttl_disconnected_at[0] is not None:
+            return
+        lost = time.time()
+        _ttl_disconnected_at[0] = lost
+        _ttl_missed_during_gap[0] = 1  # The pulse that just failed
+    print(f"TTL WARNING: Cedrus device lost at {lost:.3f}. Triggers are dropped until the watchdog reconnects it.", file=sys.stderr)
+    sys.stderr.flush()
+    _log_ttl_backend_event("ttl_device_lost", lost)
+
+def _ttl_watchdog_loop():
+    """Background thread: initial device discovery, then re-scan for a Cedrus device while disconnected (or absent).
+    A lost device is re-scanned every _ttl_watchdog_interval_s; when none was ever found the period doubles up to
+    _ttl_watchdog_max_interval_s, so a station without a TTL box does not enumerate USB all session."""
+    global _ttl_backend
+    backend = _discover_ttl_backend()
+    with _ttl_lock:
+        _ttl_backend = backend
+    _ttl_discovery_done.set()
+    absent_delay = _ttl_watchdog_interval_s
+    while True:
+        lost_device = _ttl_disconnected_at[0] is not None
+        time.sleep(_ttl_watchdog_interval_s if lost_device else absent_delay)
+        # Only scan when there is something to recover: lost Cedrus, or no backend at all (device plugged in later)
+        if _ttl_disconnected_at[0] is None and _ttl_backend is not False:
+            continue
+        if _ttl_disconnected_at[0] is None and _response_pad_ref[0] is not None:
+            continue  # No TTL box was ever found and the response pad is in use: no hot-plug scans during responses
+        dev = _find_cedrus_device()
+        if dev is None:
+            if _ttl_disconnected_at[0] is None:
+                absent_delay = min(absent_delay * 2, max(_ttl_watchdog_interval_s, _ttl_watchdog_max_interval_s))
+            continue
+        restored = time.time()
+        with _ttl_lock:
+            lost = _ttl_disconnected_at[0]
+            missed = _ttl_missed_during_gap[0]
+            _ttl_backend = ('cedrus', dev)
+            _ttl_disconnected_at[0] = None
+            _ttl_missed_during_gap[0] = 0
+        if lost is not None:
+            _ttl_reconnect_gaps.append({"lost": lost, "restored": restored, "missed": missed})
+            print(f"TTL OK: Cedrus device reconnected after {restored - lost:.2f}s gap ({missed} trigger(s) dropped).", file=sys.stderr)
+        else:
+            print("TTL OK: Cedrus device connected (hot-plug). Triggers will now be sent.", file=sys.stderr)
+        sys.stderr.flush()
+        _log_ttl_backend_event("ttl_device_reconnected", restored)
+
+def _start_ttl_discovery():
+    """Start the background TTL discovery/watchdog thread (once). Enumeration never blocks the render loop."""
+    if _ttl_watchdog_thread_ref[0] is not None:
+        return
+    t = threading.Thread(target=_ttl_watchdog_loop, name="ttl-watchdog", daemon=True)
+    _ttl_watchdog_thread_ref[0] = t
+    t.start()
+
+def _probe_ttl_at_startup():
+    """Wait (bounded) for background discovery and log status. Call when photodiode is first enabled. No pulse sent."""
+    _start_ttl_discovery()
+    _start_ttl_health_monitor()  # Triggers start flowing from here on
+    if not _ttl_discovery_done.wait(_ttl_discovery_wait_s):
+        print(f"TTL WARNING: Device discovery still running after {_ttl_discovery_wait_s:g}s; triggers start as soon as it finishes.", file=sys.stderr)
+        sys.stderr.flush()
+        return
+    _log_ttl_status()
+
+def _report_ttl_reconnect_gaps():
+    """Print a summary of TTL reconnect gaps (call at end of session)."""
+    if not _ttl_reconnect_gaps and _ttl_disconnected_at[0] is None:
+        return
+    print(f"⚠ TTL device reconnected {len(_ttl_reconnect_gaps)} time(s) during session:", file=sys.stderr)
+    for gap in _ttl_reconnect_gaps:
+        print(f"    lost {gap['lost']:.3f} -> restored {gap['restored']:.3f} ({gap['restored'] - gap['lost']:.2f}s, {gap['missed']} trigger(s) dropped)", file=sys.stderr)
+    if _ttl_disconnected_at[0] is not None:
+        print(f"    lost {_ttl_disconnected_at[0]:.3f} -> never restored ({_ttl_missed_during_gap[0]} trigger(s) dropped)", file=sys.stderr)
+    sys.stderr.flush()
+
+# =========================
+#  TTL HEALTH MONITOR
+# =========================
+# Console-only (experimenter) - never drawn on the participant screen.
+_ttl_health_interval_s = float(os.environ.get('TTL_HEALTH_INTERVAL_S', '1.0'))  # How often the monitor checks counters
+_ttl_health_report_s = float(os.environ.get('TTL_HEALTH_REPORT_S', '60'))  # Periodic status line (0 = off)
+_ttl_stall_warn_s = float(os.environ.get('TTL_STALL_WARN_S', '15'))  # Warn when no pulse has gone out for this long (0 = off)
+_ttl_gap_warn_s = float(os.environ.get('TTL_GAP_WARN_S', '10'))  # Warn when two consecutive pulses were further apart (0 = off)
+_ttl_drift_warn = int(os.environ.get('TTL_DRIFT_WARN', '5'))  # Warn when signalled - sent - failed stays above this (0 = off)
+_ttl_health_stopped = [False]  # Set at session end: the end screens send no triggers, so stop stall/gap warnings
+_ttl_health_thread_ref = [None]
+_ttl_signalled_count = [0]  # Pulses requested by flash flips (one per event)
+_ttl_sent_count = [0]  # Pulses the backend accepted
+_ttl_failed_count = [0]  # Pulses dropped (no backend, discovery pending, device lost, send error)
+_ttl_last_sent_at = [None]  # time.time() of the last successful pulse
+_ttl_max_gap_s = [0.0]  # Longest interval between two successful pulses
+_ttl_sent_times = deque(maxlen=512)  # Recent successful pulse times (for rate)
+
+def _ttl_state_reason():
+    """Short human-readable reason why pulses are not going out."""
+    if not _ttl_discovery_done.is_set():
+        return "device discovery still running"
+    if _ttl_disconnected_at[0] is not None:
+        return f"Cedrus device lost {time.time() - _ttl_disconnected_at[0]:.1f}s ago, watchdog reconnecting"
+    if _ttl_backend is False or _ttl_backend is None:
+        return "no TTL backend (Cedrus not found, parallel port unavailable)"
+    return "backend send error"
+
+def _count_ttl_sent(n=1):
+    """Record n successful pulses (render thread or pulse-train thread)."""
+    now = time.time()
+    with _ttl_lock:
+        _ttl_sent_count[0] += n
+        if _ttl_last_sent_at[0] is not None:
+            _ttl_max_gap_s[0] = max(_ttl_max_gap_s[0], now - _ttl_last_sent_at[0])
+        _ttl_last_sent_at[0] = now
+    _ttl_sent_times.append(now)
+
+def _count_ttl_failed(n=1):
+    with _ttl_lock:
+        _ttl_failed_count[0] += n
+
+def _ttl_health_banner(message):
+    """Print a TTL HEALTH WARNING banner with the current counters."""
+    print("=" * 60, file=sys.stderr)
+    print(f"TTL HEALTH WARNING: {message}", file=sys.stderr)
+    print(f"  Signalled {_ttl_signalled_count[0]}, sent {_ttl_sent_count[0]}, failed {_ttl_failed_count[0]} so far. Blackrock is not receiving these events.", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+    sys.stderr.flush()
+
+def _ttl_health_loop():
+    """Background thread: warn within seconds when triggers fail, stop, leave long gaps or drift from the signalled count; print a periodic status line."""
+    last_failed = 0
+    failing_since = None
+    started = time.time()
+    stalled_since = None  # Reference pulse time (or monitor start) of a stall already warned about
+    gap_warned_at = None  # Pulse time whose preceding gap was already warned about
+    last_drift = 0
+    last_report = started
+    while True:
+        time.sleep(_ttl_health_interval_s)
+        now = time.time()
+        failed = _ttl_failed_count[0]
+        new_failures = failed - last_failed
+        last_failed = failed
+        if new_failures > 0:
+            if failing_since is None:
+                failing_since = now
+                _ttl_health_banner(f"{new_failures} trigger(s) NOT sent in the last {_ttl_health_interval_s:g}s - {_ttl_state_reason()}.")
+        elif failing_since is not None and _ttl_last_sent_at[0] is not None and _ttl_last_sent_at[0] > failing_since:
+            print(f"TTL HEALTH OK: triggers flowing again after {now - failing_since:.1f}s of failures ({failed} failed in total).", file=sys.stderr)
+            sys.stderr.flush()
+            failing_since = None
+        if _ttl_health_stopped[0]:
+            continue
+        last_sent = _ttl_last_sent_at[0]
+        reference = last_sent if last_sent is not None else started
+        # Stall: nothing sent for a while although the task is running (covers silent stops with no failure counted)
+        if _ttl_stall_warn_s > 0 and now - reference >= _ttl_stall_warn_s and stalled_since != reference:
+            stalled_since = reference
+            since = f"{now - last_sent:.1f}s since the last pulse" if last_sent is not None else f"no pulse in {now - started:.1f}s"
+            reason = _ttl_state_reason() if (_ttl_backend in (None, False) or _ttl_disconnected_at[0] is not None) else "backend connected, no events signalled"
+            _ttl_health_banner(f"triggers stopped - {since} (TTL_STALL_WARN_S={_ttl_stall_warn_s:g}) - {reason}.")
+        elif stalled_since is not None and last_sent is not None and last_sent != stalled_since:
+            print(f"TTL HEALTH OK: triggers flowing again after a {last_sent - stalled_since:.1f}s stall.", file=sys.stderr)
+            sys.stderr.flush()
+            gap_warned_at = last_sent  # Already reported as a stall
+            stalled_since = None
+        # Gap: the latest inter-pulse interval exceeded the threshold (stalls shorter than TTL_STALL_WARN_S)
+        times = list(_ttl_sent_times)[-2:]
+        if _ttl_gap_warn_s > 0 and len(times) == 2 and times[1] - times[0] >= _ttl_gap_warn_s and gap_warned_at != times[1]:
+            gap_warned_at = times[1]
+            _ttl_health_banner(f"{times[1] - times[0]:.1f}s gap between consecutive pulses (TTL_GAP_WARN_S={_ttl_gap_warn_s:g}).")
+        # Drift: signalled pulses neither sent nor counted as failed (two checks in a row, so queued trains do not count)
+        drift = _ttl_signalled_count[0] - _ttl_sent_count[0] - failed
+        if _ttl_drift_warn > 0 and drift > _ttl_drift_warn and last_drift > _ttl_drift_warn and drift > last_drift:
+            _ttl_health_banner(f"{drift} signalled trigger(s) unaccounted for (neither sent nor failed; TTL_DRIFT_WARN={_ttl_drift_warn}).")
+        last_drift = drift
+        if _ttl_health_report_s > 0 and now - last_report >= _ttl_health_report_s:
+            last_report = now
+            print(f"TTL health: {_ttl_health_summary()}", file=sys.stderr)
+            sys.stderr.flush()
+
+def _ttl_health_summary(window_s=60.0):
+    """One-line counters: signalled/sent/failed, recent pulse rate, longest inter-pulse gap."""
+    now = time.time()
+    recent = sum(1 for t in list(_ttl_sent_times) if now - t <= window_s)
+    since_last = f"{now - _ttl_last_sent_at[0]:.1f}s ago" if _ttl_last_sent_at[0] is not None else "never"
+    return (f"signalled {_ttl_signalled_count[0]}, sent {_ttl_sent_count[0]}, failed {_ttl_failed_count[0]}; "
+            f"{recent / window_s:.2f} pulses/s over last {window_s:g}s; max gap {_ttl_max_gap_s[0]:.1f}s; last pulse {since_last}")
+
+def _start_ttl_health_monitor():
+    """Start the TTL health monitor thread (once)."""
+    if _ttl_health_thread_ref[0] is not None:
+        return
+    t = threading.Thread(target=_ttl_health_loop, name="ttl-health", daemon=True)
+    _ttl_health_thread_ref[0] = t
+    t.start()
+
+def _report_ttl_health():
+    """Print final TTL health counters (call at end of session)."""
+    _ttl_health_stopped[0] = True
+    if _ttl_health_thread_ref[0] is None:
+        return
+    mark = "⚠" if _ttl_failed_count[0] else "✓"
+    print(f"{mark} TTL health: {_ttl_health_summary()}", file=sys.stderr)
+    sys.stderr.flush()
+
+def _pulse_ttl_backend(backend, on_train_thread=False):
+    """Send one pulse on an already-discovered backend. Returns False if a Cedrus write failed (device lost).
+    On the render thread a parallel-port pulse only raises the lines; the pulse-train thread lowers them 10 ms
+    later, so the flip callback never waits out the pulse width."""
+    backend_type, dev = backend
+    with _ttl_device_lock:
         if backend_type == 'cedrus':
-            backend.activate_line(lines=_ttl_line)
+            try:
+                dev.activate_line(lines=_ttl_line)
+            except Exception:
+                return False
         elif backend_type == 'parallel':
-            backend.setData(255)
-            core.wait(0.01)
-            backend.setData(0)
+            dev.setData(255)
+            if not on_train_thread:
+                _queue_ttl_job(('release', dev))
+                return True
+            time.sleep(0.01)
+            dev.setData(0)
+    return True
+
+def _release_parallel_pulse(dev):
+    """Pulse-train thread: end a parallel-port pulse raised on the render thread, 10 ms after it started."""
+    time.sleep(0.01)
+    with _ttl_device_lock:
+        dev.setData(0)
+
+def _send_ttl_pulse_train(backend, rows):
+    """Pulse-train thread: one additional pulse per coalesced event after the flip pulse. Each event row gets the
+    time its own pulse was sent (calibrated like the flip pulse); rows whose pulse was not sent keep it blank."""
+    spacing = (_ttl_pulse_ms + _ttl_train_gap_ms) / 1000.0
+    remaining = len(rows)
+    try:
+        for row in rows:
+            time.sleep(spacing)
+            if _ttl_disconnected_at[0] is not None:
+                break
+            ts = time.time()
+            if not _pulse_ttl_backend(backend, on_train_thread=True):
+                _mark_ttl_disconnected()
+                break
+            row["ttl_timestamp"] = _calibrated_ttl_time(ts)
+            _count_ttl_sent()
+            remaining -= 1
     except Exception:
         pass
+    if remaining > 0:
+        _count_ttl_failed(remaining)
+    _write_ttl_rows(rows)
 
-def safe_wait(duration):
-    """Wrapper for core.wait() that handles macOS event dispatch errors (e.g. NSTrackingArea)"""
+def _ttl_train_loop(q):
+    """Long-lived thread: runs queued pulse trains and parallel-port releases in order (device writes serialized by _ttl_device_lock)."""
+    while True:
+        job = q.get()
+        if job[0] == 'release':
+            _release_parallel_pulse(job[1])
+        else:
+            _send_ttl_pulse_train(job[1], job[2])
+
+def _queue_ttl_job(job):
+    """Hand a job to the pulse-train thread, starting it on first use. Never blocks the render thread."""
+    if _ttl_train_queue[0] is None:
+        import queue
+        _ttl_train_queue[0] = queue.Queue()
+        threading.Thread(target=_ttl_train_loop, args=(_ttl_train_queue[0],), name="ttl-pulse-train", daemon=True).start()
+    _ttl_train_queue[0].put(job)
+
+def _send_ttl_trigger(n_pulses=1, train_rows=()):
+    """Send a brief TTL pulse via Cedrus pyxid2 (preferred) or parallel port. Never blocks on discovery; fails silently if unavailable.
+    
+    Args:
+        n_pulses: Number of events sharing this flip. The first pulse fires now; the rest follow as a
+            pulse train on the pulse-train thread so the render loop is not held up.
+        train_rows: TTL log rows of the events after the first, handed to the pulse-train thread, which
+            writes them once their pulses are sent.
+    Returns True if train_rows were handed over; otherwise the caller writes them (ttl_timestamp blank).
+    """
+    with _ttl_lock:
+        _ttl_signalled_count[0] += n_pulses
     try:
-        core.wait(duration)
-    except AttributeError as e:
-        err_str = str(e)
-        if "type" in err_str and ("ObjCInstance" in err_str or "NSConcreteNotification" in err_str or "NSTrackingArea" in err_str):
-            pass
+        if not _ttl_discovery_done.is_set():
+            _count_ttl_failed(n_pulses)  # Discovery still running on the background thread
+            return
+        if _ttl_disconnected_at[0] is not None:
+            with _ttl_lock:
+                _ttl_missed_during_gap[0] += n_pulses
+            _count_ttl_failed(n_pulses)
+            return
+        backend = _ttl_backend
+        if backend is False or backend is None:
+            _count_ttl_failed(n_pulses)
+            _log_ttl_status()
+            return
+        t0 = time.perf_counter()
+        if not _pulse_ttl_backend(backend):
+            _mark_ttl_disconnected()
+            with _ttl_lock:
+                _ttl_missed_during_gap[0] += n_pulses - 1
+            _count_ttl_failed(n_pulses)
+            return
+        _last_ttl_send_duration_s[0] = time.perf_counter() - t0
+        _count_ttl_sent()
+        if n_pulses > 1 and train_rows:
+            _queue_ttl_job(('train', backend, list(train_rows)))
+            return True
+    except Exception:
+        _count_ttl_failed()
+    return False
+
+# =========================
+#  STATION LATENCY CALIBRATION
+# =========================
+# Per-station offsets (flip -> flip callback -> TTL out -> photons) stored in ../LOG_FILES/station_profiles.json,
+# keyed by hostname + screen + resolution. Run once per station/display with STATION_CALIBRATE=1; set
+# PHOTODIODE_TRACE_FILE to a recorded trace (CSV: time, photodiode, ttl - same clock) to measure flip-to-photon.
+_station_profile = {}  # Offsets for this station/display (ms); empty = uncalibrated
+_last_ttl_send_duration_s = [None]  # Duration of the last successful pulse call (set in _send_ttl_trigger)
+
+def _station_key(window):
+    """Profile key: hostname|screenN|WxH."""
+    try:
+        w, h = int(window.size[0]), int(window.size[1])
+    except Exception:
+        w, h = 0, 0
+    return f"{platform.node()}|screen{getattr(window, 'screen', 0)}|{w}x{h}"
+
+def _station_profiles_path():
+    return os.path.join(get_log_directory(), 'station_profiles.json')
+
+def _read_station_profiles():
+    try:
+        with open(_station_profiles_path(), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _load_station_profile(window):
+    """Load offsets for this station/display into _station_profile. Returns True if a profile was found."""
+    key = _station_key(window)
+    profile = _read_station_profiles().get(key)
+    _station_profile.clear()
+    if not profile:
+        print(f"Station calibration: no profile for {key} - calibrated timestamp columns will be blank. Run with STATION_CALIBRATE=1.", file=sys.stderr)
+        sys.stderr.flush()
+        return False
+    _station_profile.update(profile)
+    fmt = lambda ms: f"{ms:.2f}ms" if ms is not None else "not measured"
+    print(f"Station calibration: {key} (calibrated {profile.get('calibrated_at', '?')}): callback->TTL {fmt(profile.get('callback_to_ttl_ms'))}, TTL->photon {fmt(profile.get('ttl_to_photon_ms'))}", file=sys.stderr)
+    sys.stderr.flush()
+    return True
+
+def _calibrated_ttl_time(ts):
+    """Raw flip-callback timestamp -> time the TTL pulse actually left ('' if uncalibrated)."""
+    if not isinstance(ts, (int, float)) or _station_profile.get('callback_to_ttl_ms') is None:
+        return ''
+    return ts + _station_profile['callback_to_ttl_ms'] / 1000.0
+
+def _calibrated_photon_time(ts):
+    """Raw flip-callback timestamp -> time the photodiode patch actually changed on screen ('' if uncalibrated)."""
+    ttl_t = _calibrated_ttl_time(ts)
+    if ttl_t == '' or _station_profile.get('ttl_to_photon_ms') is None:
+        return ''
+    return ttl_t + _station_profile['ttl_to_photon_ms'] / 1000.0
+
+def _add_calibrated_trigger_columns(row):
+    """Return a copy of row with a *_trigger_photon column right after every *_trigger column."""
+    out = {}
+    for k, v in row.items():
+        out[k] = v
+        if k.endswith('_trigger'):
+            out[k + '_photon'] = _calibrated_photon_time(v)
+    return out
+
+def _measure_ttl_to_photon_from_trace(path, max_lag_s=0.2):
+    """Median lag (ms) from each TTL rising edge to the next photodiode level change in a recorded trace.
+    
+    Args:
+        path: CSV with header and columns time (s), photodiode (analog), ttl (digital/analog), sampled on one clock.
+        max_lag_s: Ignore TTL edges with no photodiode change within this window.
+    Returns:
+        (median_lag_ms, n_matched) or (None, 0) if no edges could be matched.
+    """
+    import numpy as np
+    data = np.loadtxt(path, delimiter=',', skiprows=1, usecols=(0, 1, 2), ndmin=2)
+    t, pd_v, ttl_v = data[:, 0], data[:, 1], data[:, 2]
+    ttl_hi = ttl_v > (ttl_v.min() + ttl_v.max()) / 2.0
+    ttl_edges = t[1:][ttl_hi[1:] & ~ttl_hi[:-1]]
+    pd_state = pd_v > (pd_v.min() + pd_v.max()) / 2.0
+    pd_changes = t[1:][pd_state[1:] != pd_state[:-1]]
+    if len(ttl_edges) == 0 or len(pd_changes) == 0:
+        return None, 0
+    idx = np.searchsorted(pd_changes, ttl_edges)
+    valid = idx < len(pd_changes)
+    lags = pd_changes[idx[valid]] - ttl_edges[valid]
+    lags = lags[lags <= max_lag_s]
+    if len(lags) == 0:
+        return None, 0
+    return float(np.median(lags) * 1000.0), int(len(lags))
+
+def _calibrate_station(window, n_flashes=None):
+    """Flash the photodiode n_flashes times, measure flip->callback and callback->TTL, fold in the trace (if any), save profile."""
+    if n_flashes is None:
+        n_flashes = int(os.environ.get('STATION_CALIBRATE_FLASHES', '40'))
+    msg = visual.TextStim(window, text="Calibrating station timing...", color='black', height=0.04, pos=(0, 0))
+    flip_to_cb = []
+    cb_to_ttl = []
+    for _ in range(n_flashes):
+        cb_time = [None]
+        _last_ttl_send_duration_s[0] = None
+        window.callOnFlip(lambda: cb_time.__setitem__(0, core.monotonicClock.getTime()))
+        _queue_ttl_event(None)  # Flash (TTL) without a TTL-log row
+        msg.draw()
+        flip_t = window.flip()
+        if isinstance(flip_t, (int, float)) and cb_time[0] is not None:
+            flip_to_cb.append(cb_time[0] - flip_t)
+        if _last_ttl_send_duration_s[0] is not None:
+            cb_to_ttl.append(_last_ttl_send_duration_s[0])
+        if not USE_TOUCH_SCREEN:
+            safe_wait(0.017)
+        msg.draw()
+        window.flip()
+        safe_wait(0.2)  # Keep flashes well separated in the recorded trace
+    median = lambda xs: _median(xs) * 1000.0 if xs else None
+    key = _station_key(window)
+    profiles = _read_station_profiles()
+    previous = profiles.get(key, {})
+    profile = {
+        'hostname': platform.node(),
+        'screen': getattr(window, 'screen', 0),
+        'size': [int(v) for v in window.size],
+        'ttl_backend': _ttl_backend[0] if isinstance(_ttl_backend, tuple) else None,
+        'n_flashes': n_flashes,
+        'flip_to_callback_ms': median(flip_to_cb),
+        'callback_to_ttl_ms': median(cb_to_ttl),  # None without a TTL backend: nothing was measured
+        'ttl_to_photon_ms': previous.get('ttl_to_photon_ms'),  # Kept until a new trace is supplied
+        'trace_file': previous.get('trace_file'),
+        'calibrated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    trace_path = os.environ.get('PHOTODIODE_TRACE_FILE')
+    if trace_path:
+        try:
+            lag_ms, n_matched = _measure_ttl_to_photon_from_trace(trace_path)
+            if lag_ms is not None:
+                profile['ttl_to_photon_ms'] = lag_ms
+                profile['trace_file'] = os.path.abspath(trace_path)
+                print(f"Station calibration: TTL->photon {lag_ms:.2f}ms from {n_matched} flashes in {trace_path}", file=sys.stderr)
+            else:
+                print(f"Warning: No TTL/photodiode edge pairs found in {trace_path}", file=sys.stderr)
+        except Exception as e:
+            print(f"Warning: Could not read photodiode trace {trace_path}: {e}", file=sys.stderr)
+    if profile['callback_to_ttl_ms'] is None:
+        print("Warning: No TTL pulses sent during calibration - callback->TTL not measured; calibrated timestamp columns stay blank.", file=sys.stderr)
+    elif profile['ttl_to_photon_ms'] is not None:
+        profile['flip_to_photon_ms'] = (profile['flip_to_callback_ms'] or 0.0) + profile['callback_to_ttl_ms'] + profile['ttl_to_photon_ms']
+    profiles[key] = profile
+    try:
+        with open(_station_profiles_path(), 'w') as f:
+            json.dump(profiles, f, indent=2, sort_keys=True)
+        print(f"✓ Station profile saved for {key}: {_station_profiles_path()}")
+    except OSError as e:
+        print(f"Warning: Could not save station profile: {e}", file=sys.stderr)
+    sys.stderr.flush()
+    _station_profile.clear()
+    _station_profile.update(profile)
+
+def _setup_station_calibration(window):
+    """Calibrate (STATION_CALIBRATE=1) or load this station's latency profile. Call after the photodiode flip wrapper is installed."""
+    try:
+        if os.environ.get('STATION_CALIBRATE', '0') == '1':
+            _calibrate_station(window)
         else:
-            raise
+            _load_station_profile(window)
+    except Exception as e:
+        print(f"Warning: Station calibration unavailable: {e}", file=sys.stderr)
+        sys.stderr.flush()
+
+# =========================
+#  STATION PRE-FLIGHT
+# =========================
+# ~10 s health check before name entry: refresh stability, log-disk fsync latency, stimulus decode time,
+# TTL round trip, free disk. Results -> console, ../LOG_FILES/station_health.csv, and an on-screen
+# acknowledge prompt only if a threshold is exceeded. PREFLIGHT=0 skips it.
+_PREFLIGHT_THRESHOLDS = {
+    'frame_interval_sd_ms': float(os.environ.get('PREFLIGHT_MAX_FRAME_SD_MS', '4.0')),
+    'long_frames': int(os.environ.get('PREFLIGHT_MAX_LONG_FRAMES', '3')),
+    'fsync_ms_median': float(os.environ.get('PREFLIGHT_MAX_FSYNC_MS', '20')),
+    'decode_ms_median': float(os.environ.get('PREFLIGHT_MAX_DECODE_MS', '50')),
+    'ttl_roundtrip_ms': float(os.environ.get('PREFLIGHT_MAX_TTL_MS', '5')),
+    'free_disk_gb': float(os.environ.get('PREFLIGHT_MIN_FREE_GB', '2')),
+}
+_PREFLIGHT_FIELDNAMES = [
+    'timestamp', 'hostname', 'script', 'screen_size', 'n_flips', 'frame_interval_mean_ms', 'frame_interval_sd_ms',
+    'frame_interval_max_ms', 'long_frames', 'fsync_ms_median', 'fsync_ms_max', 'n_decoded', 'decode_ms_median',
+    'decode_ms_max', 'ttl_backend', 'ttl_roundtrip_ms', 'free_disk_gb', 'failures', 'passed'
+]
+
+def _median(xs):
+    xs = sorted(xs)
+    return xs[len(xs) // 2] if xs else None
+
+def _preflight_frame_intervals(window, n_flips):
+    """Flip n_flips blank frames; returns intervals in ms. The window uses waitBlanking=False, so each flip is
+    followed by glFinish: the sample is taken once the swap has completed, not when the non-blocking flip returns."""
+    times = []
+    for _ in range(n_flips):
+        window.flip()
+        _gpu_finish()
+        times.append(time.perf_counter())
+    return [(b - a) * 1000.0 for a, b in zip(times, times[1:])]
+
+def _flip_interval_sd_ms(window, n_flips):
+    """SD (ms) of n_flips blank-frame intervals on window."""
+    intervals = _preflight_frame_intervals(window, n_flips)
+    mean = sum(intervals) / len(intervals)
+    return (sum((x - mean) ** 2 for x in intervals) / len(intervals)) ** 0.5
+
+def _retire_temp_window(window, temp_window):
+    """Close the input-method window once the main window exists, so the session runs on one GL context.
+    Safe: the main window is still open, so PsychoPy never sees zero windows. FLIP_VARIANCE_FLIPS=N (opt-in, default 0)
+    measures the SD of N completed-swap intervals with both contexts live and again after the close."""
+    if temp_window is None:
+        return
+    n_flips = int(os.environ.get('FLIP_VARIANCE_FLIPS', '0'))
+    sd_before = _flip_interval_sd_ms(window, n_flips) if n_flips > 1 else None
+    try:
+        temp_window.close()
+    except Exception as e:
+        print(f"⚠ Could not close input-method window: {e}", file=sys.stderr)
+        return
+    try:
+        window.winHandle.switch_to()  # Make the main window's GL context current again before any further drawing
+        window.winHandle.activate()  # Focus back to the main window
     except Exception:
         pass
+    if sd_before is not None:
+        sd_after = _flip_interval_sd_ms(window, n_flips)
+        print(f"✓ Input-method window closed: flip-interval SD {sd_before:.2f}ms (2 contexts) -> {sd_after:.2f}ms (1 context)")
+    else:
+        print("✓ Input-method window closed")
+    sys.stdout.flush()
 
-def wait_with_escape(duration):
-    """Wait for duration, checking for ESC every 0.05s. If ESC pressed, quit immediately."""
-    elapsed = 0.0
-    chunk = 0.05
-    while elapsed < duration:
-        # Check ESC FIRST before any wait (event.getKeys is destructive)
+def _preflight_fsync_ms(log_dir, n=20):
+    """Append + flush + fsync n small rows to a scratch file in the log directory; returns per-row ms."""
+    path = os.path.join(log_dir, f".preflight_{os.getpid()}.tmp")
+    samples = []
+    try:
+        with open(path, 'w') as f:
+            for i in range(n):
+                t0 = time.perf_counter()
+                f.write(f"{i},{time.time():.9f},preflight\n")
+                f.flush()
+                os.fsync(f.fileno())
+                samples.append((time.perf_counter() - t0) * 1000.0)
+    finally:
         try:
-            keys = event.getKeys(keyList=['escape'])
-            if keys and 'escape' in keys:
-                core.quit()
-        except (AttributeError, RuntimeError):
+            os.remove(path)
+        except OSError:
             pass
-        remaining = min(chunk, duration - elapsed)
-        if remaining > 0:
-            safe_wait(remaining)
-        elapsed += remaining
+    return samples
 
-def safe_window_close(window):
-    """Safely close a window, checking if it's still valid to prevent NoneType errors"""
+def _preflight_decode_ms(stimuli_dir, n=10):
+    """Fully decode up to n random stimulus images with PIL; returns per-image ms."""
+    from PIL import Image
+    paths = []
+    for root, _, files in os.walk(stimuli_dir):
+        paths.extend(os.path.join(root, fn) for fn in files if fn.lower().endswith(('.jpg', '.jpeg', '.png')))
+    samples = []
+    for p in random.sample(paths, min(n, len(paths))):
+        t0 = time.perf_counter()
+        with Image.open(p) as im:
+            im.load()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+def _preflight_ttl_roundtrip_ms(n=10):
+    """Median ms of a command that needs no pulse (Cedrus base-timer query, parallel-port write of 0). None if unavailable."""
+    if not _ttl_discovery_done.wait(_ttl_discovery_wait_s):
+        return None
+    backend = _ttl_backend
+    if not isinstance(backend, tuple):
+        return None
+    backend_type, dev = backend
+    if backend_type == 'cedrus':
+        probe = getattr(dev, 'query_base_timer', None)
+    else:
+        probe = lambda: dev.setData(0)
+    if probe is None:
+        return None
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        probe()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return _median(samples)
+
+def _run_station_preflight(window, script_name, stimuli_dir):
+    """Measure station health, compare with _PREFLIGHT_THRESHOLDS, save a record and report to the experimenter."""
+    if os.environ.get('PREFLIGHT', '1') == '0' or _RENDER_BENCHMARK:
+        return None
+    print("Running station pre-flight...")
+    sys.stdout.flush()
+    _start_ttl_discovery()
+    log_dir = get_log_directory()
+    rec = {'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'hostname': platform.node(), 'script': script_name}
     try:
-        if window is not None:
-            # Check if window has a backend and it's not None
-            if hasattr(window, 'backend') and window.backend is not None:
-                window.close()
-            elif hasattr(window, 'close'):
-                # Try to close anyway, but catch any errors
-                try:
-                    window.close()
-                except Exception as e:
-                    print(f"ERROR in safe_window_close (inner): {repr(e)}", file=sys.stderr)
-                    traceback.print_exc()
+        rec['screen_size'] = f"{int(window.size[0])}x{int(window.size[1])}"
+    except Exception:
+        rec['screen_size'] = ''
+    failures = []
+    try:
+        n_flips = int(os.environ.get('PREFLIGHT_FLIPS', '300'))
+        intervals = _preflight_frame_intervals(window, n_flips)
+        mean = sum(intervals) / len(intervals)
+        sd = (sum((x - mean) ** 2 for x in intervals) / len(intervals)) ** 0.5
+        long_limit = 1.5 * 1000.0 / float(os.environ.get('PREFLIGHT_REFRESH_HZ', '60'))
+        rec.update(n_flips=n_flips, frame_interval_mean_ms=round(mean, 3), frame_interval_sd_ms=round(sd, 3),
+                   frame_interval_max_ms=round(max(intervals), 3), long_frames=sum(1 for x in intervals if x > long_limit))
+        if sd > _PREFLIGHT_THRESHOLDS['frame_interval_sd_ms']:
+            failures.append(f"frame interval SD {sd:.2f}ms")
+        if rec['long_frames'] > _PREFLIGHT_THRESHOLDS['long_frames']:
+            failures.append(f"{rec['long_frames']} frames > {long_limit:.1f}ms")
     except Exception as e:
-        print(f"ERROR in safe_window_close (outer): {repr(e)}", file=sys.stderr)
-        traceback.print_exc()
+        failures.append(f"flip test error: {e}")
+    try:
+        fs = _preflight_fsync_ms(log_dir)
+        rec.update(fsync_ms_median=round(_median(fs), 3), fsync_ms_max=round(max(fs), 3))
+        if rec['fsync_ms_median'] > _PREFLIGHT_THRESHOLDS['fsync_ms_median']:
+            failures.append(f"log fsync {rec['fsync_ms_median']:.1f}ms")
+    except Exception as e:
+        failures.append(f"log write error: {e}")
+    try:
+        dec = _preflight_decode_ms(stimuli_dir)
+        rec['n_decoded'] = len(dec)
+        if dec:
+            rec.update(decode_ms_median=round(_median(dec), 3), decode_ms_max=round(max(dec), 3))
+            if rec['decode_ms_median'] > _PREFLIGHT_THRESHOLDS['decode_ms_median']:
+                failures.append(f"image decode {rec['decode_ms_median']:.1f}ms")
+        else:
+            failures.append(f"no stimuli found in {stimuli_dir}")
+    except Exception as e:
+        failures.append(f"image decode error: {e}")
+    try:
+        rt = _preflight_ttl_roundtrip_ms()  # Waits (bounded) for discovery before _ttl_backend is read
+        rec['ttl_backend'] = _ttl_backend[0] if isinstance(_ttl_backend, tuple) else 'none'
+        rec['ttl_roundtrip_ms'] = round(rt, 3) if rt is not None else ''
+        if rec['ttl_backend'] == 'none':
+            failures.append("no TTL backend")
+        elif rt is not None and rt > _PREFLIGHT_THRESHOLDS['ttl_roundtrip_ms']:
+            failures.append(f"TTL round trip {rt:.1f}ms")
+    except Exception as e:
+        failures.append(f"TTL probe error: {e}")
+    try:
+        rec['free_disk_gb'] = round(shutil.disk_usage(log_dir).free / 1e9, 2)
+        if rec['free_disk_gb'] < _PREFLIGHT_THRESHOLDS['free_disk_gb']:
+            failures.append(f"only {rec['free_disk_gb']:.1f}GB free")
+    except Exception as e:
+        failures.append(f"disk check error: {e}")
+    rec['failures'] = '; '.join(failures)
+    rec['passed'] = not failures
+    # Append to station health record
+    health_file = os.path.join(log_dir, 'station_health.csv')
+    try:
+        file_exists = os.path.exists(health_file)
+        with open(health_file, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=_PREFLIGHT_FIELDNAMES, extrasaction='ignore')
+            if not file_exists:
+                writer.writeheader()
+            writer.writerow(rec)
+            f.flush()
+            try:
+                os.fsync(f.fileno())
+            except (AttributeError, OSError):
+                pass
+    except Exception as e:
+        print(f"Warning: Could not save station health record: {e}", file=sys.stderr)
+    print("=" * 60)
+    print(f"STATION PRE-FLIGHT {'PASSED' if rec['passed'] else 'FAILED'} ({rec['hostname']}, {rec['screen_size']})")
+    print(f"  Frames: mean {rec.get('frame_interval_mean_ms', '?')}ms, SD {rec.get('frame_interval_sd_ms', '?')}ms, max {rec.get('frame_interval_max_ms', '?')}ms, long {rec.get('long_frames', '?')}")
+    print(f"  Log fsync: median {rec.get('fsync_ms_median', '?')}ms, max {rec.get('fsync_ms_max', '?')}ms | Decode: median {rec.get('decode_ms_median', '?')}ms ({rec.get('n_decoded', 0)} images)")
+    print(f"  TTL: {rec['ttl_backend']} round trip {rec['ttl_roundtrip_ms'] if rec['ttl_roundtrip_ms'] != '' else 'n/a'}ms | Free disk: {rec.get('free_disk_gb', '?')}GB")
+    for f_msg in failures:
+        print(f"  ⚠ {f_msg}")
+    print(f"  Record appended to {health_file}")
+    print("=" * 60)
+    sys.stdout.flush()
+    if failures:
+        _show_preflight_failures(window, failures)
+    return rec
 
-def get_input_method():
-    """Ask user whether they're using touch screen (1) or click screen (2)"""
-    global USE_TOUCH_SCREEN
-    
-    # Create temporary window - handle partial initialization
-    temp_win = None
+def _show_preflight_failures(window, failures):
+    """Experimenter acknowledgement screen (before the participant starts). C / click continues, ESC quits."""
+    msg = visual.TextStim(
+        window,
+        text="STATION PRE-FLIGHT WARNING\n\n" + "\n".join(failures) +
+             "\n\nExperimenter: press C (or click) to continue anyway, ESC to quit.",
+        color='darkred', height=0.035, pos=(0, 0), wrapWidth=1.4
+    )
+    preflight_mouse = event.Mouse(win=window)
+    event.clearEvents()
+    while True:
+        msg.draw()
+        window.flip()
+        keys = event.getKeys(keyList=['c', 'escape'])
+        if 'escape' in keys:
+            core.quit()
+        if 'c' in keys or any(preflight_mouse.getPressed()):
+            break
+        core.wait(0.01)
+    event.clearEvents()
+
+# =========================
+#  GPU WARM-UP
+# =========================
+# The first draw of each stimulus class (ImageStim texture upload, TextStim glyph atlas per height, shape
+# shaders) is much slower than later draws. _warm_up_gpu() pays those costs on hidden frames (a full-screen
+# background rect covers every stim before the flip) after TTL probing and before the first photodiode
+# event, and prints first vs steady-state draw latency per class. WARMUP=0 skips it.
+
+_WARMUP_TEXT_HEIGHTS = (0.025, 0.035, 0.04, 0.025*0.75*1.35, 0.032*0.75*1.35, 0.035*0.75*1.35, 0.04*0.75*1.35,
+                        0.045*0.75*1.35, 0.06*0.75*1.35, 0.1*0.75*1.35, 0.04*1.35, 0.06*1.35)
+_WARMUP_STEADY_DRAWS = 5
+
+def _gpu_finish():
+    """Block until queued GL commands complete so draw timings include GPU work (no-op if unavailable)."""
     try:
-        # Create windowed window
-        # Add waitBlanking=False and useFBO=False to prevent hanging
-        temp_win = visual.Window(
-            size=(1400, 900),
-            color='lightgray',
-            units='height',
-            fullscr=True,
-            allowGUI=True,
-            waitBlanking=False,  # Prevent blocking on display sync
-            useFBO=False  # Disable framebuffer objects to prevent hangs
-        )
-        temp_win.flip()
-        
-        prompt_text = visual.TextStim(
-            temp_win,
-            text="What input method are you using?\n\n"
-                 "Double tap for touch screen, or press Right Arrow for keyboard:\n\n"
-                 "(Press ESC or tap Exit to leave fullscreen)",
-            color='black',
-            height=30/720*0.75,
-            pos=(0, 200/720*0.6),
-            wrapWidth=1000/720*0.75,
-            units='height'
-        )
-        
-        # Create button 1 (TOUCH SCREEN) - height units
-        button1 = visual.Rect(
-            temp_win,
-            width=520/720*0.75,
-            height=180/720*0.75,
-            fillColor='lightgreen',
-            lineColor='black',
-            pos=(-320/720*0.6, -80/720*0.6),
-            lineWidth=1/720*0.75,
-            units='height'
-        )
+        from pyglet import gl
+        gl.glFinish()
+    except Exception:
+        pass
+
+def _warm_up_draw_ms(stim):
+    """Time one draw of stim (ms, GPU work included)."""
+    t0 = time.perf_counter()
+    stim.draw()
+    _gpu_finish()
+    return (time.perf_counter() - t0) * 1000.0
+
+def _warm_up_gpu(window, stimuli_dir):
+    """Draw every stimulus class and text height on hidden frames; report first vs steady-state draw ms per class."""
+    if os.environ.get('WARMUP', '1') == '0':
+        return None
+    print("Warming up GPU stimulus paths...")
+    sys.stdout.flush()
+    stims = []  # (class label, stim)
+    image_path = None
+    for root, _, files in os.walk(stimuli_dir):
+        for fn in sorted(files):
+            if fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                image_path = os.path.join(root, fn)
+                break
+        if image_path:
+            break
+    try:
+        if image_path:
+            stims.append(('ImageStim', visual.ImageStim(window, image=image_path, size=(0.5*0.75, 0.5*0.75))))
+        for h in _WARMUP_TEXT_HEIGHTS:
+            stims.append((f'TextStim h={h:.4f}', visual.TextStim(window, text="Warm-up 0123456789 ?!.,",
+                                                                 color='black', height=h, pos=(0, 0))))
+        stims.append(('Circle', visual.Circle(window, radius=0.05, fillColor='white', lineColor='black')))
+        stims.append(('Rect', visual.Rect(window, width=0.2, height=0.1, fillColor='lightblue', lineColor='black')))
+        stims.append(('Line', visual.Line(window, start=(-0.2, 0), end=(0.2, 0), lineColor='black', lineWidth=3)))
+        cover = visual.Rect(window, width=4, height=4, fillColor='lightgray', lineColor='lightgray')
+    except Exception as e:
+        print(f"⚠ GPU warm-up skipped: {e}", file=sys.stderr)
+        return None
+    report = {}
+    for label, stim in stims:
+        try:
+            first = _warm_up_draw_ms(stim)
+            steady = _median([_warm_up_draw_ms(stim) for _ in range(_WARMUP_STEADY_DRAWS)])
+        except Exception as e:
+            print(f"⚠ GPU warm-up: {label} failed: {e}", file=sys.stderr)
+            continue
+        cover.draw()  # Hide everything drawn so far
+        window.flip()
+        report[label] = (first, steady)
+    window.flip()
+    for label, (first, steady) in report.items():
+        print(f"  {label}: first {first:.2f} ms / steady {steady:.2f} ms")
+    print(f"✓ GPU warm-up done ({len(report)} stimulus classes)")
+    sys.stdout.flush()
+    return report
+
+# =========================
+#  SESSION CAPTURE
+# =========================
+# CAPTURE_VIDEO=1 records the session to video for QA, in place of hand-made screen recordings. At most CAPTURE_FPS
+# times a second (default 30), and on every flip that carries a TTL event, the back buffer is blitted just before
+# the flip into a small framebuffer (CAPTURE_SCALE, default 0.5), so the downscale happens on the GPU. The small
+# frame is then read into a pixel buffer object without waiting. The PBO is mapped on a later flip, once the GPU
+# has finished, and the pixels go to a bounded queue. A background thread pipes them to an ffmpeg encoder process
+# through imageio. Each frame is held until the next captured flip, so the video runs in wall-clock time. A sidecar
+# _frames.csv tags every captured frame with its flip timestamp and TTL event types. The display never waits for
+# the encoder: if the queue (CAPTURE_QUEUE, default 8 frames) is full, the capture frame is dropped and counted.
+# The count is reported when the session ends.
+
+_capture_queue = [None]  # queue.Queue of (flip_time, event_types, width, height, rgb bytes); None = capture off
+_capture_thread = [None]
+_capture_dropped = [0]
+_capture_path_ref = [None]
+_capture_stopped = [False]  # Set when the worker thread fails; the flip hook then stops reading back frames
+_CAPTURE_FSYNC_INTERVAL_S = 1.0  # _frames.csv is flushed every frame and fsynced at most this often (and at close)
+_capture_gl = {'fbo': None, 'rb': None, 'pbo': None, 'size': None, 'scale': 0.5, 'interval': 0.0, 'last': 0.0,
+               'pending': None}  # pending = [width, height, flip_time, event_types] of the read in the PBO
+_CAPTURE_FRAME_FIELDNAMES = ['frame', 'video_frame', 'flip_time', 'event_types']
+
+def _capture_worker(q, path, fps, max_hold_s):
+    """Background thread: run the encoder; on any failure stop capture (flip hook checks _capture_stopped)."""
+    try:
+        _capture_encode(q, path, fps, max_hold_s)
+    except Exception as e:
+        _capture_stopped[0] = True
+        print(f"⚠ Session capture stopped: {e}", file=sys.stderr)
+        sys.stderr.flush()
+
+def _capture_encode(q, path, fps, max_hold_s):
+    """Decode queued frames, hold each until the next captured flip, write video + frame index."""
+    import numpy as np
+    import imageio
+    from PIL import Image
+    writer = imageio.get_writer(path, fps=fps, macro_block_size=2)
+    index_path = os.path.splitext(path)[0] + "_frames.csv"
+    n_frames = 0
+    n_video_frames = 0
+    last = None  # (flip_time, array)
+    last_fsync = time.monotonic()
+    try:
+        with open(index_path, 'w', newline='') as index_file:
+            index = csv.DictWriter(index_file, fieldnames=_CAPTURE_FRAME_FIELDNAMES)
+            index.writeheader()
+            try:
+                while True:
+                    item = q.get()
+                    if item is None:
+                        break
+                    flip_time, event_types, w, h, data = item
+                    img = Image.frombytes('RGB', (w, h), data).transpose(Image.FLIP_TOP_BOTTOM)
+                    if last is not None:
+                        hold = max(1, min(int(round((flip_time - last[0]) * fps)), int(max_hold_s * fps)))
+                        for _ in range(hold):
+                            writer.append_data(last[1])
+                        n_video_frames += hold
+                    last = (flip_time, np.asarray(img))
+                    index.writerow({'frame': n_frames, 'video_frame': n_video_frames, 'flip_time': f"{flip_time:.9f}",
+                                    'event_types': ";".join(event_types)})
+                    index_file.flush()
+                    if time.monotonic() - last_fsync >= _CAPTURE_FSYNC_INTERVAL_S:  # Leave the disk to the TTL/trial fsyncs
+                        os.fsync(index_file.fileno())
+                        last_fsync = time.monotonic()
+                    n_frames += 1
+                if last is not None:
+                    writer.append_data(last[1])
+            finally:
+                index_file.flush()
+                os.fsync(index_file.fileno())
+    finally:
+        writer.close()
+    print(f"✓ Session capture saved to {path} ({n_frames} frames captured, {_capture_dropped[0]} dropped)")
+    sys.stdout.flush()
+
+def _start_session_capture(window, name):
+    """Start the capture thread if CAPTURE_VIDEO=1 and imageio (with ffmpeg) is installed."""
+    if os.environ.get('CAPTURE_VIDEO', '0') != '1' or _capture_queue[0] is not None:
+        return
+    try:
+        import imageio  # noqa: F401 (used by the worker thread)
+        import imageio_ffmpeg
+        imageio_ffmpeg.get_ffmpeg_exe()  # Raises if the ffmpeg binary is missing
+        from pyglet import gl  # noqa: F401
+    except Exception as e:
+        print(f"⚠ Session capture unavailable ({e}); install imageio and imageio-ffmpeg", file=sys.stderr)
+        return
+    import queue
+    import atexit
+    fps = max(1, int(os.environ.get('CAPTURE_FPS', '30')))
+    path = os.path.join(get_log_directory(), f"{name}_capture_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
+    q = queue.Queue(maxsize=max(1, int(os.environ.get('CAPTURE_QUEUE', '8'))))
+    t = threading.Thread(target=_capture_worker, name="session-capture", daemon=True, args=(q, path, fps, 30.0))
+    t.start()
+    _capture_gl['scale'] = float(os.environ.get('CAPTURE_SCALE', '0.5'))
+    _capture_gl['interval'] = 1.0 / fps
+    _capture_queue[0] = q
+    _capture_thread[0] = t
+    _capture_path_ref[0] = path
+    atexit.register(_stop_session_capture)  # Also finalizes the file on ESC / core.quit()
+    print(f"✓ Session capture: {path}")
+
+def _capture_gl_setup(window):
+    """Create the downscale framebuffer and the pixel pack buffer (first capture, window context current)."""
+    import ctypes
+    from pyglet import gl
+    w, h = (int(v) for v in getattr(window, 'frameBufferSize', window.size))
+    scale = _capture_gl['scale']
+    sw, sh = max(2, int(w * scale)) // 2 * 2, max(2, int(h * scale)) // 2 * 2  # Even sizes for yuv420p
+    fbo, rb, pbo, prev_draw = gl.GLuint(0), gl.GLuint(0), gl.GLuint(0), gl.GLint(0)
+    gl.glGenRenderbuffers(1, ctypes.byref(rb))
+    gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, rb)
+    gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_RGBA8, sw, sh)
+    gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, 0)
+    gl.glGenFramebuffers(1, ctypes.byref(fbo))
+    gl.glGetIntegerv(gl.GL_DRAW_FRAMEBUFFER_BINDING, ctypes.byref(prev_draw))
+    gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, fbo)
+    gl.glFramebufferRenderbuffer(gl.GL_DRAW_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_RENDERBUFFER, rb)
+    status = gl.glCheckFramebufferStatus(gl.GL_DRAW_FRAMEBUFFER)
+    gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, prev_draw.value)
+    if status != gl.GL_FRAMEBUFFER_COMPLETE:
+        raise RuntimeError(f"capture framebuffer incomplete (0x{status:x})")
+    gl.glGenBuffers(1, ctypes.byref(pbo))
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, pbo)
+    gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER, sw * sh * 3, None, gl.GL_STREAM_READ)
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+    _capture_gl.update(fbo=fbo, rb=rb, pbo=pbo, size=(w, h, sw, sh))
+
+def _capture_collect(q):
+    """Map the PBO filled on an earlier flip and queue its pixels (never blocks on the encoder)."""
+    pending = _capture_gl['pending']
+    if pending is None:
+        return
+    _capture_gl['pending'] = None
+    sw, sh, flip_time, event_types = pending
+    if flip_time is None:  # The flip after the read failed: nothing to time-stamp the frame against
+        _capture_dropped[0] += 1
+        return
+    import ctypes
+    from pyglet import gl
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, _capture_gl['pbo'])
+    try:
+        ptr = gl.glMapBuffer(gl.GL_PIXEL_PACK_BUFFER, gl.GL_READ_ONLY)
+        data = ctypes.string_at(ptr, sw * sh * 3) if ptr else None
+    finally:
+        gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+    if data is None:  # Map failed: no pixels for this frame
+        _capture_dropped[0] += 1
+        return
+    try:
+        q.put_nowait((flip_time, event_types, sw, sh, data))
+    except Exception:
+        _capture_dropped[0] += 1
+
+def _capture_read_back(window, force=False):
+    """Called just before the flip: queue the previous capture, then start a GPU-downscaled, asynchronous read of
+    the back buffer. Rate-limited to CAPTURE_FPS unless force (flips carrying TTL events). True if a read started."""
+    q = _capture_queue[0]
+    if q is None or _capture_stopped[0]:
+        return None
+    try:
+        if _capture_gl['fbo'] is None:
+            _capture_gl_setup(window)
+    except Exception as e:
+        print(f"⚠ Session capture stopped: GPU downscale/PBO read-back unavailable ({e})", file=sys.stderr)
+        _stop_session_capture()
+        return None
+    try:
+        import ctypes
+        from pyglet import gl
+        _capture_collect(q)
+        now = time.perf_counter()
+        if not force and now - _capture_gl['last'] < _capture_gl['interval']:
+            return None
+        if q.full():
+            _capture_dropped[0] += 1
+            return None
+        w, h, sw, sh = _capture_gl['size']
+        prev_read, prev_draw = gl.GLint(0), gl.GLint(0)
+        gl.glGetIntegerv(gl.GL_READ_FRAMEBUFFER_BINDING, ctypes.byref(prev_read))
+        gl.glGetIntegerv(gl.GL_DRAW_FRAMEBUFFER_BINDING, ctypes.byref(prev_draw))
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, 0)
+        gl.glReadBuffer(gl.GL_BACK)
+        gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, _capture_gl['fbo'])
+        gl.glBlitFramebuffer(0, 0, w, h, 0, 0, sw, sh, gl.GL_COLOR_BUFFER_BIT, gl.GL_LINEAR)
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, _capture_gl['fbo'])
+        gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, _capture_gl['pbo'])
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        gl.glReadPixels(0, 0, sw, sh, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, None)  # Into the PBO: returns without waiting
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, prev_read.value)
+        gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, prev_draw.value)
+        _capture_gl['last'] = now
+        _capture_gl['pending'] = [sw, sh, None, []]
+        return True
+    except Exception:
+        _capture_dropped[0] += 1
+        return None
+
+def _capture_submit(flip_time, event_types):
+    """Attach the flip timestamp and TTL event types to the read started before this flip."""
+    pending = _capture_gl['pending']
+    if pending is not None:
+        pending[2], pending[3] = flip_time, list(event_types)
+
+def _stop_session_capture():
+    """Flush queued frames and close the video (idempotent)."""
+    q, t = _capture_queue[0], _capture_thread[0]
+    if q is None:
+        return
+    _capture_queue[0] = None
+    if _capture_stopped[0]:
+        return  # Worker already gone (failure reported by the worker)
+    try:
+        q.put(None, timeout=5.0)
+        t.join(timeout=60.0)
+    except Exception as e:
+        print(f"⚠ Session capture did not finish cleanly: {e}", file=sys.stderr)
+
+# =========================
+#  DRAW TIMING
+# =========================
+# Per-screen draw cost. _timed_draw(screen)(draw_func) wraps a screen's draw function. It always records CPU
+# time. With GPU_TIMER_QUERIES=1 (and GL 3.3 / ARB_timer_query) it also records the GPU time of the same draw
+# calls through a GL_TIME_ELAPSED query. Query results are collected on later calls once the GPU reports them,
+# so the frame never stalls on a readback. _draw_timing_summary() gives median/p95 per screen and the share of the
+# frame budget, for the session summary. Screens close to the budget are flagged on the console.
+
+_draw_timing = {}  # screen -> {'cpu': [ms, ...], 'gpu': [ms, ...]}
+_gpu_queries = {'enabled': os.environ.get('GPU_TIMER_QUERIES', '0') == '1', 'free': [], 'pending': deque(), 'active': False}
+
+def _gpu_query_begin():
+    """Start a GL_TIME_ELAPSED query; returns its id, or None (disabled, unsupported, or one already running)."""
+    if not _gpu_queries['enabled'] or _gpu_queries['active']:
+        return None
+    try:
+        from pyglet import gl
+        if _gpu_queries['free']:
+            qid = _gpu_queries['free'].pop()
+        else:
+            ids = (gl.GLuint * 16)()
+            gl.glGenQueries(16, ids)
+            _gpu_queries['free'].extend(ids[1:])
+            qid = ids[0]
+        gl.glBeginQuery(getattr(gl, 'GL_TIME_ELAPSED', 0x88BF), qid)
+        _gpu_queries['active'] = True
+        return qid
+    except Exception as e:
+        _gpu_queries['enabled'] = False
+        print(f"⚠ GPU timer queries unavailable ({e}); recording CPU draw time only", file=sys.stderr)
+        return None
+
+def _gpu_query_end(screen, qid):
+    try:
+        from pyglet import gl
+        gl.glEndQuery(getattr(gl, 'GL_TIME_ELAPSED', 0x88BF))
+        _gpu_queries['pending'].append((screen, qid))
+    except Exception:
+        pass
+    _gpu_queries['active'] = False
+
+def _collect_gpu_queries(wait=False):
+    """Move finished query results (ns) into _draw_timing, oldest first. wait=True blocks for all of them."""
+    pending = _gpu_queries['pending']
+    if not pending:
+        return
+    try:
+        import ctypes
+        from pyglet import gl
+        while pending:
+            screen, qid = pending[0]
+            available = gl.GLint(0)
+            gl.glGetQueryObjectiv(qid, gl.GL_QUERY_RESULT_AVAILABLE, ctypes.byref(available))
+            if not available.value and not wait:
+                break
+            elapsed_ns = gl.GLuint64(0)
+            gl.glGetQueryObjectui64v(qid, gl.GL_QUERY_RESULT, ctypes.byref(elapsed_ns))
+            pending.popleft()
+            _gpu_queries['free'].append(qid)
+            _draw_timing.setdefault(screen, {'cpu': [], 'gpu': []})['gpu'].append(elapsed_ns.value / 1e6)
+    except Exception:
+        pending.clear()
+
+def _timed_draw(screen):
+    """Decorator: record CPU (and optionally GPU) time of each call of a screen's draw function under screen."""
+    def wrap(draw_func):
+        def timed():
+            _collect_gpu_queries()
+            qid = _gpu_query_begin()
+            t0 = time.perf_counter()
+            draw_func()
+            cpu_ms = (time.perf_counter() - t0) * 1000.0
+            if qid is not None:
+                _gpu_query_end(screen, qid)
+            _draw_timing.setdefault(screen, {'cpu': [], 'gpu': []})['cpu'].append(cpu_ms)
+        return timed
+    return wrap
+
+def _draw_timing_summary(window):
+    """{column: value} per screen: n, CPU/GPU median and p95 (ms), and p95 as % of the frame budget. Prints a table."""
+    _collect_gpu_queries(wait=True)
+    try:
+        frame_period = float(getattr(window, 'monitorFramePeriod', None))
+    except (TypeError, ValueError):
+        frame_period = None
+    if not frame_period or not 0.002 < frame_period < 0.05:
+        frame_period = 1.0 / 60.0
+    def pct(xs, q):
+        xs = sorted(xs)
+        return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else None
+    budget_ms = frame_period * 1000.0
+    summary = {}
+    if _draw_timing:
+        print(f"Draw timing per screen (frame budget {budget_ms:.1f} ms):")
+    for screen, t in sorted(_draw_timing.items()):
+        cpu_p95, gpu_p95 = pct(t['cpu'], 0.95), pct(t['gpu'], 0.95)
+        worst = max(x for x in (cpu_p95, gpu_p95) if x is not None)
+        row = {'n': len(t['cpu']), 'cpu_ms_median': _median(t['cpu']), 'cpu_ms_p95': cpu_p95,
+               'gpu_ms_median': _median(t['gpu']), 'gpu_ms_p95': gpu_p95, 'frame_budget_pct': 100.0 * worst / budget_ms}
+        for key, value in row.items():
+            summary[f"draw_{screen}_{key}"] = '' if value is None else round(value, 3)
+        mark = "⚠" if row['frame_budget_pct'] > 80.0 else " "
+        gpu = f"{gpu_p95:.2f}" if gpu_p95 is not None else "-"
+        print(f"{mark} {screen}: CPU p95 {cpu_p95:.2f} ms, GPU p95 {gpu} ms, {row['frame_budget_pct']:.0f}% of frame ({row['n']} draws)")
+    sys.stdout.flush()
+    return summary
+
+# =========================
+#  RENDER BENCHMARK
+# =========================
+# RENDER_BENCHMARK=1 runs the real task unattended, so draw costs can be tracked in CI. It works headless (pyglet
+# EGL context, enabled before PsychoPy is imported). Input-method choice, name entry and pre-flight are skipped.
+# An autopilot thread emulates key presses (RENDER_BENCHMARK_KEYS every RENDER_BENCHMARK_KEY_INTERVAL s). Every
+# flip is split into draw_ms (glFinish on the frame's queued draws; with a software GL driver this is the real
+# CPU rasterization of ImageStim/TextStim/shapes) and flip_ms (swap + finish). Costs are grouped by screen, where a
+# screen is named by the last photodiode event queued. At exit the per-screen medians/p95 go to
+# render_benchmark_<script>_<host>_<time>.csv. RENDER_BENCHMARK_BASELINE=<earlier csv> flags screens whose median
+# draw cost grew by more than RENDER_BENCHMARK_TOLERANCE (default 0.25) and 0.5 ms.
+
+_RENDER_BENCHMARK = os.environ.get('RENDER_BENCHMARK', '0') == '1'
+_bench_screen = ['startup']  # Screen label for the next flips: last photodiode event type queued
+_bench_samples = {}  # screen -> [(draw_ms, flip_ms), ...]
+_RENDER_BENCHMARK_FIELDNAMES = ['screen', 'n_frames', 'draw_ms_median', 'draw_ms_p95', 'draw_ms_max',
+                                'flip_ms_median', 'flip_ms_p95', 'flip_ms_max', 'baseline_draw_ms_median', 'regression']
+
+def _bench_timed_flip(orig_flip, *args, **kwargs):
+    """Flip via orig_flip and record draw/flip cost for the current screen."""
+    t0 = time.perf_counter()
+    _gpu_finish()
+    t1 = time.perf_counter()
+    result = orig_flip(*args, **kwargs)
+    _gpu_finish()
+    t2 = time.perf_counter()
+    _bench_samples.setdefault(_bench_screen[0], []).append(((t1 - t0) * 1000.0, (t2 - t1) * 1000.0))
+    return result
+
+def _bench_autopilot_loop(keys, interval):
+    """Background: emulate one key press every interval s, cycling through keys (PsychoPy buffer + input queue)."""
+    i = 0
+    while True:
+        time.sleep(interval)
+        name = keys[i % len(keys)]
+        i += 1
+        try:
+            event._onPygletKey(name, 0, emulated=True)  # Same path as psychopy.hardware.emulator
+        except Exception:
+            pass
+        _key_events.append((name, time.time()))
+
+def _start_render_benchmark(script_name):
+    """Start the key autopilot and register the results writer (RENDER_BENCHMARK=1 only)."""
+    if not _RENDER_BENCHMARK:
+        return
+    import atexit
+    keys = [k.strip() for k in os.environ.get('RENDER_BENCHMARK_KEYS', 'right,return,left,return,space').split(',') if k.strip()]
+    interval = float(os.environ.get('RENDER_BENCHMARK_KEY_INTERVAL', '0.3'))
+    threading.Thread(target=_bench_autopilot_loop, args=(keys, interval), name="render-benchmark-autopilot", daemon=True).start()
+    atexit.register(_save_render_benchmark, script_name)
+    print(f"✓ Render benchmark: autopilot keys {keys} every {interval}s")
+    sys.stdout.flush()
+
+def _save_render_benchmark(script_name):
+    """Write per-screen draw/flip cost summary; compare with RENDER_BENCHMARK_BASELINE if given."""
+    if not _bench_samples:
+        return
+    def pct(xs, q):
+        xs = sorted(xs)
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
+    baseline = {}
+    baseline_path = os.environ.get('RENDER_BENCHMARK_BASELINE')
+    if baseline_path:
+        try:
+            with open(baseline_path, newline='') as f:
+                baseline = {row['screen']: float(row['draw_ms_median']) for row in csv.DictReader(f)}
+        except Exception as e:
+            print(f"⚠ Could not read render benchmark baseline {baseline_path}: {e}", file=sys.stderr)
+    tolerance = float(os.environ.get('RENDER_BENCHMARK_TOLERANCE', '0.25'))
+    rows = []
+    regressions = []
+    for screen, samples in sorted(_bench_samples.items()):
+        draws = [d for d, _ in samples]
+        flips = [f for _, f in samples]
+        draw_median = _median(draws)
+        base = baseline.get(screen)
+        regression = base is not None and draw_median > base * (1.0 + tolerance) and draw_median - base > 0.5
+        if regression:
+            regressions.append(f"{screen} {base:.2f} -> {draw_median:.2f} ms")
+        rows.append({'screen': screen, 'n_frames': len(samples), 'draw_ms_median': round(draw_median, 3),
+                     'draw_ms_p95': round(pct(draws, 0.95), 3), 'draw_ms_max': round(max(draws), 3),
+                     'flip_ms_median': round(_median(flips), 3), 'flip_ms_p95': round(pct(flips, 0.95), 3),
+                     'flip_ms_max': round(max(flips), 3), 'baseline_draw_ms_median': '' if base is None else base,
+                     'regression': int(regression)})
+    path = os.path.join(get_log_directory(), f"render_benchmark_{script_name}_{platform.node()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    try:
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=_RENDER_BENCHMARK_FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"✓ Render benchmark saved to {path} ({len(rows)} screens)")
+    except Exception as e:
+        print(f"⚠ Could not save render benchmark: {e}", file=sys.stderr)
+    for r in regressions:
+        print(f"⚠ Render regression: {r}", file=sys.stderr)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+def safe_wait(duration):
+    """Wrapper for core.wait() that handles macOS event dispatch errors (e.g. NSTrackingArea)"""
+    try:
+        core.wait(duration)
+    except AttributeError as e:
+        err_str = str(e)
+        if "type" in err_str and ("ObjCInstance" in err_str or "NSConcreteNotification" in err_str or "NSTrackingArea" in err_str):
+            pass
+        else:
+            raise
+    except Exception:
+        pass
+
+def wait_with_escape(duration):
+    """Wait for duration, checking for ESC every 0.05s. If ESC pressed, quit immediately."""
+    elapsed = 0.0
+    chunk = 0.05
+    while elapsed < duration:
+        # Check ESC FIRST before any wait (event.getKeys is destructive)
+        try:
+            keys = event.getKeys(keyList=['escape'])
+            if keys and 'escape' in keys:
+                core.quit()
+        except (AttributeError, RuntimeError):
+            pass
+        remaining = min(chunk, duration - elapsed)
+        if remaining > 0:
+            safe_wait(remaining)
+        elapsed += remaining
+
+def safe_window_close(window):
+    """Safely close a window, checking if it's still valid to prevent NoneType errors"""
+    try:
+        if window is not None:
+            # Check if window has a backend and it's not None
+            if hasattr(window, 'backend') and window.backend is not None:
+                window.close()
+            elif hasattr(window, 'close'):
+                # Try to close anyway, but catch any errors
+                try:
+                    window.close()
+                except Exception as e:
+                    print(f"ERROR in safe_window_close (inner): {repr(e)}", file=sys.stderr)
+                    traceback.print_exc()
+    except Exception as e:
+        print(f"ERROR in safe_window_close (outer): {repr(e)}", file=sys.stderr)
+        traceback.print_exc()
+
+def get_input_method():
+    """Ask user whether they're using touch screen (1) or click screen (2)"""
+    global USE_TOUCH_SCREEN
+    if _RENDER_BENCHMARK:
+        USE_TOUCH_SCREEN = False  # Autopilot drives the keyboard paths
+        return USE_TOUCH_SCREEN, None
+    
+    # Create temporary window - handle partial initialization
+    temp_win = None
+    try:
+        # Create windowed window
+        # Add waitBlanking=False and useFBO=False to prevent hanging
+        temp_win = visual.Window(
+            size=(1400, 900),
+            color='lightgray',
+            units='height',
+            fullscr=True,
+            allowGUI=True,
+            waitBlanking=False,  # Prevent blocking on display sync
+            useFBO=False  # Disable framebuffer objects to prevent hangs
+        )
+        temp_win.flip()
+        
+        prompt_text = visual.TextStim(
+            temp_win,
+            text="What input method are you using?\n\n"
+                 "Double tap for touch screen, or press Right Arrow for keyboard:\n\n"
+                 "(Press ESC or tap Exit to leave fullscreen)",
+            color='black',
+            height=30/720*0.75,
+            pos=(0, 200/720*0.6),
+            wrapWidth=1000/720*0.75,
+            units='height'
+        )
+        
+        # Create button 1 (TOUCH SCREEN) - height units
+        button1 = visual.Rect(
+            temp_win,
+            width=520/720*0.75,
+            height=180/720*0.75,
+            fillColor='lightgreen',
+            lineColor='black',
+            pos=(-320/720*0.6, -80/720*0.6),
+            lineWidth=1/720*0.75,
+            units='height'
+        )
         button1_text = visual.TextStim(
             temp_win, 
             text="TOUCH SCREEN\n(Double tap)", 
@@ -566,7 +1836,6 @@ def get_input_method():
         # If there's an error, close temp window in exception handler
         print(f"ERROR in get_input_method: {e}", file=sys.stderr)
         sys.stderr.flush()
-        import traceback
         traceback.print_exc(file=sys.stderr)
         sys.stderr.flush()
         if temp_win is not None:
@@ -581,6 +1850,67 @@ def get_input_method():
         # This prevents PsychoPy from quitting when all windows are closed
         pass
 
+# =========================
+#  TEXTURE REGISTRY
+# =========================
+# One ImageStim (one GL texture) per (path, size), shared by every presentation: partner avatars at each switch,
+# practice shapes across trials, and a studied image when it returns in recognition. acquire() returns the
+# cached stim (pos reset to centre; callers only move images) and counts a reference. release() drops it.
+# Textures with no references stay cached. When the estimated texture memory (4 bytes per source pixel) exceeds
+# TEXTURE_BUDGET_MB (default 256), unreferenced ones are evicted, least recently used first.
+
+class TextureRegistry:
+    """Refcounted LRU cache of ImageStims keyed by (path, size)."""
+    def __init__(self, budget_mb):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> [stim, refs, nbytes], least recently used first
+        self._keys = {}  # id(stim) -> key
+
+    def acquire(self, path, size=None, maintain_aspect_ratio=False):
+        """Shared ImageStim for path. size in window units; maintain_aspect_ratio scales width to the file's aspect."""
+        key = (os.path.abspath(path), 'aspect' if maintain_aspect_ratio else tuple(size))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            entry[0].pos = (0, 0)
+            entry[1] += 1
+            self.hits += 1
+            return entry[0]
+        from PIL import Image as PILImage
+        with PILImage.open(path) as img:  # Header only: dimensions for the aspect ratio and the memory estimate
+            img_width, img_height = img.size
+        if maintain_aspect_ratio:
+            size = (size[1] * img_width / img_height, size[1])
+        stim = visual.ImageStim(win, image=path, size=size)
+        self._entries[key] = [stim, 1, img_width * img_height * 4]
+        self._keys[id(stim)] = key
+        self.total_bytes += img_width * img_height * 4
+        self.misses += 1
+        self._evict()
+        return stim
+
+    def release(self, stim):
+        """Drop one reference to a stim from acquire() (others are ignored)."""
+        entry = self._entries.get(self._keys.get(id(stim)))
+        if entry is not None and entry[1] > 0:
+            entry[1] -= 1
+            self._evict()
+
+    def _evict(self):
+        if self.total_bytes <= self.budget_bytes:
+            return
+        for key in [k for k, e in self._entries.items() if e[1] == 0]:
+            stim, _, nbytes = self._entries.pop(key)
+            del self._keys[id(stim)]
+            self.total_bytes -= nbytes  # Texture is freed when the last reference to the stim goes
+            if self.total_bytes <= self.budget_bytes:
+                break
+
+_textures = TextureRegistry(float(os.environ.get('TEXTURE_BUDGET_MB', '256')))
+
 # =========================
 #  STIMULI SETUP (Module-level constants)
 # =========================
@@ -600,71 +1930,71 @@ CATEGORY_MAPPING = {
     "VEHICLE": (91, 100),       # 091-100
 }
 
-# Ask for input method first
-print("Getting input method...")
-result = None
-temp_win = None
-try:
-    print("DEBUG: About to call get_input_method()...", file=sys.stderr)
-    sys.stderr.flush()
-    result, temp_win = get_input_method()
-    print(f"DEBUG: get_input_method() returned: result={result}, temp_win={temp_win}", file=sys.stderr)
-    sys.stderr.flush()
-    print(f"Input method result: {result}")
-    sys.stdout.flush()
-except Exception as e:
-    print(f"ERROR in get_input_method(): {e}", file=sys.stderr)
-    sys.stderr.flush()
-    import traceback
-    traceback.print_exc(file=sys.stderr)
-    sys.stderr.flush()
-    traceback.print_exc()
-    print(f"ERROR in get_input_method(): {e}")
-    # Close temp window if it exists
-    if temp_win is not None:
-        try:
-            temp_win.close()
-        except:
-            pass
-    print("Press Enter to exit...")
-    try:
-        input()
-    except Exception as e:
-        print(f"ERROR in get_input_method() exception handler: {repr(e)}", file=sys.stderr)
-        traceback.print_exc()
+def _choose_input_method():
+    """Show the input-method screen; returns its window, which run_localizer() retires (exits on cancel or failure)."""
+    # Ask for input method first
+    print("Getting input method...")
+    result = None
+    temp_win = None
     try:
-        core.quit()
+        print("DEBUG: About to call get_input_method()...", file=sys.stderr)
+        sys.stderr.flush()
+        result, temp_win = get_input_method()
+        print(f"DEBUG: get_input_method() returned: result={result}, temp_win={temp_win}", file=sys.stderr)
+        sys.stderr.flush()
+        print(f"Input method result: {result}")
+        sys.stdout.flush()
     except Exception as e:
-        print(f"ERROR calling core.quit(): {repr(e)}", file=sys.stderr)
+        print(f"ERROR in get_input_method(): {e}", file=sys.stderr)
+        sys.stderr.flush()
+        traceback.print_exc(file=sys.stderr)
+        sys.stderr.flush()
         traceback.print_exc()
-    exit(1)
+        print(f"ERROR in get_input_method(): {e}")
+        # Close temp window if it exists
+        if temp_win is not None:
+            try:
+                temp_win.close()
+            except:
+                pass
+        print("Press Enter to exit...")
+        try:
+            input()
+        except Exception as e:
+            print(f"ERROR in get_input_method() exception handler: {repr(e)}", file=sys.stderr)
+            traceback.print_exc()
+        try:
+            core.quit()
+        except Exception as e:
+            print(f"ERROR calling core.quit(): {repr(e)}", file=sys.stderr)
+            traceback.print_exc()
+        exit(1)
 
-if result is None:
-    print("Input method selection cancelled. Exiting...")
-    print("Press Enter to exit...")
-    try:
-        input()
-    except Exception as e:
-        print(f"ERROR in input() call: {repr(e)}", file=sys.stderr)
-        traceback.print_exc()
-    try:
-        core.quit()
-    except Exception as e:
-        print(f"ERROR calling core.quit(): {repr(e)}", file=sys.stderr)
-        traceback.print_exc()
-    exit(0)
-
-print(f"Input method selected: {'TOUCH SCREEN' if result else 'MOUSE/TRACKPAD'}")
-sys.stdout.flush()
-sys.stderr.flush()
-print(f"Result value: {result}, Type: {type(result)}")
-sys.stdout.flush()
-sys.stderr.flush()
-print("About to create main window...")
-sys.stdout.flush()
-sys.stderr.flush()
-print("DEBUG: About to define helper functions before window creation", file=sys.stderr)
-sys.stderr.flush()
+    if result is None:
+        print("Input method selection cancelled. Exiting...")
+        print("Press Enter to exit...")
+        try:
+            input()
+        except Exception as e:
+            print(f"ERROR in input() call: {repr(e)}", file=sys.stderr)
+            traceback.print_exc()
+        try:
+            core.quit()
+        except Exception as e:
+            print(f"ERROR calling core.quit(): {repr(e)}", file=sys.stderr)
+            traceback.print_exc()
+        exit(0)
+
+    print(f"Input method selected: {'TOUCH SCREEN' if result else 'MOUSE/TRACKPAD'}")
+    sys.stdout.flush()
+    sys.stderr.flush()
+    print(f"Result value: {result}, Type: {type(result)}")
+    sys.stdout.flush()
+    sys.stderr.flush()
+    print("About to create main window...")
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return temp_win
 
 def get_category_for_stimulus(stimulus_num):
     """Get the category name for a given stimulus number"""
@@ -776,6 +2106,8 @@ def load_all_stimuli():
 
 def get_participant_id():
     """Get participant ID from PsychoPy screen input with on-screen keyboard for touch screens"""
+    if _RENDER_BENCHMARK:
+        return "benchmark_test"  # Test ID: no session data files are written
     global PHOTODIODE_ACTIVE
     PHOTODIODE_ACTIVE = False  # Exclude name entry from photodiode
     
@@ -791,7 +2123,6 @@ def get_participant_id():
         print("Mouse created successfully")
     except Exception as e:
         print(f"Error creating mouse: {e}")
-        import traceback
         traceback.print_exc()
         raise
 
@@ -813,7 +2144,6 @@ def get_participant_id():
             print("input_display created")
     except Exception as e:
         print(f"ERROR creating text stimuli: {e}")
-        import traceback
         traceback.print_exc()
         raise
 
@@ -867,45 +2197,71 @@ def get_participant_id():
             print("All keyboard buttons created successfully")
         except Exception as e:
             print(f"ERROR creating keyboard buttons: {e}")
-            import traceback
             traceback.print_exc()
             raise
 
+    if USE_TOUCH_SCREEN:
+        # The whole keyboard (keys, BACKSPACE, CONTINUE, Exit) is rendered once into one texture; a press is shown by a
+        # highlight overlay drawn over that key, so a frame is one textured quad + prompt + typed text
+        draw_keyboard = _static_layers([stim for row in keyboard_buttons for button, text, _, _, _ in row for stim in (button, text)]
+                                       + [backspace_button, backspace_text, continue_button, continue_text, exit_btn, exit_text])
+        key_highlight = visual.Rect(win, width=0.07*0.75, height=0.08*0.75*1.35, fillColor='yellow', lineColor='black', opacity=0.6)
+        highlight_on = [False]
+        
+        # Hit areas registered once: exit first, then keys, BACKSPACE, CONTINUE (exact bounds, as contains() used)
+        id_hits = HitRegistry().add_exit()
+        key_buttons = {}
+        for row in keyboard_buttons:
+            for button, text, key, x_pos, y_pos in row:
+                id_hits.add_button('key:' + key, button, touch_margin=False)
+                key_buttons[key] = button
+        id_hits.add_button('backspace', backspace_button, touch_margin=False)
+        id_hits.add_button('continue', continue_button, touch_margin=False)
+    
+    shown_id = [None]
+    
     def redraw():
-        id_prompt.draw()
-        input_display.text = input_id if input_id else "_"
-        input_display.draw()
+        if shown_id[0] != input_id:
+            input_display.text = input_id if input_id else "_"  # Re-rendered only when the typed text changes
+            shown_id[0] = input_id
         
         if USE_TOUCH_SCREEN:
-            for row in keyboard_buttons:
-                for button, text, _, _, _ in row:
-                    button.draw()
-                    text.draw()
-            backspace_button.draw()
-            backspace_text.draw()
-            continue_button.draw()
-            continue_text.draw()
-            exit_btn.draw()
-            exit_text.draw()
+            draw_keyboard()  # Full-window quad: drawn first, text goes on top
+            if highlight_on[0]:
+                key_highlight.draw()
+        id_prompt.draw()
+        input_display.draw()
         
         win.flip()
+    
+    def flash_key(button, color, seconds):
+        """Briefly show the highlight overlay over button (replaces recolouring the prerendered key)."""
+        key_highlight.pos = button.pos
+        key_highlight.size = button.size
+        key_highlight.fillColor = color
+        highlight_on[0] = True
+        redraw()
+        core.wait(seconds)
+        highlight_on[0] = False
+        redraw()
 
     # Initial redraw to ensure buttons are visible
     redraw()
     # Clear events BEFORE loop starts, not inside loop
     event.clearEvents()
     
-    # POSITION-CHANGE DETECTION: Store initial mouse position
-    mouserec = mouse.getPos()
-    try:
-        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-    except (ValueError, TypeError, IndexError) as e:
-        print(f"Warning: Could not parse initial mouse position in get_participant_id: {e}", file=sys.stderr)
-        mouserec_x, mouserec_y = 0.0, 0.0
+    minRT = 0.05  # Minimum time between accepted taps (reduced for faster response)
     
-    minRT = 0.05  # Minimum response time (reduced for faster response)
-    clock = core.Clock()
-    clock.reset()
+    if USE_TOUCH_SCREEN:
+        # Queued taps (with arrival times) resolved against the key table
+        _clear_input_events()
+        tap_state = {'mouse': mouse, 'last': None}
+        try:
+            mouserec = mouse.getPos()
+            tap_state['last'] = (float(mouserec[0]), float(mouserec[1]))
+        except (ValueError, TypeError, IndexError) as e:
+            print(f"Warning: Could not parse initial mouse position in get_participant_id: {e}", file=sys.stderr)
+        last_accept = time.time()
     
     while True:
         # Check for escape key FIRST, before clearing events
@@ -917,193 +2273,27 @@ def get_participant_id():
             print(f"Warning: Error checking escape key in get_participant_id: {e}", file=sys.stderr)
         
         if USE_TOUCH_SCREEN:
-            mouseloc = mouse.getPos()
-            try:
-                mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-            except:
-                mouseloc_x, mouseloc_y = 0.0, 0.0
-            
-            t = clock.getTime()
-            clicked = False
-            
-            # Check if mouse position has changed (touch moved)
-            if mouseloc_x == mouserec_x and mouseloc_y == mouserec_y:
-                # Position hasn't changed, just redraw
-                redraw()
-            else:
-                # Position has changed - check if touch is within any button
-                # Check Exit button FIRST (top-right, always clickable)
-                on_exit = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                          EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                if on_exit:
+            hit = _next_hit(id_hits, tap_state)
+            while hit is not None:
+                widget, _, _, tap_time = hit
+                if widget == 'exit':
                     core.quit()  # Exit always responsive (no minRT)
-                # Check keyboard buttons
-                for row in keyboard_buttons:
-                    for button, text, key, x_pos, y_pos in row:
-                        try:
-                            if button.contains(mouseloc):
-                                if t > minRT:  # Minimum time has passed
-                                    input_id += key
-                                    button.fillColor = 'yellow'
-                                    redraw()
-                                    core.wait(0.05)
-                                    button.fillColor = 'lightgray'
-                                    redraw()
-                                    clicked = True
-                                    mouserec = mouse.getPos()  # Update reference position
-                                    try:
-                                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                    except:
-                                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                                    clock.reset()  # Reset timer
-                                    break
-                                else:
-                                    mouserec = mouse.getPos()  # Update reference position
-                                    try:
-                                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                    except:
-                                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                        except:
-                            # Fallback to manual calculation
-                            hit_margin = 0.08
-                            if (x_pos - 0.035 - hit_margin <= mouseloc_x <= x_pos + 0.035 + hit_margin and
-                                y_pos - 0.04 - hit_margin <= mouseloc_y <= y_pos + 0.04 + hit_margin):
-                                if t > minRT:
-                                    input_id += key
-                                    button.fillColor = 'yellow'
-                                    redraw()
-                                    core.wait(0.05)
-                                    button.fillColor = 'lightgray'
-                                    redraw()
-                                    clicked = True
-                                    mouserec = mouse.getPos()
-                                    try:
-                                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                    except:
-                                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                                    clock.reset()
-                                    break
-                                else:
-                                    mouserec = mouse.getPos()
-                                    try:
-                                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                    except:
-                                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                    if clicked:
-                        break
-                
-                if not clicked:
-                    # Check BACKSPACE button
-                    try:
-                        if backspace_button.contains(mouseloc):
-                            if t > minRT:
-                                input_id = input_id[:-1] if input_id else ""
-                                backspace_button.fillColor = 'red'
-                                redraw()
-                                core.wait(0.05)
-                                backspace_button.fillColor = 'lightcoral'
-                                redraw()
-                                clicked = True
-                                mouserec = mouse.getPos()
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                                clock.reset()
-                            else:
-                                mouserec = mouse.getPos()
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                    except Exception as e:
-                        # Fallback to manual calculation
-                        print(f"ERROR in backspace/continue button.contains() fallback: {repr(e)}", file=sys.stderr)
-                        traceback.print_exc()
-                        hit_margin = 0.08*0.75
-                        backspace_x, backspace_y = -0.35*0.6, (start_y + 0.2)*0.6
-                        backspace_width, backspace_height = 0.3*0.75, 0.1*0.75
-                        if (backspace_x - backspace_width/2 - hit_margin <= mouseloc_x <= backspace_x + backspace_width/2 + hit_margin and
-                            backspace_y - backspace_height/2 - hit_margin <= mouseloc_y <= backspace_y + backspace_height/2 + hit_margin):
-                            if t > minRT:
-                                input_id = input_id[:-1] if input_id else ""
-                                backspace_button.fillColor = 'red'
-                                redraw()
-                                core.wait(0.05)
-                                backspace_button.fillColor = 'lightcoral'
-                                redraw()
-                                clicked = True
-                                mouserec = mouse.getPos()
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                                clock.reset()
-                            else:
-                                mouserec = mouse.getPos()
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                    
-                    # Check CONTINUE button
-                    if not clicked:
-                        try:
-                            if continue_button.contains(mouseloc):
-                                if t > minRT:
-                                    if input_id.strip():
-                                        mouse.setVisible(False)
-                                        event.clearEvents()
-                                        PHOTODIODE_ACTIVE = True
-                                        return input_id.strip()
-                                    # If empty, show feedback
-                                    continue_button.fillColor = 'darkgreen'
-                                    redraw()
-                                    core.wait(0.1)
-                                    continue_button.fillColor = 'lightgreen'
-                                    redraw()
-                                    mouserec = mouse.getPos()
-                                    try:
-                                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                    except:
-                                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                                    clock.reset()
-                                else:
-                                    mouserec = mouse.getPos()
-                                    try:
-                                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                    except:
-                                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                        except:
-                            # Fallback to manual calculation
-                            hit_margin = 0.08
-                            continue_x, continue_y = 0.25, 0.12  # Match button_y_pos
-                            continue_width, continue_height = 0.3, 0.1
-                            if (continue_x - continue_width/2 - hit_margin <= mouseloc_x <= continue_x + continue_width/2 + hit_margin and
-                                continue_y - continue_height/2 - hit_margin <= mouseloc_y <= continue_y + continue_height/2 + hit_margin):
-                                if t > minRT:
-                                    if input_id.strip():
-                                        mouse.setVisible(False)
-                                        event.clearEvents()
-                                        PHOTODIODE_ACTIVE = True
-                                        return input_id.strip()
-                                    continue_button.fillColor = 'darkgreen'
-                                    redraw()
-                                    core.wait(0.1)
-                                    continue_button.fillColor = 'lightgreen'
-                                    redraw()
-                                    mouserec = mouse.getPos()
-                                    try:
-                                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                    except:
-                                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                                    clock.reset()
-                                else:
-                                    mouserec = mouse.getPos()
-                                    try:
-                                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                    except:
-                                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
+                elif widget is not None and tap_time - last_accept > minRT:
+                    last_accept = tap_time
+                    if widget.startswith('key:'):
+                        input_id += widget[4:]
+                        flash_key(key_buttons[widget[4:]], 'yellow', 0.05)
+                    elif widget == 'backspace':
+                        input_id = input_id[:-1] if input_id else ""
+                        flash_key(backspace_button, 'red', 0.05)
+                    elif widget == 'continue':
+                        if input_id.strip():
+                            mouse.setVisible(False)
+                            event.clearEvents()
+                            PHOTODIODE_ACTIVE = True
+                            return input_id.strip()
+                        flash_key(continue_button, 'darkgreen', 0.1)  # Empty ID: feedback only
+                hit = _next_hit(id_hits, tap_state)
             
             # Redraw every frame
             redraw()
@@ -1116,7 +2306,7 @@ def get_participant_id():
                 pass
             # Clear events only once per loop iteration, after all checks
             event.clearEvents()
-            core.wait(0.001)  # Very fast polling
+            _input_wait(0.001)  # Very fast polling
         else:
             # Standard keyboard input for click mode - safe handling of empty keys
             try:
@@ -1135,17 +2325,621 @@ def get_participant_id():
                                 return input_id.strip()
                         elif key == 'backspace':
                             input_id = input_id[:-1] if input_id else ""
-                            input_display.text = input_id if input_id else "_"
                             redraw()
                         elif len(key) == 1:
                             input_id += key
-                            input_display.text = input_id if input_id else "_"
                             redraw()
             except (AttributeError, Exception):
                 pass  # Ignore event errors
         
         core.wait(0.01)
 
+# =========================
+#  INPUT EVENT QUEUE
+# =========================
+# Window-system callbacks push every tap/click and key press into these queues with the wall-clock time
+# (time.time()) at which the event was dispatched to the handler. Response screens consume the queues, so
+# RTs and click times come from event dispatch rather than from whichever polling pass noticed the change.
+# Events are only dispatched when the window's event loop is pumped: ~1 ms apart while _input_wait() idles, but
+# not during draw() / flip(), so an event arriving mid-frame is stamped late by the rest of that draw/flip
+# (a few ms on BufferImageStim screens and photodiode flashes). The OS event time is not used.
+_pointer_events = deque(maxlen=256)  # ('press' | 'motion', t, x, y) in window 'height' units
+_key_events = deque(maxlen=256)  # (key_name, t)
+_input_queue_active = [False]  # True once handlers are installed on the main window
+_TAP_MOTION_GRACE_S = 0.05  # Cursor-only touch drivers: a move with no press within this window counts as a tap
+
+def _install_input_queue(window):
+    """Push pyglet handlers on window that feed _pointer_events/_key_events. Falls back to polling if unavailable."""
+    _start_response_pad()  # Optional Cedrus response pad (RESPONSE_PAD=cedrus)
+    if USE_TOUCH_SCREEN:
+        _start_evdev_touch_reader(window)  # Optional kernel-timestamped touch taps (TOUCH_INPUT_BACKEND=evdev)
+    else:
+        _start_keyboard_backend()  # Background key buffer with press/release times
+    handle = getattr(window, 'winHandle', None)
+    if handle is None or not hasattr(handle, 'push_handlers'):
+        print("Warning: Window backend has no event handlers - input falls back to polling", file=sys.stderr)
+        return False
+    try:
+        from pyglet.window import key as pyglet_key
+    except Exception as e:
+        print(f"Warning: Could not import pyglet key map ({e}) - input falls back to polling", file=sys.stderr)
+        return False
+
+    def _to_height_units(x, y):
+        w, h = float(handle.width), float(handle.height)
+        return (x - w / 2.0) / h, (y - h / 2.0) / h
+
+    def on_mouse_press(x, y, button, modifiers):
+        if _evdev_active[0]:
+            return  # evdev reader supplies the taps; the emulated mouse press would duplicate them
+        hx, hy = _to_height_units(x, y)
+        _pointer_events.append(('press', time.time(), hx, hy))
+
+    def on_mouse_motion(x, y, dx, dy):
+        if _evdev_active[0]:
+            return
+        hx, hy = _to_height_units(x, y)
+        _pointer_events.append(('motion', time.time(), hx, hy))
+
+    def on_mouse_drag(x, y, dx, dy, buttons, modifiers):
+        on_mouse_motion(x, y, dx, dy)
+
+    def on_key_press(symbol, modifiers):
+        name = pyglet_key.symbol_string(symbol).lower()
+        if name.startswith('_') and name[1:].isdigit():
+            name = name[1:]  # pyglet '_1' -> psychopy '1'
+        _key_events.append((name, time.time()))
+
+    # Handlers return None so PsychoPy's own handlers (event.getKeys, Mouse) still see every event
+    handle.push_handlers(on_mouse_press=on_mouse_press, on_mouse_motion=on_mouse_motion,
+                         on_mouse_drag=on_mouse_drag, on_key_press=on_key_press)
+    _input_queue_active[0] = True
+    return True
+
+def _pump_window_events():
+    """Dispatch pending window-system events so queued input gets its arrival time now."""
+    try:
+        win.winHandle.dispatch_events()
+    except Exception:
+        pass  # Includes macOS NSTrackingArea/NSConcreteNotification dispatch errors (see safe_wait)
+
+def _clear_input_events():
+    """Drop queued input (call at screen onset, together with event.clearEvents())."""
+    _pointer_events.clear()
+    _key_events.clear()
+    if _keyboard_ref[0] is not None:
+        try:
+            _keyboard_ref[0].getKeys(waitRelease=False, clear=True)  # Not clearEvents(): keeps release tracking of logged presses
+        except Exception:
+            pass
+
+def _input_wait(duration):
+    """Replacement for core.wait() in response loops: sleep while pumping window events every ~1 ms."""
+    if not _input_queue_active[0]:
+        safe_wait(duration)
+        return
+    end = time.perf_counter() + duration
+    while True:
+        _pump_window_events()
+        remaining = end - time.perf_counter()
+        if remaining <= 0:
+            break
+        time.sleep(min(0.001, remaining))
+
+def _next_tap(tap_state):
+    """Next touch/click as (x, y, t), or None. tap_state = {'mouse': event.Mouse, 'last': (x, y)} for the polling fallback.
+    
+    Queue path: a press is a tap; a cursor move with no press within _TAP_MOTION_GRACE_S is also a tap (touch drivers
+    that only move the cursor), time-stamped at the move. Repeated taps on the same spot are seen. Fallback path (no
+    queue): position-change detection, time-stamped when noticed. With the evdev reader, taps are touch-downs.
+    """
+    if not (_input_queue_active[0] or _evdev_active[0]):
+        try:
+            pos = tap_state['mouse'].getPos()
+            x, y = float(pos[0]), float(pos[1])
+        except Exception:
+            return None
+        if (x, y) == tap_state.get('last'):
+            return None
+        tap_state['last'] = (x, y)
+        return (x, y, time.time())
+    _pump_window_events()
+    now = time.time()
+    while _pointer_events:
+        kind, t, x, y = _pointer_events[0]
+        if kind == 'press':
+            _pointer_events.popleft()
+            return (x, y, t)
+        # Motion: defer until we know no press follows (the press carries the exact tap)
+        if any(k == 'press' and t2 - t <= _TAP_MOTION_GRACE_S for k, t2, _, _ in _pointer_events):
+            _pointer_events.popleft()
+            continue
+        if now - t < _TAP_MOTION_GRACE_S:
+            return None
+        _pointer_events.popleft()
+        return (x, y, t)
+    return None
+
+class HitRegistry:
+    """Per-screen hit-test table. Widgets register a rectangle (centre, size, extra margins) once; hit(x, y) returns
+    the name of the first registered widget containing the point, so registration order is priority (exit first)."""
+    def __init__(self):
+        self._bounds = []  # (name, x0, x1, y0, y1) precomputed so a lookup is only comparisons
+
+    def add(self, name, pos, width, height, margin_x=0.0, margin_y=0.0):
+        x, y = float(pos[0]), float(pos[1])
+        hw, hh = float(width) / 2.0 + margin_x, float(height) / 2.0 + margin_y
+        self._bounds.append((name, x - hw, x + hw, y - hh, y + hh))
+        return self
+
+    def add_exit(self):
+        """Exit button (top-right), with the enlarged touch margin every screen uses."""
+        return self.add('exit', EXIT_BTN_POS, 0.12, 0.04, EXIT_HIT_MARGIN, EXIT_HIT_MARGIN)
+
+    def add_button(self, name, stim, touch_margin=True):
+        """Register a visual.Rect button. touch_margin widens the hit area by half the button size (at least 0.08 x 0.04)."""
+        width, height = float(stim.width), float(stim.height)
+        if touch_margin:
+            return self.add(name, stim.pos, width, height, max(width * 0.5, 0.08), max(height * 0.5, 0.04))
+        return self.add(name, stim.pos, width, height)
+
+    def hit(self, x, y):
+        for name, x0, x1, y0, y1 in self._bounds:
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                return name
+        return None
+
+    def hit_all(self, x, y):
+        """Names of every widget containing the point (for screens where hit areas overlap on purpose)."""
+        return [name for name, x0, x1, y0, y1 in self._bounds if x0 <= x <= x1 and y0 <= y <= y1]
+
+def _next_hit(registry, tap_state):
+    """Shared touch/mouse dispatch: next queued tap resolved against registry, as (widget name or None, x, y, t), or None."""
+    tap = _next_tap(tap_state)
+    if tap is None:
+        return None
+    x, y, t = tap
+    return (registry.hit(x, y), x, y, t)
+
+def _get_keys_timed(key_list):
+    """Like event.getKeys(keyList=key_list) but returns [(key, t), ...] with t = press time (time.time() clock)."""
+    kb = _keyboard_ref[0]
+    if kb is not None:
+        try:
+            presses = kb.getKeys(keyList=key_list, waitRelease=False, clear=True)
+        except Exception:
+            presses = []
+        try:
+            event.getKeys(keyList=key_list)  # Keep PsychoPy's window-event copy of these keys drained
+        except Exception:
+            pass
+        remaining = [(k, t) for k, t in _key_events if k not in key_list]
+        _key_events.clear()
+        _key_events.extend(remaining)
+        offset = time.time() - core.getTime()  # KeyPress.tDown is on PsychoPy's clock
+        hits = []
+        for press in presses:
+            t = press.tDown + offset
+            _recent_key_presses.append((press.name, t, press))
+            hits.append((press.name, t))
+        return hits
+    if not _input_queue_active[0]:
+        try:
+            keys = event.getKeys(keyList=key_list, timeStamped=True)
+        except Exception:
+            return []
+        offset = time.time() - core.getTime()  # PsychoPy stamps on its own clock
+        return [(k, t + offset) for k, t in keys]
+    try:
+        event.getKeys(keyList=key_list)  # Pumps events into the queue and drains PsychoPy's copy of the same keys
+    except Exception:
+        pass
+    hits = [(k, t) for k, t in _key_events if k in key_list]
+    if hits:
+        remaining = [(k, t) for k, t in _key_events if k not in key_list]
+        _key_events.clear()
+        _key_events.extend(remaining)
+    return hits
+
+def _first_key_time(timed_keys, key_name):
+    """Arrival time of the first key_name in a _get_keys_timed() result, or None."""
+    for k, t in timed_keys:
+        if k == key_name:
+            return t
+    return None
+
+# =========================
+#  EVDEV TOUCH READER (Linux)
+# =========================
+# Optional touch backend for Linux stations: TOUCH_INPUT_BACKEND=evdev reads the touchscreen's raw kernel events on a
+# dedicated thread and queues each touch-down as a tap stamped with the kernel event time (CLOCK_REALTIME, same clock
+# as time.time()). Same-spot taps are seen and no frame of latency is added. Requires python-evdev and read access to
+# /dev/input/event*; otherwise the window-event queue above is used. TOUCH_EVDEV_DEVICE picks a device (default: first
+# with touch axes), e.g. a uinput virtual device for testing. TOUCH_EVDEV_REPLAY=<evemu-record file> replays a recording.
+_touch_backend_name = os.environ.get('TOUCH_INPUT_BACKEND', '').strip().lower()
+_evdev_device_path = os.environ.get('TOUCH_EVDEV_DEVICE', '').strip() or None
+_evdev_replay_path = os.environ.get('TOUCH_EVDEV_REPLAY', '').strip() or None
+_evdev_active = [False]  # True while the reader thread feeds _pointer_events (window pointer events are then ignored)
+_evdev_thread_ref = [None]
+# Linux input-event codes (linux/input-event-codes.h); kept local so recordings decode without python-evdev
+_EV_SYN, _EV_KEY, _EV_ABS = 0x00, 0x01, 0x03
+_SYN_REPORT = 0x00
+_BTN_TOUCH = 0x14a
+_ABS_X, _ABS_Y = 0x00, 0x01
+_ABS_MT_POSITION_X, _ABS_MT_POSITION_Y, _ABS_MT_TRACKING_ID = 0x35, 0x36, 0x39
+
+class EvdevTapDecoder:
+    """Turns a stream of raw evdev events into taps (x, y, t) in window 'height' units.
+    
+    Handles single-touch (BTN_TOUCH + ABS_X/Y) and multi-touch type B (ABS_MT_*) devices; only the first contact
+    of a touch counts. A tap is emitted on the SYN_REPORT that completes the touch-down frame, with that frame's
+    kernel timestamp.
+    """
+    def __init__(self, x_range, y_range, aspect):
+        self.x_min, self.x_max = x_range
+        self.y_min, self.y_max = y_range
+        self.aspect = aspect  # window width / height
+        self.x = (self.x_min + self.x_max) / 2.0
+        self.y = (self.y_min + self.y_max) / 2.0
+        self.touching = False
+        self.down_pending = False
+
+    def feed(self, t, ev_type, code, value):
+        """Feed one event; returns (x, y, t) when a tap completes, else None."""
+        if ev_type == _EV_ABS:
+            if code in (_ABS_X, _ABS_MT_POSITION_X):
+                self.x = value
+            elif code in (_ABS_Y, _ABS_MT_POSITION_Y):
+                self.y = value
+            elif code == _ABS_MT_TRACKING_ID:
+                if value >= 0 and not self.touching:
+                    self.touching = True
+                    self.down_pending = True
+                elif value < 0:
+                    self.touching = False
+        elif ev_type == _EV_KEY and code == _BTN_TOUCH:
+            if value and not self.touching:
+                self.touching = True
+                self.down_pending = True
+            elif not value:
+                self.touching = False
+        elif ev_type == _EV_SYN and code == _SYN_REPORT and self.down_pending:
+            self.down_pending = False
+            nx = (self.x - self.x_min) / float(max(1, self.x_max - self.x_min))
+            ny = (self.y - self.y_min) / float(max(1, self.y_max - self.y_min))
+            return ((nx - 0.5) * self.aspect, 0.5 - ny, t)  # Panel y grows downward; window y grows upward
+        return None
+
+def _read_evemu_recording(path):
+    """Parse an evemu-record file. Returns ({axis_code: (min, max)}, [(t, type, code, value), ...])."""
+    axes, events = {}, []
+    with open(path) as f:
+        for line in f:
+            parts = line.split('#', 1)[0].split()
+            if len(parts) >= 4 and parts[0] == 'A:':
+                axes[int(parts[1].rstrip(':'), 16)] = (int(parts[2]), int(parts[3]))
+            elif len(parts) >= 5 and parts[0] == 'E:':
+                events.append((float(parts[1]), int(parts[2], 16), int(parts[3], 16), int(parts[4])))
+    return axes, events
+
+def _window_aspect(window):
+    try:
+        w, h = window.size
+        return float(w) / float(h)
+    except Exception:
+        return 16.0 / 9.0
+
+def _find_evdev_touch_device():
+    """Open TOUCH_EVDEV_DEVICE, or the first input device reporting touch position axes. Returns an evdev.InputDevice or None."""
+    import evdev
+    paths = [_evdev_device_path] if _evdev_device_path else evdev.list_devices()
+    for path in paths:
+        try:
+            dev = evdev.InputDevice(path)
+            abs_codes = [c for c, _ in dev.capabilities().get(_EV_ABS, [])]
+            if (_ABS_MT_POSITION_X in abs_codes or _ABS_X in abs_codes) and (_evdev_device_path or _BTN_TOUCH in dev.capabilities().get(_EV_KEY, []) or _ABS_MT_TRACKING_ID in abs_codes):
+                return dev
+            dev.close()
+        except Exception:
+            continue
+    return None
+
+def _evdev_reader_loop(dev, decoder):
+    """Reader thread: block on the device and queue taps with their kernel timestamps."""
+    try:
+        for ev in dev.read_loop():
+            tap = decoder.feed(ev.timestamp(), ev.type, ev.code, ev.value)
+            if tap is not None:
+                x, y, t = tap
+                _pointer_events.append(('press', t, x, y))
+    except Exception as e:
+        _evdev_active[0] = False  # Device gone (unplugged) - fall back to window pointer events
+        print(f"⚠ evdev touch reader stopped ({e}) - falling back to window pointer events", file=sys.stderr)
+        sys.stderr.flush()
+
+def _evdev_replay_loop(axes, events, decoder):
+    """Replay thread: re-emit a recording in real time, re-based so its first event happens now."""
+    if not events:
+        return
+    offset = time.time() - events[0][0]
+    for t, ev_type, code, value in events:
+        delay = (t + offset) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        tap = decoder.feed(t + offset, ev_type, code, value)
+        if tap is not None:
+            x, y, tt = tap
+            _pointer_events.append(('press', tt, x, y))
+
+def _start_evdev_touch_reader(window):
+    """Start the evdev (or replay) reader thread if TOUCH_INPUT_BACKEND=evdev. Returns True if it is running."""
+    if _touch_backend_name != 'evdev' or _evdev_thread_ref[0] is not None:
+        return _evdev_active[0]
+    aspect = _window_aspect(window)
+    if _evdev_replay_path:
+        try:
+            axes, events = _read_evemu_recording(_evdev_replay_path)
+        except Exception as e:
+            print(f"⚠ Could not read evdev recording {_evdev_replay_path}: {e}", file=sys.stderr)
+            return False
+        x_range = axes.get(_ABS_MT_POSITION_X, axes.get(_ABS_X, (0, 4095)))
+        y_range = axes.get(_ABS_MT_POSITION_Y, axes.get(_ABS_Y, (0, 4095)))
+        target, args, source = _evdev_replay_loop, (axes, events, EvdevTapDecoder(x_range, y_range, aspect)), _evdev_replay_path
+    else:
+        try:
+            import evdev  # noqa: F401 - optional dependency (Linux only)
+        except ImportError:
+            print("⚠ TOUCH_INPUT_BACKEND=evdev but python-evdev is not installed - using window pointer events", file=sys.stderr)
+            return False
+        dev = _find_evdev_touch_device()
+        if dev is None:
+            print("⚠ No evdev touch device found (check TOUCH_EVDEV_DEVICE and /dev/input permissions) - using window pointer events", file=sys.stderr)
+            return False
+        absinfo = dict(dev.capabilities(absinfo=True).get(_EV_ABS, []))
+        def _range(*codes):
+            for c in codes:
+                if c in absinfo:
+                    return (absinfo[c].min, absinfo[c].max)
+            return (0, 4095)
+        decoder = EvdevTapDecoder(_range(_ABS_MT_POSITION_X, _ABS_X), _range(_ABS_MT_POSITION_Y, _ABS_Y), aspect)
+        target, args, source = _evdev_reader_loop, (dev, decoder), f"{dev.path} ({dev.name})"
+    _evdev_active[0] = True
+    t = threading.Thread(target=target, args=args, name="evdev-touch", daemon=True)
+    _evdev_thread_ref[0] = t
+    t.start()
+    print(f"✓ Touch input: evdev reader on {source} (kernel timestamps)", file=sys.stderr)
+    sys.stderr.flush()
+    return True
+
+# =========================
+#  KEYBOARD BACKEND
+# =========================
+# Keyboard mode reads keys from PsychoPy's psychtoolbox keyboard (psychopy.hardware.keyboard), which buffers key
+# events on a background thread with per-press down times and release durations. KEYBOARD_BACKEND=event keeps the
+# window-event queue only (also the fallback when psychtoolbox is unavailable). Every keyboard response is logged
+# to _key_responses and appended to the *_key_responses CSV as it happens (flush + fsync per write, like the TTL
+# log): a key_down row per press, and a key_up row once the keyboard backend has reported the release.
+_keyboard_backend_name = os.environ.get('KEYBOARD_BACKEND', 'ptb').strip().lower()
+_keyboard_ref = [None]  # psychopy.hardware.keyboard.Keyboard while the ptb backend is running
+_recent_key_presses = deque(maxlen=64)  # (key, t, KeyPress) returned by _get_keys_timed, for release lookup
+_key_responses = []  # [{"screen": str, "key": str, "key_down": t, "_press": KeyPress or None, "_down_written": bool, "_up_written": bool}, ...]
+_KEY_RESPONSE_FIELDNAMES = ['event', 'screen', 'key', 'key_down', 'key_up', 'key_duration']
+_key_file_ref = [None]  # Open key-response CSV (set at session start)
+_key_writer_ref = [None]  # csv.DictWriter for incremental key-response writes
+_key_file_path_ref = [None]
+
+def _start_keyboard_backend():
+    """Start the psychtoolbox keyboard buffer. Returns True if key times now come from it."""
+    if _keyboard_backend_name != 'ptb' or _keyboard_ref[0] is not None or _RENDER_BENCHMARK:
+        return _keyboard_ref[0] is not None  # Render benchmark: emulated keys only reach the window-event queue
+    try:
+        from psychopy.hardware import keyboard
+        if not getattr(keyboard, 'havePTB', False):
+            raise ImportError("psychtoolbox is not installed")
+        kb = keyboard.Keyboard()
+        kb.clearEvents()
+        _keyboard_ref[0] = kb
+        print("✓ Keyboard input: psychtoolbox key buffer (press and release times)", file=sys.stderr)
+        sys.stderr.flush()
+        return True
+    except Exception as e:
+        print(f"⚠ psychtoolbox keyboard unavailable ({e}) - key times come from window events", file=sys.stderr)
+        sys.stderr.flush()
+        return False
+
+def _log_key_response(screen, key_name, key_down):
+    """Record a key press (key_down from _get_keys_timed()) as the response for screen and append it to the key-response CSV."""
+    if key_down is None:
+        return
+    press = next((p for k, t, p in _recent_key_presses if k == key_name and t == key_down), None)
+    _key_responses.append({"screen": screen, "key": key_name, "key_down": key_down, "_press": press,
+                           "_down_written": False, "_up_written": False})
+    _write_key_responses()
+
+def _pending_key_rows():
+    """key_down rows not yet written, and key_up rows for presses whose release the backend has now reported."""
+    kb = _keyboard_ref[0]
+    if kb is not None:
+        try:
+            kb.getKeys(waitRelease=False, clear=False)  # Process pending releases into the KeyPress objects
+        except Exception:
+            pass
+    rows = []
+    for r in _key_responses:
+        base = {"screen": r["screen"], "key": r["key"], "key_down": f"{r['key_down']:.9f}", "key_up": "", "key_duration": ""}
+        if not r["_down_written"]:
+            rows.append(dict(base, event="key_down"))
+            r["_down_written"] = True
+        duration = getattr(r["_press"], 'duration', None)
+        if not r["_up_written"] and isinstance(duration, (int, float)):
+            rows.append(dict(base, event="key_up", key_up=f"{r['key_down'] + duration:.9f}", key_duration=f"{duration:.6f}"))
+            r["_up_written"] = True
+    return rows
+
+def _write_key_responses():
+    """Append pending key rows to the open key-response CSV (one flush + fsync per call). No-op until it is opened."""
+    if _key_writer_ref[0] is None or _key_file_ref[0] is None:
+        return
+    try:
+        rows = _pending_key_rows()
+        if not rows:
+            return
+        _key_writer_ref[0].writerows(rows)
+        _key_file_ref[0].flush()
+        try:
+            os.fsync(_key_file_ref[0].fileno())
+        except (AttributeError, OSError):
+            pass
+    except Exception as e:
+        print(f"Warning: Could not write key responses incrementally: {e}", file=sys.stderr)
+
+def _open_key_responses(path):
+    """Open the key-response CSV for incremental writes (session start); presses logged earlier are written at once."""
+    try:
+        _key_file_ref[0] = open(path, 'w', newline='')
+        _key_writer_ref[0] = csv.DictWriter(_key_file_ref[0], fieldnames=_KEY_RESPONSE_FIELDNAMES)
+        _key_writer_ref[0].writeheader()
+        _key_file_ref[0].flush()
+        _key_file_path_ref[0] = path
+    except Exception as e:
+        print(f"Warning: Could not open key-response file for incremental writes: {e}", file=sys.stderr)
+        _key_file_ref[0] = _key_writer_ref[0] = None
+        return
+    _write_key_responses()
+
+def _close_key_responses():
+    """Write releases seen since the last press and close the key-response CSV (call at session end)."""
+    if _key_file_ref[0] is None:
+        return
+    _write_key_responses()
+    try:
+        _key_file_ref[0].close()
+    except Exception:
+        pass
+    _key_file_ref[0] = _key_writer_ref[0] = None
+    print(f"✓ Key responses saved to {_key_file_path_ref[0]} ({len(_key_responses)} presses)")
+
+# =========================
+#  CEDRUS RESPONSE PAD
+# =========================
+# RESPONSE_PAD=cedrus adds a Cedrus response pad (RB-x40 etc., via pyxid2) as a response device for the switch/stay
+# decision, the localizer yes/no question and a discretized slider. Each screen resets the pad's RT timer at onset;
+# the pad time-stamps presses on its own millisecond clock, so RTs skip the OS input stack. Session times are the
+# timer-reset time (time.time() right after the reset command) plus the pad RT.
+_response_pad_mode = os.environ.get('RESPONSE_PAD', '').strip().lower()
+_pad_choice_keys = [int(k) for k in os.environ.get('RESPONSE_PAD_CHOICE_KEYS', '0,1').split(',')]  # left (STAY / YES), right (SWITCH / NO)
+_pad_slider_keys = [int(k) for k in os.environ.get('RESPONSE_PAD_SLIDER_KEYS', '0,1,2,3,4,5').split(',')]  # OLD ... NEW, evenly spaced
+_pad_submit_key = int(os.environ.get('RESPONSE_PAD_SUBMIT_KEY', '6'))
+_response_pad_ref = [None]  # pyxid2 device
+_pad_t0 = [None]  # time.time() when the pad RT timer was last reset
+_pad_reset_pending = [False]  # Screen-onset reset deferred because a Cedrus scan held the lock; done on the next poll
+
+def _start_response_pad():
+    """Open the first Cedrus response device if RESPONSE_PAD=cedrus. Returns True if the pad is in use.
+    Uses the pad found by TTL discovery (same enumeration), so the pad is never handed to the TTL backend."""
+    if _response_pad_mode != 'cedrus' or _response_pad_ref[0] is not None:
+        return _response_pad_ref[0] is not None
+    _start_ttl_discovery()
+    _ttl_discovery_done.wait(_ttl_discovery_wait_s)
+    pads = [_cedrus_pad_found[0]] if _cedrus_pad_found[0] is not None else []
+    _cedrus_pad_found[0] = None
+    if not pads:
+        try:
+            pads = _scan_cedrus_devices()[1]
+        except Exception as e:
+            print(f"⚠ Could not enumerate Cedrus devices for the response pad: {e}", file=sys.stderr)
+    if not pads:
+        print("⚠ RESPONSE_PAD=cedrus but no Cedrus response pad found - responses use touch/keyboard only", file=sys.stderr)
+        sys.stderr.flush()
+        return False
+    _response_pad_ref[0] = pads[0]
+    print(f"✓ Response pad: {pads[0]} (choices {_pad_choice_keys}, slider {_pad_slider_keys}, submit {_pad_submit_key})", file=sys.stderr)
+    sys.stderr.flush()
+    return True
+
+def _clear_response_pad(pad):
+    """Drop queued presses and zero the pad's RT timer (caller holds _cedrus_scan_lock)."""
+    _pad_reset_pending[0] = False
+    try:
+        pad.clear_response_queue()
+        pad.reset_rt_timer()
+        _pad_t0[0] = time.time()
+    except Exception as e:
+        print(f"⚠ Response pad reset failed: {e}", file=sys.stderr)
+        _pad_t0[0] = None
+
+def _reset_response_pad():
+    """Call at response-screen onset: drop queued presses and zero the pad's RT timer. Never waits for a Cedrus
+    scan: if one holds the lock, the reset is retried by the next _next_pad_press poll (session times stay right,
+    as they are the reset time plus the pad RT)."""
+    pad = _response_pad_ref[0]
+    if pad is None:
+        return
+    _pad_t0[0] = None
+    if not _cedrus_scan_lock.acquire(blocking=False):
+        _pad_reset_pending[0] = True
+        return
+    try:
+        _clear_response_pad(pad)
+    finally:
+        _cedrus_scan_lock.release()
+
+def _next_pad_press(keys):
+    """Next press of one of keys since the last reset, as (key, rt, t) - rt on the pad clock, t = session time. Else None."""
+    pad = _response_pad_ref[0]
+    if pad is None or (_pad_t0[0] is None and not _pad_reset_pending[0]):
+        return None
+    if not _cedrus_scan_lock.acquire(blocking=False):
+        return None  # Watchdog re-scan in progress: presses stay buffered (with their pad RT) until the next poll
+    try:
+        if _pad_reset_pending[0]:
+            _clear_response_pad(pad)
+            if _pad_t0[0] is None:
+                return None
+        pad.poll_for_response()
+        while pad.has_response():
+            r = pad.get_next_response()
+            if r.get('pressed') and r.get('key') in keys:
+                rt = r['time'] / 1000.0
+                t = _pad_t0[0] + rt
+                return (r['key'], rt, t)
+            pad.poll_for_response()
+    except Exception as e:
+        print(f"⚠ Response pad read failed: {e}", file=sys.stderr)
+    finally:
+        _cedrus_scan_lock.release()
+    return None
+
+# =========================
+#  STATIC LAYER CACHE
+# =========================
+# Screens whose content is fixed while the participant responds (the on-screen ID keyboard) are rendered once into a
+# BufferImageStim, so each frame is one textured quad plus whatever changes. STATIC_LAYER_CACHE=0 draws the layers
+# individually instead.
+_static_layer_cache = [os.environ.get('STATIC_LAYER_CACHE', '1') != '0']
+
+def _draw_layers(layers):
+    """Draw layers in order. A layer is a stim (anything with .draw()) or a zero-argument draw function; None is skipped."""
+    for layer in layers:
+        if layer is None:
+            continue
+        if hasattr(layer, 'draw'):
+            layer.draw()
+        else:
+            layer()
+
+def _static_layers(layers):
+    """Capture layers (stims, drawn in order; None skipped) into one buffered image and return its draw function.
+    Falls back to drawing the layers one by one if capture is off or fails (the first failure turns it off)."""
+    layers = [layer for layer in layers if layer is not None]
+    if _static_layer_cache[0] and layers:
+        try:
+            return visual.BufferImageStim(win, stim=layers).draw  # Renders to the back buffer, reads it back, clears it
+        except Exception as e:
+            _static_layer_cache[0] = False
+            print(f"⚠ Static layer capture unavailable ({e}) - drawing screens layer by layer", file=sys.stderr)
+    return lambda: _draw_layers(layers)
+
 def wait_for_button(button_text="CONTINUE", additional_stimuli=None):
     """Wait for button click/touch using position-change detection for touchscreens
     
@@ -1195,20 +2989,23 @@ def wait_for_button(button_text="CONTINUE", additional_stimuli=None):
             win.flip()
     
     draw_screen()
+    _clear_input_events()  # Taps from the previous screen must not count here
     
     clicked = False
     
     if USE_TOUCH_SCREEN:
-        # Position-change detection for touchscreens
-        mouserec = mouse.getPos()
+        # Queued touch events (position-change detection when the queue is unavailable)
+        tap_state = {'mouse': mouse, 'last': None}
         try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
+            mouserec = mouse.getPos()
+            tap_state['last'] = (float(mouserec[0]), float(mouserec[1]))
         except:
-            mouserec_x, mouserec_y = 0.0, 0.0
+            pass
         
         minRT = 0.2  # Minimum response time
-        clock = core.Clock()
-        clock.reset()
+        screen_start = time.time()
+        # Hit areas registered once: enlarged exit target, exact continue button bounds
+        hits = HitRegistry().add_exit().add_button('continue', continue_button, touch_margin=False)
         
         while not clicked:
             # Check for escape key
@@ -1220,60 +3017,26 @@ def wait_for_button(button_text="CONTINUE", additional_stimuli=None):
                 pass
             
             try:
-                mouseloc = mouse.getPos()
-                try:
-                    mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-                except:
-                    mouseloc_x, mouseloc_y = 0.0, 0.0
-                
-                t = clock.getTime()
+                tap = _next_tap(tap_state)
                 
-                # Check if mouse position has changed (touch moved)
-                if mouseloc_x != mouserec_x or mouseloc_y != mouserec_y:
-                    # Position has changed - check if touch is within button
-                    # Exit button: use explicit bounds for reliable touch registration
-                    on_exit_btn = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                                  EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                    try:
-                        if (on_exit_btn or exit_btn.contains(mouseloc)):
-                            core.quit()
-                        elif continue_button.contains(mouseloc):
-                            if t > minRT:
-                                _do_photodiode_flash(draw_content, event_type="instruction_continue")  # Participant response: black (TTL), white
-                                core.wait(0.2)
-                                clicked = True
-                                break
-                            else:
-                                mouserec = mouse.getPos()
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                    except:
-                        # Fallback to manual calculation (including exit button)
-                        if on_exit_btn:
-                            core.quit()
-                        hit_margin = 0.02*0.75
-                        button_x, button_y = 0.0, -0.5*0.6  # Updated to match new button position
-                        button_width, button_height = 0.3*0.75, 0.1*0.75
-                        if (button_x - button_width/2 - hit_margin <= mouseloc_x <= button_x + button_width/2 + hit_margin and
-                            button_y - button_height/2 - hit_margin <= mouseloc_y <= button_y + button_height/2 + hit_margin):
-                            if t > minRT:
-                                _do_photodiode_flash(draw_content, event_type="instruction_continue")  # Participant response: black (TTL), white
-                                core.wait(0.2)
-                                clicked = True
-                                break
-                            else:
-                                mouserec = mouse.getPos()
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except (ValueError, TypeError, IndexError) as e:
-                                    print(f"Warning: Could not parse mouse position in wait_for_button: {e}", file=sys.stderr)
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
+                # Taps are queued with their arrival time
+                if tap is not None:
+                    mouseloc_x, mouseloc_y, tap_time = tap
+                    t = tap_time - screen_start
+                    # Tap arrived - resolve it against the screen's hit areas (exit first)
+                    widget = hits.hit(mouseloc_x, mouseloc_y)
+                    if widget == 'exit':
+                        core.quit()
+                    elif widget == 'continue':
+                        if t > minRT:
+                            _do_photodiode_flash(draw_content, event_type="instruction_continue")  # Participant response: black (TTL), white
+                            core.wait(0.2)
+                            clicked = True
+                            break
                 
                 # Redraw once per iteration (avoids double-flip that could cause flicker)
                 draw_screen()
-                safe_wait(0.016)  # ~60 Hz polling
+                _input_wait(0.016)  # ~60 Hz redraw; events are time-stamped as they arrive
             except (AttributeError, RuntimeError, ValueError, TypeError) as e:
                 # Log specific errors instead of silently ignoring
                 print(f"Warning: Error in wait_for_button touch screen loop: {e}", file=sys.stderr)
@@ -1298,9 +3061,11 @@ def wait_for_button(button_text="CONTINUE", additional_stimuli=None):
         while not clicked:
             draw_screen()
             try:
-                keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
+                timed_keys = _get_keys_timed(['return', 'escape'])
+                keys = [k for k, _ in timed_keys]
                 if keys:
                     if 'return' in keys:
+                        _log_key_response("instruction_continue", 'return', _first_key_time(timed_keys, 'return'))
                         _do_photodiode_flash(draw_content, event_type="instruction_continue")  # Participant response: black (TTL), white
                         clicked = True
                         break
@@ -1376,6 +3141,7 @@ def ask_object_question(object_name, timeout=10.0):
     mouse = event.Mouse(win=win)
     mouse.setVisible(True)
     
+    @_timed_draw('localizer_question')
     def draw_question_content():
         question_stim.draw()
         yes_button.draw()
@@ -1397,19 +3163,27 @@ def ask_object_question(object_name, timeout=10.0):
     timed_out = False
     clock = core.Clock()
     clock.reset()
+    question_start = time.time()  # Wall-clock onset; queued events are stamped with time.time()
+    _clear_input_events()
+    _reset_response_pad()  # Pad RT timer starts with the question screen
     response_time = None
     answer_click_time = None  # Absolute timestamp when answer was clicked
     question_answer_trigger = None  # Photodiode/TTL timestamp when participant answered (tap or key)
     
     if USE_TOUCH_SCREEN:
-        # Position-change detection for touchscreens
-        mouserec = mouse.getPos()
+        # Queued touch events (position-change detection when the queue is unavailable)
+        tap_state = {'mouse': mouse, 'last': None}
         try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
+            mouserec = mouse.getPos()
+            tap_state['last'] = (float(mouserec[0]), float(mouserec[1]))
         except:
-            mouserec_x, mouserec_y = 0.0, 0.0
+            pass
         
         minRT = 0.2  # Minimum response time
+        # Hit areas registered once: enlarged exit target, exact YES/NO button bounds
+        question_hits = (HitRegistry().add_exit()
+                         .add_button('yes', yes_button, touch_margin=False)
+                         .add_button('no', no_button, touch_margin=False))
         
         while not answered:
             # Check for escape FIRST, before any other processing
@@ -1427,134 +3201,78 @@ def ask_object_question(object_name, timeout=10.0):
                 answered = True
                 break
             
+            # Cedrus response pad: left choice key = YES, right = NO; RT from the pad's own clock
+            pad_press = _next_pad_press(_pad_choice_keys)
+            if pad_press is not None:
+                pad_key, pad_rt, pad_time = pad_press
+                _log_key_response("question_answer_trigger", f"pad{pad_key}", pad_time)
+                _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at pad press
+                question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+                answer = (pad_key == _pad_choice_keys[0])
+                response_time = pad_rt
+                answer_click_time = pad_time
+                answered = True
+                break
+            
             try:
-                mouseloc = mouse.getPos()
-                try:
-                    mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-                except:
-                    mouseloc_x, mouseloc_y = 0.0, 0.0
-                
-                t = clock.getTime()
+                tap = _next_tap(tap_state)
                 
-                # Check if mouse position has changed (touch moved)
-                if mouseloc_x == mouserec_x and mouseloc_y == mouserec_y:
-                    # Position hasn't changed, just redraw
+                # Taps are queued with their arrival time; RT runs to the tap, not to when this loop saw it
+                if tap is None:
+                    # No tap, just redraw
                     draw_question()
                 else:
-                    # Position has changed - check if touch is within buttons
-                    on_exit_btn = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                                  EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                    try:
-                        if (on_exit_btn or exit_btn.contains(mouseloc)):
-                            core.quit()
-                        # Check YES button
-                        elif yes_button.contains(mouseloc):
-                            if t > minRT:
-                                answer = True
-                                response_time = clock.getTime()
-                                answer_click_time = time.time()  # Record absolute timestamp
-                                yes_button.fillColor = 'green'
-                                _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at click
-                                question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-                                core.wait(0.3)
-                                answered = True
-                                break
-                            else:
-                                mouserec = mouse.getPos()
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                        # Check NO button
-                        elif no_button.contains(mouseloc):
-                            if t > minRT:
-                                answer = False
-                                response_time = clock.getTime()
-                                answer_click_time = time.time()  # Record absolute timestamp
-                                no_button.fillColor = 'red'
-                                _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at click
-                                question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-                                core.wait(0.3)
-                                answered = True
-                                break
-                            else:
-                                mouserec = mouse.getPos()
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                    except:
-                        # Fallback to manual calculation (including exit button)
-                        if on_exit_btn:
-                            core.quit()
-                        hit_margin = 0.02
-                        yes_x, yes_y = -0.3, -0.2
-                        yes_width, yes_height = 0.25, 0.1
-                        no_x, no_y = 0.3, -0.2
-                        no_width, no_height = 0.25, 0.1
-                        
-                        on_yes = (yes_x - yes_width/2 - hit_margin <= mouseloc_x <= yes_x + yes_width/2 + hit_margin and
-                                 yes_y - yes_height/2 - hit_margin <= mouseloc_y <= yes_y + yes_height/2 + hit_margin)
-                        on_no = (no_x - no_width/2 - hit_margin <= mouseloc_x <= no_x + no_width/2 + hit_margin and
-                                no_y - no_height/2 - hit_margin <= mouseloc_y <= no_y + no_height/2 + hit_margin)
-                        
-                        if on_yes and t > minRT:
+                    mouseloc_x, mouseloc_y, tap_time = tap
+                    t = tap_time - question_start
+                    # Tap arrived - resolve it against the screen's hit areas (exit first)
+                    widget = question_hits.hit(mouseloc_x, mouseloc_y)
+                    if widget == 'exit':
+                        core.quit()
+                    elif widget == 'yes':
+                        if t > minRT:
                             answer = True
-                            response_time = clock.getTime()
-                            answer_click_time = time.time()  # Record absolute timestamp
+                            response_time = t
+                            answer_click_time = tap_time  # Arrival time of the tap
                             yes_button.fillColor = 'green'
                             _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at click
                             question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
                             core.wait(0.3)
                             answered = True
                             break
-                        elif on_no and t > minRT:
+                    elif widget == 'no':
+                        if t > minRT:
                             answer = False
-                            response_time = clock.getTime()
-                            answer_click_time = time.time()  # Record absolute timestamp
+                            response_time = t
+                            answer_click_time = tap_time  # Arrival time of the tap
                             no_button.fillColor = 'red'
                             _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at click
                             question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
                             core.wait(0.3)
                             answered = True
                             break
-                        elif on_yes or on_no:
-                            mouserec = mouse.getPos()
-                            try:
-                                mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                            except (ValueError, TypeError, IndexError) as e:
-                                print(f"Warning: Could not parse mouse position in ask_category_question: {e}", file=sys.stderr)
-                                mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
                 
                 # Redraw every frame
                 draw_question()
-                core.wait(0.001)  # Very fast polling
+                _input_wait(0.001)  # Very fast polling
             except (AttributeError, RuntimeError, ValueError, TypeError) as e:
                 # Log specific errors instead of silently ignoring
                 print(f"Warning: Error in ask_category_question touch screen loop: {e}", file=sys.stderr)
             
             # Check keys AFTER processing touch, BEFORE clearing events
             try:
-                keys = event.getKeys(keyList=['y', 'n', 'escape'], timeStamped=False)
-                if keys:
-                    if 'escape' in keys:
+                timed_keys = _get_keys_timed(['y', 'n', 'escape'])
+                if timed_keys:
+                    if _first_key_time(timed_keys, 'escape') is not None:
                         core.quit()
-                    elif 'y' in keys:
-                        _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at key press
-                        question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-                        answer = True
-                        response_time = clock.getTime()
-                        answer_click_time = time.time()  # Record absolute timestamp
-                        answered = True
-                        break
-                    elif 'n' in keys:
-                        _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at key press
-                        question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-                        answer = False
-                        response_time = clock.getTime()
-                        answer_click_time = time.time()  # Record absolute timestamp
-                        answered = True
-                        break
+                    key, key_time = next((k, kt) for k, kt in timed_keys if k in ('y', 'n'))
+                    _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at key press
+                    question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+                    answer = (key == 'y')
+                    response_time = key_time - question_start
+                    answer_click_time = key_time  # Arrival time of the key press
+                    _log_key_response("question_answer_trigger", key, key_time)
+                    answered = True
+                    break
             except (AttributeError, RuntimeError) as e:
                 print(f"Warning: Error checking y/n keys in ask_category_question: {e}", file=sys.stderr)
             
@@ -1571,32 +3289,38 @@ def ask_object_question(object_name, timeout=10.0):
                 answered = True
                 break
             
+            # Cedrus response pad: left choice key = YES, right = NO; RT from the pad's own clock
+            pad_press = _next_pad_press(_pad_choice_keys)
+            if pad_press is not None:
+                pad_key, pad_rt, pad_time = pad_press
+                _log_key_response("question_answer_trigger", f"pad{pad_key}", pad_time)
+                _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at pad press
+                question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+                answer = (pad_key == _pad_choice_keys[0])
+                response_time = pad_rt
+                answer_click_time = pad_time
+                answered = True
+                break
+            
             draw_question()
             try:
-                keys = event.getKeys(keyList=['left', 'right', 'escape'], timeStamped=False)
-                if keys:
-                    if 'escape' in keys:
+                timed_keys = _get_keys_timed(['left', 'right', 'escape'])
+                if timed_keys:
+                    if _first_key_time(timed_keys, 'escape') is not None:
                         core.quit()
-                    if 'left' in keys:
-                        _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at key press
-                        question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-                        answer = True
-                        response_time = clock.getTime()
-                        answer_click_time = time.time()
-                        answered = True
-                        break
-                    if 'right' in keys:
-                        _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at key press
-                        question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-                        answer = False
-                        response_time = clock.getTime()
-                        answer_click_time = time.time()
-                        answered = True
-                        break
+                    key, key_time = next((k, kt) for k, kt in timed_keys if k in ('left', 'right'))
+                    _do_photodiode_flash(draw_question_content, event_type="question_answer_trigger")  # Flash at key press
+                    question_answer_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+                    answer = (key == 'left')
+                    response_time = key_time - question_start
+                    answer_click_time = key_time  # Arrival time of the key press
+                    _log_key_response("question_answer_trigger", key, key_time)
+                    answered = True
+                    break
             except (AttributeError, RuntimeError) as e:
                 print(f"Warning: Error checking keys in ask_object_question: {e}", file=sys.stderr)
             
-            safe_wait(0.01)
+            _input_wait(0.01)
     
     mouse.setVisible(False)
     event.clearEvents()
@@ -1619,741 +3343,794 @@ def ask_object_question(object_name, timeout=10.0):
     
     return (answer, timed_out, response_time, answer_click_time, question_trigger, question_answer_trigger)
 
-# Create main window with appropriate settings - use try/finally pattern
-print("DEBUG: About to start window creation block", file=sys.stderr)
-sys.stderr.flush()
-win = None
-try:
-    print("DEBUG: Inside try block, about to print STARTING WINDOW CREATION", file=sys.stderr)
-    sys.stderr.flush()
-    print("="*60)
-    sys.stdout.flush()
-    sys.stderr.flush()
-    print("STARTING WINDOW CREATION")
-    sys.stdout.flush()
-    sys.stderr.flush()
-    print("="*60)
-    sys.stdout.flush()
-    sys.stderr.flush()
-    
-    import time
-    # Window creation happens exactly 0.4 seconds after continue was clicked
-    # (delay already handled in get_input_method function)
-    # Add delay to ensure temp window is fully closed
-    # NOTE: Do NOT close temp_win here - PsychoPy auto-quits when all windows are closed
-    print("Waiting before creating main window...")
-    sys.stdout.flush()
+def run_localizer(temp_win):
+    """Create the main window and photodiode/TTL flip wrapper, then run the whole localizer (exits on failure)."""
+    global win, fixation, show_fixation, photodiode_patch, _blank_rect, PHOTODIODE_ACTIVE, _ttl_events, _ttl_file_ref
+    global _ttl_writer_ref, _pending_ttl_event_types, _photodiode_signal_next_flip, _signal_photodiode_event
+    global _queue_ttl_event, _do_photodiode_flash, _wrapped_flip
+    # Create main window with appropriate settings - use try/finally pattern
+    print("DEBUG: About to start window creation block", file=sys.stderr)
     sys.stderr.flush()
-    time.sleep(0.2)  # Longer delay to ensure temp window is fully closed
-    
-    print("Creating main window (1400x900)...")
-    sys.stdout.flush()
-    sys.stderr.flush()
-    # Create windowed window
+    win = None
     try:
-        print("DEBUG: About to call visual.Window()...", file=sys.stderr)
+        print("DEBUG: Inside try block, about to print STARTING WINDOW CREATION", file=sys.stderr)
         sys.stderr.flush()
-        
-        # Ensure events are cleared before window creation
-        event.clearEvents()
-        
-        print("DEBUG: Calling visual.Window(size=(1400, 900), fullscr=True)...", file=sys.stderr)
+        print("="*60)
+        sys.stdout.flush()
         sys.stderr.flush()
-        
-        win = visual.Window(
-            size=(1400, 900), 
-            color='lightgray', 
-            units='height',
-            fullscr=True,
-            waitBlanking=False,  # Prevent blocking on display sync
-            allowGUI=True,  # Ensure GUI is available
-            useFBO=False  # Disable framebuffer objects to prevent hangs
-        )
-        
-        print("DEBUG: visual.Window() call completed successfully", file=sys.stderr)
+        print("STARTING WINDOW CREATION")
+        sys.stdout.flush()
         sys.stderr.flush()
-        print("Window object created, about to flip...", file=sys.stderr)
-        sys.stderr.flush()
-        
-        # Ensure window is ready before proceeding
-        try:
-            # Immediately flip to ensure window is ready
-            win.flip()
-            print("Window flip successful", file=sys.stderr)
-            sys.stderr.flush()
-        except Exception as flip_error:
-            print(f"Warning: Initial flip failed: {flip_error}", file=sys.stderr)
-            sys.stderr.flush()
-            # Try to continue anyway - window might still be usable
-        
-        print("Windowed window created successfully")
+        print("="*60)
         sys.stdout.flush()
         sys.stderr.flush()
-        
-        # Photodiode created AFTER name entry (see below) - not during window creation
-        # Don't close temp window yet - wait until main window is fully set up
-    except Exception as e:
-        # If window creation fails, show error
-        import traceback
-        print("="*60, file=sys.stderr)
-        print("WINDOW CREATION FAILED", file=sys.stderr)
-        print("="*60, file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
+
+        # Window creation happens exactly 0.4 seconds after continue was clicked
+        # (delay already handled in get_input_method function)
+        # Brief settle before the second context is created (temp window is closed once the main window is up)
+        print("Waiting before creating main window...")
+        sys.stdout.flush()
         sys.stderr.flush()
-        traceback.print_exc()
-        print(f"Window creation failed: {e}")
+        time.sleep(0.2)  # Let the input-method window settle before creating the main window
+
+        print("Creating main window (1400x900)...")
         sys.stdout.flush()
-        print("Press Enter to exit...")
-        try:
-            input()
-        except Exception as e:
-            print(f"ERROR in input() call: {repr(e)}", file=sys.stderr)
-            traceback.print_exc()
+        sys.stderr.flush()
+        # Create windowed window
         try:
-            core.quit()
+            print("DEBUG: About to call visual.Window()...", file=sys.stderr)
+            sys.stderr.flush()
+
+            # Ensure events are cleared before window creation
+            event.clearEvents()
+
+            print("DEBUG: Calling visual.Window(size=(1400, 900), fullscr=True)...", file=sys.stderr)
+            sys.stderr.flush()
+
+            win = visual.Window(
+                size=(1400, 900), 
+                color='lightgray', 
+                units='height',
+                fullscr=not _RENDER_BENCHMARK,  # Benchmark: 1400x900 offscreen/windowed
+                waitBlanking=False,  # Prevent blocking on display sync
+                allowGUI=True,  # Ensure GUI is available
+                useFBO=False  # Disable framebuffer objects to prevent hangs
+            )
+
+            print("DEBUG: visual.Window() call completed successfully", file=sys.stderr)
+            sys.stderr.flush()
+            print("Window object created, about to flip...", file=sys.stderr)
+            sys.stderr.flush()
+
+            # Ensure window is ready before proceeding
+            try:
+                # Immediately flip to ensure window is ready
+                win.flip()
+                print("Window flip successful", file=sys.stderr)
+                sys.stderr.flush()
+            except Exception as flip_error:
+                print(f"Warning: Initial flip failed: {flip_error}", file=sys.stderr)
+                sys.stderr.flush()
+                # Try to continue anyway - window might still be usable
+
+            print("Windowed window created successfully")
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+            # Photodiode created AFTER name entry (see below) - not during window creation
+            # Don't close temp window yet - wait until main window is fully set up
         except Exception as e:
-            print(f"ERROR calling core.quit(): {repr(e)}", file=sys.stderr)
+            # If window creation fails, show error
+            print("="*60, file=sys.stderr)
+            print("WINDOW CREATION FAILED", file=sys.stderr)
+            print("="*60, file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            sys.stderr.flush()
             traceback.print_exc()
-        # Close temp window if it still exists
-        if temp_win is not None:
+            print(f"Window creation failed: {e}")
+            sys.stdout.flush()
+            print("Press Enter to exit...")
             try:
-                temp_win.close()
+                input()
+            except Exception as e:
+                print(f"ERROR in input() call: {repr(e)}", file=sys.stderr)
+                traceback.print_exc()
+            try:
+                core.quit()
+            except Exception as e:
+                print(f"ERROR calling core.quit(): {repr(e)}", file=sys.stderr)
+                traceback.print_exc()
+            # Close temp window if it still exists
+            if temp_win is not None:
+                try:
+                    temp_win.close()
+                except:
+                    pass
+            exit(1)
+
+        # Verify window was created successfully
+        if win is None:
+            error_msg = "ERROR: Failed to create main window - win is None"
+            print("="*60, file=sys.stderr)
+            print(error_msg, file=sys.stderr)
+            print("="*60, file=sys.stderr)
+            sys.stderr.flush()
+            print("="*60)
+            print("ERROR: Failed to create main window - win is None")
+            print("="*60)
+            print("Press Enter to exit...")
+            sys.stdout.flush()
+            try:
+                input()
             except:
                 pass
-        exit(1)
-    
-    # Verify window was created successfully
-    if win is None:
-        error_msg = "ERROR: Failed to create main window - win is None"
-        print("="*60, file=sys.stderr)
-        print(error_msg, file=sys.stderr)
-        print("="*60, file=sys.stderr)
-        sys.stderr.flush()
-        print("="*60)
-        print("ERROR: Failed to create main window - win is None")
-        print("="*60)
-        print("Press Enter to exit...")
+            try:
+                core.quit()
+            except:
+                pass
+            exit(1)
+
+        print(f"Window created successfully: {win}")
         sys.stdout.flush()
+
+        # Ensure window is visible and ready
         try:
-            input()
-        except:
-            pass
-        try:
+            win.flip()
+            core.wait(0.1)  # Brief wait to ensure window is fully ready
+            print("Main window created successfully")
+            sys.stdout.flush()
+        except Exception as e:
+            print(f"Error preparing window: {e}")
+            traceback.print_exc()
             core.quit()
-        except:
-            pass
-        exit(1)
-    
-    print(f"Window created successfully: {win}")
-    sys.stdout.flush()
-    
-    # Ensure window is visible and ready
-    try:
-        win.flip()
-        core.wait(0.1)  # Brief wait to ensure window is fully ready
-        print("Main window created successfully")
+            exit(1)
+
+        # Force window to front on macOS
+        try:
+            if platform.system() == 'Darwin':  # macOS
+                try:
+                    win.winHandle.activate()
+                except Exception as e:
+                    print(f"Warning: Could not activate window on macOS: {e}", file=sys.stderr)
+                    # This is not critical, continue anyway
+        except Exception as e:
+            print(f"Warning: Error checking platform for window activation: {e}", file=sys.stderr)
+            # This is not critical, continue anyway
+
+        # Initial flip to ensure window is ready
+        print("Performing initial window flip...")
         sys.stdout.flush()
-    except Exception as e:
-        print(f"Error preparing window: {e}")
-        import traceback
-        traceback.print_exc()
-        core.quit()
-        exit(1)
-    
-    # Force window to front on macOS
-    try:
-        if platform.system() == 'Darwin':  # macOS
-            try:
-                win.winHandle.activate()
-            except Exception as e:
-                print(f"Warning: Could not activate window on macOS: {e}", file=sys.stderr)
-                # This is not critical, continue anyway
-    except Exception as e:
-        print(f"Warning: Error checking platform for window activation: {e}", file=sys.stderr)
-        # This is not critical, continue anyway
+        try:
+            win.flip()
+            print("Initial flip successful")
+            sys.stdout.flush()
+        except Exception as e:
+            print(f"ERROR during initial flip: {e}")
+            sys.stdout.flush()
+            raise
+        core.wait(0.1)
 
-    # Initial flip to ensure window is ready
-    print("Performing initial window flip...")
-    sys.stdout.flush()
-    try:
-        win.flip()
-        print("Initial flip successful")
+        # Test that window can draw something simple
+        print("Testing window with simple draw...")
         sys.stdout.flush()
-    except Exception as e:
-        print(f"ERROR during initial flip: {e}")
+        try:
+            test_text = visual.TextStim(win, text=" ", color='black', height=0.05*0.75*1.35, pos=(0, 0))
+            test_text.draw()
+            win.flip()
+            print("Window draw test successful")
+            sys.stdout.flush()
+            core.wait(0.1)
+        except Exception as e:
+            print(f"ERROR during window draw test: {e}")
+            sys.stdout.flush()
+            traceback.print_exc()
+            raise
+
+        # Verify window is ready before continuing
+        if win is None:
+            print("="*60)
+            print("CRITICAL ERROR: win is None after window creation attempt")
+            print("="*60)
+            raise RuntimeError("Main window creation failed - win is None")
+
+        print("Window verification complete, proceeding to experiment...")
         sys.stdout.flush()
-        raise
-    core.wait(0.1)
-    
-    # Test that window can draw something simple
-    print("Testing window with simple draw...")
-    sys.stdout.flush()
-    try:
-        test_text = visual.TextStim(win, text=" ", color='black', height=0.05*0.75*1.35, pos=(0, 0))
-        test_text.draw()
-        win.flip()
-        print("Window draw test successful")
+        print(f"Window object: {win}")
         sys.stdout.flush()
-        core.wait(0.1)
-    except Exception as e:
-        print(f"ERROR during window draw test: {e}")
+        print(f"Window type: {type(win)}")
+        sys.stdout.flush()
+        print("Main window setup complete. Window is ready.")
         sys.stdout.flush()
-        import traceback
-        traceback.print_exc()
-        raise
-    
-    # Verify window is ready before continuing
-    if win is None:
         print("="*60)
-        print("CRITICAL ERROR: win is None after window creation attempt")
+        sys.stdout.flush()
+        print("WINDOW CREATION SUCCESSFUL")
+        sys.stdout.flush()
         print("="*60)
-        raise RuntimeError("Main window creation failed - win is None")
-    
-    print("Window verification complete, proceeding to experiment...")
-    sys.stdout.flush()
-    print(f"Window object: {win}")
-    sys.stdout.flush()
-    print(f"Window type: {type(win)}")
-    sys.stdout.flush()
-    print("Main window setup complete. Window is ready.")
-    sys.stdout.flush()
-    print("="*60)
-    sys.stdout.flush()
-    print("WINDOW CREATION SUCCESSFUL")
-    sys.stdout.flush()
-    print("="*60)
-    sys.stdout.flush()
-    
-    # Don't close temp window - keep it open to prevent PsychoPy from auto-quitting
-    # Closing it causes PsychoPy to detect all windows are closed and quit
-    # We'll just leave it open (it's behind the main window anyway)
-    if temp_win is not None:
-        print("DEBUG: Keeping temp window open to prevent PsychoPy auto-quit", file=sys.stderr)
-        sys.stderr.flush()
-        # Don't close temp_win - leave it open
-    
-    # =========================
-    #  MAIN EXPERIMENT
-    # =========================
-
-    # Create fixation cross
-    fixation = visual.TextStim(win, text="+", color='black', height=0.08*0.75*1.35, pos=(0, 0))
-    
-    def show_fixation(duration=1.0, return_onset=False, return_offset_trigger=False, onset_event_type=None, offset_event_type=None):
-        """Display fixation cross for specified duration. Photodiode stays white; flashes black (TTL) then white at onset/offset."""
-        _do_photodiode_flash(lambda: fixation.draw(), event_type=onset_event_type)  # Onset: black (TTL), white
-        onset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-        wait_with_escape(duration)
-        _do_photodiode_flash(lambda: _blank_rect.draw(), event_type=offset_event_type)  # Offset: black (TTL), white
-        offset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-        if return_onset and return_offset_trigger:
-            return onset_trigger, offset_trigger
-        return onset_trigger if return_onset else None
-
-    # Get participant ID
-    print("About to call get_participant_id()...")
-    print(f"USE_TOUCH_SCREEN = {USE_TOUCH_SCREEN}")
-    try:
-        print("Entering get_participant_id() function...")
-        participant_id = get_participant_id()
-        print(f"Got participant ID: {participant_id}")
-    except Exception as e:
-        print(f"ERROR in get_participant_id(): {e}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
-        print("This error was caught - will exit now")
-        if win is not None:
-            try:
-                win.close()
-            except Exception as e:
-                print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
-                traceback.print_exc()
-        core.quit()
-        exit(1)
-
-    # Create photodiode and install wrapper AFTER name is submitted. White baseline; flashes black (TTL) then white per event.
-    # Photodiode: shown in BOTH touch-screen and keyboard modes. Touch: -0.70; keyboard: -0.75
-    # Refs for incremental TTL writes (set when CSV is created, before first trial)
-    _ttl_file_ref = [None]
-    _ttl_writer_ref = [None]
-    PHOTODIODE_ACTIVE = True  # Re-enable for main task
-    _probe_ttl_at_startup()  # Initialize TTL backend and log status for Blackrock
-    _blank_rect = visual.Rect(win, width=3, height=3, fillColor='lightgray', lineColor=None, pos=(0, 0), units='height')
-    try:
-        _pd_x = -0.70 if USE_TOUCH_SCREEN else -0.75
-        # Photodiode: twice exit-button vertical size (0.08×0.24), bottom-left
-        photodiode_patch = visual.Rect(
-            win, width=0.08, height=0.24,
-            fillColor='white', lineColor=None,
-            pos=(_pd_x, -0.48),
-            units='height'
-        )
-        _photodiode_signal_next_flip = [False]
-        _ttl_events = []
-        _pending_ttl_event_type = [None]
-        def _signal_photodiode_event():
-            _photodiode_signal_next_flip[0] = True
-        def _do_photodiode_flash(draw_func, event_type=None):
-            """Signal photodiode, then flip black (TTL) then white. Keyboard only: 17ms delay between flips so the black frame displays; touch screen skips delay. Logs TTL if event_type given."""
-            if event_type is not None:
-                _pending_ttl_event_type[0] = event_type
-            _signal_photodiode_event()
-            if draw_func:
-                draw_func()
-            win.flip()  # Black flash, TTL
-            if not USE_TOUCH_SCREEN:
-                safe_wait(0.017)  # ~1 frame at 60Hz: ensures black displays before white; prevents vsync coalescing on keyboard
-            if draw_func:
-                draw_func()
-            win.flip()  # White (baseline)
-        _orig_flip = win.flip
-        def _wrapped_flip(*args, **kwargs):
-            did_flash = False
-            if PHOTODIODE_ACTIVE and photodiode_patch is not None:
-                # Always start white (baseline). Flash black only when explicitly signaled.
-                photodiode_patch.fillColor = 'white'
-                if _photodiode_signal_next_flip[0]:
-                    photodiode_patch.fillColor = 'black'
-                    _photodiode_signal_next_flip[0] = False
-                    did_flash = True
-                photodiode_patch.draw()
-            # TTL at exact flip moment – callOnFlip fires when screen changes, same time as photodiode flash
-            if PHOTODIODE_ACTIVE and photodiode_patch is not None and did_flash:
-                def _on_flash():
-                    ts = time.time()
-                    _last_photodiode_ttl_timestamp[0] = ts
-                    _send_ttl_trigger()
-                    if _pending_ttl_event_type[0] is not None:
-                        ev = {"timestamp": ts, "event_type": _pending_ttl_event_type[0]}
-                        _ttl_events.append(ev)
-                        _pending_ttl_event_type[0] = None
-                        # Write incrementally to TTL file if open
-                        if _ttl_writer_ref[0] is not None and _ttl_file_ref[0] is not None:
-                            try:
-                                row = dict(ev)
-                                if isinstance(row.get('timestamp'), (int, float)):
-                                    row['timestamp'] = f"{row['timestamp']:.9f}"
-                                _ttl_writer_ref[0].writerow(row)
-                                _ttl_file_ref[0].flush()
-
-                                try:
-                                    os.fsync(_ttl_file_ref[0].fileno())
-                                except (AttributeError, OSError):
-                                    pass
-                            except Exception as e:
-                                print(f"Warning: Could not write TTL event incrementally: {e}", file=sys.stderr)
-                win.callOnFlip(_on_flash)
-            result = _orig_flip(*args, **kwargs)
-            return result
-        win.flip = _wrapped_flip
-    except Exception as e:
-        print(f"Warning: Could not create photodiode patch: {e}", file=sys.stderr)
-
-    # Load all stimuli
-    print("Loading stimuli...")
-    all_stimuli = load_all_stimuli()
-
-    if len(all_stimuli) != 200:
-        print(f"Warning: Expected 200 stimuli (100 Image + 100 Lure), found {len(all_stimuli)}")
-        print(f"  The localizer will proceed with the available {len(all_stimuli)} stimuli.")
-        print(f"  Check the detailed output above to see which stimulus files are missing.")
+        sys.stdout.flush()
 
-    if len(all_stimuli) == 0:
-        print("ERROR: No stimuli found! Cannot proceed with localizer task.")
-        print("Please check that the STIMULI directory exists and contains image files.")
-        if win is not None:
-            try:
-                win.close()
-            except:
-                pass
-        core.quit()
-        exit(1)
+        # Close the input-method window now that the main window exists (closing it earlier would leave PsychoPy
+        # with no open windows and it would auto-quit). One GL context for the rest of the session.
+        _retire_temp_window(win, temp_win)
+        temp_win = None
 
-    # Randomize order
-    random.shuffle(all_stimuli)
+        # =========================
+        #  MAIN EXPERIMENT
+        # =========================
 
-    # Build list of all unique object names (for wrong-object questions)
-    all_object_names = sorted(set(s['object_name'] for s in all_stimuli))
+        # Create fixation cross
+        fixation = visual.TextStim(win, text="+", color='black', height=0.08*0.75*1.35, pos=(0, 0))
 
-    # Pre-generate randomized sequence for question objects (exactly 50% correct, 50% random)
-    # There are 20 questions total (every 10th trial out of 200 trials)
-    num_questions = 20
-    num_correct_questions = num_questions // 2  # Exactly 10 correct, 10 random
-    question_sequence = [True] * num_correct_questions + [False] * (num_questions - num_correct_questions)
-    random.shuffle(question_sequence)  # Randomize the order
-    question_index = 0  # Track which question we're on
+        def show_fixation(duration=1.0, return_onset=False, return_offset_trigger=False, onset_event_type=None, offset_event_type=None):
+            """Display fixation cross for specified duration. Photodiode stays white; flashes black (TTL) then white at onset/offset."""
+            _do_photodiode_flash(_timed_draw('fixation')(fixation.draw), event_type=onset_event_type)  # Onset: black (TTL), white
+            onset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+            wait_with_escape(duration)
+            _do_photodiode_flash(lambda: _blank_rect.draw(), event_type=offset_event_type)  # Offset: black (TTL), white
+            offset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+            if return_onset and return_offset_trigger:
+                return onset_trigger, offset_trigger
+            return onset_trigger if return_onset else None
 
-    # Show instructions
-    instructions = visual.TextStim(
-        win,
-        text="LOCALIZER TASK\n\n"
-             "You will see 200 images one at a time.\n"
-             "Every few images, you will be asked a question about the previous image.\n"
-             "Your total score will be shown at the end of the task.\n",
-        color='black',
-        height=0.05*0.75*1.35,
-        pos=(0, 0),
-        wrapWidth=1.4*0.75
-    )
+        _install_input_queue(win)  # Time-stamped touch/key events for response screens
+        _run_station_preflight(win, "localizer", STIMULI_DIR)  # Experimenter-facing health check
 
-    def draw_instructions():
-        instructions.draw()
-    _do_photodiode_flash(draw_instructions, event_type="instruction_onset")  # First instruction onset: black (TTL), white
-    wait_for_button("BEGIN", additional_stimuli=[instructions])
-
-    # Data storage
-    localizer_data = []
-    csv_file = None
-    csv_writer = None
-    csv_file_path = None
-    fieldnames = None
-    csv_initialized = False
-    
-    # Initialize CSV file before first image (trial-by-trial incremental write for BOTH touch and keyboard modes)
-    if not is_test_participant(participant_id):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_dir = get_log_directory()
-        csv_file_path = os.path.join(log_dir, f"localizer_{participant_id}_{timestamp}.csv")
-        csv_file = open(csv_file_path, 'w', newline='')
-        # Define fieldnames for all images (will include question fields for every 10th)
-        fieldnames = [
-            'participant_id', 'trial', 'stimulus_number', 'object_name', 'category',
-            'stimulus_type', 'is_lure', 'image_path', 'presentation_time', 
-            'localizer_fixation_onset_trigger', 'localizer_fixation_offset_trigger', 'fixation_duration',
-            'localizer_image_onset_trigger', 'localizer_image_offset_trigger', 'is_question_trial', 
-            'question_object', 'question_text', 'question_trigger', 'question_answer_trigger',
-            'answer', 'correct_answer', 'correct', 'timed_out', 'response_time', 'answer_click_time'
-        ]
-        csv_writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        csv_writer.writeheader()
-        csv_file.flush()
-        csv_initialized = True
-        print(f"✓ Created localizer CSV file: {csv_file_path}")
-        # Open TTL file for incremental writes (same directory, derived from csv path)
+        # Get participant ID
+        print("About to call get_participant_id()...")
+        print(f"USE_TOUCH_SCREEN = {USE_TOUCH_SCREEN}")
         try:
-            base = os.path.basename(csv_file_path)
-            ttl_filename = base.replace("localizer_", "localizer_ttl_events_", 1)
-            ttl_file_path = os.path.join(log_dir, ttl_filename)
-            _ttl_file_ref[0] = open(ttl_file_path, 'w', newline='')
-            _ttl_writer_ref[0] = csv.DictWriter(_ttl_file_ref[0], fieldnames=['timestamp', 'event_type'])
-            _ttl_writer_ref[0].writeheader()
-            _ttl_file_ref[0].flush()
+            print("Entering get_participant_id() function...")
+            participant_id = get_participant_id()
+            print(f"Got participant ID: {participant_id}")
         except Exception as e:
-            print(f"Warning: Could not open TTL file for incremental writes: {e}", file=sys.stderr)
+            print(f"ERROR in get_participant_id(): {e}")
+            print(f"Error type: {type(e).__name__}")
+            traceback.print_exc()
+            print("This error was caught - will exit now")
+            if win is not None:
+                try:
+                    win.close()
+                except Exception as e:
+                    print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
+                    traceback.print_exc()
+            core.quit()
+            exit(1)
 
-    # Show images
-    # Start with a fixation cross before the first image
-    fixation_duration_first = random.uniform(0.25, 0.75)
-    localizer_fixation_onset_trigger_first, localizer_fixation_offset_trigger_first = show_fixation(fixation_duration_first, return_onset=True, return_offset_trigger=True, onset_event_type="localizer_fixation_onset_trigger", offset_event_type="localizer_fixation_offset_trigger")
-    
-    for idx, stimulus in enumerate(all_stimuli, 1):
-        # Record presentation time
-        presentation_time = datetime.now()
-        presentation_timestamp = presentation_time.strftime("%Y-%m-%d %H:%M:%S.%f")
-        
-        # Show jittered fixation between images (except before first image, which was already shown)
-        if idx > 1:
-            fixation_duration = random.uniform(0.25, 0.75)
-            localizer_fixation_onset_trigger, localizer_fixation_offset_trigger = show_fixation(fixation_duration, return_onset=True, return_offset_trigger=True, onset_event_type="localizer_fixation_onset_trigger", offset_event_type="localizer_fixation_offset_trigger")
-        else:
-            fixation_duration = fixation_duration_first
-            localizer_fixation_onset_trigger = localizer_fixation_onset_trigger_first
-            localizer_fixation_offset_trigger = localizer_fixation_offset_trigger_first
-        
-        # Load and display image; photodiode flashes at fixation onset/offset, image onset/offset
+        # Create photodiode and install wrapper AFTER name is submitted. White baseline; flashes black (TTL) then white per event.
+        # Photodiode: shown in BOTH touch-screen and keyboard modes. Touch: -0.70; keyboard: -0.75
+        # Refs for incremental TTL writes (set when CSV is created, before first trial)
+        _ttl_file_ref = [None]
+        _ttl_writer_ref = [None]
+        PHOTODIODE_ACTIVE = True  # Re-enable for main task
+        _probe_ttl_at_startup()  # Initialize TTL backend and log status for Blackrock
+        _blank_rect = visual.Rect(win, width=3, height=3, fillColor='lightgray', lineColor=None, pos=(0, 0), units='height')
         try:
-            img = visual.ImageStim(win, image=stimulus['path'], size=(0.8*0.75*1.35, 0.8*0.75*1.35))
-            _do_photodiode_flash(lambda: img.draw(), event_type="localizer_image_onset_trigger")  # Image onset: black (TTL), white
-            localizer_image_onset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-            
-            # Show image for exactly 0.5 seconds (fixed duration). ESC works during wait.
-            wait_with_escape(0.5)
-            _do_photodiode_flash(lambda: _blank_rect.draw(), event_type="localizer_image_offset_trigger")  # Image offset: black (TTL), white
-            localizer_image_offset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-            
-            # Check if this is the 10th image (or every 10th after the first)
-            is_question_trial = (idx % 10 == 0)
-            
-            if is_question_trial:
-                # Ask object question about the image we just showed (the 10th, 20th, 30th, etc.)
-                current_stimulus = stimulus
-                correct_object = current_stimulus['object_name']
-                
-                # Use pre-generated randomized sequence to ensure exactly 50% correct, 50% random
-                if question_index < len(question_sequence):
-                    ask_about_correct = question_sequence[question_index]
-                    question_index += 1
-                else:
-                    ask_about_correct = random.choice([True, False])
-                
-                if ask_about_correct:
-                    question_object = correct_object
-                    correct_answer = True
-                else:
-                    # 50% of trials: ask about a random incorrect object (from all other objects)
-                    wrong_objects = [o for o in all_object_names if o != correct_object]
-                    question_object = random.choice(wrong_objects) if wrong_objects else correct_object
-                    correct_answer = False
-                
-                answer, timed_out, response_time, answer_click_time, question_trigger, question_answer_trigger = ask_object_question(question_object, timeout=10.0)
-                is_correct = (answer == correct_answer) if not timed_out else None
-                
-                # No per-trial feedback; feedback shown at end only
-                trial_data = {
-                    'participant_id': participant_id,
-                    'trial': idx,
-                    'stimulus_number': current_stimulus['number'],
-                    'object_name': current_stimulus['object_name'],
-                    'category': current_stimulus['category'],
-                    'stimulus_type': current_stimulus['stimulus_type'],
-                    'is_lure': current_stimulus['is_lure'],
-                    'image_path': current_stimulus['path'],
-                    'presentation_time': presentation_timestamp,
-                    'localizer_fixation_onset_trigger': localizer_fixation_onset_trigger,
-                    'localizer_fixation_offset_trigger': localizer_fixation_offset_trigger,
-                    'fixation_duration': fixation_duration,
-                    'localizer_image_onset_trigger': localizer_image_onset_trigger,
-                    'localizer_image_offset_trigger': localizer_image_offset_trigger,
-                    'is_question_trial': True,
-                    'question_object': question_object,
-                    'question_text': object_to_question(question_object),
-                    'question_trigger': question_trigger,
-                    'question_answer_trigger': question_answer_trigger,
-                    'answer': answer if not timed_out else 'TIMEOUT',
-                    'correct_answer': correct_answer,
-                    'correct': is_correct,
-                    'timed_out': timed_out,
-                    'response_time': response_time if response_time is not None else None,
-                    'answer_click_time': answer_click_time
-                }
-            else:
-                trial_data = {
-                    'participant_id': participant_id,
-                    'trial': idx,
-                    'stimulus_number': stimulus['number'],
-                    'object_name': stimulus['object_name'],
-                    'category': stimulus['category'],
-                    'stimulus_type': stimulus['stimulus_type'],
-                    'is_lure': stimulus['is_lure'],
-                    'image_path': stimulus['path'],
-                    'presentation_time': presentation_timestamp,
-                    'localizer_fixation_onset_trigger': localizer_fixation_onset_trigger,
-                    'localizer_fixation_offset_trigger': localizer_fixation_offset_trigger,
-                    'fixation_duration': fixation_duration,
-                    'localizer_image_onset_trigger': localizer_image_onset_trigger,
-                    'localizer_image_offset_trigger': localizer_image_offset_trigger,
-                    'is_question_trial': False,
-                    'question_object': None,
-                    'question_text': None,
-                    'question_trigger': None,
-                    'question_answer_trigger': None,
-                    'answer': None,
-                    'correct_answer': None,
-                    'correct': None,
-                    'timed_out': None,
-                    'response_time': None,
-                    'answer_click_time': None
-                }
-            
-            localizer_data.append(trial_data)
-            
-            # Write current trial to CSV incrementally (both touch and keyboard modes; flush+fsync for crash safety)
-            if csv_writer is not None and csv_file is not None:
-                csv_writer.writerow(trial_data)
-                csv_file.flush()
+            _pd_x = -0.70 if USE_TOUCH_SCREEN else -0.75
+            # Photodiode: twice exit-button vertical size (0.08×0.24), bottom-left
+            photodiode_patch = visual.Rect(
+                win, width=0.08, height=0.24,
+                fillColor='white', lineColor=None,
+                pos=(_pd_x, -0.48),
+                units='height'
+            )
+            _photodiode_signal_next_flip = [False]
+            _ttl_events = []
+            _pending_ttl_event_types = []  # Every event signalled before the next flash flip (all share its timestamp)
+            def _signal_photodiode_event():
+                _photodiode_signal_next_flip[0] = True
+            def _queue_ttl_event(event_type=None):
+                """Flag the next flip as a flash and queue event_type for it. Several calls before one flip all get logged."""
+                if event_type is not None:
+                    _pending_ttl_event_types.append(event_type)
+                    _bench_screen[0] = event_type  # Render benchmark: frames from here on belong to this screen
+                _signal_photodiode_event()
+            def _do_photodiode_flash(draw_func, event_type=None):
+                """Signal photodiode, then flip black (TTL) then white. Keyboard only: 17ms delay between flips so the black frame displays; touch screen skips delay. Logs TTL if event_type given."""
+                _queue_ttl_event(event_type)
+                if draw_func:
+                    draw_func()
+                win.flip()  # Black flash, TTL
+                if not USE_TOUCH_SCREEN:
+                    safe_wait(0.017)  # ~1 frame at 60Hz: ensures black displays before white; prevents vsync coalescing on keyboard
+                if draw_func:
+                    draw_func()
+                win.flip()  # White (baseline)
+            _orig_flip = win.flip
+            def _wrapped_flip(*args, **kwargs):
+                did_flash = False
+                if PHOTODIODE_ACTIVE and photodiode_patch is not None:
+                    # Always start white (baseline). Flash black only when explicitly signaled.
+                    photodiode_patch.fillColor = 'white'
+                    if _photodiode_signal_next_flip[0]:
+                        photodiode_patch.fillColor = 'black'
+                        _photodiode_signal_next_flip[0] = False
+                        did_flash = True
+                    photodiode_patch.draw()
+                elif _pending_ttl_event_types:
+                    del _pending_ttl_event_types[:]  # Photodiode off: no flash, so nothing to time-stamp these against
+                # TTL at exact flip moment – callOnFlip fires when screen changes, same time as photodiode flash
+                if PHOTODIODE_ACTIVE and photodiode_patch is not None and did_flash:
+                    def _on_flash():
+                        ts = time.time()
+                        _last_photodiode_ttl_timestamp[0] = ts
+                        event_types = _pending_ttl_event_types[:]
+                        del _pending_ttl_event_types[:]
+                        # Rows after the first get their own pulse time from the pulse-train thread
+                        evs = [{"timestamp": ts, "event_type": et, "ttl_timestamp": _calibrated_ttl_time(ts) if i == 0 else '', "photon_timestamp": _calibrated_photon_time(ts)} for i, et in enumerate(event_types)]
+                        _ttl_events.extend(evs)
+                        train_queued = _send_ttl_trigger(n_pulses=max(1, len(event_types)), train_rows=evs[1:])  # One pulse per event (pulse train if coalesced)
+                        if len(event_types) > 1:
+                            _ttl_coalesced_flips[0] += 1
+                            _ttl_coalesced_events[0] += len(event_types) - 1
+                        if evs:
+                            _write_ttl_rows(evs[:1] if train_queued else evs)  # Write incrementally to TTL file if open
+                    win.callOnFlip(_on_flash)
+                capture_events = _pending_ttl_event_types[:] if did_flash else []
+                capture = _capture_read_back(win, force=bool(capture_events))  # Session capture (CAPTURE_VIDEO=1)
+                result = _bench_timed_flip(_orig_flip, *args, **kwargs) if _RENDER_BENCHMARK else _orig_flip(*args, **kwargs)
+                if capture:
+                    _capture_submit(time.time(), capture_events)
+                return result
+            win.flip = _wrapped_flip
+            _start_session_capture(win, "localizer")
+            _start_render_benchmark("localizer")
+        except Exception as e:
+            print(f"Warning: Could not create photodiode patch: {e}", file=sys.stderr)
+        _setup_station_calibration(win)  # Per-station latency offsets for calibrated timestamp columns
+        _warm_up_gpu(win, STIMULI_DIR)  # Shader/texture/glyph costs paid on hidden frames before the first timed screen
+
+        # Load all stimuli
+        print("Loading stimuli...")
+        all_stimuli = load_all_stimuli()
+
+        if len(all_stimuli) != 200:
+            print(f"Warning: Expected 200 stimuli (100 Image + 100 Lure), found {len(all_stimuli)}")
+            print(f"  The localizer will proceed with the available {len(all_stimuli)} stimuli.")
+            print(f"  Check the detailed output above to see which stimulus files are missing.")
+
+        if len(all_stimuli) == 0:
+            print("ERROR: No stimuli found! Cannot proceed with localizer task.")
+            print("Please check that the STIMULI directory exists and contains image files.")
+            if win is not None:
                 try:
-                    os.fsync(csv_file.fileno())  # Ensure data is persisted to disk
-                except (AttributeError, OSError):
+                    win.close()
+                except:
                     pass
-                
-        except Exception as e:
-            print(f"Error loading image {stimulus['path']}: {e}")
-            continue
+            core.quit()
+            exit(1)
 
-    # Calculate accuracy for question trials
-    question_trials = [trial for trial in localizer_data if trial.get('is_question_trial', False)]
-    if question_trials:
-        correct_count = sum(1 for trial in question_trials if trial.get('correct') is True)
-        total_questions = len(question_trials)
-        accuracy_percent = (correct_count / total_questions * 100) if total_questions > 0 else 0.0
-        accuracy_text = f"Your accuracy: {correct_count}/{total_questions} ({accuracy_percent:.1f}%)"
-    else:
-        accuracy_text = "No questions answered"
-    
-    # Show accuracy message
-    accuracy_display = visual.TextStim(
-        win,
-        text=accuracy_text,
-        color='black',
-        height=0.06*0.75*1.35,
-        pos=(0, 0.1),
-        wrapWidth=1.4*0.75
-    )
-    
-    # Show completion message
-    completion_text = visual.TextStim(
-        win,
-        text="LOCALIZER TASK COMPLETE!\n\n"
-             "Thank you for your participation.",
-        color='black',
-        height=0.06*0.75*1.35,
-        pos=(0, -0.1),
-        wrapWidth=1.4*0.75
-    )
+        # Randomize order
+        random.shuffle(all_stimuli)
 
-    accuracy_display.draw()
-    completion_text.draw()
-    win.flip()
-    wait_for_button("EXIT", additional_stimuli=[accuracy_display, completion_text])
+        # Build list of all unique object names (for wrong-object questions)
+        all_object_names = sorted(set(s['object_name'] for s in all_stimuli))
 
-    # Close CSV file if it was opened
-    if csv_file is not None:
-        csv_file.close()
-        if csv_file_path:
-            print(f"✓ Closed localizer CSV file: {csv_file_path}")
-        else:
-            print(f"✓ Closed localizer CSV file")
+        # Pre-generate randomized sequence for question objects (exactly 50% correct, 50% random)
+        # There are 20 questions total (every 10th trial out of 200 trials)
+        num_questions = 20
+        num_correct_questions = num_questions // 2  # Exactly 10 correct, 10 random
+        question_sequence = [True] * num_correct_questions + [False] * (num_questions - num_correct_questions)
+        random.shuffle(question_sequence)  # Randomize the order
+        question_index = 0  # Track which question we're on
 
-    # Close TTL file (written incrementally throughout experiment)
-    if not is_test_participant(participant_id) and csv_file_path:
-        if _ttl_file_ref[0] is not None:
-            try:
-                _ttl_file_ref[0].close()
-                _ttl_file_ref[0] = None
-                _ttl_writer_ref[0] = None
-                print(f"✓ TTL events saved incrementally ({len(_ttl_events)} triggers)")
-            except Exception as e:
-                print(f"⚠ Could not close TTL file: {e}", file=sys.stderr)
-        elif _ttl_events:
-            # Fallback: batch write if incremental was never opened
+        # Show instructions
+        instructions = visual.TextStim(
+            win,
+            text="LOCALIZER TASK\n\n"
+                 "You will see 200 images one at a time.\n"
+                 "Every few images, you will be asked a question about the previous image.\n"
+                 "Your total score will be shown at the end of the task.\n",
+            color='black',
+            height=0.05*0.75*1.35,
+            pos=(0, 0),
+            wrapWidth=1.4*0.75
+        )
+
+        def draw_instructions():
+            instructions.draw()
+        _do_photodiode_flash(draw_instructions, event_type="instruction_onset")  # First instruction onset: black (TTL), white
+        wait_for_button("BEGIN", additional_stimuli=[instructions])
+
+        # Data storage
+        localizer_data = []
+        csv_file = None
+        csv_writer = None
+        csv_file_path = None
+        fieldnames = None
+        csv_initialized = False
+
+        # Initialize CSV file before first image (trial-by-trial incremental write for BOTH touch and keyboard modes)
+        if not is_test_participant(participant_id):
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            log_dir = get_log_directory()
+            csv_file_path = os.path.join(log_dir, f"localizer_{participant_id}_{timestamp}.csv")
+            csv_file = open(csv_file_path, 'w', newline='')
+            # Define fieldnames for all images (will include question fields for every 10th)
+            fieldnames = [
+                'participant_id', 'trial', 'stimulus_number', 'object_name', 'category',
+                'stimulus_type', 'is_lure', 'image_path', 'presentation_time', 
+                'localizer_fixation_onset_trigger', 'localizer_fixation_offset_trigger', 'fixation_duration',
+                'localizer_image_onset_trigger', 'localizer_image_offset_trigger', 'is_question_trial', 
+                'question_object', 'question_text', 'question_trigger', 'question_answer_trigger',
+                'answer', 'correct_answer', 'correct', 'timed_out', 'response_time', 'answer_click_time'
+            ]
+            # Station-calibrated photon time next to every raw *_trigger column (blank if station not calibrated)
+            fieldnames = list(_add_calibrated_trigger_columns({f: None for f in fieldnames}).keys())
+            csv_writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            csv_writer.writeheader()
+            csv_file.flush()
+            csv_initialized = True
+            print(f"✓ Created localizer CSV file: {csv_file_path}")
+            # Open TTL and key-response files for incremental writes (same directory, derived from csv path)
             try:
-                log_dir = get_log_directory()
                 base = os.path.basename(csv_file_path)
                 ttl_filename = base.replace("localizer_", "localizer_ttl_events_", 1)
-                ttl_file = os.path.join(log_dir, ttl_filename)
-                with open(ttl_file, 'w', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=['timestamp', 'event_type'])
-                    writer.writeheader()
-                    for ev in _ttl_events:
-                        row = dict(ev)
-                        if isinstance(row.get('timestamp'), (int, float)):
-                            row['timestamp'] = f"{row['timestamp']:.9f}"
-                        writer.writerow(row)
-                print(f"✓ TTL events saved to {ttl_file} ({len(_ttl_events)} triggers)")
+                ttl_file_path = os.path.join(log_dir, ttl_filename)
+                with _ttl_log_lock:  # Watchdog thread may log a reconnect row at any time
+                    _ttl_file_ref[0] = open(ttl_file_path, 'w', newline='')
+                    _ttl_writer_ref[0] = csv.DictWriter(_ttl_file_ref[0], fieldnames=_TTL_FIELDNAMES)
+                    _ttl_writer_ref[0].writeheader()
+                    _ttl_file_ref[0].flush()
+                _open_key_responses(os.path.join(log_dir, base.replace("localizer_", "localizer_key_responses_", 1)))
             except Exception as e:
-                print(f"⚠ Could not save TTL events: {e}", file=sys.stderr)
+                print(f"Warning: Could not open TTL file for incremental writes: {e}", file=sys.stderr)
 
-    # Save data (backup - in case CSV wasn't created incrementally)
-    if not is_test_participant(participant_id) and not csv_initialized:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_dir = get_log_directory()
-        output_file = os.path.join(log_dir, f"localizer_{participant_id}_{timestamp}.csv")
-        
-        if localizer_data:
-            fieldnames = list(localizer_data[0].keys())
-            with open(output_file, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(localizer_data)
-            
-            print(f"✓ Saved localizer data to {output_file}")
+        # Show images
+        # Start with a fixation cross before the first image
+        fixation_duration_first = random.uniform(0.25, 0.75)
+        localizer_fixation_onset_trigger_first, localizer_fixation_offset_trigger_first = show_fixation(fixation_duration_first, return_onset=True, return_offset_trigger=True, onset_event_type="localizer_fixation_onset_trigger", offset_event_type="localizer_fixation_offset_trigger")
+
+        if _RENDER_BENCHMARK:
+            all_stimuli = all_stimuli[:int(os.environ.get('RENDER_BENCHMARK_TRIALS', '20'))]  # Includes question trials 10, 20
+        for idx, stimulus in enumerate(all_stimuli, 1):
+            # Record presentation time
+            presentation_time = datetime.now()
+            presentation_timestamp = presentation_time.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+            # Show jittered fixation between images (except before first image, which was already shown)
+            if idx > 1:
+                fixation_duration = random.uniform(0.25, 0.75)
+                localizer_fixation_onset_trigger, localizer_fixation_offset_trigger = show_fixation(fixation_duration, return_onset=True, return_offset_trigger=True, onset_event_type="localizer_fixation_onset_trigger", offset_event_type="localizer_fixation_offset_trigger")
+            else:
+                fixation_duration = fixation_duration_first
+                localizer_fixation_onset_trigger = localizer_fixation_onset_trigger_first
+                localizer_fixation_offset_trigger = localizer_fixation_offset_trigger_first
+
+            # Load and display image; photodiode flashes at fixation onset/offset, image onset/offset
+            try:
+                img = _textures.acquire(stimulus['path'], size=(0.8*0.75*1.35, 0.8*0.75*1.35))
+                _do_photodiode_flash(_timed_draw('localizer_image')(img.draw), event_type="localizer_image_onset_trigger")  # Image onset: black (TTL), white
+                localizer_image_onset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+
+                # Show image for exactly 0.5 seconds (fixed duration). ESC works during wait.
+                wait_with_escape(0.5)
+                _do_photodiode_flash(lambda: _blank_rect.draw(), event_type="localizer_image_offset_trigger")  # Image offset: black (TTL), white
+                localizer_image_offset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+                _textures.release(img)
+
+                # Check if this is the 10th image (or every 10th after the first)
+                is_question_trial = (idx % 10 == 0)
+
+                if is_question_trial:
+                    # Ask object question about the image we just showed (the 10th, 20th, 30th, etc.)
+                    current_stimulus = stimulus
+                    correct_object = current_stimulus['object_name']
+
+                    # Use pre-generated randomized sequence to ensure exactly 50% correct, 50% random
+                    if question_index < len(question_sequence):
+                        ask_about_correct = question_sequence[question_index]
+                        question_index += 1
+                    else:
+                        ask_about_correct = random.choice([True, False])
+
+                    if ask_about_correct:
+                        question_object = correct_object
+                        correct_answer = True
+                    else:
+                        # 50% of trials: ask about a random incorrect object (from all other objects)
+                        wrong_objects = [o for o in all_object_names if o != correct_object]
+                        question_object = random.choice(wrong_objects) if wrong_objects else correct_object
+                        correct_answer = False
+
+                    answer, timed_out, response_time, answer_click_time, question_trigger, question_answer_trigger = ask_object_question(question_object, timeout=10.0)
+                    is_correct = (answer == correct_answer) if not timed_out else None
+
+                    # No per-trial feedback; feedback shown at end only
+                    trial_data = {
+                        'participant_id': participant_id,
+                        'trial': idx,
+                        'stimulus_number': current_stimulus['number'],
+                        'object_name': current_stimulus['object_name'],
+                        'category': current_stimulus['category'],
+                        'stimulus_type': current_stimulus['stimulus_type'],
+                        'is_lure': current_stimulus['is_lure'],
+                        'image_path': current_stimulus['path'],
+                        'presentation_time': presentation_timestamp,
+                        'localizer_fixation_onset_trigger': localizer_fixation_onset_trigger,
+                        'localizer_fixation_offset_trigger': localizer_fixation_offset_trigger,
+                        'fixation_duration': fixation_duration,
+                        'localizer_image_onset_trigger': localizer_image_onset_trigger,
+                        'localizer_image_offset_trigger': localizer_image_offset_trigger,
+                        'is_question_trial': True,
+                        'question_object': question_object,
+                        'question_text': object_to_question(question_object),
+                        'question_trigger': question_trigger,
+                        'question_answer_trigger': question_answer_trigger,
+                        'answer': answer if not timed_out else 'TIMEOUT',
+                        'correct_answer': correct_answer,
+                        'correct': is_correct,
+                        'timed_out': timed_out,
+                        'response_time': response_time if response_time is not None else None,
+                        'answer_click_time': answer_click_time
+                    }
+                else:
+                    trial_data = {
+                        'participant_id': participant_id,
+                        'trial': idx,
+                        'stimulus_number': stimulus['number'],
+                        'object_name': stimulus['object_name'],
+                        'category': stimulus['category'],
+                        'stimulus_type': stimulus['stimulus_type'],
+                        'is_lure': stimulus['is_lure'],
+                        'image_path': stimulus['path'],
+                        'presentation_time': presentation_timestamp,
+                        'localizer_fixation_onset_trigger': localizer_fixation_onset_trigger,
+                        'localizer_fixation_offset_trigger': localizer_fixation_offset_trigger,
+                        'fixation_duration': fixation_duration,
+                        'localizer_image_onset_trigger': localizer_image_onset_trigger,
+                        'localizer_image_offset_trigger': localizer_image_offset_trigger,
+                        'is_question_trial': False,
+                        'question_object': None,
+                        'question_text': None,
+                        'question_trigger': None,
+                        'question_answer_trigger': None,
+                        'answer': None,
+                        'correct_answer': None,
+                        'correct': None,
+                        'timed_out': None,
+                        'response_time': None,
+                        'answer_click_time': None
+                    }
+
+                trial_data = _add_calibrated_trigger_columns(trial_data)
+                localizer_data.append(trial_data)
+
+                # Write current trial to CSV incrementally (both touch and keyboard modes; flush+fsync for crash safety)
+                if csv_writer is not None and csv_file is not None:
+                    csv_writer.writerow(trial_data)
+                    csv_file.flush()
+                    try:
+                        os.fsync(csv_file.fileno())  # Ensure data is persisted to disk
+                    except (AttributeError, OSError):
+                        pass
+
+            except Exception as e:
+                print(f"Error loading image {stimulus['path']}: {e}")
+                continue
+
+        # Calculate accuracy for question trials
+        question_trials = [trial for trial in localizer_data if trial.get('is_question_trial', False)]
+        if question_trials:
+            correct_count = sum(1 for trial in question_trials if trial.get('correct') is True)
+            total_questions = len(question_trials)
+            accuracy_percent = (correct_count / total_questions * 100) if total_questions > 0 else 0.0
+            accuracy_text = f"Your accuracy: {correct_count}/{total_questions} ({accuracy_percent:.1f}%)"
         else:
-            print("⚠ No data to save")
-    elif is_test_participant(participant_id):
-        print(f"⚠ Test participant detected - skipping file save")
-    
-    # Clean up on successful completion
-    print("Experiment completed successfully")
-    sys.stdout.flush()
-    if win is not None:
+            accuracy_text = "No questions answered"
+
+        # Show accuracy message
+        accuracy_display = visual.TextStim(
+            win,
+            text=accuracy_text,
+            color='black',
+            height=0.06*0.75*1.35,
+            pos=(0, 0.1),
+            wrapWidth=1.4*0.75
+        )
+
+        # Show completion message
+        completion_text = visual.TextStim(
+            win,
+            text="LOCALIZER TASK COMPLETE!\n\n"
+                 "Thank you for your participation.",
+            color='black',
+            height=0.06*0.75*1.35,
+            pos=(0, -0.1),
+            wrapWidth=1.4*0.75
+        )
+
+        accuracy_display.draw()
+        completion_text.draw()
+        win.flip()
+        wait_for_button("EXIT", additional_stimuli=[accuracy_display, completion_text])
+
+        # Close CSV file if it was opened
+        if csv_file is not None:
+            csv_file.close()
+            if csv_file_path:
+                print(f"✓ Closed localizer CSV file: {csv_file_path}")
+            else:
+                print(f"✓ Closed localizer CSV file")
+
+        # Close TTL file (written incrementally throughout experiment)
+        if not is_test_participant(participant_id) and csv_file_path:
+            if _ttl_file_ref[0] is not None:
+                try:
+                    with _ttl_log_lock:
+                        _ttl_file_ref[0].close()
+                        _ttl_file_ref[0] = None
+                        _ttl_writer_ref[0] = None
+                    print(f"✓ TTL events saved incrementally ({len(_ttl_events)} triggers)")
+                except Exception as e:
+                    print(f"⚠ Could not close TTL file: {e}", file=sys.stderr)
+            elif _ttl_events:
+                # Fallback: batch write if incremental was never opened
+                try:
+                    log_dir = get_log_directory()
+                    base = os.path.basename(csv_file_path)
+                    ttl_filename = base.replace("localizer_", "localizer_ttl_events_", 1)
+                    ttl_file = os.path.join(log_dir, ttl_filename)
+                    with open(ttl_file, 'w', newline='') as f:
+                        writer = csv.DictWriter(f, fieldnames=_TTL_FIELDNAMES)
+                        writer.writeheader()
+                        for ev in _ttl_events:
+                            row = dict(ev)
+                            for col in _TTL_TIME_COLUMNS:
+                                if isinstance(row.get(col), (int, float)):
+                                    row[col] = f"{row[col]:.9f}"
+                            writer.writerow(row)
+                    print(f"✓ TTL events saved to {ttl_file} ({len(_ttl_events)} triggers)")
+                except Exception as e:
+                    print(f"⚠ Could not save TTL events: {e}", file=sys.stderr)
+            _close_key_responses()
+            draw_timing = _draw_timing_summary(win)  # Per-screen CPU/GPU draw cost vs frame budget
+            print(f"  Textures: {_textures.misses} loaded, {_textures.hits} reused, {_textures.total_bytes / 1048576:.0f} MB cached")
+            if draw_timing:
+                timing_file = os.path.join(get_log_directory(), os.path.basename(csv_file_path).replace("localizer_", "localizer_timing_summary_", 1))
+                try:
+                    with open(timing_file, 'w', newline='') as f:
+                        writer = csv.DictWriter(f, fieldnames=['participant_id'] + list(draw_timing))
+                        writer.writeheader()
+                        writer.writerow({'participant_id': participant_id, **draw_timing})
+                    print(f"✓ Timing summary saved to {timing_file}")
+                except Exception as e:
+                    print(f"⚠ Could not save timing summary: {e}", file=sys.stderr)
+        if _ttl_coalesced_flips[0]:
+            print(f"  TTL: {_ttl_coalesced_flips[0]} flip(s) carried multiple events ({_ttl_coalesced_events[0]} extra event(s) sent as pulse trains)")
+        _report_ttl_reconnect_gaps()  # Experimenter console only
+        _report_ttl_health()
+
+        # Save data (backup - in case CSV wasn't created incrementally)
+        if not is_test_participant(participant_id) and not csv_initialized:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            log_dir = get_log_directory()
+            output_file = os.path.join(log_dir, f"localizer_{participant_id}_{timestamp}.csv")
+
+            if localizer_data:
+                fieldnames = list(localizer_data[0].keys())
+                with open(output_file, 'w', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=fieldnames)
+                    writer.writeheader()
+                    writer.writerows(localizer_data)
+
+                print(f"✓ Saved localizer data to {output_file}")
+            else:
+                print("⚠ No data to save")
+        elif is_test_participant(participant_id):
+            print(f"⚠ Test participant detected - skipping file save")
+
+        # Clean up on successful completion
+        print("Experiment completed successfully")
+        sys.stdout.flush()
+        if win is not None:
+            try:
+                win.close()
+            except Exception:
+                pass
         try:
-            win.close()
-        except Exception:
+            core.quit()
+        except:
             pass
-    try:
-        core.quit()
-    except:
-        pass
 
-except SystemExit as se:
-    print("SystemExit caught in main experiment", file=sys.stderr)
-    sys.stderr.flush()
-    print(f"SystemExit value: {se}", file=sys.stderr)
-    sys.stderr.flush()
-    print("SystemExit caught in main experiment")
-    sys.stdout.flush()
-    raise
-except Exception as e:
-    # Catch any unhandled exceptions in the main experiment
-    print("="*60)
-    sys.stdout.flush()
-    print("EXCEPTION CAUGHT IN MAIN EXPERIMENT BLOCK")
-    sys.stdout.flush()
-    print("="*60)
-    sys.stdout.flush()
-    print(f"Exception: {e}")
-    sys.stdout.flush()
-    print(f"Error type: {type(e).__name__}")
-    sys.stdout.flush()
-    print(f"Window state: win = {win}")
-    sys.stdout.flush()
-    import traceback
-    print("Full traceback:")
-    sys.stdout.flush()
-    traceback.print_exc()
-    print("="*60)
-    sys.stdout.flush()
-    print("Press Enter to see error details...")
-    try:
-        input()
-    except:
-        pass
-    if win is not None:
+    except SystemExit as se:
+        print("SystemExit caught in main experiment", file=sys.stderr)
+        sys.stderr.flush()
+        print(f"SystemExit value: {se}", file=sys.stderr)
+        sys.stderr.flush()
+        print("SystemExit caught in main experiment")
+        sys.stdout.flush()
+        raise
+    except Exception as e:
+        # Catch any unhandled exceptions in the main experiment
+        print("="*60)
+        sys.stdout.flush()
+        print("EXCEPTION CAUGHT IN MAIN EXPERIMENT BLOCK")
+        sys.stdout.flush()
+        print("="*60)
+        sys.stdout.flush()
+        print(f"Exception: {e}")
+        sys.stdout.flush()
+        print(f"Error type: {type(e).__name__}")
+        sys.stdout.flush()
+        print(f"Window state: win = {win}")
+        sys.stdout.flush()
+        print("Full traceback:")
+        sys.stdout.flush()
+        traceback.print_exc()
+        print("="*60)
+        sys.stdout.flush()
+        print("Press Enter to see error details...")
         try:
-            win.close()
-        except Exception:
+            input()
+        except:
             pass
-    try:
-        core.quit()
-    except:
-        pass
-    exit(1)
-except BaseException as be:
-    print("="*60, file=sys.stderr)
-    print("UNKNOWN EXCEPTION CAUGHT IN MAIN EXPERIMENT BLOCK", file=sys.stderr)
-    print(f"Exception type: {type(be).__name__}", file=sys.stderr)
-    print(f"Exception value: {be}", file=sys.stderr)
-    print("="*60, file=sys.stderr)
-    sys.stderr.flush()
-    print("="*60)
-    sys.stdout.flush()
-    print("UNKNOWN EXCEPTION CAUGHT IN MAIN EXPERIMENT BLOCK")
-    sys.stdout.flush()
-    print("="*60)
-    sys.stdout.flush()
-    import traceback
-    traceback.print_exc(file=sys.stderr)
-    sys.stderr.flush()
-    traceback.print_exc()
-    print("="*60)
-    sys.stdout.flush()
-    if win is not None:
+        if win is not None:
+            try:
+                win.close()
+            except Exception:
+                pass
         try:
-            win.close()
-        except Exception:
+            core.quit()
+        except:
             pass
-    print("Press Enter to exit...")
-    try:
-        input()
-    except:
-        pass
-    try:
-        core.quit()
-    except:
+        exit(1)
+    except BaseException as be:
+        print("="*60, file=sys.stderr)
+        print("UNKNOWN EXCEPTION CAUGHT IN MAIN EXPERIMENT BLOCK", file=sys.stderr)
+        print(f"Exception type: {type(be).__name__}", file=sys.stderr)
+        print(f"Exception value: {be}", file=sys.stderr)
+        print("="*60, file=sys.stderr)
+        sys.stderr.flush()
+        print("="*60)
+        sys.stdout.flush()
+        print("UNKNOWN EXCEPTION CAUGHT IN MAIN EXPERIMENT BLOCK")
+        sys.stdout.flush()
+        print("="*60)
+        sys.stdout.flush()
+        traceback.print_exc(file=sys.stderr)
+        sys.stderr.flush()
+        traceback.print_exc()
+        print("="*60)
+        sys.stdout.flush()
+        if win is not None:
+            try:
+                win.close()
+            except Exception:
+                pass
+        print("Press Enter to exit...")
+        try:
+            input()
+        except:
+            pass
+        try:
+            core.quit()
+        except:
+            pass
+        exit(1)
+    finally:
+        # Cleanup - this block always executes
+        # Window and core.quit() are handled in the try/except blocks above
         pass
-    exit(1)
-finally:
-    # Cleanup - this block always executes
-    # Window and core.quit() are handled in the try/except blocks above
-    pass
+
+# =========================
+#  SESSION
+# =========================
+# Everything above is importable without a display. A Session brings up PsychoPy, the exception hook, TTL
+# discovery and the input-method screen; run() creates the main window and runs the localizer on it.
+class Session:
+    """Display and hardware for one localizer run; nothing is created until open()."""
+    def __init__(self):
+        self.temp_win = None
+
+    def open(self):
+        _import_psychopy()
+        sys.excepthook = exception_handler
+        _start_ttl_discovery()  # Enumerate TTL devices on a background thread while the input-method screen is up
+        self.temp_win = _choose_input_method()
+        return self
+
+    def run(self):
+        temp_win, self.temp_win = self.temp_win, None
+        run_localizer(temp_win)
+
+if __name__ == "__main__":
+    Session().open().run()
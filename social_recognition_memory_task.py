@@ -1,61 +1,101 @@
-
-
-# Suppress iohub import errors (numpy/tables compatibility issue)
-import warnings
+# Importing this module has no side effects: PsychoPy, the window and the TTL hardware are only brought up by
+# Session.open() (see SESSION), so stimulus, scheduling, AICollaborator and data-saving code can be imported by
+# tests and analysis tools without a display.
 import sys
 import os
+import importlib.abc
+import importlib.machinery
+import random, time, re
+import numpy as np
+import csv
+from datetime import datetime
+import math
+import traceback
+import platform
+import threading
+from collections import deque, OrderedDict
+from array import array
+import json
+import shutil
+
+# Import hook scoped to tables/iohub: a numpy/tables binary-incompatibility error while executing one of these
+# modules leaves an empty module instead of crashing. Only the first import of a module reaches sys.meta_path,
+# and the finder returns at once for every other name, so PsychoPy startup and later imports pay nothing extra.
+def _is_guarded_module(fullname):
+    parts = fullname.split('.')
+    return parts[0] == 'tables' or 'iohub' in parts
 
-# Suppress the specific numpy/tables compatibility warning
-warnings.filterwarnings('ignore', category=UserWarning, message='.*pkg_resources.*')
-warnings.filterwarnings('ignore', message='.*numpy.dtype size changed.*')
+class _GuardedLoader(importlib.abc.Loader):
+    """Wraps a real loader; swallows numpy/tables compatibility errors during exec_module."""
+    def __init__(self, loader):
+        self._loader = loader
 
-# Prevent iohub from being imported (causes numpy/tables compatibility issues)
-os.environ['PSYCHOPY_IOHUB'] = '0'
+    def __getattr__(self, name):
+        return getattr(self._loader, name)  # get_code, get_resource_reader, ... from the real loader
 
-# Monkey-patch to prevent tables import error from crashing
-import builtins
-_original_import = builtins.__import__
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
 
-def _safe_import(name, globals=None, locals=None, fromlist=(), level=0):
-    """Import wrapper that catches numpy/tables compatibility errors"""
-    if 'tables' in name or 'iohub' in name:
+    def exec_module(self, module):
         try:
-            return _original_import(name, globals, locals, fromlist, level)
+            self._loader.exec_module(module)
         except (ValueError, ImportError) as e:
             if 'numpy.dtype size changed' in str(e) or 'binary incompatibility' in str(e):
-                # Suppress the error and return a dummy module
-                import types
-                dummy_module = types.ModuleType(name)
-                print(f"Warning: Suppressed import error for {name}: {e}", file=sys.stderr)
-                return dummy_module
+                print(f"Warning: Suppressed import error for {module.__name__}: {e}", file=sys.stderr)
+                return  # Module stays importable, empty
             raise
-    return _original_import(name, globals, locals, fromlist, level)
 
-builtins.__import__ = _safe_import
+class _GuardedImportFinder(importlib.abc.MetaPathFinder):
+    """sys.meta_path finder that only handles tables/iohub: resolves the normal spec and guards its loader."""
+    def find_spec(self, fullname, path, target=None):
+        if not _is_guarded_module(fullname):
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if spec is not None and spec.loader is not None:
+            spec.loader = _GuardedLoader(spec.loader)
+        return spec
 
-# Suppress stderr temporarily during psychopy import to catch iohub errors
-import io
-from contextlib import redirect_stderr
+# PsychoPy modules, bound by _import_psychopy() when a Session opens
+visual = core = event = None
 
-# Try importing psychopy with stderr suppressed
-stderr_buffer = io.StringIO()
-try:
-    with redirect_stderr(stderr_buffer):
-        from psychopy import visual, core, event
-except Exception as e:
-    # If import fails, try again without suppression to see the real error
-    print(f"Warning: Error importing psychopy: {e}", file=sys.stderr)
-    from psychopy import visual, core, event
+def _import_psychopy():
+    """Import PsychoPy once, with iohub disabled, the tables/iohub guard installed and headless pyglet if benchmarking."""
+    global visual, core, event
+    if visual is not None:
+        return
+    import warnings
+    import io
+    from contextlib import redirect_stderr
+    # Suppress the specific numpy/tables compatibility warning
+    warnings.filterwarnings('ignore', category=UserWarning, message='.*pkg_resources.*')
+    warnings.filterwarnings('ignore', message='.*numpy.dtype size changed.*')
+    # Prevent iohub from being imported (causes numpy/tables compatibility issues)
+    os.environ['PSYCHOPY_IOHUB'] = '0'
+    if not any(isinstance(f, _GuardedImportFinder) for f in sys.meta_path):
+        sys.meta_path.insert(0, _GuardedImportFinder())
+    t0 = time.perf_counter()
+    modules0 = len(sys.modules)
 
-import random, time, re
-import numpy as np
-import csv
-from datetime import datetime
-from PIL import Image, ImageDraw
-import math
-import sys
-import traceback
-import platform
+    # RENDER_BENCHMARK=1 (see RENDER BENCHMARK section): without a display (CI) pyglet must be switched to a
+    # headless context before PsychoPy creates any window. RENDER_BENCHMARK_HEADLESS=0 keeps the normal display.
+    if os.environ.get('RENDER_BENCHMARK', '0') == '1' and os.environ.get('RENDER_BENCHMARK_HEADLESS', '1') != '0':
+        try:
+            import pyglet
+            pyglet.options['headless'] = True
+        except Exception as e:
+            print(f"Warning: Could not enable headless rendering: {e}", file=sys.stderr)
+
+    # Try importing psychopy with stderr suppressed to catch iohub errors
+    stderr_buffer = io.StringIO()
+    try:
+        with redirect_stderr(stderr_buffer):
+            from psychopy import visual, core, event
+    except Exception as e:
+        # If import fails, try again without suppression to see the real error
+        print(f"Warning: Error importing psychopy: {e}", file=sys.stderr)
+        from psychopy import visual, core, event
+    # Startup import report; run with `python -X importtime` for a per-module breakdown
+    print(f"✓ PsychoPy import: {time.perf_counter() - t0:.2f}s, {len(sys.modules) - modules0} modules", file=sys.stderr)
 
 # Force stdout to flush after each print
 def print_flush(*args, **kwargs):
@@ -64,7 +104,7 @@ def print_flush(*args, **kwargs):
 
 # Use print_flush for critical messages, but keep regular print for compatibility
 
-# Set up exception hook to catch all unhandled exceptions
+# Exception hook for all unhandled exceptions (installed by Session.open)
 def exception_handler(exc_type, exc_value, exc_traceback):
     """Handle unhandled exceptions"""
     if issubclass(exc_type, KeyboardInterrupt):
@@ -81,8 +121,6 @@ def exception_handler(exc_type, exc_value, exc_traceback):
     except:
         pass
 
-sys.excepthook = exception_handler
-
 # =========================
 #  SETUP
 # =========================
@@ -96,6 +134,7 @@ EXIT_HIT_MARGIN = 0.05  # Larger margin for reliable touch registration
 # Photodiode detector: black rectangle in bottom-left (0.5" x 1"), drawn on each flip except input/name screens
 PHOTODIODE_ACTIVE = True  # Set False during get_input_method (temp_win) and get_participant_id
 photodiode_patch = None  # Created after main window exists
+win = None  # Main window, created by Session.open()
 _blank_rect = None  # Full-screen gray rect for blank frames (fixation offset)
 _last_photodiode_ttl_timestamp = [None]  # Set at exact moment of photodiode flash + TTL (for CSV alignment)
 _ttl_events = []  # Log every TTL: [{"timestamp": t, "event_type": str}, ...] (populated when photodiode active)
@@ -106,10 +145,27 @@ _ttl_file_path_ref = [None]  # Path to TTL file (for closing and log message)
 # TTL trigger: Cedrus pyxid2 (StimTracker, c-pod, Lumina, etc.) or parallel port fallback
 # See https://github.com/cedrus-opensource/pyxid
 # NOTE: Parallel port works on Windows/Linux only. On macOS, Cedrus pyxid2 (USB) is required for Blackrock.
-_ttl_backend = None  # Lazy-init: pyxid device, psychopy parallel, or False
+_ttl_backend = None  # Set by background discovery: ('cedrus', dev), ('parallel', parallel), or False
 _ttl_line = int(os.environ.get('CEDRUS_TTL_LINE', '1'))  # Output line for Cedrus (default 1)
 _ttl_pulse_ms = int(os.environ.get('CEDRUS_TTL_PULSE_MS', '10'))  # Pulse duration in ms (default 10)
 _ttl_status_logged = [False]  # One-time diagnostic print
+_TTL_TIME_COLUMNS = ['timestamp', 'ttl_timestamp', 'photon_timestamp']  # Raw flip-callback time + station-calibrated times
+_TTL_FIELDNAMES = ['timestamp', 'event_type', 'ttl_timestamp', 'photon_timestamp']
+_ttl_watchdog_interval_s = float(os.environ.get('CEDRUS_WATCHDOG_INTERVAL_S', '2.0'))  # Re-scan period after a device loss
+_ttl_watchdog_max_interval_s = float(os.environ.get('CEDRUS_WATCHDOG_MAX_INTERVAL_S', '60.0'))  # Backoff cap while no device was ever found
+_ttl_discovery_wait_s = float(os.environ.get('CEDRUS_DISCOVERY_WAIT_S', '5.0'))  # Max wait in _probe_ttl_at_startup
+_ttl_lock = threading.Lock()  # Guards backend swaps between the render thread and the watchdog thread
+_ttl_log_lock = threading.Lock()  # Serializes TTL CSV writes (flip callback + watchdog thread)
+_ttl_discovery_done = threading.Event()  # Set once the startup enumeration has finished
+_ttl_watchdog_thread_ref = [None]
+_ttl_disconnected_at = [None]  # time.time() when the Cedrus device was lost (None while connected)
+_ttl_missed_during_gap = [0]  # Triggers dropped while disconnected (reset on reconnect)
+_ttl_reconnect_gaps = []  # [{"lost": t0, "restored": t1, "missed": n}, ...] for end-of-session report
+_ttl_train_gap_ms = int(os.environ.get('CEDRUS_TTL_TRAIN_GAP_MS', '10'))  # Low time between pulses of a coalesced-event train
+_ttl_coalesced_flips = [0]  # Flips that carried more than one TTL event
+_ttl_coalesced_events = [0]  # Extra events (beyond the first) sharing a flip with another event
+_ttl_device_lock = threading.Lock()  # One writer at a time on the Cedrus/parallel device (render thread + pulse-train thread)
+_ttl_train_queue = [None]  # queue.Queue of pulse-train thread jobs (train or parallel-port release); None until first job
 
 def _log_ttl_status():
     """Print TTL backend status once (for Blackrock/debugging)."""
@@ -122,6 +178,7 @@ def _log_ttl_status():
         print("  - On macOS: Cedrus pyxid2 (StimTracker/c-pod/Lumina) via USB is required.", file=sys.stderr)
         print("  - Parallel port is Windows/Linux only.", file=sys.stderr)
         print("  - Ensure Cedrus device is connected and pyxid2 is installed.", file=sys.stderr)
+        print(f"  - Watchdog keeps scanning for a Cedrus device (hot-plug), backing off from {_ttl_watchdog_interval_s:g}s to {_ttl_watchdog_max_interval_s:g}s.", file=sys.stderr)
         print("=" * 60, file=sys.stderr)
         sys.stderr.flush()
     elif _ttl_backend is not None:
@@ -129,106 +186,1332 @@ def _log_ttl_status():
         print(f"TTL OK: Using {bt} backend, line {_ttl_line}, {_ttl_pulse_ms}ms pulse. If Blackrock still misses triggers: check m-pod output mapping (Xidon 2), wiring to Blackrock DIN, and Blackrock digital input channel.", file=sys.stderr)
         sys.stderr.flush()
 
-def _probe_ttl_at_startup():
-    """Initialize TTL backend and log status. Call when photodiode is first enabled. No pulse sent."""
-    global _ttl_backend
-    if _ttl_backend is not None:
-        _log_ttl_status()
-        return
-    try:
+_cedrus_scan_lock = threading.Lock()  # One pyxid2 enumeration at a time; response-pad I/O never overlaps a scan
+_cedrus_pad_found = [None]  # Response pad seen by TTL discovery (RESPONSE_PAD=cedrus), handed to _start_response_pad
+
+def _scan_cedrus_devices():
+    """One pyxid2 enumeration shared by TTL discovery and the response pad. Returns (trigger_devices, response_pads)."""
+    with _cedrus_scan_lock:
         import pyxid2
         devices = pyxid2.get_xid_devices()
-        if devices:
-            dev = devices[0]
+    triggers, pads = [], []
+    for dev in devices:
+        try:
+            is_pad = dev.is_response_device()
+        except Exception:
+            is_pad = False
+        (pads if is_pad else triggers).append(dev)
+    return triggers, pads
+
+def _find_cedrus_device():
+    """First Cedrus trigger device (StimTracker, c-pod, ...; response pads excluded), pulse duration set, or None. Slow (USB scan) - never call on the render thread."""
+    try:
+        triggers, pads = _scan_cedrus_devices()
+        if pads and _response_pad_mode == 'cedrus' and _response_pad_ref[0] is None and _cedrus_pad_found[0] is None:
+            _cedrus_pad_found[0] = pads[0]
+        if triggers:
+            dev = triggers[0]
             dev.set_pulse_duration(_ttl_pulse_ms)
-            _ttl_backend = ('cedrus', dev)
+            return dev
     except Exception:
         pass
-    if _ttl_backend is None:
+    return None
+
+def _discover_ttl_backend():
+    """Try Cedrus pyxid2 first (works on macOS), then parallel port (Windows/Linux only). Returns backend tuple or False."""
+    dev = _find_cedrus_device()
+    if dev is not None:
+        return ('cedrus', dev)
+    try:
+        from psychopy import parallel
+        addr = int(os.environ.get('PARALLEL_PORT_ADDRESS', '0x0378'), 16)
+        parallel.setPortAddress(addr)
+        return ('parallel', parallel)
+    except Exception:
+        return False
+
+def _write_ttl_rows(evs):
+    """Append TTL rows to the incremental TTL CSV (one flush + fsync per call). Safe to call from the watchdog thread."""
+    if _ttl_writer_ref[0] is None or _ttl_file_ref[0] is None:
+        return
+    with _ttl_log_lock:
         try:
-            from psychopy import parallel
-            addr = int(os.environ.get('PARALLEL_PORT_ADDRESS', '0x0378'), 16)
-            parallel.setPortAddress(addr)
-            _ttl_backend = ('parallel', parallel)
-        except Exception:
-            _ttl_backend = False
-    _log_ttl_status()
+            for ev in evs:
+                row = dict(ev)
+                for col in _TTL_TIME_COLUMNS:
+                    if isinstance(row.get(col), (int, float)):
+                        row[col] = f"{row[col]:.9f}"
+                _ttl_writer_ref[0].writerow(row)
+            _ttl_file_ref[0].flush()
+            try:
+                os.fsync(_ttl_file_ref[0].fileno())
+            except (AttributeError, OSError):
+                pass
+        except Exception as e:
+            print(f"Warning: Could not write TTL event incrementally: {e}", file=sys.stderr)
+
+def _log_ttl_backend_event(event_type, ts):
+    """Record a TTL backend state change (device lost/reconnected) as a row in the TTL log."""
+    ev = {"timestamp": ts, "event_type": event_type}
+    _ttl_events.append(ev)
+    _write_ttl_rows([ev])
+
+def _mark_ttl_disconnected():
+    """Called on the render thread when a Cedrus pulse fails. Hands reconnection to the watchdog."""
+    with _ttl_lock:
+        if _ttl_disconnected_at[0] is not None:
+            return
+        lost = time.time()
+        _ttl_disconnected_at[0] = lost
+        _ttl_missed_during_gap[0] = 1  # The pulse that just failed
+    print(f"TTL WARNING: Cedrus device lost at {lost:.3f}. Triggers are dropped until the watchdog reconnects it.", file=sys.stderr)
+    sys.stderr.flush()
+    _log_ttl_backend_event("ttl_device_lost", lost)
 
-def _send_ttl_trigger():
-    """Send a brief TTL pulse via Cedrus pyxid2 (preferred) or parallel port. Fails silently if unavailable."""
+def _ttl_watchdog_loop():
+    """Background thread: initial device discovery, then re-scan for a Cedrus device while disconnected (or absent).
+    A lost device is re-scanned every _ttl_watchdog_interval_s; when none was ever found the period doubles up to
+    _ttl_watchdog_max_interval_s, so a station without a TTL box does not enumerate USB all session."""
     global _ttl_backend
+    backend = _discover_ttl_backend()
+    with _ttl_lock:
+        _ttl_backend = backend
+    _ttl_discovery_done.set()
+    absent_delay = _ttl_watchdog_interval_s
+    while True:
+        lost_device = _ttl_disconnected_at[0] is not None
+        time.sleep(_ttl_watchdog_interval_s if lost_device else absent_delay)
+        # Only scan when there is something to recover: lost Cedrus, or no backend at all (device plugged in later)
+        if _ttl_disconnected_at[0] is None and _ttl_backend is not False:
+            continue
+        if _ttl_disconnected_at[0] is None and _response_pad_ref[0] is not None:
+            continue  # No TTL box was ever found and the response pad is in use: no hot-plug scans during responses
+        dev = _find_cedrus_device()
+        if dev is None:
+            if _ttl_disconnected_at[0] is None:
+                absent_delay = min(absent_delay * 2, max(_ttl_watchdog_interval_s, _ttl_watchdog_max_interval_s))
+            continue
+        restored = time.time()
+        with _ttl_lock:
+            lost = _ttl_disconnected_at[0]
+            missed = _ttl_missed_during_gap[0]
+            _ttl_backend = ('cedrus', dev)
+            _ttl_disconnected_at[0] = None
+            _ttl_missed_during_gap[0] = 0
+        if lost is not None:
+            _ttl_reconnect_gaps.append({"lost": lost, "restored": restored, "missed": missed})
+            print(f"TTL OK: Cedrus device reconnected after {restored - lost:.2f}s gap ({missed} trigger(s) dropped).", file=sys.stderr)
+        else:
+            print("TTL OK: Cedrus device connected (hot-plug). Triggers will now be sent.", file=sys.stderr)
+        sys.stderr.flush()
+        _log_ttl_backend_event("ttl_device_reconnected", restored)
+
+def _start_ttl_discovery():
+    """Start the background TTL discovery/watchdog thread (once). Enumeration never blocks the render loop."""
+    if _ttl_watchdog_thread_ref[0] is not None:
+        return
+    t = threading.Thread(target=_ttl_watchdog_loop, name="ttl-watchdog", daemon=True)
+    _ttl_watchdog_thread_ref[0] = t
+    t.start()
+
+def _probe_ttl_at_startup():
+    """Wait (bounded) for background discovery and log status. Call when photodiode is first enabled. No pulse sent."""
+    _start_ttl_discovery()
+    _start_ttl_health_monitor()  # Triggers start flowing from here on
+    if not _ttl_discovery_done.wait(_ttl_discovery_wait_s):
+        print(f"TTL WARNING: Device discovery still running after {_ttl_discovery_wait_s:g}s; triggers start as soon as it finishes.", file=sys.stderr)
+        sys.stderr.flush()
+        return
+    _log_ttl_status()
+
+def _report_ttl_reconnect_gaps():
+    """Print a summary of TTL reconnect gaps (call at end of session)."""
+    if not _ttl_reconnect_gaps and _ttl_disconnected_at[0] is None:
+        return
+    print(f"⚠ TTL device reconnected {len(_ttl_reconnect_gaps)} time(s) during session:", file=sys.stderr)
+    for gap in _ttl_reconnect_gaps:
+        print(f"    lost {gap['lost']:.3f} -> restored {gap['restored']:.3f} ({gap['restored'] - gap['lost']:.2f}s, {gap['missed']} trigger(s) dropped)", file=sys.stderr)
+    if _ttl_disconnected_at[0] is not None:
+        print(f"    lost {_ttl_disconnected_at[0]:.3f} -> never restored ({_ttl_missed_during_gap[0]} trigger(s) dropped)", file=sys.stderr)
+    sys.stderr.flush()
+
+# =========================
+#  TTL HEALTH MONITOR
+# =========================
+# Console-only (experimenter) - never drawn on the participant screen.
+_ttl_health_interval_s = float(os.environ.get('TTL_HEALTH_INTERVAL_S', '1.0'))  # How often the monitor checks counters
+_ttl_health_report_s = float(os.environ.get('TTL_HEALTH_REPORT_S', '60'))  # Periodic status line (0 = off)
+_ttl_stall_warn_s = float(os.environ.get('TTL_STALL_WARN_S', '15'))  # Warn when no pulse has gone out for this long (0 = off)
+_ttl_gap_warn_s = float(os.environ.get('TTL_GAP_WARN_S', '10'))  # Warn when two consecutive pulses were further apart (0 = off)
+_ttl_drift_warn = int(os.environ.get('TTL_DRIFT_WARN', '5'))  # Warn when signalled - sent - failed stays above this (0 = off)
+_ttl_health_stopped = [False]  # Set at session end: the end screens send no triggers, so stop stall/gap warnings
+_ttl_health_thread_ref = [None]
+_ttl_signalled_count = [0]  # Pulses requested by flash flips (one per event)
+_ttl_sent_count = [0]  # Pulses the backend accepted
+_ttl_failed_count = [0]  # Pulses dropped (no backend, discovery pending, device lost, send error)
+_ttl_last_sent_at = [None]  # time.time() of the last successful pulse
+_ttl_max_gap_s = [0.0]  # Longest interval between two successful pulses
+_ttl_sent_times = deque(maxlen=512)  # Recent successful pulse times (for rate)
+
+def _ttl_state_reason():
+    """Short human-readable reason why pulses are not going out."""
+    if not _ttl_discovery_done.is_set():
+        return "device discovery still running"
+    if _ttl_disconnected_at[0] is not None:
+        return f"Cedrus device lost {time.time() - _ttl_disconnected_at[0]:.1f}s ago, watchdog reconnecting"
+    if _ttl_backend is False or _ttl_backend is None:
+        return "no TTL backend (Cedrus not found, parallel port unavailable)"
+    return "backend send error"
+
+def _count_ttl_sent(n=1):
+    """Record n successful pulses (render thread or pulse-train thread)."""
+    now = time.time()
+    with _ttl_lock:
+        _ttl_sent_count[0] += n
+        if _ttl_last_sent_at[0] is not None:
+            _ttl_max_gap_s[0] = max(_ttl_max_gap_s[0], now - _ttl_last_sent_at[0])
+        _ttl_last_sent_at[0] = now
+    _ttl_sent_times.append(now)
+
+def _count_ttl_failed(n=1):
+    with _ttl_lock:
+        _ttl_failed_count[0] += n
+
+def _ttl_health_banner(message):
+    """Print a TTL HEALTH WARNING banner with the current counters."""
+    print("=" * 60, file=sys.stderr)
+    print(f"TTL HEALTH WARNING: {message}", file=sys.stderr)
+    print(f"  Signalled {_ttl_signalled_count[0]}, sent {_ttl_sent_count[0]}, failed {_ttl_failed_count[0]} so far. Blackrock is not receiving these events.", file=sys.stderr)
+    print("=" * 60, file=sys.stderr)
+    sys.stderr.flush()
+
+def _ttl_health_loop():
+    """Background thread: warn within seconds when triggers fail, stop, leave long gaps or drift from the signalled count; print a periodic status line."""
+    last_failed = 0
+    failing_since = None
+    started = time.time()
+    stalled_since = None  # Reference pulse time (or monitor start) of a stall already warned about
+    gap_warned_at = None  # Pulse time whose preceding gap was already warned about
+    last_drift = 0
+    last_report = started
+    while True:
+        time.sleep(_ttl_health_interval_s)
+        now = time.time()
+        failed = _ttl_failed_count[0]
+        new_failures = failed - last_failed
+        last_failed = failed
+        if new_failures > 0:
+            if failing_since is None:
+                failing_since = now
+                _ttl_health_banner(f"{new_failures} trigger(s) NOT sent in the last {_ttl_health_interval_s:g}s - {_ttl_state_reason()}.")
+        elif failing_since is not None and _ttl_last_sent_at[0] is not None and _ttl_last_sent_at[0] > failing_since:
+            print(f"TTL HEALTH OK: triggers flowing again after {now - failing_since:.1f}s of failures ({failed} failed in total).", file=sys.stderr)
+            sys.stderr.flush()
+            failing_since = None
+        if _ttl_health_stopped[0]:
+            continue
+        last_sent = _ttl_last_sent_at[0]
+        reference = last_sent if last_sent is not None else started
+        # Stall: nothing sent for a while although the task is running (covers silent stops with no failure counted)
+        if _ttl_stall_warn_s > 0 and now - reference >= _ttl_stall_warn_s and stalled_since != reference:
+            stalled_since = reference
+            since = f"{now - last_sent:.1f}s since the last pulse" if last_sent is not None else f"no pulse in {now - started:.1f}s"
+            reason = _ttl_state_reason() if (_ttl_backend in (None, False) or _ttl_disconnected_at[0] is not None) else "backend connected, no events signalled"
+            _ttl_health_banner(f"triggers stopped - {since} (TTL_STALL_WARN_S={_ttl_stall_warn_s:g}) - {reason}.")
+        elif stalled_since is not None and last_sent is not None and last_sent != stalled_since:
+            print(f"TTL HEALTH OK: triggers flowing again after a {last_sent - stalled_since:.1f}s stall.", file=sys.stderr)
+            sys.stderr.flush()
+            gap_warned_at = last_sent  # Already reported as a stall
+            stalled_since = None
+        # Gap: the latest inter-pulse interval exceeded the threshold (stalls shorter than TTL_STALL_WARN_S)
+        times = list(_ttl_sent_times)[-2:]
+        if _ttl_gap_warn_s > 0 and len(times) == 2 and times[1] - times[0] >= _ttl_gap_warn_s and gap_warned_at != times[1]:
+            gap_warned_at = times[1]
+            _ttl_health_banner(f"{times[1] - times[0]:.1f}s gap between consecutive pulses (TTL_GAP_WARN_S={_ttl_gap_warn_s:g}).")
+        # Drift: signalled pulses neither sent nor counted as failed (two checks in a row, so queued trains do not count)
+        drift = _ttl_signalled_count[0] - _ttl_sent_count[0] - failed
+        if _ttl_drift_warn > 0 and drift > _ttl_drift_warn and last_drift > _ttl_drift_warn and drift > last_drift:
+            _ttl_health_banner(f"{drift} signalled trigger(s) unaccounted for (neither sent nor failed; TTL_DRIFT_WARN={_ttl_drift_warn}).")
+        last_drift = drift
+        if _ttl_health_report_s > 0 and now - last_report >= _ttl_health_report_s:
+            last_report = now
+            print(f"TTL health: {_ttl_health_summary()}", file=sys.stderr)
+            sys.stderr.flush()
+
+def _ttl_health_summary(window_s=60.0):
+    """One-line counters: signalled/sent/failed, recent pulse rate, longest inter-pulse gap."""
+    now = time.time()
+    recent = sum(1 for t in list(_ttl_sent_times) if now - t <= window_s)
+    since_last = f"{now - _ttl_last_sent_at[0]:.1f}s ago" if _ttl_last_sent_at[0] is not None else "never"
+    return (f"signalled {_ttl_signalled_count[0]}, sent {_ttl_sent_count[0]}, failed {_ttl_failed_count[0]}; "
+            f"{recent / window_s:.2f} pulses/s over last {window_s:g}s; max gap {_ttl_max_gap_s[0]:.1f}s; last pulse {since_last}")
+
+def _start_ttl_health_monitor():
+    """Start the TTL health monitor thread (once)."""
+    if _ttl_health_thread_ref[0] is not None:
+        return
+    t = threading.Thread(target=_ttl_health_loop, name="ttl-health", daemon=True)
+    _ttl_health_thread_ref[0] = t
+    t.start()
+
+def _report_ttl_health():
+    """Print final TTL health counters (call at end of session)."""
+    _ttl_health_stopped[0] = True
+    if _ttl_health_thread_ref[0] is None:
+        return
+    mark = "⚠" if _ttl_failed_count[0] else "✓"
+    print(f"{mark} TTL health: {_ttl_health_summary()}", file=sys.stderr)
+    sys.stderr.flush()
+
+def _pulse_ttl_backend(backend, on_train_thread=False):
+    """Send one pulse on an already-discovered backend. Returns False if a Cedrus write failed (device lost).
+    On the render thread a parallel-port pulse only raises the lines; the pulse-train thread lowers them 10 ms
+    later, so the flip callback never waits out the pulse width."""
+    backend_type, dev = backend
+    with _ttl_device_lock:
+        if backend_type == 'cedrus':
+            try:
+                dev.activate_line(lines=_ttl_line)
+            except Exception:
+                return False
+        elif backend_type == 'parallel':
+            dev.setData(255)
+            if not on_train_thread:
+                _queue_ttl_job(('release', dev))
+                return True
+            time.sleep(0.01)
+            dev.setData(0)
+    return True
+
+def _release_parallel_pulse(dev):
+    """Pulse-train thread: end a parallel-port pulse raised on the render thread, 10 ms after it started."""
+    time.sleep(0.01)
+    with _ttl_device_lock:
+        dev.setData(0)
+
+def _send_ttl_pulse_train(backend, rows):
+    """Pulse-train thread: one additional pulse per coalesced event after the flip pulse. Each event row gets the
+    time its own pulse was sent (calibrated like the flip pulse); rows whose pulse was not sent keep it blank."""
+    spacing = (_ttl_pulse_ms + _ttl_train_gap_ms) / 1000.0
+    remaining = len(rows)
+    try:
+        for row in rows:
+            time.sleep(spacing)
+            if _ttl_disconnected_at[0] is not None:
+                break
+            ts = time.time()
+            if not _pulse_ttl_backend(backend, on_train_thread=True):
+                _mark_ttl_disconnected()
+                break
+            row["ttl_timestamp"] = _calibrated_ttl_time(ts)
+            _count_ttl_sent()
+            remaining -= 1
+    except Exception:
+        pass
+    if remaining > 0:
+        _count_ttl_failed(remaining)
+    _write_ttl_rows(rows)
+
+def _ttl_train_loop(q):
+    """Long-lived thread: runs queued pulse trains and parallel-port releases in order (device writes serialized by _ttl_device_lock)."""
+    while True:
+        job = q.get()
+        if job[0] == 'release':
+            _release_parallel_pulse(job[1])
+        else:
+            _send_ttl_pulse_train(job[1], job[2])
+
+def _queue_ttl_job(job):
+    """Hand a job to the pulse-train thread, starting it on first use. Never blocks the render thread."""
+    if _ttl_train_queue[0] is None:
+        import queue
+        _ttl_train_queue[0] = queue.Queue()
+        threading.Thread(target=_ttl_train_loop, args=(_ttl_train_queue[0],), name="ttl-pulse-train", daemon=True).start()
+    _ttl_train_queue[0].put(job)
+
+def _send_ttl_trigger(n_pulses=1, train_rows=()):
+    """Send a brief TTL pulse via Cedrus pyxid2 (preferred) or parallel port. Never blocks on discovery; fails silently if unavailable.
+    
+    Args:
+        n_pulses: Number of events sharing this flip. The first pulse fires now; the rest follow as a
+            pulse train on the pulse-train thread so the render loop is not held up.
+        train_rows: TTL log rows of the events after the first, handed to the pulse-train thread, which
+            writes them once their pulses are sent.
+    Returns True if train_rows were handed over; otherwise the caller writes them (ttl_timestamp blank).
+    """
+    with _ttl_lock:
+        _ttl_signalled_count[0] += n_pulses
     try:
-        if _ttl_backend is False:
+        if not _ttl_discovery_done.is_set():
+            _count_ttl_failed(n_pulses)  # Discovery still running on the background thread
+            return
+        if _ttl_disconnected_at[0] is not None:
+            with _ttl_lock:
+                _ttl_missed_during_gap[0] += n_pulses
+            _count_ttl_failed(n_pulses)
+            return
+        backend = _ttl_backend
+        if backend is False or backend is None:
+            _count_ttl_failed(n_pulses)
             _log_ttl_status()
             return
-        if _ttl_backend is None:
-            # Try Cedrus pyxid2 first (StimTracker, c-pod, Lumina, etc.) - works on macOS
+        t0 = time.perf_counter()
+        if not _pulse_ttl_backend(backend):
+            _mark_ttl_disconnected()
+            with _ttl_lock:
+                _ttl_missed_during_gap[0] += n_pulses - 1
+            _count_ttl_failed(n_pulses)
+            return
+        _last_ttl_send_duration_s[0] = time.perf_counter() - t0
+        _count_ttl_sent()
+        if n_pulses > 1 and train_rows:
+            _queue_ttl_job(('train', backend, list(train_rows)))
+            return True
+    except Exception:
+        _count_ttl_failed()
+    return False
+
+# =========================
+#  STATION LATENCY CALIBRATION
+# =========================
+# Per-station offsets (flip -> flip callback -> TTL out -> photons) stored in ../LOG_FILES/station_profiles.json,
+# keyed by hostname + screen + resolution. Run once per station/display with STATION_CALIBRATE=1; set
+# PHOTODIODE_TRACE_FILE to a recorded trace (CSV: time, photodiode, ttl - same clock) to measure flip-to-photon.
+_station_profile = {}  # Offsets for this station/display (ms); empty = uncalibrated
+_last_ttl_send_duration_s = [None]  # Duration of the last successful pulse call (set in _send_ttl_trigger)
+
+def _station_key(window):
+    """Profile key: hostname|screenN|WxH."""
+    try:
+        w, h = int(window.size[0]), int(window.size[1])
+    except Exception:
+        w, h = 0, 0
+    return f"{platform.node()}|screen{getattr(window, 'screen', 0)}|{w}x{h}"
+
+def _station_profiles_path():
+    return os.path.join(get_log_directory(), 'station_profiles.json')
+
+def _read_station_profiles():
+    try:
+        with open(_station_profiles_path(), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _load_station_profile(window):
+    """Load offsets for this station/display into _station_profile. Returns True if a profile was found."""
+    key = _station_key(window)
+    profile = _read_station_profiles().get(key)
+    _station_profile.clear()
+    if not profile:
+        print(f"Station calibration: no profile for {key} - calibrated timestamp columns will be blank. Run with STATION_CALIBRATE=1.", file=sys.stderr)
+        sys.stderr.flush()
+        return False
+    _station_profile.update(profile)
+    fmt = lambda ms: f"{ms:.2f}ms" if ms is not None else "not measured"
+    print(f"Station calibration: {key} (calibrated {profile.get('calibrated_at', '?')}): callback->TTL {fmt(profile.get('callback_to_ttl_ms'))}, TTL->photon {fmt(profile.get('ttl_to_photon_ms'))}", file=sys.stderr)
+    sys.stderr.flush()
+    return True
+
+def _calibrated_ttl_time(ts):
+    """Raw flip-callback timestamp -> time the TTL pulse actually left ('' if uncalibrated)."""
+    if not isinstance(ts, (int, float)) or _station_profile.get('callback_to_ttl_ms') is None:
+        return ''
+    return ts + _station_profile['callback_to_ttl_ms'] / 1000.0
+
+def _calibrated_photon_time(ts):
+    """Raw flip-callback timestamp -> time the photodiode patch actually changed on screen ('' if uncalibrated)."""
+    ttl_t = _calibrated_ttl_time(ts)
+    if ttl_t == '' or _station_profile.get('ttl_to_photon_ms') is None:
+        return ''
+    return ttl_t + _station_profile['ttl_to_photon_ms'] / 1000.0
+
+def _add_calibrated_trigger_columns(row):
+    """Return a copy of row with a *_trigger_photon column right after every *_trigger column."""
+    out = {}
+    for k, v in row.items():
+        out[k] = v
+        if k.endswith('_trigger'):
+            out[k + '_photon'] = _calibrated_photon_time(v)
+    return out
+
+def _measure_ttl_to_photon_from_trace(path, max_lag_s=0.2):
+    """Median lag (ms) from each TTL rising edge to the next photodiode level change in a recorded trace.
+    
+    Args:
+        path: CSV with header and columns time (s), photodiode (analog), ttl (digital/analog), sampled on one clock.
+        max_lag_s: Ignore TTL edges with no photodiode change within this window.
+    Returns:
+        (median_lag_ms, n_matched) or (None, 0) if no edges could be matched.
+    """
+    import numpy as np
+    data = np.loadtxt(path, delimiter=',', skiprows=1, usecols=(0, 1, 2), ndmin=2)
+    t, pd_v, ttl_v = data[:, 0], data[:, 1], data[:, 2]
+    ttl_hi = ttl_v > (ttl_v.min() + ttl_v.max()) / 2.0
+    ttl_edges = t[1:][ttl_hi[1:] & ~ttl_hi[:-1]]
+    pd_state = pd_v > (pd_v.min() + pd_v.max()) / 2.0
+    pd_changes = t[1:][pd_state[1:] != pd_state[:-1]]
+    if len(ttl_edges) == 0 or len(pd_changes) == 0:
+        return None, 0
+    idx = np.searchsorted(pd_changes, ttl_edges)
+    valid = idx < len(pd_changes)
+    lags = pd_changes[idx[valid]] - ttl_edges[valid]
+    lags = lags[lags <= max_lag_s]
+    if len(lags) == 0:
+        return None, 0
+    return float(np.median(lags) * 1000.0), int(len(lags))
+
+def _calibrate_station(window, n_flashes=None):
+    """Flash the photodiode n_flashes times, measure flip->callback and callback->TTL, fold in the trace (if any), save profile."""
+    if n_flashes is None:
+        n_flashes = int(os.environ.get('STATION_CALIBRATE_FLASHES', '40'))
+    msg = visual.TextStim(window, text="Calibrating station timing...", color='black', height=0.04, pos=(0, 0))
+    flip_to_cb = []
+    cb_to_ttl = []
+    for _ in range(n_flashes):
+        cb_time = [None]
+        _last_ttl_send_duration_s[0] = None
+        window.callOnFlip(lambda: cb_time.__setitem__(0, core.monotonicClock.getTime()))
+        _queue_ttl_event(None)  # Flash (TTL) without a TTL-log row
+        msg.draw()
+        flip_t = window.flip()
+        if isinstance(flip_t, (int, float)) and cb_time[0] is not None:
+            flip_to_cb.append(cb_time[0] - flip_t)
+        if _last_ttl_send_duration_s[0] is not None:
+            cb_to_ttl.append(_last_ttl_send_duration_s[0])
+        if not USE_TOUCH_SCREEN:
+            safe_wait(0.017)
+        msg.draw()
+        window.flip()
+        safe_wait(0.2)  # Keep flashes well separated in the recorded trace
+    median = lambda xs: _median(xs) * 1000.0 if xs else None
+    key = _station_key(window)
+    profiles = _read_station_profiles()
+    previous = profiles.get(key, {})
+    profile = {
+        'hostname': platform.node(),
+        'screen': getattr(window, 'screen', 0),
+        'size': [int(v) for v in window.size],
+        'ttl_backend': _ttl_backend[0] if isinstance(_ttl_backend, tuple) else None,
+        'n_flashes': n_flashes,
+        'flip_to_callback_ms': median(flip_to_cb),
+        'callback_to_ttl_ms': median(cb_to_ttl),  # None without a TTL backend: nothing was measured
+        'ttl_to_photon_ms': previous.get('ttl_to_photon_ms'),  # Kept until a new trace is supplied
+        'trace_file': previous.get('trace_file'),
+        'calibrated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    trace_path = os.environ.get('PHOTODIODE_TRACE_FILE')
+    if trace_path:
+        try:
+            lag_ms, n_matched = _measure_ttl_to_photon_from_trace(trace_path)
+            if lag_ms is not None:
+                profile['ttl_to_photon_ms'] = lag_ms
+                profile['trace_file'] = os.path.abspath(trace_path)
+                print(f"Station calibration: TTL->photon {lag_ms:.2f}ms from {n_matched} flashes in {trace_path}", file=sys.stderr)
+            else:
+                print(f"Warning: No TTL/photodiode edge pairs found in {trace_path}", file=sys.stderr)
+        except Exception as e:
+            print(f"Warning: Could not read photodiode trace {trace_path}: {e}", file=sys.stderr)
+    if profile['callback_to_ttl_ms'] is None:
+        print("Warning: No TTL pulses sent during calibration - callback->TTL not measured; calibrated timestamp columns stay blank.", file=sys.stderr)
+    elif profile['ttl_to_photon_ms'] is not None:
+        profile['flip_to_photon_ms'] = (profile['flip_to_callback_ms'] or 0.0) + profile['callback_to_ttl_ms'] + profile['ttl_to_photon_ms']
+    profiles[key] = profile
+    try:
+        with open(_station_profiles_path(), 'w') as f:
+            json.dump(profiles, f, indent=2, sort_keys=True)
+        print(f"✓ Station profile saved for {key}: {_station_profiles_path()}")
+    except OSError as e:
+        print(f"Warning: Could not save station profile: {e}", file=sys.stderr)
+    sys.stderr.flush()
+    _station_profile.clear()
+    _station_profile.update(profile)
+
+def _setup_station_calibration(window):
+    """Calibrate (STATION_CALIBRATE=1) or load this station's latency profile. Call after the photodiode flip wrapper is installed."""
+    try:
+        if os.environ.get('STATION_CALIBRATE', '0') == '1':
+            _calibrate_station(window)
+        else:
+            _load_station_profile(window)
+    except Exception as e:
+        print(f"Warning: Station calibration unavailable: {e}", file=sys.stderr)
+        sys.stderr.flush()
+
+# =========================
+#  STATION PRE-FLIGHT
+# =========================
+# ~10 s health check before name entry: refresh stability, log-disk fsync latency, stimulus decode time,
+# TTL round trip, free disk. Results -> console, ../LOG_FILES/station_health.csv, and an on-screen
+# acknowledge prompt only if a threshold is exceeded. PREFLIGHT=0 skips it.
+_PREFLIGHT_THRESHOLDS = {
+    'frame_interval_sd_ms': float(os.environ.get('PREFLIGHT_MAX_FRAME_SD_MS', '4.0')),
+    'long_frames': int(os.environ.get('PREFLIGHT_MAX_LONG_FRAMES', '3')),
+    'fsync_ms_median': float(os.environ.get('PREFLIGHT_MAX_FSYNC_MS', '20')),
+    'decode_ms_median': float(os.environ.get('PREFLIGHT_MAX_DECODE_MS', '50')),
+    'ttl_roundtrip_ms': float(os.environ.get('PREFLIGHT_MAX_TTL_MS', '5')),
+    'free_disk_gb': float(os.environ.get('PREFLIGHT_MIN_FREE_GB', '2')),
+}
+_PREFLIGHT_FIELDNAMES = [
+    'timestamp', 'hostname', 'script', 'screen_size', 'n_flips', 'frame_interval_mean_ms', 'frame_interval_sd_ms',
+    'frame_interval_max_ms', 'long_frames', 'fsync_ms_median', 'fsync_ms_max', 'n_decoded', 'decode_ms_median',
+    'decode_ms_max', 'ttl_backend', 'ttl_roundtrip_ms', 'free_disk_gb', 'failures', 'passed'
+]
+
+def _median(xs):
+    xs = sorted(xs)
+    return xs[len(xs) // 2] if xs else None
+
+def _preflight_frame_intervals(window, n_flips):
+    """Flip n_flips blank frames; returns intervals in ms. The window uses waitBlanking=False, so each flip is
+    followed by glFinish: the sample is taken once the swap has completed, not when the non-blocking flip returns."""
+    times = []
+    for _ in range(n_flips):
+        window.flip()
+        _gpu_finish()
+        times.append(time.perf_counter())
+    return [(b - a) * 1000.0 for a, b in zip(times, times[1:])]
+
+def _flip_interval_sd_ms(window, n_flips):
+    """SD (ms) of n_flips blank-frame intervals on window."""
+    intervals = _preflight_frame_intervals(window, n_flips)
+    mean = sum(intervals) / len(intervals)
+    return (sum((x - mean) ** 2 for x in intervals) / len(intervals)) ** 0.5
+
+def _retire_temp_window(window, temp_window):
+    """Close the input-method window once the main window exists, so the session runs on one GL context.
+    Safe: the main window is still open, so PsychoPy never sees zero windows. FLIP_VARIANCE_FLIPS=N (opt-in, default 0)
+    measures the SD of N completed-swap intervals with both contexts live and again after the close."""
+    if temp_window is None:
+        return
+    n_flips = int(os.environ.get('FLIP_VARIANCE_FLIPS', '0'))
+    sd_before = _flip_interval_sd_ms(window, n_flips) if n_flips > 1 else None
+    try:
+        temp_window.close()
+    except Exception as e:
+        print(f"⚠ Could not close input-method window: {e}", file=sys.stderr)
+        return
+    try:
+        window.winHandle.switch_to()  # Make the main window's GL context current again before any further drawing
+        window.winHandle.activate()  # Focus back to the main window
+    except Exception:
+        pass
+    if sd_before is not None:
+        sd_after = _flip_interval_sd_ms(window, n_flips)
+        print(f"✓ Input-method window closed: flip-interval SD {sd_before:.2f}ms (2 contexts) -> {sd_after:.2f}ms (1 context)")
+    else:
+        print("✓ Input-method window closed")
+    sys.stdout.flush()
+
+def _preflight_fsync_ms(log_dir, n=20):
+    """Append + flush + fsync n small rows to a scratch file in the log directory; returns per-row ms."""
+    path = os.path.join(log_dir, f".preflight_{os.getpid()}.tmp")
+    samples = []
+    try:
+        with open(path, 'w') as f:
+            for i in range(n):
+                t0 = time.perf_counter()
+                f.write(f"{i},{time.time():.9f},preflight\n")
+                f.flush()
+                os.fsync(f.fileno())
+                samples.append((time.perf_counter() - t0) * 1000.0)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return samples
+
+def _preflight_decode_ms(stimuli_dir, n=10):
+    """Fully decode up to n random stimulus images with PIL; returns per-image ms."""
+    from PIL import Image
+    paths = []
+    for root, _, files in os.walk(stimuli_dir):
+        paths.extend(os.path.join(root, fn) for fn in files if fn.lower().endswith(('.jpg', '.jpeg', '.png')))
+    samples = []
+    for p in random.sample(paths, min(n, len(paths))):
+        t0 = time.perf_counter()
+        with Image.open(p) as im:
+            im.load()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+def _preflight_ttl_roundtrip_ms(n=10):
+    """Median ms of a command that needs no pulse (Cedrus base-timer query, parallel-port write of 0). None if unavailable."""
+    if not _ttl_discovery_done.wait(_ttl_discovery_wait_s):
+        return None
+    backend = _ttl_backend
+    if not isinstance(backend, tuple):
+        return None
+    backend_type, dev = backend
+    if backend_type == 'cedrus':
+        probe = getattr(dev, 'query_base_timer', None)
+    else:
+        probe = lambda: dev.setData(0)
+    if probe is None:
+        return None
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        probe()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return _median(samples)
+
+def _run_station_preflight(window, script_name, stimuli_dir):
+    """Measure station health, compare with _PREFLIGHT_THRESHOLDS, save a record and report to the experimenter."""
+    if os.environ.get('PREFLIGHT', '1') == '0' or _RENDER_BENCHMARK:
+        return None
+    print("Running station pre-flight...")
+    sys.stdout.flush()
+    _start_ttl_discovery()
+    log_dir = get_log_directory()
+    rec = {'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'hostname': platform.node(), 'script': script_name}
+    try:
+        rec['screen_size'] = f"{int(window.size[0])}x{int(window.size[1])}"
+    except Exception:
+        rec['screen_size'] = ''
+    failures = []
+    try:
+        n_flips = int(os.environ.get('PREFLIGHT_FLIPS', '300'))
+        intervals = _preflight_frame_intervals(window, n_flips)
+        mean = sum(intervals) / len(intervals)
+        sd = (sum((x - mean) ** 2 for x in intervals) / len(intervals)) ** 0.5
+        long_limit = 1.5 * 1000.0 / float(os.environ.get('PREFLIGHT_REFRESH_HZ', '60'))
+        rec.update(n_flips=n_flips, frame_interval_mean_ms=round(mean, 3), frame_interval_sd_ms=round(sd, 3),
+                   frame_interval_max_ms=round(max(intervals), 3), long_frames=sum(1 for x in intervals if x > long_limit))
+        if sd > _PREFLIGHT_THRESHOLDS['frame_interval_sd_ms']:
+            failures.append(f"frame interval SD {sd:.2f}ms")
+        if rec['long_frames'] > _PREFLIGHT_THRESHOLDS['long_frames']:
+            failures.append(f"{rec['long_frames']} frames > {long_limit:.1f}ms")
+    except Exception as e:
+        failures.append(f"flip test error: {e}")
+    try:
+        fs = _preflight_fsync_ms(log_dir)
+        rec.update(fsync_ms_median=round(_median(fs), 3), fsync_ms_max=round(max(fs), 3))
+        if rec['fsync_ms_median'] > _PREFLIGHT_THRESHOLDS['fsync_ms_median']:
+            failures.append(f"log fsync {rec['fsync_ms_median']:.1f}ms")
+    except Exception as e:
+        failures.append(f"log write error: {e}")
+    try:
+        dec = _preflight_decode_ms(stimuli_dir)
+        rec['n_decoded'] = len(dec)
+        if dec:
+            rec.update(decode_ms_median=round(_median(dec), 3), decode_ms_max=round(max(dec), 3))
+            if rec['decode_ms_median'] > _PREFLIGHT_THRESHOLDS['decode_ms_median']:
+                failures.append(f"image decode {rec['decode_ms_median']:.1f}ms")
+        else:
+            failures.append(f"no stimuli found in {stimuli_dir}")
+    except Exception as e:
+        failures.append(f"image decode error: {e}")
+    try:
+        rt = _preflight_ttl_roundtrip_ms()  # Waits (bounded) for discovery before _ttl_backend is read
+        rec['ttl_backend'] = _ttl_backend[0] if isinstance(_ttl_backend, tuple) else 'none'
+        rec['ttl_roundtrip_ms'] = round(rt, 3) if rt is not None else ''
+        if rec['ttl_backend'] == 'none':
+            failures.append("no TTL backend")
+        elif rt is not None and rt > _PREFLIGHT_THRESHOLDS['ttl_roundtrip_ms']:
+            failures.append(f"TTL round trip {rt:.1f}ms")
+    except Exception as e:
+        failures.append(f"TTL probe error: {e}")
+    try:
+        rec['free_disk_gb'] = round(shutil.disk_usage(log_dir).free / 1e9, 2)
+        if rec['free_disk_gb'] < _PREFLIGHT_THRESHOLDS['free_disk_gb']:
+            failures.append(f"only {rec['free_disk_gb']:.1f}GB free")
+    except Exception as e:
+        failures.append(f"disk check error: {e}")
+    rec['failures'] = '; '.join(failures)
+    rec['passed'] = not failures
+    # Append to station health record
+    health_file = os.path.join(log_dir, 'station_health.csv')
+    try:
+        file_exists = os.path.exists(health_file)
+        with open(health_file, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=_PREFLIGHT_FIELDNAMES, extrasaction='ignore')
+            if not file_exists:
+                writer.writeheader()
+            writer.writerow(rec)
+            f.flush()
             try:
-                import pyxid2
-                devices = pyxid2.get_xid_devices()
-                if devices:
-                    dev = devices[0]
-                    dev.set_pulse_duration(_ttl_pulse_ms)
-                    _ttl_backend = ('cedrus', dev)
-            except Exception:
+                os.fsync(f.fileno())
+            except (AttributeError, OSError):
                 pass
-            # Fallback to parallel port (Windows/Linux only - not supported on macOS)
-            if _ttl_backend is None:
-                try:
-                    from psychopy import parallel
-                    addr = int(os.environ.get('PARALLEL_PORT_ADDRESS', '0x0378'), 16)
-                    parallel.setPortAddress(addr)
-                    _ttl_backend = ('parallel', parallel)
-                except Exception:
-                    _ttl_backend = False
-            if _ttl_backend is False:
-                _log_ttl_status()
-                return
-            _log_ttl_status()
-        backend_type, backend = _ttl_backend
-        if backend_type == 'cedrus':
-            backend.activate_line(lines=_ttl_line)
-        elif backend_type == 'parallel':
-            backend.setData(255)
-            core.wait(0.01)
-            backend.setData(0)
+    except Exception as e:
+        print(f"Warning: Could not save station health record: {e}", file=sys.stderr)
+    print("=" * 60)
+    print(f"STATION PRE-FLIGHT {'PASSED' if rec['passed'] else 'FAILED'} ({rec['hostname']}, {rec['screen_size']})")
+    print(f"  Frames: mean {rec.get('frame_interval_mean_ms', '?')}ms, SD {rec.get('frame_interval_sd_ms', '?')}ms, max {rec.get('frame_interval_max_ms', '?')}ms, long {rec.get('long_frames', '?')}")
+    print(f"  Log fsync: median {rec.get('fsync_ms_median', '?')}ms, max {rec.get('fsync_ms_max', '?')}ms | Decode: median {rec.get('decode_ms_median', '?')}ms ({rec.get('n_decoded', 0)} images)")
+    print(f"  TTL: {rec['ttl_backend']} round trip {rec['ttl_roundtrip_ms'] if rec['ttl_roundtrip_ms'] != '' else 'n/a'}ms | Free disk: {rec.get('free_disk_gb', '?')}GB")
+    for f_msg in failures:
+        print(f"  ⚠ {f_msg}")
+    print(f"  Record appended to {health_file}")
+    print("=" * 60)
+    sys.stdout.flush()
+    if failures:
+        _show_preflight_failures(window, failures)
+    return rec
+
+def _show_preflight_failures(window, failures):
+    """Experimenter acknowledgement screen (before the participant starts). C / click continues, ESC quits."""
+    msg = visual.TextStim(
+        window,
+        text="STATION PRE-FLIGHT WARNING\n\n" + "\n".join(failures) +
+             "\n\nExperimenter: press C (or click) to continue anyway, ESC to quit.",
+        color='darkred', height=0.035, pos=(0, 0), wrapWidth=1.4
+    )
+    preflight_mouse = event.Mouse(win=window)
+    event.clearEvents()
+    while True:
+        msg.draw()
+        window.flip()
+        keys = event.getKeys(keyList=['c', 'escape'])
+        if 'escape' in keys:
+            core.quit()
+        if 'c' in keys or any(preflight_mouse.getPressed()):
+            break
+        core.wait(0.01)
+    event.clearEvents()
+
+# =========================
+#  GPU WARM-UP
+# =========================
+# The first draw of each stimulus class (ImageStim texture upload, TextStim glyph atlas per height, shape
+# shaders) is much slower than later draws. _warm_up_gpu() pays those costs on hidden frames (a full-screen
+# background rect covers every stim before the flip) after TTL probing and before the first photodiode
+# event, and prints first vs steady-state draw latency per class. WARMUP=0 skips it.
+
+_WARMUP_TEXT_HEIGHTS = (0.025, 0.035, 0.04, 0.025*0.75*1.35, 0.032*0.75*1.35, 0.035*0.75*1.35, 0.04*0.75*1.35,
+                        0.045*0.75*1.35, 0.06*0.75*1.35, 0.1*0.75*1.35, 0.04*1.35, 0.06*1.35)
+_WARMUP_STEADY_DRAWS = 5
+
+def _gpu_finish():
+    """Block until queued GL commands complete so draw timings include GPU work (no-op if unavailable)."""
+    try:
+        from pyglet import gl
+        gl.glFinish()
     except Exception:
         pass
 
-def safe_window_close(window):
-    """Safely close a window, checking if it's still valid to prevent NoneType errors"""
+def _warm_up_draw_ms(stim):
+    """Time one draw of stim (ms, GPU work included)."""
+    t0 = time.perf_counter()
+    stim.draw()
+    _gpu_finish()
+    return (time.perf_counter() - t0) * 1000.0
+
+def _warm_up_gpu(window, stimuli_dir):
+    """Draw every stimulus class and text height on hidden frames; report first vs steady-state draw ms per class."""
+    if os.environ.get('WARMUP', '1') == '0':
+        return None
+    print("Warming up GPU stimulus paths...")
+    sys.stdout.flush()
+    stims = []  # (class label, stim)
+    image_path = None
+    for root, _, files in os.walk(stimuli_dir):
+        for fn in sorted(files):
+            if fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                image_path = os.path.join(root, fn)
+                break
+        if image_path:
+            break
     try:
-        if window is not None:
-            # Check if window has a backend and it's not None
-            if hasattr(window, 'backend') and window.backend is not None:
-                window.close()
-            elif hasattr(window, 'close'):
-                # Try to close anyway, but catch any errors
-                try:
-                    window.close()
-                except Exception as e:
-                    print(f"ERROR in safe_window_close (inner): {repr(e)}", file=sys.stderr)
-                    traceback.print_exc()
+        if image_path:
+            stims.append(('ImageStim', visual.ImageStim(window, image=image_path, size=(0.5*0.75, 0.5*0.75))))
+        for h in _WARMUP_TEXT_HEIGHTS:
+            stims.append((f'TextStim h={h:.4f}', visual.TextStim(window, text="Warm-up 0123456789 ?!.,",
+                                                                 color='black', height=h, pos=(0, 0))))
+        stims.append(('Circle', visual.Circle(window, radius=0.05, fillColor='white', lineColor='black')))
+        stims.append(('Rect', visual.Rect(window, width=0.2, height=0.1, fillColor='lightblue', lineColor='black')))
+        stims.append(('Line', visual.Line(window, start=(-0.2, 0), end=(0.2, 0), lineColor='black', lineWidth=3)))
+        cover = visual.Rect(window, width=4, height=4, fillColor='lightgray', lineColor='lightgray')
     except Exception as e:
-        print(f"ERROR in safe_window_close (outer): {repr(e)}", file=sys.stderr)
-        traceback.print_exc()
+        print(f"⚠ GPU warm-up skipped: {e}", file=sys.stderr)
+        return None
+    report = {}
+    for label, stim in stims:
+        try:
+            first = _warm_up_draw_ms(stim)
+            steady = _median([_warm_up_draw_ms(stim) for _ in range(_WARMUP_STEADY_DRAWS)])
+        except Exception as e:
+            print(f"⚠ GPU warm-up: {label} failed: {e}", file=sys.stderr)
+            continue
+        cover.draw()  # Hide everything drawn so far
+        window.flip()
+        report[label] = (first, steady)
+    window.flip()
+    for label, (first, steady) in report.items():
+        print(f"  {label}: first {first:.2f} ms / steady {steady:.2f} ms")
+    print(f"✓ GPU warm-up done ({len(report)} stimulus classes)")
+    sys.stdout.flush()
+    return report
 
-def get_input_method():
-    """Ask user whether they're using touch screen (1) or click screen (2)"""
-    global USE_TOUCH_SCREEN
-    
-    # Create temporary window - handle partial initialization
-    temp_win = None
+# =========================
+#  SESSION CAPTURE
+# =========================
+# CAPTURE_VIDEO=1 records the session to video for QA, in place of hand-made screen recordings. At most CAPTURE_FPS
+# times a second (default 30), and on every flip that carries a TTL event, the back buffer is blitted just before
+# the flip into a small framebuffer (CAPTURE_SCALE, default 0.5), so the downscale happens on the GPU. The small
+# frame is then read into a pixel buffer object without waiting. The PBO is mapped on a later flip, once the GPU
+# has finished, and the pixels go to a bounded queue. A background thread pipes them to an ffmpeg encoder process
+# through imageio. Each frame is held until the next captured flip, so the video runs in wall-clock time. A sidecar
+# _frames.csv tags every captured frame with its flip timestamp and TTL event types. The display never waits for
+# the encoder: if the queue (CAPTURE_QUEUE, default 8 frames) is full, the capture frame is dropped and counted.
+# The count is reported when the session ends.
+
+_capture_queue = [None]  # queue.Queue of (flip_time, event_types, width, height, rgb bytes); None = capture off
+_capture_thread = [None]
+_capture_dropped = [0]
+_capture_path_ref = [None]
+_capture_stopped = [False]  # Set when the worker thread fails; the flip hook then stops reading back frames
+_CAPTURE_FSYNC_INTERVAL_S = 1.0  # _frames.csv is flushed every frame and fsynced at most this often (and at close)
+_capture_gl = {'fbo': None, 'rb': None, 'pbo': None, 'size': None, 'scale': 0.5, 'interval': 0.0, 'last': 0.0,
+               'pending': None}  # pending = [width, height, flip_time, event_types] of the read in the PBO
+_CAPTURE_FRAME_FIELDNAMES = ['frame', 'video_frame', 'flip_time', 'event_types']
+
+def _capture_worker(q, path, fps, max_hold_s):
+    """Background thread: run the encoder; on any failure stop capture (flip hook checks _capture_stopped)."""
     try:
-        # Create windowed window
-        # Add waitBlanking=False and useFBO=False to prevent hanging
-        temp_win = visual.Window(
-            size=(1400, 900),
-            color='lightgray',
-            units='height',
-            fullscr=True,
-            allowGUI=True,
-            waitBlanking=False,  # Prevent blocking on display sync
+        _capture_encode(q, path, fps, max_hold_s)
+    except Exception as e:
+        _capture_stopped[0] = True
+        print(f"⚠ Session capture stopped: {e}", file=sys.stderr)
+        sys.stderr.flush()
+
+def _capture_encode(q, path, fps, max_hold_s):
+    """Decode queued frames, hold each until the next captured flip, write video + frame index."""
+    import numpy as np
+    import imageio
+    from PIL import Image
+    writer = imageio.get_writer(path, fps=fps, macro_block_size=2)
+    index_path = os.path.splitext(path)[0] + "_frames.csv"
+    n_frames = 0
+    n_video_frames = 0
+    last = None  # (flip_time, array)
+    last_fsync = time.monotonic()
+    try:
+        with open(index_path, 'w', newline='') as index_file:
+            index = csv.DictWriter(index_file, fieldnames=_CAPTURE_FRAME_FIELDNAMES)
+            index.writeheader()
+            try:
+                while True:
+                    item = q.get()
+                    if item is None:
+                        break
+                    flip_time, event_types, w, h, data = item
+                    img = Image.frombytes('RGB', (w, h), data).transpose(Image.FLIP_TOP_BOTTOM)
+                    if last is not None:
+                        hold = max(1, min(int(round((flip_time - last[0]) * fps)), int(max_hold_s * fps)))
+                        for _ in range(hold):
+                            writer.append_data(last[1])
+                        n_video_frames += hold
+                    last = (flip_time, np.asarray(img))
+                    index.writerow({'frame': n_frames, 'video_frame': n_video_frames, 'flip_time': f"{flip_time:.9f}",
+                                    'event_types': ";".join(event_types)})
+                    index_file.flush()
+                    if time.monotonic() - last_fsync >= _CAPTURE_FSYNC_INTERVAL_S:  # Leave the disk to the TTL/trial fsyncs
+                        os.fsync(index_file.fileno())
+                        last_fsync = time.monotonic()
+                    n_frames += 1
+                if last is not None:
+                    writer.append_data(last[1])
+            finally:
+                index_file.flush()
+                os.fsync(index_file.fileno())
+    finally:
+        writer.close()
+    print(f"✓ Session capture saved to {path} ({n_frames} frames captured, {_capture_dropped[0]} dropped)")
+    sys.stdout.flush()
+
+def _start_session_capture(window, name):
+    """Start the capture thread if CAPTURE_VIDEO=1 and imageio (with ffmpeg) is installed."""
+    if os.environ.get('CAPTURE_VIDEO', '0') != '1' or _capture_queue[0] is not None:
+        return
+    try:
+        import imageio  # noqa: F401 (used by the worker thread)
+        import imageio_ffmpeg
+        imageio_ffmpeg.get_ffmpeg_exe()  # Raises if the ffmpeg binary is missing
+        from pyglet import gl  # noqa: F401
+    except Exception as e:
+        print(f"⚠ Session capture unavailable ({e}); install imageio and imageio-ffmpeg", file=sys.stderr)
+        return
+    import queue
+    import atexit
+    fps = max(1, int(os.environ.get('CAPTURE_FPS', '30')))
+    path = os.path.join(get_log_directory(), f"{name}_capture_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
+    q = queue.Queue(maxsize=max(1, int(os.environ.get('CAPTURE_QUEUE', '8'))))
+    t = threading.Thread(target=_capture_worker, name="session-capture", daemon=True, args=(q, path, fps, 30.0))
+    t.start()
+    _capture_gl['scale'] = float(os.environ.get('CAPTURE_SCALE', '0.5'))
+    _capture_gl['interval'] = 1.0 / fps
+    _capture_queue[0] = q
+    _capture_thread[0] = t
+    _capture_path_ref[0] = path
+    atexit.register(_stop_session_capture)  # Also finalizes the file on ESC / core.quit()
+    print(f"✓ Session capture: {path}")
+
+def _capture_gl_setup(window):
+    """Create the downscale framebuffer and the pixel pack buffer (first capture, window context current)."""
+    import ctypes
+    from pyglet import gl
+    w, h = (int(v) for v in getattr(window, 'frameBufferSize', window.size))
+    scale = _capture_gl['scale']
+    sw, sh = max(2, int(w * scale)) // 2 * 2, max(2, int(h * scale)) // 2 * 2  # Even sizes for yuv420p
+    fbo, rb, pbo, prev_draw = gl.GLuint(0), gl.GLuint(0), gl.GLuint(0), gl.GLint(0)
+    gl.glGenRenderbuffers(1, ctypes.byref(rb))
+    gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, rb)
+    gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_RGBA8, sw, sh)
+    gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, 0)
+    gl.glGenFramebuffers(1, ctypes.byref(fbo))
+    gl.glGetIntegerv(gl.GL_DRAW_FRAMEBUFFER_BINDING, ctypes.byref(prev_draw))
+    gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, fbo)
+    gl.glFramebufferRenderbuffer(gl.GL_DRAW_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_RENDERBUFFER, rb)
+    status = gl.glCheckFramebufferStatus(gl.GL_DRAW_FRAMEBUFFER)
+    gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, prev_draw.value)
+    if status != gl.GL_FRAMEBUFFER_COMPLETE:
+        raise RuntimeError(f"capture framebuffer incomplete (0x{status:x})")
+    gl.glGenBuffers(1, ctypes.byref(pbo))
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, pbo)
+    gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER, sw * sh * 3, None, gl.GL_STREAM_READ)
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+    _capture_gl.update(fbo=fbo, rb=rb, pbo=pbo, size=(w, h, sw, sh))
+
+def _capture_collect(q):
+    """Map the PBO filled on an earlier flip and queue its pixels (never blocks on the encoder)."""
+    pending = _capture_gl['pending']
+    if pending is None:
+        return
+    _capture_gl['pending'] = None
+    sw, sh, flip_time, event_types = pending
+    if flip_time is None:  # The flip after the read failed: nothing to time-stamp the frame against
+        _capture_dropped[0] += 1
+        return
+    import ctypes
+    from pyglet import gl
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, _capture_gl['pbo'])
+    try:
+        ptr = gl.glMapBuffer(gl.GL_PIXEL_PACK_BUFFER, gl.GL_READ_ONLY)
+        data = ctypes.string_at(ptr, sw * sh * 3) if ptr else None
+    finally:
+        gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+    if data is None:  # Map failed: no pixels for this frame
+        _capture_dropped[0] += 1
+        return
+    try:
+        q.put_nowait((flip_time, event_types, sw, sh, data))
+    except Exception:
+        _capture_dropped[0] += 1
+
+def _capture_read_back(window, force=False):
+    """Called just before the flip: queue the previous capture, then start a GPU-downscaled, asynchronous read of
+    the back buffer. Rate-limited to CAPTURE_FPS unless force (flips carrying TTL events). True if a read started."""
+    q = _capture_queue[0]
+    if q is None or _capture_stopped[0]:
+        return None
+    try:
+        if _capture_gl['fbo'] is None:
+            _capture_gl_setup(window)
+    except Exception as e:
+        print(f"⚠ Session capture stopped: GPU downscale/PBO read-back unavailable ({e})", file=sys.stderr)
+        _stop_session_capture()
+        return None
+    try:
+        import ctypes
+        from pyglet import gl
+        _capture_collect(q)
+        now = time.perf_counter()
+        if not force and now - _capture_gl['last'] < _capture_gl['interval']:
+            return None
+        if q.full():
+            _capture_dropped[0] += 1
+            return None
+        w, h, sw, sh = _capture_gl['size']
+        prev_read, prev_draw = gl.GLint(0), gl.GLint(0)
+        gl.glGetIntegerv(gl.GL_READ_FRAMEBUFFER_BINDING, ctypes.byref(prev_read))
+        gl.glGetIntegerv(gl.GL_DRAW_FRAMEBUFFER_BINDING, ctypes.byref(prev_draw))
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, 0)
+        gl.glReadBuffer(gl.GL_BACK)
+        gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, _capture_gl['fbo'])
+        gl.glBlitFramebuffer(0, 0, w, h, 0, 0, sw, sh, gl.GL_COLOR_BUFFER_BIT, gl.GL_LINEAR)
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, _capture_gl['fbo'])
+        gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, _capture_gl['pbo'])
+        gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+        gl.glReadPixels(0, 0, sw, sh, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, None)  # Into the PBO: returns without waiting
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, prev_read.value)
+        gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, prev_draw.value)
+        _capture_gl['last'] = now
+        _capture_gl['pending'] = [sw, sh, None, []]
+        return True
+    except Exception:
+        _capture_dropped[0] += 1
+        return None
+
+def _capture_submit(flip_time, event_types):
+    """Attach the flip timestamp and TTL event types to the read started before this flip."""
+    pending = _capture_gl['pending']
+    if pending is not None:
+        pending[2], pending[3] = flip_time, list(event_types)
+
+def _stop_session_capture():
+    """Flush queued frames and close the video (idempotent)."""
+    q, t = _capture_queue[0], _capture_thread[0]
+    if q is None:
+        return
+    _capture_queue[0] = None
+    if _capture_stopped[0]:
+        return  # Worker already gone (failure reported by the worker)
+    try:
+        q.put(None, timeout=5.0)
+        t.join(timeout=60.0)
+    except Exception as e:
+        print(f"⚠ Session capture did not finish cleanly: {e}", file=sys.stderr)
+
+# =========================
+#  DRAW TIMING
+# =========================
+# Per-screen draw cost. _timed_draw(screen)(draw_func) wraps a screen's draw function. It always records CPU
+# time. With GPU_TIMER_QUERIES=1 (and GL 3.3 / ARB_timer_query) it also records the GPU time of the same draw
+# calls through a GL_TIME_ELAPSED query. Query results are collected on later calls once the GPU reports them,
+# so the frame never stalls on a readback. _draw_timing_summary() gives median/p95 per screen and the share of the
+# frame budget, for the session summary. Screens close to the budget are flagged on the console.
+
+_draw_timing = {}  # screen -> {'cpu': [ms, ...], 'gpu': [ms, ...]}
+_gpu_queries = {'enabled': os.environ.get('GPU_TIMER_QUERIES', '0') == '1', 'free': [], 'pending': deque(), 'active': False}
+
+def _gpu_query_begin():
+    """Start a GL_TIME_ELAPSED query; returns its id, or None (disabled, unsupported, or one already running)."""
+    if not _gpu_queries['enabled'] or _gpu_queries['active']:
+        return None
+    try:
+        from pyglet import gl
+        if _gpu_queries['free']:
+            qid = _gpu_queries['free'].pop()
+        else:
+            ids = (gl.GLuint * 16)()
+            gl.glGenQueries(16, ids)
+            _gpu_queries['free'].extend(ids[1:])
+            qid = ids[0]
+        gl.glBeginQuery(getattr(gl, 'GL_TIME_ELAPSED', 0x88BF), qid)
+        _gpu_queries['active'] = True
+        return qid
+    except Exception as e:
+        _gpu_queries['enabled'] = False
+        print(f"⚠ GPU timer queries unavailable ({e}); recording CPU draw time only", file=sys.stderr)
+        return None
+
+def _gpu_query_end(screen, qid):
+    try:
+        from pyglet import gl
+        gl.glEndQuery(getattr(gl, 'GL_TIME_ELAPSED', 0x88BF))
+        _gpu_queries['pending'].append((screen, qid))
+    except Exception:
+        pass
+    _gpu_queries['active'] = False
+
+def _collect_gpu_queries(wait=False):
+    """Move finished query results (ns) into _draw_timing, oldest first. wait=True blocks for all of them."""
+    pending = _gpu_queries['pending']
+    if not pending:
+        return
+    try:
+        import ctypes
+        from pyglet import gl
+        while pending:
+            screen, qid = pending[0]
+            available = gl.GLint(0)
+            gl.glGetQueryObjectiv(qid, gl.GL_QUERY_RESULT_AVAILABLE, ctypes.byref(available))
+            if not available.value and not wait:
+                break
+            elapsed_ns = gl.GLuint64(0)
+            gl.glGetQueryObjectui64v(qid, gl.GL_QUERY_RESULT, ctypes.byref(elapsed_ns))
+            pending.popleft()
+            _gpu_queries['free'].append(qid)
+            _draw_timing.setdefault(screen, {'cpu': [], 'gpu': []})['gpu'].append(elapsed_ns.value / 1e6)
+    except Exception:
+        pending.clear()
+
+def _timed_draw(screen):
+    """Decorator: record CPU (and optionally GPU) time of each call of a screen's draw function under screen."""
+    def wrap(draw_func):
+        def timed():
+            _collect_gpu_queries()
+            qid = _gpu_query_begin()
+            t0 = time.perf_counter()
+            draw_func()
+            cpu_ms = (time.perf_counter() - t0) * 1000.0
+            if qid is not None:
+                _gpu_query_end(screen, qid)
+            _draw_timing.setdefault(screen, {'cpu': [], 'gpu': []})['cpu'].append(cpu_ms)
+        return timed
+    return wrap
+
+def _draw_timing_summary(window):
+    """{column: value} per screen: n, CPU/GPU median and p95 (ms), and p95 as % of the frame budget. Prints a table."""
+    _collect_gpu_queries(wait=True)
+    try:
+        frame_period = float(getattr(window, 'monitorFramePeriod', None))
+    except (TypeError, ValueError):
+        frame_period = None
+    if not frame_period or not 0.002 < frame_period < 0.05:
+        frame_period = 1.0 / 60.0
+    def pct(xs, q):
+        xs = sorted(xs)
+        return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else None
+    budget_ms = frame_period * 1000.0
+    summary = {}
+    if _draw_timing:
+        print(f"Draw timing per screen (frame budget {budget_ms:.1f} ms):")
+    for screen, t in sorted(_draw_timing.items()):
+        cpu_p95, gpu_p95 = pct(t['cpu'], 0.95), pct(t['gpu'], 0.95)
+        worst = max(x for x in (cpu_p95, gpu_p95) if x is not None)
+        row = {'n': len(t['cpu']), 'cpu_ms_median': _median(t['cpu']), 'cpu_ms_p95': cpu_p95,
+               'gpu_ms_median': _median(t['gpu']), 'gpu_ms_p95': gpu_p95, 'frame_budget_pct': 100.0 * worst / budget_ms}
+        for key, value in row.items():
+            summary[f"draw_{screen}_{key}"] = '' if value is None else round(value, 3)
+        mark = "⚠" if row['frame_budget_pct'] > 80.0 else " "
+        gpu = f"{gpu_p95:.2f}" if gpu_p95 is not None else "-"
+        print(f"{mark} {screen}: CPU p95 {cpu_p95:.2f} ms, GPU p95 {gpu} ms, {row['frame_budget_pct']:.0f}% of frame ({row['n']} draws)")
+    sys.stdout.flush()
+    return summary
+
+# =========================
+#  RENDER BENCHMARK
+# =========================
+# RENDER_BENCHMARK=1 runs the real task unattended, so draw costs can be tracked in CI. It works headless (pyglet
+# EGL context, enabled before PsychoPy is imported). Input-method choice, name entry and pre-flight are skipped.
+# An autopilot thread emulates key presses (RENDER_BENCHMARK_KEYS every RENDER_BENCHMARK_KEY_INTERVAL s). Every
+# flip is split into draw_ms (glFinish on the frame's queued draws; with a software GL driver this is the real
+# CPU rasterization of ImageStim/TextStim/shapes) and flip_ms (swap + finish). Costs are grouped by screen, where a
+# screen is named by the last photodiode event queued. At exit the per-screen medians/p95 go to
+# render_benchmark_<script>_<host>_<time>.csv. RENDER_BENCHMARK_BASELINE=<earlier csv> flags screens whose median
+# draw cost grew by more than RENDER_BENCHMARK_TOLERANCE (default 0.25) and 0.5 ms.
+
+_RENDER_BENCHMARK = os.environ.get('RENDER_BENCHMARK', '0') == '1'
+_bench_screen = ['startup']  # Screen label for the next flips: last photodiode event type queued
+_bench_samples = {}  # screen -> [(draw_ms, flip_ms), ...]
+_RENDER_BENCHMARK_FIELDNAMES = ['screen', 'n_frames', 'draw_ms_median', 'draw_ms_p95', 'draw_ms_max',
+                                'flip_ms_median', 'flip_ms_p95', 'flip_ms_max', 'baseline_draw_ms_median', 'regression']
+
+def _bench_timed_flip(orig_flip, *args, **kwargs):
+    """Flip via orig_flip and record draw/flip cost for the current screen."""
+    t0 = time.perf_counter()
+    _gpu_finish()
+    t1 = time.perf_counter()
+    result = orig_flip(*args, **kwargs)
+    _gpu_finish()
+    t2 = time.perf_counter()
+    _bench_samples.setdefault(_bench_screen[0], []).append(((t1 - t0) * 1000.0, (t2 - t1) * 1000.0))
+    return result
+
+def _bench_autopilot_loop(keys, interval):
+    """Background: emulate one key press every interval s, cycling through keys (PsychoPy buffer + input queue)."""
+    i = 0
+    while True:
+        time.sleep(interval)
+        name = keys[i % len(keys)]
+        i += 1
+        try:
+            event._onPygletKey(name, 0, emulated=True)  # Same path as psychopy.hardware.emulator
+        except Exception:
+            pass
+        _key_events.append((name, time.time()))
+
+def _start_render_benchmark(script_name):
+    """Start the key autopilot and register the results writer (RENDER_BENCHMARK=1 only)."""
+    if not _RENDER_BENCHMARK:
+        return
+    import atexit
+    keys = [k.strip() for k in os.environ.get('RENDER_BENCHMARK_KEYS', 'right,return,left,return,space').split(',') if k.strip()]
+    interval = float(os.environ.get('RENDER_BENCHMARK_KEY_INTERVAL', '0.3'))
+    threading.Thread(target=_bench_autopilot_loop, args=(keys, interval), name="render-benchmark-autopilot", daemon=True).start()
+    atexit.register(_save_render_benchmark, script_name)
+    print(f"✓ Render benchmark: autopilot keys {keys} every {interval}s")
+    sys.stdout.flush()
+
+def _save_render_benchmark(script_name):
+    """Write per-screen draw/flip cost summary; compare with RENDER_BENCHMARK_BASELINE if given."""
+    if not _bench_samples:
+        return
+    def pct(xs, q):
+        xs = sorted(xs)
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
+    baseline = {}
+    baseline_path = os.environ.get('RENDER_BENCHMARK_BASELINE')
+    if baseline_path:
+        try:
+            with open(baseline_path, newline='') as f:
+                baseline = {row['screen']: float(row['draw_ms_median']) for row in csv.DictReader(f)}
+        except Exception as e:
+            print(f"⚠ Could not read render benchmark baseline {baseline_path}: {e}", file=sys.stderr)
+    tolerance = float(os.environ.get('RENDER_BENCHMARK_TOLERANCE', '0.25'))
+    rows = []
+    regressions = []
+    for screen, samples in sorted(_bench_samples.items()):
+        draws = [d for d, _ in samples]
+        flips = [f for _, f in samples]
+        draw_median = _median(draws)
+        base = baseline.get(screen)
+        regression = base is not None and draw_median > base * (1.0 + tolerance) and draw_median - base > 0.5
+        if regression:
+            regressions.append(f"{screen} {base:.2f} -> {draw_median:.2f} ms")
+        rows.append({'screen': screen, 'n_frames': len(samples), 'draw_ms_median': round(draw_median, 3),
+                     'draw_ms_p95': round(pct(draws, 0.95), 3), 'draw_ms_max': round(max(draws), 3),
+                     'flip_ms_median': round(_median(flips), 3), 'flip_ms_p95': round(pct(flips, 0.95), 3),
+                     'flip_ms_max': round(max(flips), 3), 'baseline_draw_ms_median': '' if base is None else base,
+                     'regression': int(regression)})
+    path = os.path.join(get_log_directory(), f"render_benchmark_{script_name}_{platform.node()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    try:
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=_RENDER_BENCHMARK_FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"✓ Render benchmark saved to {path} ({len(rows)} screens)")
+    except Exception as e:
+        print(f"⚠ Could not save render benchmark: {e}", file=sys.stderr)
+    for r in regressions:
+        print(f"⚠ Render regression: {r}", file=sys.stderr)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+def safe_window_close(window):
+    """Safely close a window, checking if it's still valid to prevent NoneType errors"""
+    try:
+        if window is not None:
+            # Check if window has a backend and it's not None
+            if hasattr(window, 'backend') and window.backend is not None:
+                window.close()
+            elif hasattr(window, 'close'):
+                # Try to close anyway, but catch any errors
+                try:
+                    window.close()
+                except Exception as e:
+                    print(f"ERROR in safe_window_close (inner): {repr(e)}", file=sys.stderr)
+                    traceback.print_exc()
+    except Exception as e:
+        print(f"ERROR in safe_window_close (outer): {repr(e)}", file=sys.stderr)
+        traceback.print_exc()
+
+def get_input_method():
+    """Ask user whether they're using touch screen (1) or click screen (2)"""
+    global USE_TOUCH_SCREEN
+    if _RENDER_BENCHMARK:
+        USE_TOUCH_SCREEN = False  # Autopilot drives the keyboard paths
+        return USE_TOUCH_SCREEN, None
+    
+    # Create temporary window - handle partial initialization
+    temp_win = None
+    try:
+        # Create windowed window
+        # Add waitBlanking=False and useFBO=False to prevent hanging
+        temp_win = visual.Window(
+            size=(1400, 900),
+            color='lightgray',
+            units='height',
+            fullscr=True,
+            allowGUI=True,
+            waitBlanking=False,  # Prevent blocking on display sync
             useFBO=False  # Disable framebuffer objects to prevent hangs
         )
         temp_win.flip()
@@ -565,7 +1848,6 @@ def get_input_method():
         # If there's an error, close temp window in exception handler
         print(f"ERROR in get_input_method: {e}", file=sys.stderr)
         sys.stderr.flush()
-        import traceback
         traceback.print_exc(file=sys.stderr)
         sys.stderr.flush()
         if temp_win is not None:
@@ -580,478 +1862,449 @@ def get_input_method():
         # This prevents PsychoPy from quitting when all windows are closed
         pass
 
-# Ask for input method first
-print("Getting input method...")
-result = None
-temp_win = None
-try:
-    print("DEBUG: About to call get_input_method()...", file=sys.stderr)
-    sys.stderr.flush()
-    result, temp_win = get_input_method()
-    print(f"DEBUG: get_input_method() returned: result={result}, temp_win={temp_win}", file=sys.stderr)
-    sys.stderr.flush()
-    print(f"Input method result: {result}")
-    sys.stdout.flush()
-    print(f"Input method type: {type(result)}")
-    sys.stdout.flush()
-except Exception as e:
-    print(f"ERROR in get_input_method(): {e}", file=sys.stderr)
-    sys.stderr.flush()
-    import traceback
-    traceback.print_exc(file=sys.stderr)
-    sys.stderr.flush()
-    traceback.print_exc()
-    print(f"ERROR in get_input_method(): {e}")
-    # Close temp window if it exists
-    if temp_win is not None:
-        try:
-            temp_win.close()
-        except:
-            pass
-    print("Press Enter to exit...")
-    try:
-        input()
-    except:
-        pass
-    core.quit()
-    exit(1)
-
-if result is None:
-    print("Input method selection cancelled. Exiting...")
-    print("Press Enter to exit...")
-    try:
-        input()
-    except:
-        pass
-    core.quit()
-    exit(0)
-
-print(f"Input method selected: {'TOUCH SCREEN' if result else 'MOUSE/TRACKPAD'}")
-print(f"Result value: {result}, Type: {type(result)}")
-print("About to create main window...")
-
-# Create main window with appropriate settings - use try/finally pattern
-win = None
-try:
-    print("="*60)
-    sys.stdout.flush()
-    print("STARTING WINDOW CREATION")
-    sys.stdout.flush()
-    print("="*60)
-    sys.stdout.flush()
-    import time
-    # Window creation happens exactly 0.4 seconds after continue was clicked
-    # (delay already handled in get_input_method function)
-    # Add delay to ensure temp window is fully closed
-    print("Waiting before creating main window...")
-    sys.stdout.flush()
-    sys.stderr.flush()
-    time.sleep(0.2)  # Longer delay to ensure temp window is fully closed
-    
-    print("Creating main window (1400x900)...")
-    sys.stdout.flush()
-    sys.stderr.flush()
-    # Create windowed window
+def _open_main_window():
+    """Ask for the input method, create the main window and install the photodiode/TTL flip wrapper (exits on failure)."""
+    global win, photodiode_patch, _blank_rect, _ttl_events, _pending_ttl_event_types, _photodiode_signal_next_flip
+    global _signal_photodiode_event, _queue_ttl_event, _do_photodiode_flash, _wrapped_flip
+    # Ask for input method first
+    print("Getting input method...")
+    result = None
+    temp_win = None
     try:
-        print("DEBUG: About to call visual.Window()...", file=sys.stderr)
+        print("DEBUG: About to call get_input_method()...", file=sys.stderr)
         sys.stderr.flush()
-        
-        # Ensure events are cleared before window creation
-        event.clearEvents()
-        
-        print("DEBUG: Calling visual.Window(size=(1400, 900), fullscr=True)...", file=sys.stderr)
-        sys.stderr.flush()
-        
-        win = visual.Window(
-            size=(1400, 900), 
-            color='lightgray', 
-            units='height',
-            fullscr=True,
-            waitBlanking=False,  # Prevent blocking on display sync
-            allowGUI=True,  # Ensure GUI is available
-            useFBO=False  # Disable framebuffer objects to prevent hangs
-        )
-        
-        print("DEBUG: visual.Window() call completed successfully", file=sys.stderr)
-        sys.stderr.flush()
-        print("Window object created, about to flip...", file=sys.stderr)
+        result, temp_win = get_input_method()
+        print(f"DEBUG: get_input_method() returned: result={result}, temp_win={temp_win}", file=sys.stderr)
         sys.stderr.flush()
-        
-        # Ensure window is ready before proceeding
-        try:
-            # Immediately flip to ensure window is ready
-            win.flip()
-            print("Window flip successful", file=sys.stderr)
-            sys.stderr.flush()
-        except Exception as flip_error:
-            print(f"Warning: Initial flip failed: {flip_error}", file=sys.stderr)
-            sys.stderr.flush()
-            # Try to continue anyway - window might still be usable
-        
-        print("Windowed window created successfully")
+        print(f"Input method result: {result}")
+        sys.stdout.flush()
+        print(f"Input method type: {type(result)}")
         sys.stdout.flush()
-        sys.stderr.flush()
-        
-        # Don't close temp window yet - wait until main window is fully set up
     except Exception as e:
-        # If window creation fails, show error
-        import traceback
-        print("="*60, file=sys.stderr)
-        print("WINDOW CREATION FAILED", file=sys.stderr)
-        print("="*60, file=sys.stderr)
+        print(f"ERROR in get_input_method(): {e}", file=sys.stderr)
+        sys.stderr.flush()
         traceback.print_exc(file=sys.stderr)
         sys.stderr.flush()
         traceback.print_exc()
-        print(f"Window creation failed: {e}")
-        sys.stdout.flush()
-        print("Press Enter to exit...")
-        try:
-            input()
-        except Exception as e:
-            print(f"ERROR in input() call: {repr(e)}", file=sys.stderr)
-            traceback.print_exc()
-        try:
-            core.quit()
-        except Exception as e:
-            print(f"ERROR calling core.quit(): {repr(e)}", file=sys.stderr)
-            traceback.print_exc()
-        # Close temp window if it still exists
+        print(f"ERROR in get_input_method(): {e}")
+        # Close temp window if it exists
         if temp_win is not None:
             try:
                 temp_win.close()
             except:
                 pass
-        exit(1)
-    
-    # Verify window was created successfully
-    if win is None:
-        error_msg = "ERROR: Failed to create main window - win is None"
-        print("="*60, file=sys.stderr)
-        print(error_msg, file=sys.stderr)
-        print("="*60, file=sys.stderr)
-        sys.stderr.flush()
-        print("="*60)
-        print("ERROR: Failed to create main window - win is None")
-        print("="*60)
         print("Press Enter to exit...")
-        sys.stdout.flush()
         try:
             input()
         except:
             pass
+        core.quit()
+        exit(1)
+
+    if result is None:
+        print("Input method selection cancelled. Exiting...")
+        print("Press Enter to exit...")
         try:
-            core.quit()
+            input()
         except:
             pass
-        exit(1)
-    
-    print(f"Window created successfully: {win}")
-    sys.stdout.flush()
-    
-    # Ensure window is visible and ready
-    try:
-        win.flip()
-        core.wait(0.1)  # Brief wait to ensure window is fully ready
-        print("Main window created successfully")
-        sys.stdout.flush()
-    except Exception as e:
-        print(f"Error preparing window: {e}")
-        import traceback
-        traceback.print_exc()
         core.quit()
-        exit(1)
-    
-    # Force window to front on macOS
-    try:
-        if platform.system() == 'Darwin':  # macOS
-            try:
-                win.winHandle.activate()
-            except Exception as e:
-                print(f"Warning: Could not activate window on macOS: {e}", file=sys.stderr)
-                # This is not critical, continue anyway
-    except Exception as e:
-        print(f"Warning: Error checking platform for window activation: {e}", file=sys.stderr)
-        # This is not critical, continue anyway
+        exit(0)
 
-    # Initial flip to ensure window is ready
-    print("Performing initial window flip...")
-    sys.stdout.flush()
+    print(f"Input method selected: {'TOUCH SCREEN' if result else 'MOUSE/TRACKPAD'}")
+    print(f"Result value: {result}, Type: {type(result)}")
+    print("About to create main window...")
+
+    # Create main window with appropriate settings - use try/finally pattern
+    win = None
     try:
-        win.flip()
-        print("Initial flip successful")
+        print("="*60)
         sys.stdout.flush()
-    except Exception as e:
-        print(f"ERROR during initial flip: {e}")
+        print("STARTING WINDOW CREATION")
         sys.stdout.flush()
-        raise
-    core.wait(0.1)
-    
-    # Test that window can draw something simple
-    print("Testing window with simple draw...")
-    sys.stdout.flush()
-    try:
-        test_text = visual.TextStim(win, text=" ", color='black', height=0.04*0.75*1.35, pos=(0, 0))
-        test_text.draw()
-        win.flip()
-        print("Window draw test successful")
+        print("="*60)
         sys.stdout.flush()
-        core.wait(0.1)
-    except Exception as e:
-        print(f"ERROR during window draw test: {e}")
+        # Window creation happens exactly 0.4 seconds after continue was clicked
+        # (delay already handled in get_input_method function)
+        # Brief settle before the second context is created (temp window is closed once the main window is up)
+        print("Waiting before creating main window...")
         sys.stdout.flush()
-        import traceback
-        traceback.print_exc()
-        raise
-    
-    # Verify window is ready before continuing
-    if win is None:
-        print("="*60)
-        print("CRITICAL ERROR: win is None after window creation attempt")
-        print("="*60)
-        raise RuntimeError("Main window creation failed - win is None")
-    
-    print("Window verification complete, proceeding to experiment...")
-    sys.stdout.flush()
-    print(f"Window object: {win}")
-    sys.stdout.flush()
-    print(f"Window type: {type(win)}")
-    sys.stdout.flush()
-    
-    print("Main window setup complete. Window is ready.")
-    print("="*60)
-    print("WINDOW CREATION SUCCESSFUL")
-    print("="*60)
-    
-    # Photodiode: white baseline, flashes black (TTL) then white on every event. Never stays black.
-    # Extreme left of screen
-    _photodiode_signal_next_flip = [False]  # List for mutability in closure
-    _ttl_events = []  # Log every TTL: [{"timestamp": t, "event_type": str}, ...]
-    _pending_ttl_event_type = [None]
-    def _signal_photodiode_event():
-        _photodiode_signal_next_flip[0] = True
-    def _do_photodiode_flash(draw_func, event_type=None):
-        """Signal photodiode, then flip black (TTL) then white. Keyboard only: 17ms delay between flips so the black frame displays; touch screen skips delay. Logs TTL if event_type given."""
-        if event_type is not None:
-            _pending_ttl_event_type[0] = event_type
-        _signal_photodiode_event()
-        if draw_func:
-            draw_func()
-        win.flip()  # Black flash, TTL
-        if not USE_TOUCH_SCREEN:
-            core.wait(0.017)  # ~1 frame at 60Hz: ensures black displays before white; prevents vsync coalescing on keyboard
-        if draw_func:
-            draw_func()
-        win.flip()  # White (baseline)
-    # Photodiode: shown in BOTH touch-screen and keyboard modes (no USE_TOUCH_SCREEN check).
-    # Touch screen: -0.70; keyboard: -0.75
-    try:
-        _pd_x = -0.70 if USE_TOUCH_SCREEN else -0.75
-        # Photodiode: twice exit-button vertical size (0.08×0.24), bottom-left
-        photodiode_patch = visual.Rect(
-            win, width=0.08, height=0.24,
-            fillColor='white', lineColor=None,
-            pos=(_pd_x, -0.48),
-            units='height'
-        )
-        _blank_rect = visual.Rect(win, width=3, height=3, fillColor='lightgray', lineColor=None, pos=(0, 0), units='height')
-        _orig_flip = win.flip
-        def _wrapped_flip(*args, **kwargs):
-            did_flash = False
-            if PHOTODIODE_ACTIVE and photodiode_patch is not None:
-                # Always start white (baseline). Flash black only when explicitly signaled.
-                photodiode_patch.fillColor = 'white'
-                if _photodiode_signal_next_flip[0]:
-                    photodiode_patch.fillColor = 'black'
-                    _photodiode_signal_next_flip[0] = False
-                    did_flash = True
-                photodiode_patch.draw()
-            # TTL at exact flip moment – callOnFlip fires when screen changes, same time as photodiode flash
-            if PHOTODIODE_ACTIVE and photodiode_patch is not None and did_flash:
-                def _on_flash():
-                    ts = time.time()
-                    _last_photodiode_ttl_timestamp[0] = ts
-                    _send_ttl_trigger()
-                    if _pending_ttl_event_type[0] is not None:
-                        ev = {"timestamp": ts, "event_type": _pending_ttl_event_type[0]}
-                        _ttl_events.append(ev)
-                        _pending_ttl_event_type[0] = None
-                        # Write incrementally to TTL file if open
-                        if _ttl_writer_ref[0] is not None and _ttl_file_ref[0] is not None:
-                            try:
-                                row = dict(ev)
-                                if isinstance(row.get('timestamp'), (int, float)):
-                                    row['timestamp'] = f"{row['timestamp']:.9f}"
-                                _ttl_writer_ref[0].writerow(row)
-                                _ttl_file_ref[0].flush()
-                                try:
-                                    os.fsync(_ttl_file_ref[0].fileno())
-                                except (AttributeError, OSError):
-                                    pass
-                            except Exception as e:
-                                print(f"Warning: Could not write TTL event incrementally: {e}", file=sys.stderr)
-                win.callOnFlip(_on_flash)
-            result = _orig_flip(*args, **kwargs)
-            return result
-        win.flip = _wrapped_flip
-    except Exception as e:
-        print(f"Warning: Could not create photodiode patch: {e}", file=sys.stderr)
-    
-    # Don't close temp window - keep it open to prevent PsychoPy from auto-quitting
-    # Closing it causes PsychoPy to detect all windows are closed and quit
-    # We'll just leave it open (it's behind the main window anyway)
-    if temp_win is not None:
-        print("DEBUG: Keeping temp window open to prevent PsychoPy auto-quit", file=sys.stderr)
         sys.stderr.flush()
-        # Don't close temp_win - leave it open
-    
-except Exception as e:
-    print("="*60)
-    print("EXCEPTION CAUGHT IN WINDOW CREATION")
-    print("="*60)
-    print(f"ERROR creating main window: {e}")
-    print(f"Error type: {type(e).__name__}")
-    import traceback
-    traceback.print_exc()
-    print("="*60)
-    print("CRITICAL ERROR: Failed to create main window")
-    print("="*60)
-    if win is not None:
+        time.sleep(0.2)  # Let the input-method window settle before creating the main window
+
+        print("Creating main window (1400x900)...")
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Create windowed window
         try:
-            win.close()
-        except Exception as e:
-            print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
-            traceback.print_exc()
-    print("Press Enter to exit...")
-    try:
-        input()
-    except:
-        pass
-    try:
-        core.quit()
-    except:
-        pass
-    exit(1)
-except SystemExit:
-    print("SystemExit caught - program is exiting")
-    raise
-except:
-    print("="*60)
-    print("UNKNOWN EXCEPTION CAUGHT IN WINDOW CREATION")
-    print("="*60)
-    import traceback
-    traceback.print_exc()
-    print("="*60)
-    if win is not None:
+            print("DEBUG: About to call visual.Window()...", file=sys.stderr)
+            sys.stderr.flush()
+
+            # Ensure events are cleared before window creation
+            event.clearEvents()
+
+            print("DEBUG: Calling visual.Window(size=(1400, 900), fullscr=True)...", file=sys.stderr)
+            sys.stderr.flush()
+
+            win = visual.Window(
+                size=(1400, 900), 
+                color='lightgray', 
+                units='height',
+                fullscr=not _RENDER_BENCHMARK,  # Benchmark: 1400x900 offscreen/windowed
+                waitBlanking=False,  # Prevent blocking on display sync
+                allowGUI=True,  # Ensure GUI is available
+                useFBO=False  # Disable framebuffer objects to prevent hangs
+            )
+
+            print("DEBUG: visual.Window() call completed successfully", file=sys.stderr)
+            sys.stderr.flush()
+            print("Window object created, about to flip...", file=sys.stderr)
+            sys.stderr.flush()
+
+            # Ensure window is ready before proceeding
+            try:
+                # Immediately flip to ensure window is ready
+                win.flip()
+                print("Window flip successful", file=sys.stderr)
+                sys.stderr.flush()
+            except Exception as flip_error:
+                print(f"Warning: Initial flip failed: {flip_error}", file=sys.stderr)
+                sys.stderr.flush()
+                # Try to continue anyway - window might still be usable
+
+            print("Windowed window created successfully")
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+            # Don't close temp window yet - wait until main window is fully set up
+        except Exception as e:
+            # If window creation fails, show error
+            print("="*60, file=sys.stderr)
+            print("WINDOW CREATION FAILED", file=sys.stderr)
+            print("="*60, file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            sys.stderr.flush()
+            traceback.print_exc()
+            print(f"Window creation failed: {e}")
+            sys.stdout.flush()
+            print("Press Enter to exit...")
+            try:
+                input()
+            except Exception as e:
+                print(f"ERROR in input() call: {repr(e)}", file=sys.stderr)
+                traceback.print_exc()
+            try:
+                core.quit()
+            except Exception as e:
+                print(f"ERROR calling core.quit(): {repr(e)}", file=sys.stderr)
+                traceback.print_exc()
+            # Close temp window if it still exists
+            if temp_win is not None:
+                try:
+                    temp_win.close()
+                except:
+                    pass
+            exit(1)
+
+        # Verify window was created successfully
+        if win is None:
+            error_msg = "ERROR: Failed to create main window - win is None"
+            print("="*60, file=sys.stderr)
+            print(error_msg, file=sys.stderr)
+            print("="*60, file=sys.stderr)
+            sys.stderr.flush()
+            print("="*60)
+            print("ERROR: Failed to create main window - win is None")
+            print("="*60)
+            print("Press Enter to exit...")
+            sys.stdout.flush()
+            try:
+                input()
+            except:
+                pass
+            try:
+                core.quit()
+            except:
+                pass
+            exit(1)
+
+        print(f"Window created successfully: {win}")
+        sys.stdout.flush()
+
+        # Ensure window is visible and ready
         try:
-            win.close()
+            win.flip()
+            core.wait(0.1)  # Brief wait to ensure window is fully ready
+            print("Main window created successfully")
+            sys.stdout.flush()
         except Exception as e:
-            print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
+            print(f"Error preparing window: {e}")
             traceback.print_exc()
-    print("Press Enter to exit...")
-    try:
-        input()
-    except:
-        pass
-    try:
-        core.quit()
+            core.quit()
+            exit(1)
+
+        # Force window to front on macOS
+        try:
+            if platform.system() == 'Darwin':  # macOS
+                try:
+                    win.winHandle.activate()
+                except Exception as e:
+                    print(f"Warning: Could not activate window on macOS: {e}", file=sys.stderr)
+                    # This is not critical, continue anyway
+        except Exception as e:
+            print(f"Warning: Error checking platform for window activation: {e}", file=sys.stderr)
+            # This is not critical, continue anyway
+
+        # Initial flip to ensure window is ready
+        print("Performing initial window flip...")
+        sys.stdout.flush()
+        try:
+            win.flip()
+            print("Initial flip successful")
+            sys.stdout.flush()
+        except Exception as e:
+            print(f"ERROR during initial flip: {e}")
+            sys.stdout.flush()
+            raise
+        core.wait(0.1)
+
+        # Test that window can draw something simple
+        print("Testing window with simple draw...")
+        sys.stdout.flush()
+        try:
+            test_text = visual.TextStim(win, text=" ", color='black', height=0.04*0.75*1.35, pos=(0, 0))
+            test_text.draw()
+            win.flip()
+            print("Window draw test successful")
+            sys.stdout.flush()
+            core.wait(0.1)
+        except Exception as e:
+            print(f"ERROR during window draw test: {e}")
+            sys.stdout.flush()
+            traceback.print_exc()
+            raise
+
+        # Verify window is ready before continuing
+        if win is None:
+            print("="*60)
+            print("CRITICAL ERROR: win is None after window creation attempt")
+            print("="*60)
+            raise RuntimeError("Main window creation failed - win is None")
+
+        print("Window verification complete, proceeding to experiment...")
+        sys.stdout.flush()
+        print(f"Window object: {win}")
+        sys.stdout.flush()
+        print(f"Window type: {type(win)}")
+        sys.stdout.flush()
+
+        print("Main window setup complete. Window is ready.")
+        print("="*60)
+        print("WINDOW CREATION SUCCESSFUL")
+        print("="*60)
+
+        # Photodiode: white baseline, flashes black (TTL) then white on every event. Never stays black.
+        # Extreme left of screen
+        _photodiode_signal_next_flip = [False]  # List for mutability in closure
+        _ttl_events = []  # Log every TTL: [{"timestamp": t, "event_type": str}, ...]
+        _pending_ttl_event_types = []  # Every event signalled before the next flash flip (all share its timestamp)
+        def _signal_photodiode_event():
+            _photodiode_signal_next_flip[0] = True
+        def _queue_ttl_event(event_type=None):
+            """Flag the next flip as a flash and queue event_type for it. Several calls before one flip all get logged."""
+            if event_type is not None:
+                _pending_ttl_event_types.append(event_type)
+                _bench_screen[0] = event_type  # Render benchmark: frames from here on belong to this screen
+            _signal_photodiode_event()
+        def _do_photodiode_flash(draw_func, event_type=None):
+            """Signal photodiode, then flip black (TTL) then white. Keyboard only: 17ms delay between flips so the black frame displays; touch screen skips delay. Logs TTL if event_type given."""
+            _queue_ttl_event(event_type)
+            if draw_func:
+                draw_func()
+            win.flip()  # Black flash, TTL
+            if not USE_TOUCH_SCREEN:
+                core.wait(0.017)  # ~1 frame at 60Hz: ensures black displays before white; prevents vsync coalescing on keyboard
+            if draw_func:
+                draw_func()
+            win.flip()  # White (baseline)
+        # Photodiode: shown in BOTH touch-screen and keyboard modes (no USE_TOUCH_SCREEN check).
+        # Touch screen: -0.70; keyboard: -0.75
+        try:
+            _pd_x = -0.70 if USE_TOUCH_SCREEN else -0.75
+            # Photodiode: twice exit-button vertical size (0.08×0.24), bottom-left
+            photodiode_patch = visual.Rect(
+                win, width=0.08, height=0.24,
+                fillColor='white', lineColor=None,
+                pos=(_pd_x, -0.48),
+                units='height'
+            )
+            _blank_rect = visual.Rect(win, width=3, height=3, fillColor='lightgray', lineColor=None, pos=(0, 0), units='height')
+            _orig_flip = win.flip
+            def _wrapped_flip(*args, **kwargs):
+                did_flash = False
+                if PHOTODIODE_ACTIVE and photodiode_patch is not None:
+                    # Always start white (baseline). Flash black only when explicitly signaled.
+                    photodiode_patch.fillColor = 'white'
+                    if _photodiode_signal_next_flip[0]:
+                        photodiode_patch.fillColor = 'black'
+                        _photodiode_signal_next_flip[0] = False
+                        did_flash = True
+                    photodiode_patch.draw()
+                elif _pending_ttl_event_types:
+                    del _pending_ttl_event_types[:]  # Photodiode off: no flash, so nothing to time-stamp these against
+                # TTL at exact flip moment – callOnFlip fires when screen changes, same time as photodiode flash
+                if PHOTODIODE_ACTIVE and photodiode_patch is not None and did_flash:
+                    def _on_flash():
+                        ts = time.time()
+                        _last_photodiode_ttl_timestamp[0] = ts
+                        event_types = _pending_ttl_event_types[:]
+                        del _pending_ttl_event_types[:]
+                        # Rows after the first get their own pulse time from the pulse-train thread
+                        evs = [{"timestamp": ts, "event_type": et, "ttl_timestamp": _calibrated_ttl_time(ts) if i == 0 else '', "photon_timestamp": _calibrated_photon_time(ts)} for i, et in enumerate(event_types)]
+                        _ttl_events.extend(evs)
+                        train_queued = _send_ttl_trigger(n_pulses=max(1, len(event_types)), train_rows=evs[1:])  # One pulse per event (pulse train if coalesced)
+                        if len(event_types) > 1:
+                            _ttl_coalesced_flips[0] += 1
+                            _ttl_coalesced_events[0] += len(event_types) - 1
+                        if evs:
+                            _write_ttl_rows(evs[:1] if train_queued else evs)  # Write incrementally to TTL file if open
+                    win.callOnFlip(_on_flash)
+                capture_events = _pending_ttl_event_types[:] if did_flash else []
+                capture = _capture_read_back(win, force=bool(capture_events))  # Session capture (CAPTURE_VIDEO=1)
+                result = _bench_timed_flip(_orig_flip, *args, **kwargs) if _RENDER_BENCHMARK else _orig_flip(*args, **kwargs)
+                if capture:
+                    _capture_submit(time.time(), capture_events)
+                return result
+            win.flip = _wrapped_flip
+            _start_session_capture(win, "recognition")
+            _start_render_benchmark("recognition")
+        except Exception as e:
+            print(f"Warning: Could not create photodiode patch: {e}", file=sys.stderr)
+
+        # Close the input-method window now that the main window exists (closing it earlier would leave PsychoPy
+        # with no open windows and it would auto-quit). One GL context for the rest of the session.
+        _retire_temp_window(win, temp_win)
+        temp_win = None
+
+    except Exception as e:
+        print("="*60)
+        print("EXCEPTION CAUGHT IN WINDOW CREATION")
+        print("="*60)
+        print(f"ERROR creating main window: {e}")
+        print(f"Error type: {type(e).__name__}")
+        traceback.print_exc()
+        print("="*60)
+        print("CRITICAL ERROR: Failed to create main window")
+        print("="*60)
+        if win is not None:
+            try:
+                win.close()
+            except Exception as e:
+                print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
+                traceback.print_exc()
+        print("Press Enter to exit...")
+        try:
+            input()
+        except:
+            pass
+        try:
+            core.quit()
+        except:
+            pass
+        exit(1)
+    except SystemExit:
+        print("SystemExit caught - program is exiting")
+        raise
     except:
-        pass
-    exit(1)
+        print("="*60)
+        print("UNKNOWN EXCEPTION CAUGHT IN WINDOW CREATION")
+        print("="*60)
+        traceback.print_exc()
+        print("="*60)
+        if win is not None:
+            try:
+                win.close()
+            except Exception as e:
+                print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
+                traceback.print_exc()
+        print("Press Enter to exit...")
+        try:
+            input()
+        except:
+            pass
+        try:
+            core.quit()
+        except:
+            pass
+        exit(1)
 
 # =========================
-#  GENERATE PRACTICE STIMULI
+#  GENERATED STIMULI (IN MEMORY)
 # =========================
-def generate_practice_shapes(output_dir="PLACEHOLDERS"):
-    """Generate the 3 specific practice shapes: green circle, red circle, blue circle"""
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    # Green circle (practice shape 1)
-    img = Image.new('RGB', (200, 200), color='lightgray')
-    draw = ImageDraw.Draw(img)
-    draw.ellipse([20, 20, 180, 180], fill='green', outline='black', width=3)
-    img.save(os.path.join(output_dir, "PRACTICE_GREEN_CIRCLE.png"))
-    
-    # Red circle (practice shape 2)
-    img = Image.new('RGB', (200, 200), color='lightgray')
-    draw = ImageDraw.Draw(img)
-    draw.ellipse([20, 20, 180, 180], fill='red', outline='black', width=3)
-    img.save(os.path.join(output_dir, "PRACTICE_RED_CIRCLE.png"))
-    
-    # Blue circle (practice shape 3)
-    img = Image.new('RGB', (200, 200), color='lightgray')
-    draw = ImageDraw.Draw(img)
-    draw.ellipse([20, 20, 180, 180], fill='blue', outline='black', width=3)
-    img.save(os.path.join(output_dir, "PRACTICE_BLUE_CIRCLE.png"))
-    
-    print(f"✓ Generated 3 practice shapes in {output_dir}/")
+# Practice shapes and placeholder stimuli are drawn as NumPy arrays and handed straight to ImageStim through the
+# texture registry. Nothing is written to disk and PIL is not used. Each one keeps its path under PLACEHOLDER_DIR
+# (IMAGE_<n>.png / LURE_<n>.png) as its identity in the CSVs and in extract_stimulus_number, but no file exists.
+# Colours for all pairs come from one vectorized pass. Which half of the pairs swap shapes (square studied, circle
+# lure) is seeded with PLACEHOLDER_SEED (default 0), so placeholder sets are the same across runs.
 
-# =========================
-#  GENERATE PLACEHOLDER STIMULI
-# =========================
-def generate_placeholder_stimuli(num_stimuli=100, output_dir="PLACEHOLDERS"):
-    """Generate placeholder stimuli: circles (studied) and squares (lures)
-    
-    For 50% of pairs, swap so squares are studied items and circles are lures.
-    """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    # Generate distinct colors for each stimulus
-    colors = []
-    for i in range(num_stimuli):
-        # Generate distinct colors using HSV
-        hue = (i * 137.508) % 360  # Golden angle for good distribution
-        saturation = 0.7 + (i % 3) * 0.1
-        value = 0.6 + (i % 2) * 0.3
-        
-        # Convert HSV to RGB
-        import colorsys
-        r, g, b = colorsys.hsv_to_rgb(hue/360, saturation, value)
-        colors.append((int(r*255), int(g*255), int(b*255)))
-    
-    # Randomly select 50% of pairs to swap (squares become studied, circles become lures)
-    num_to_swap = num_stimuli // 2
-    pairs_to_swap = set(random.sample(range(1, num_stimuli + 1), num_to_swap))
-    
-    # Create studied items and lures
-    for i in range(num_stimuli):
-        pair_num = i + 1
-        color = colors[i]
-        
-        # Determine if this pair should be swapped
-        is_swapped = pair_num in pairs_to_swap
-        
-        if is_swapped:
-            # Swapped: square is studied item, circle is lure
-            # Create studied item (square)
-            img = Image.new('RGB', (200, 200), color='lightgray')
-            draw = ImageDraw.Draw(img)
-            draw.rectangle([20, 20, 180, 180], fill=color, outline='black', width=3)
-            img.save(os.path.join(output_dir, f"IMAGE_{pair_num}.png"))
-            
-            # Create lure (circle)
-            img = Image.new('RGB', (200, 200), color='lightgray')
-            draw = ImageDraw.Draw(img)
-            draw.ellipse([20, 20, 180, 180], fill=color, outline='black', width=3)
-            img.save(os.path.join(output_dir, f"LURE_{pair_num}.png"))
+_SHAPE_SIZE = 200  # px; shape spans 20..180 with a 3 px black outline on a lightgray ground
+_SHAPE_GROUND = np.array([211, 211, 211], dtype=np.float32) / 255.0  # 'lightgray'
+_generated_stimuli = {}  # virtual path -> (shape, rgb in 0..1)
+_shape_masks = {}  # shape -> (fill mask, outline mask), built on first use
+
+def _get_shape_masks(shape):
+    """Boolean (fill, outline) masks for 'circle' or 'square', computed once per shape."""
+    if shape not in _shape_masks:
+        yy, xx = np.mgrid[0:_SHAPE_SIZE, 0:_SHAPE_SIZE]
+        if shape == 'circle':
+            d = np.hypot(xx + 0.5 - _SHAPE_SIZE / 2.0, yy + 0.5 - _SHAPE_SIZE / 2.0)
+            inside, outline = d <= 80.5, d > 77.5
         else:
-            # Normal: circle is studied item, square is lure
-            # Create studied item (circle)
-            img = Image.new('RGB', (200, 200), color='lightgray')
-            draw = ImageDraw.Draw(img)
-            draw.ellipse([20, 20, 180, 180], fill=color, outline='black', width=3)
-            img.save(os.path.join(output_dir, f"IMAGE_{pair_num}.png"))
-            
-            # Create lure (square)
-            img = Image.new('RGB', (200, 200), color='lightgray')
-            draw = ImageDraw.Draw(img)
-            draw.rectangle([20, 20, 180, 180], fill=color, outline='black', width=3)
-            img.save(os.path.join(output_dir, f"LURE_{pair_num}.png"))
-    
-    print(f"✓ Generated {num_stimuli} placeholder stimuli in {output_dir}/")
-    print(f"  - {num_to_swap} pairs swapped (squares=studied, circles=lures)")
-    print(f"  - {num_stimuli - num_to_swap} pairs normal (circles=studied, squares=lures)")
+            edge = np.minimum(np.minimum(xx - 20, 180 - xx), np.minimum(yy - 20, 180 - yy))
+            inside, outline = edge >= 0, edge < 3
+        _shape_masks[shape] = (inside, inside & outline)
+    return _shape_masks[shape]
+
+def _render_generated(path):
+    """Image array (H, W, 3) in PsychoPy's -1..1 range for a registered generated stimulus."""
+    shape, rgb = _generated_stimuli[path]
+    fill, outline = _get_shape_masks(shape)
+    img = np.empty((_SHAPE_SIZE, _SHAPE_SIZE, 3), dtype=np.float32)
+    img[:] = _SHAPE_GROUND
+    img[fill] = rgb
+    img[outline] = 0.0
+    return img * 2.0 - 1.0
+
+def register_placeholder_stimuli(num_stimuli=100, output_dir="PLACEHOLDERS"):
+    """Register placeholder pairs: circles (studied) and squares (lures), with a seeded 50% of pairs swapped."""
+    i = np.arange(num_stimuli)
+    # Distinct colours: golden-angle hues, HSV -> RGB for all pairs at once (truncated to 8 bit like a PNG)
+    h = (i * 137.508) % 360 / 60.0
+    s = 0.7 + (i % 3) * 0.1
+    v = 0.6 + (i % 2) * 0.3
+    k = (np.array([5.0, 3.0, 1.0]) + h[:, None]) % 6
+    rgb = v[:, None] - v[:, None] * s[:, None] * np.clip(np.minimum(k, 4 - k), 0, 1)
+    rgb = (np.floor(rgb * 255) / 255.0).astype(np.float32)
+    rng = np.random.default_rng(int(os.environ.get('PLACEHOLDER_SEED', '0')))
+    swapped = set(rng.choice(np.arange(1, num_stimuli + 1), num_stimuli // 2, replace=False).tolist())
+    for idx in range(num_stimuli):
+        pair_num = idx + 1
+        studied, lure = ('square', 'circle') if pair_num in swapped else ('circle', 'square')
+        _generated_stimuli[os.path.join(output_dir, f"IMAGE_{pair_num}.png")] = (studied, rgb[idx])
+        _generated_stimuli[os.path.join(output_dir, f"LURE_{pair_num}.png")] = (lure, rgb[idx])
+    print(f"✓ Placeholder stimuli: {num_stimuli} pairs in memory ({len(swapped)} swapped: squares=studied, circles=lures)")
+
+def register_practice_shapes(output_dir="PLACEHOLDERS"):
+    """Register the practice shapes (they replace placeholders 1-3). Returns the green circle, red circle,
+    blue circle (encoding) and blue square (trial 3 lure) paths."""
+    shapes = [("IMAGE_1.png", 'circle', (0, 128, 0)), ("IMAGE_2.png", 'circle', (255, 0, 0)),
+              ("IMAGE_3_CIRCLE.png", 'circle', (0, 0, 255)), ("IMAGE_3.png", 'square', (0, 0, 255))]
+    paths = []
+    for name, shape, rgb in shapes:
+        path = os.path.join(output_dir, name)
+        _generated_stimuli[path] = (shape, np.array(rgb, dtype=np.float32) / 255.0)
+        paths.append(path)
+    return paths
 
 # =========================
 #  LOAD REAL STIMULI
@@ -1210,205 +2463,916 @@ def assign_stimuli_to_blocks():
     
     return blocks
 
-# Generate practice shapes first
-generate_practice_shapes(PLACEHOLDER_DIR)
-
-# Generate placeholders if they don't exist (for practice block)
-# Skip generation if placeholders already exist
-# Check if directory exists and has the right number of files
-placeholder_files = []
-if os.path.exists(PLACEHOLDER_DIR):
-    placeholder_files = [f for f in os.listdir(PLACEHOLDER_DIR) if f.endswith('.png')]
-
-if not os.path.exists(PLACEHOLDER_DIR) or len(placeholder_files) < 200:
-    print("Generating placeholder stimuli...")
-    # Remove old files if they exist
-    if os.path.exists(PLACEHOLDER_DIR):
-        for f in os.listdir(PLACEHOLDER_DIR):
-            if f.endswith('.png'):
-                try:
-                    os.remove(os.path.join(PLACEHOLDER_DIR, f))
-                except:
-                    pass
-    generate_placeholder_stimuli(100, PLACEHOLDER_DIR)
-else:
-    print(f"Placeholder stimuli already exist ({len(placeholder_files)} files). Skipping generation.")
-    # Verify that we have both circles and squares by checking a sample
-    # If all checked images are the same shape, regenerate
-    sample_indices = [1, 25, 50, 75]
-    all_same_shape = True
-    first_shape = None
-    
-    for i in sample_indices:
-        img_path = os.path.join(PLACEHOLDER_DIR, f"IMAGE_{i}.png")
-        if os.path.exists(img_path):
-            try:
-                from PIL import Image as PILImage
-                img = PILImage.open(img_path)
-                pixels = img.load()
-                width, height = img.size
-                
-                # Quick check: compare corner to center
-                corner = pixels[10, 10]
-                center = pixels[width//2, height//2]
-                
-                def rgb_avg(rgb):
-                    if isinstance(rgb, int):
-                        return rgb
-                    return sum(rgb[:3]) / len(rgb[:3]) if len(rgb) >= 3 else rgb
-                
-                corner_avg = rgb_avg(corner)
-                center_avg = rgb_avg(center)
-                diff = abs(corner_avg - center_avg)
-                is_square = diff < 100  # Square if corners similar to center
-                
-                if first_shape is None:
-                    first_shape = is_square
-                elif is_square != first_shape:
-                    all_same_shape = False
-                    break
-            except:
-                pass
-    
-    # If all samples are the same shape, regenerate (only if placeholders don't already exist)
-    if all_same_shape and first_shape is not None:
-        # Check if we have the expected number of files before regenerating
-        existing_files = [f for f in os.listdir(PLACEHOLDER_DIR) if f.endswith('.png')] if os.path.exists(PLACEHOLDER_DIR) else []
-        if len(existing_files) >= 200:
-            print("Placeholder stimuli already exist. Skipping shape verification regeneration.")
-        else:
-            print("Detected all images are the same shape. Regenerating with swap logic...")
-            if os.path.exists(PLACEHOLDER_DIR):
-                for f in os.listdir(PLACEHOLDER_DIR):
-                    if f.endswith('.png'):
-                        try:
-                            os.remove(os.path.join(PLACEHOLDER_DIR, f))
-                        except:
-                            pass
-            generate_placeholder_stimuli(100, PLACEHOLDER_DIR)
-
 # =========================
 #  BASIC VISUAL ELEMENTS
 # =========================
-print("="*60)
-print("STARTING BASIC VISUAL ELEMENTS CREATION")
-print("="*60)
-instr = None
-fixation = None
-feedback_txt = None
-mouse = None
-
-try:
-    print(f"Checking win before creating elements: win = {win}, type = {type(win)}")
-    if win is None:
-        raise RuntimeError("Cannot create visual elements - win is None")
-    
-    print(f"Window status: {win}, type: {type(win)}")
-    print("Creating instr...")
-    instr = visual.TextStim(win, text="", color='black', height=0.04*0.75*1.35, wrapWidth=1.5*0.75, pos=(0, 0))
-    print("instr created")
-    print("Creating fixation...")
-    fixation = visual.TextStim(win, text="+", color='black', height=0.08*0.75*1.35, pos=(0, 0))
-    print("fixation created")
-    print("Creating feedback_txt...")
-    feedback_txt = visual.TextStim(win, text="", color='black', height=0.04*0.75*1.35, pos=(0, 0))
-    print("feedback_txt created")
-    print("Creating mouse...")
-    mouse = event.Mouse(win=win)
-    print("mouse created")
-    print("Basic visual elements created successfully")
-    print("="*60)
-    print("BASIC VISUAL ELEMENTS CREATION SUCCESSFUL")
-    print("="*60)
-except Exception as e:
-    print("="*60)
-    print("EXCEPTION CAUGHT IN BASIC VISUAL ELEMENTS CREATION")
+instr = fixation = feedback_txt = mouse = None  # Created by Session.open() once the main window exists
+
+def _create_basic_visual_elements():
+    """Create instr, fixation, feedback_txt and mouse on the main window (exits on failure)."""
+    global instr, fixation, feedback_txt, mouse
     print("="*60)
-    print(f"ERROR creating basic visual elements: {e}")
-    print(f"Error type: {type(e).__name__}")
-    import traceback
-    traceback.print_exc()
+    print("STARTING BASIC VISUAL ELEMENTS CREATION")
     print("="*60)
-    print("Press Enter to exit...")
+    instr = None
+    fixation = None
+    feedback_txt = None
+    mouse = None
+
     try:
-        input()
+        print(f"Checking win before creating elements: win = {win}, type = {type(win)}")
+        if win is None:
+            raise RuntimeError("Cannot create visual elements - win is None")
+
+        print(f"Window status: {win}, type: {type(win)}")
+        print("Creating instr...")
+        instr = visual.TextStim(win, text="", color='black', height=0.04*0.75*1.35, wrapWidth=1.5*0.75, pos=(0, 0))
+        print("instr created")
+        print("Creating fixation...")
+        fixation = visual.TextStim(win, text="+", color='black', height=0.08*0.75*1.35, pos=(0, 0))
+        print("fixation created")
+        print("Creating feedback_txt...")
+        feedback_txt = visual.TextStim(win, text="", color='black', height=0.04*0.75*1.35, pos=(0, 0))
+        print("feedback_txt created")
+        print("Creating mouse...")
+        mouse = event.Mouse(win=win)
+        print("mouse created")
+        print("Basic visual elements created successfully")
+        print("="*60)
+        print("BASIC VISUAL ELEMENTS CREATION SUCCESSFUL")
+        print("="*60)
+    except Exception as e:
+        print("="*60)
+        print("EXCEPTION CAUGHT IN BASIC VISUAL ELEMENTS CREATION")
+        print("="*60)
+        print(f"ERROR creating basic visual elements: {e}")
+        print(f"Error type: {type(e).__name__}")
+        traceback.print_exc()
+        print("="*60)
+        print("Press Enter to exit...")
+        try:
+            input()
+        except:
+            pass
+        if win is not None:
+            try:
+                win.close()
+            except Exception as e:
+                print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
+                traceback.print_exc()
+        try:
+            core.quit()
+        except:
+            pass
+        exit(1)
+    except SystemExit:
+        print("SystemExit caught in visual elements creation")
+        raise
     except:
+        print("="*60)
+        print("UNKNOWN EXCEPTION CAUGHT IN BASIC VISUAL ELEMENTS CREATION")
+        print("="*60)
+        traceback.print_exc()
+        print("="*60)
+        if win is not None:
+            try:
+                win.close()
+            except Exception as e:
+                print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
+                traceback.print_exc()
+        print("Press Enter to exit...")
+        try:
+            input()
+        except:
+            pass
+        try:
+            core.quit()
+        except:
+            pass
+        exit(1)
+
+def get_log_directory():
+    """Get the directory for log files - always saves to ../LOG_FILES"""
+    log_dir = "../LOG_FILES"
+    # Create directory if it doesn't exist
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+    return log_dir
+
+def is_test_participant(participant_id):
+    """Check if participant ID contains 'test' (case-insensitive)"""
+    if participant_id is None:
+        return False
+    return "test" in participant_id.lower()
+
+# =========================
+#  HELPER FUNCTIONS
+# =========================
+def safe_wait(duration):
+    """Wrapper for core.wait() that handles macOS event dispatch errors (e.g. NSTrackingArea/NSConcreteNotification has no attribute 'type')"""
+    try:
+        core.wait(duration)
+    except AttributeError as e:
+        err_str = str(e)
+        # Known macOS/pyglet Cocoa event dispatch issues - skip and continue
+        if ("type" in err_str and ("ObjCInstance" in err_str or "NSConcreteNotification" in err_str or "NSTrackingArea" in err_str)):
+            pass
+        else:
+            raise
+    except Exception:
+        # Ignore other non-critical wait errors
         pass
-    if win is not None:
+
+# =========================
+#  INPUT EVENT QUEUE
+# =========================
+# Window-system callbacks push every tap/click and key press into these queues with the wall-clock time
+# (time.time()) at which the event was dispatched to the handler. Response screens consume the queues, so
+# RTs and click times come from event dispatch rather than from whichever polling pass noticed the change.
+# Events are only dispatched when the window's event loop is pumped: ~1 ms apart while _input_wait() idles, but
+# not during draw() / flip(), so an event arriving mid-frame is stamped late by the rest of that draw/flip
+# (a few ms on BufferImageStim screens and photodiode flashes). The OS event time is not used.
+_pointer_events = deque(maxlen=256)  # ('press' | 'motion', t, x, y) in window 'height' units
+_key_events = deque(maxlen=256)  # (key_name, t)
+_input_queue_active = [False]  # True once handlers are installed on the main window
+_TAP_MOTION_GRACE_S = 0.05  # Cursor-only touch drivers: a move with no press within this window counts as a tap
+
+def _install_input_queue(window):
+    """Push pyglet handlers on window that feed _pointer_events/_key_events. Falls back to polling if unavailable."""
+    _start_response_pad()  # Optional Cedrus response pad (RESPONSE_PAD=cedrus)
+    if USE_TOUCH_SCREEN:
+        _start_evdev_touch_reader(window)  # Optional kernel-timestamped touch taps (TOUCH_INPUT_BACKEND=evdev)
+    else:
+        _start_keyboard_backend()  # Background key buffer with press/release times
+    handle = getattr(window, 'winHandle', None)
+    if handle is None or not hasattr(handle, 'push_handlers'):
+        print("Warning: Window backend has no event handlers - input falls back to polling", file=sys.stderr)
+        return False
+    try:
+        from pyglet.window import key as pyglet_key
+    except Exception as e:
+        print(f"Warning: Could not import pyglet key map ({e}) - input falls back to polling", file=sys.stderr)
+        return False
+
+    def _to_height_units(x, y):
+        w, h = float(handle.width), float(handle.height)
+        return (x - w / 2.0) / h, (y - h / 2.0) / h
+
+    def on_mouse_press(x, y, button, modifiers):
+        if _evdev_active[0]:
+            return  # evdev reader supplies the taps; the emulated mouse press would duplicate them
+        hx, hy = _to_height_units(x, y)
+        _pointer_events.append(('press', time.time(), hx, hy))
+
+    def on_mouse_motion(x, y, dx, dy):
+        if _evdev_active[0]:
+            return
+        hx, hy = _to_height_units(x, y)
+        _pointer_events.append(('motion', time.time(), hx, hy))
+
+    def on_mouse_drag(x, y, dx, dy, buttons, modifiers):
+        on_mouse_motion(x, y, dx, dy)
+
+    def on_key_press(symbol, modifiers):
+        name = pyglet_key.symbol_string(symbol).lower()
+        if name.startswith('_') and name[1:].isdigit():
+            name = name[1:]  # pyglet '_1' -> psychopy '1'
+        _key_events.append((name, time.time()))
+
+    def on_expose():
+        _screen_dirty[0] = True  # Window contents were lost (uncovered/restored): draw-on-change screens must redraw
+
+    def on_resize(width, height):
+        _screen_dirty[0] = True
+
+    # Handlers return None so PsychoPy's own handlers (event.getKeys, Mouse) still see every event
+    handle.push_handlers(on_mouse_press=on_mouse_press, on_mouse_motion=on_mouse_motion,
+                         on_mouse_drag=on_mouse_drag, on_key_press=on_key_press,
+                         on_expose=on_expose, on_resize=on_resize)
+    _input_queue_active[0] = True
+    return True
+
+def _pump_window_events():
+    """Dispatch pending window-system events so queued input gets its arrival time now."""
+    try:
+        win.winHandle.dispatch_events()
+    except Exception:
+        pass  # Includes macOS NSTrackingArea/NSConcreteNotification dispatch errors (see safe_wait)
+
+def _clear_input_events():
+    """Drop queued input (call at screen onset, together with event.clearEvents())."""
+    _pointer_events.clear()
+    _key_events.clear()
+    if _keyboard_ref[0] is not None:
         try:
-            win.close()
-        except Exception as e:
-            print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
-            traceback.print_exc()
+            _keyboard_ref[0].getKeys(waitRelease=False, clear=True)  # Not clearEvents(): keeps release tracking of logged presses
+        except Exception:
+            pass
+
+def _input_wait(duration):
+    """Replacement for core.wait() in response loops: sleep while pumping window events every ~1 ms."""
+    if not _input_queue_active[0]:
+        safe_wait(duration)
+        return
+    end = time.perf_counter() + duration
+    while True:
+        _pump_window_events()
+        remaining = end - time.perf_counter()
+        if remaining <= 0:
+            break
+        time.sleep(min(0.001, remaining))
+
+def _next_tap(tap_state):
+    """Next touch/click as (x, y, t), or None. tap_state = {'mouse': event.Mouse, 'last': (x, y)} for the polling fallback.
+    
+    Queue path: a press is a tap; a cursor move with no press within _TAP_MOTION_GRACE_S is also a tap (touch drivers
+    that only move the cursor), time-stamped at the move. Repeated taps on the same spot are seen. Fallback path (no
+    queue): position-change detection, time-stamped when noticed. With the evdev reader, taps are touch-downs.
+    """
+    if not (_input_queue_active[0] or _evdev_active[0]):
+        try:
+            pos = tap_state['mouse'].getPos()
+            x, y = float(pos[0]), float(pos[1])
+        except Exception:
+            return None
+        if (x, y) == tap_state.get('last'):
+            return None
+        tap_state['last'] = (x, y)
+        return (x, y, time.time())
+    _pump_window_events()
+    now = time.time()
+    while _pointer_events:
+        kind, t, x, y = _pointer_events[0]
+        if kind == 'press':
+            _pointer_events.popleft()
+            return (x, y, t)
+        # Motion: defer until we know no press follows (the press carries the exact tap)
+        if any(k == 'press' and t2 - t <= _TAP_MOTION_GRACE_S for k, t2, _, _ in _pointer_events):
+            _pointer_events.popleft()
+            continue
+        if now - t < _TAP_MOTION_GRACE_S:
+            return None
+        _pointer_events.popleft()
+        return (x, y, t)
+    return None
+
+class HitRegistry:
+    """Per-screen hit-test table. Widgets register a rectangle (centre, size, extra margins) once; hit(x, y) returns
+    the name of the first registered widget containing the point, so registration order is priority (exit first)."""
+    def __init__(self):
+        self._bounds = []  # (name, x0, x1, y0, y1) precomputed so a lookup is only comparisons
+
+    def add(self, name, pos, width, height, margin_x=0.0, margin_y=0.0):
+        x, y = float(pos[0]), float(pos[1])
+        hw, hh = float(width) / 2.0 + margin_x, float(height) / 2.0 + margin_y
+        self._bounds.append((name, x - hw, x + hw, y - hh, y + hh))
+        return self
+
+    def add_exit(self):
+        """Exit button (top-right), with the enlarged touch margin every screen uses."""
+        return self.add('exit', EXIT_BTN_POS, 0.12, 0.04, EXIT_HIT_MARGIN, EXIT_HIT_MARGIN)
+
+    def add_button(self, name, stim, touch_margin=True):
+        """Register a visual.Rect button. touch_margin widens the hit area by half the button size (at least 0.08 x 0.04)."""
+        width, height = float(stim.width), float(stim.height)
+        if touch_margin:
+            return self.add(name, stim.pos, width, height, max(width * 0.5, 0.08), max(height * 0.5, 0.04))
+        return self.add(name, stim.pos, width, height)
+
+    def hit(self, x, y):
+        for name, x0, x1, y0, y1 in self._bounds:
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                return name
+        return None
+
+    def hit_all(self, x, y):
+        """Names of every widget containing the point (for screens where hit areas overlap on purpose)."""
+        return [name for name, x0, x1, y0, y1 in self._bounds if x0 <= x <= x1 and y0 <= y <= y1]
+
+def _next_hit(registry, tap_state):
+    """Shared touch/mouse dispatch: next queued tap resolved against registry, as (widget name or None, x, y, t), or None."""
+    tap = _next_tap(tap_state)
+    if tap is None:
+        return None
+    x, y, t = tap
+    return (registry.hit(x, y), x, y, t)
+
+def _get_keys_timed(key_list):
+    """Like event.getKeys(keyList=key_list) but returns [(key, t), ...] with t = press time (time.time() clock)."""
+    kb = _keyboard_ref[0]
+    if kb is not None:
+        try:
+            presses = kb.getKeys(keyList=key_list, waitRelease=False, clear=True)
+        except Exception:
+            presses = []
+        try:
+            event.getKeys(keyList=key_list)  # Keep PsychoPy's window-event copy of these keys drained
+        except Exception:
+            pass
+        remaining = [(k, t) for k, t in _key_events if k not in key_list]
+        _key_events.clear()
+        _key_events.extend(remaining)
+        offset = time.time() - core.getTime()  # KeyPress.tDown is on PsychoPy's clock
+        hits = []
+        for press in presses:
+            t = press.tDown + offset
+            _recent_key_presses.append((press.name, t, press))
+            hits.append((press.name, t))
+        return hits
+    if not _input_queue_active[0]:
+        try:
+            keys = event.getKeys(keyList=key_list, timeStamped=True)
+        except Exception:
+            return []
+        offset = time.time() - core.getTime()  # PsychoPy stamps on its own clock
+        return [(k, t + offset) for k, t in keys]
     try:
-        core.quit()
-    except:
+        event.getKeys(keyList=key_list)  # Pumps events into the queue and drains PsychoPy's copy of the same keys
+    except Exception:
         pass
-    exit(1)
-except SystemExit:
-    print("SystemExit caught in visual elements creation")
-    raise
-except:
-    print("="*60)
-    print("UNKNOWN EXCEPTION CAUGHT IN BASIC VISUAL ELEMENTS CREATION")
-    print("="*60)
-    import traceback
-    traceback.print_exc()
-    print("="*60)
-    if win is not None:
+    hits = [(k, t) for k, t in _key_events if k in key_list]
+    if hits:
+        remaining = [(k, t) for k, t in _key_events if k not in key_list]
+        _key_events.clear()
+        _key_events.extend(remaining)
+    return hits
+
+def _first_key_time(timed_keys, key_name):
+    """Arrival time of the first key_name in a _get_keys_timed() result, or None."""
+    for k, t in timed_keys:
+        if k == key_name:
+            return t
+    return None
+
+# =========================
+#  EVDEV TOUCH READER (Linux)
+# =========================
+# Optional touch backend for Linux stations: TOUCH_INPUT_BACKEND=evdev reads the touchscreen's raw kernel events on a
+# dedicated thread and queues each touch-down as a tap stamped with the kernel event time (CLOCK_REALTIME, same clock
+# as time.time()). Same-spot taps are seen and no frame of latency is added. Requires python-evdev and read access to
+# /dev/input/event*; otherwise the window-event queue above is used. TOUCH_EVDEV_DEVICE picks a device (default: first
+# with touch axes), e.g. a uinput virtual device for testing. TOUCH_EVDEV_REPLAY=<evemu-record file> replays a recording.
+_touch_backend_name = os.environ.get('TOUCH_INPUT_BACKEND', '').strip().lower()
+_evdev_device_path = os.environ.get('TOUCH_EVDEV_DEVICE', '').strip() or None
+_evdev_replay_path = os.environ.get('TOUCH_EVDEV_REPLAY', '').strip() or None
+_evdev_active = [False]  # True while the reader thread feeds _pointer_events (window pointer events are then ignored)
+_evdev_thread_ref = [None]
+# Linux input-event codes (linux/input-event-codes.h); kept local so recordings decode without python-evdev
+_EV_SYN, _EV_KEY, _EV_ABS = 0x00, 0x01, 0x03
+_SYN_REPORT = 0x00
+_BTN_TOUCH = 0x14a
+_ABS_X, _ABS_Y = 0x00, 0x01
+_ABS_MT_POSITION_X, _ABS_MT_POSITION_Y, _ABS_MT_TRACKING_ID = 0x35, 0x36, 0x39
+
+class EvdevTapDecoder:
+    """Turns a stream of raw evdev events into taps (x, y, t) in window 'height' units.
+    
+    Handles single-touch (BTN_TOUCH + ABS_X/Y) and multi-touch type B (ABS_MT_*) devices; only the first contact
+    of a touch counts. A tap is emitted on the SYN_REPORT that completes the touch-down frame, with that frame's
+    kernel timestamp.
+    """
+    def __init__(self, x_range, y_range, aspect):
+        self.x_min, self.x_max = x_range
+        self.y_min, self.y_max = y_range
+        self.aspect = aspect  # window width / height
+        self.x = (self.x_min + self.x_max) / 2.0
+        self.y = (self.y_min + self.y_max) / 2.0
+        self.touching = False
+        self.down_pending = False
+
+    def feed(self, t, ev_type, code, value):
+        """Feed one event; returns (x, y, t) when a tap completes, else None."""
+        if ev_type == _EV_ABS:
+            if code in (_ABS_X, _ABS_MT_POSITION_X):
+                self.x = value
+            elif code in (_ABS_Y, _ABS_MT_POSITION_Y):
+                self.y = value
+            elif code == _ABS_MT_TRACKING_ID:
+                if value >= 0 and not self.touching:
+                    self.touching = True
+                    self.down_pending = True
+                elif value < 0:
+                    self.touching = False
+        elif ev_type == _EV_KEY and code == _BTN_TOUCH:
+            if value and not self.touching:
+                self.touching = True
+                self.down_pending = True
+            elif not value:
+                self.touching = False
+        elif ev_type == _EV_SYN and code == _SYN_REPORT and self.down_pending:
+            self.down_pending = False
+            nx = (self.x - self.x_min) / float(max(1, self.x_max - self.x_min))
+            ny = (self.y - self.y_min) / float(max(1, self.y_max - self.y_min))
+            return ((nx - 0.5) * self.aspect, 0.5 - ny, t)  # Panel y grows downward; window y grows upward
+        return None
+
+def _read_evemu_recording(path):
+    """Parse an evemu-record file. Returns ({axis_code: (min, max)}, [(t, type, code, value), ...])."""
+    axes, events = {}, []
+    with open(path) as f:
+        for line in f:
+            parts = line.split('#', 1)[0].split()
+            if len(parts) >= 4 and parts[0] == 'A:':
+                axes[int(parts[1].rstrip(':'), 16)] = (int(parts[2]), int(parts[3]))
+            elif len(parts) >= 5 and parts[0] == 'E:':
+                events.append((float(parts[1]), int(parts[2], 16), int(parts[3], 16), int(parts[4])))
+    return axes, events
+
+def _window_aspect(window):
+    try:
+        w, h = window.size
+        return float(w) / float(h)
+    except Exception:
+        return 16.0 / 9.0
+
+def _find_evdev_touch_device():
+    """Open TOUCH_EVDEV_DEVICE, or the first input device reporting touch position axes. Returns an evdev.InputDevice or None."""
+    import evdev
+    paths = [_evdev_device_path] if _evdev_device_path else evdev.list_devices()
+    for path in paths:
         try:
-            win.close()
+            dev = evdev.InputDevice(path)
+            abs_codes = [c for c, _ in dev.capabilities().get(_EV_ABS, [])]
+            if (_ABS_MT_POSITION_X in abs_codes or _ABS_X in abs_codes) and (_evdev_device_path or _BTN_TOUCH in dev.capabilities().get(_EV_KEY, []) or _ABS_MT_TRACKING_ID in abs_codes):
+                return dev
+            dev.close()
+        except Exception:
+            continue
+    return None
+
+def _evdev_reader_loop(dev, decoder):
+    """Reader thread: block on the device and queue taps with their kernel timestamps."""
+    try:
+        for ev in dev.read_loop():
+            tap = decoder.feed(ev.timestamp(), ev.type, ev.code, ev.value)
+            if tap is not None:
+                x, y, t = tap
+                _pointer_events.append(('press', t, x, y))
+    except Exception as e:
+        _evdev_active[0] = False  # Device gone (unplugged) - fall back to window pointer events
+        print(f"⚠ evdev touch reader stopped ({e}) - falling back to window pointer events", file=sys.stderr)
+        sys.stderr.flush()
+
+def _evdev_replay_loop(axes, events, decoder):
+    """Replay thread: re-emit a recording in real time, re-based so its first event happens now."""
+    if not events:
+        return
+    offset = time.time() - events[0][0]
+    for t, ev_type, code, value in events:
+        delay = (t + offset) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        tap = decoder.feed(t + offset, ev_type, code, value)
+        if tap is not None:
+            x, y, tt = tap
+            _pointer_events.append(('press', tt, x, y))
+
+def _start_evdev_touch_reader(window):
+    """Start the evdev (or replay) reader thread if TOUCH_INPUT_BACKEND=evdev. Returns True if it is running."""
+    if _touch_backend_name != 'evdev' or _evdev_thread_ref[0] is not None:
+        return _evdev_active[0]
+    aspect = _window_aspect(window)
+    if _evdev_replay_path:
+        try:
+            axes, events = _read_evemu_recording(_evdev_replay_path)
         except Exception as e:
-            print(f"ERROR calling win.close(): {repr(e)}", file=sys.stderr)
-            traceback.print_exc()
-    print("Press Enter to exit...")
+            print(f"⚠ Could not read evdev recording {_evdev_replay_path}: {e}", file=sys.stderr)
+            return False
+        x_range = axes.get(_ABS_MT_POSITION_X, axes.get(_ABS_X, (0, 4095)))
+        y_range = axes.get(_ABS_MT_POSITION_Y, axes.get(_ABS_Y, (0, 4095)))
+        target, args, source = _evdev_replay_loop, (axes, events, EvdevTapDecoder(x_range, y_range, aspect)), _evdev_replay_path
+    else:
+        try:
+            import evdev  # noqa: F401 - optional dependency (Linux only)
+        except ImportError:
+            print("⚠ TOUCH_INPUT_BACKEND=evdev but python-evdev is not installed - using window pointer events", file=sys.stderr)
+            return False
+        dev = _find_evdev_touch_device()
+        if dev is None:
+            print("⚠ No evdev touch device found (check TOUCH_EVDEV_DEVICE and /dev/input permissions) - using window pointer events", file=sys.stderr)
+            return False
+        absinfo = dict(dev.capabilities(absinfo=True).get(_EV_ABS, []))
+        def _range(*codes):
+            for c in codes:
+                if c in absinfo:
+                    return (absinfo[c].min, absinfo[c].max)
+            return (0, 4095)
+        decoder = EvdevTapDecoder(_range(_ABS_MT_POSITION_X, _ABS_X), _range(_ABS_MT_POSITION_Y, _ABS_Y), aspect)
+        target, args, source = _evdev_reader_loop, (dev, decoder), f"{dev.path} ({dev.name})"
+    _evdev_active[0] = True
+    t = threading.Thread(target=target, args=args, name="evdev-touch", daemon=True)
+    _evdev_thread_ref[0] = t
+    t.start()
+    print(f"✓ Touch input: evdev reader on {source} (kernel timestamps)", file=sys.stderr)
+    sys.stderr.flush()
+    return True
+
+# =========================
+#  KEYBOARD BACKEND
+# =========================
+# Keyboard mode reads keys from PsychoPy's psychtoolbox keyboard (psychopy.hardware.keyboard), which buffers key
+# events on a background thread with per-press down times and release durations. KEYBOARD_BACKEND=event keeps the
+# window-event queue only (also the fallback when psychtoolbox is unavailable). Every keyboard response is logged
+# to _key_responses and appended to the *_key_responses CSV as it happens (flush + fsync per write, like the TTL
+# log): a key_down row per press, and a key_up row once the keyboard backend has reported the release.
+_keyboard_backend_name = os.environ.get('KEYBOARD_BACKEND', 'ptb').strip().lower()
+_keyboard_ref = [None]  # psychopy.hardware.keyboard.Keyboard while the ptb backend is running
+_recent_key_presses = deque(maxlen=64)  # (key, t, KeyPress) returned by _get_keys_timed, for release lookup
+_key_responses = []  # [{"screen": str, "key": str, "key_down": t, "_press": KeyPress or None, "_down_written": bool, "_up_written": bool}, ...]
+_KEY_RESPONSE_FIELDNAMES = ['event', 'screen', 'key', 'key_down', 'key_up', 'key_duration']
+_key_file_ref = [None]  # Open key-response CSV (set at session start)
+_key_writer_ref = [None]  # csv.DictWriter for incremental key-response writes
+_key_file_path_ref = [None]
+
+def _start_keyboard_backend():
+    """Start the psychtoolbox keyboard buffer. Returns True if key times now come from it."""
+    if _keyboard_backend_name != 'ptb' or _keyboard_ref[0] is not None or _RENDER_BENCHMARK:
+        return _keyboard_ref[0] is not None  # Render benchmark: emulated keys only reach the window-event queue
     try:
-        input()
-    except:
+        from psychopy.hardware import keyboard
+        if not getattr(keyboard, 'havePTB', False):
+            raise ImportError("psychtoolbox is not installed")
+        kb = keyboard.Keyboard()
+        kb.clearEvents()
+        _keyboard_ref[0] = kb
+        print("✓ Keyboard input: psychtoolbox key buffer (press and release times)", file=sys.stderr)
+        sys.stderr.flush()
+        return True
+    except Exception as e:
+        print(f"⚠ psychtoolbox keyboard unavailable ({e}) - key times come from window events", file=sys.stderr)
+        sys.stderr.flush()
+        return False
+
+def _log_key_response(screen, key_name, key_down):
+    """Record a key press (key_down from _get_keys_timed()) as the response for screen and append it to the key-response CSV."""
+    if key_down is None:
+        return
+    press = next((p for k, t, p in _recent_key_presses if k == key_name and t == key_down), None)
+    _key_responses.append({"screen": screen, "key": key_name, "key_down": key_down, "_press": press,
+                           "_down_written": False, "_up_written": False})
+    _write_key_responses()
+
+def _pending_key_rows():
+    """key_down rows not yet written, and key_up rows for presses whose release the backend has now reported."""
+    kb = _keyboard_ref[0]
+    if kb is not None:
+        try:
+            kb.getKeys(waitRelease=False, clear=False)  # Process pending releases into the KeyPress objects
+        except Exception:
+            pass
+    rows = []
+    for r in _key_responses:
+        base = {"screen": r["screen"], "key": r["key"], "key_down": f"{r['key_down']:.9f}", "key_up": "", "key_duration": ""}
+        if not r["_down_written"]:
+            rows.append(dict(base, event="key_down"))
+            r["_down_written"] = True
+        duration = getattr(r["_press"], 'duration', None)
+        if not r["_up_written"] and isinstance(duration, (int, float)):
+            rows.append(dict(base, event="key_up", key_up=f"{r['key_down'] + duration:.9f}", key_duration=f"{duration:.6f}"))
+            r["_up_written"] = True
+    return rows
+
+def _write_key_responses():
+    """Append pending key rows to the open key-response CSV (one flush + fsync per call). No-op until it is opened."""
+    if _key_writer_ref[0] is None or _key_file_ref[0] is None:
+        return
+    try:
+        rows = _pending_key_rows()
+        if not rows:
+            return
+        _key_writer_ref[0].writerows(rows)
+        _key_file_ref[0].flush()
+        try:
+            os.fsync(_key_file_ref[0].fileno())
+        except (AttributeError, OSError):
+            pass
+    except Exception as e:
+        print(f"Warning: Could not write key responses incrementally: {e}", file=sys.stderr)
+
+def _open_key_responses(path):
+    """Open the key-response CSV for incremental writes (session start); presses logged earlier are written at once."""
+    try:
+        _key_file_ref[0] = open(path, 'w', newline='')
+        _key_writer_ref[0] = csv.DictWriter(_key_file_ref[0], fieldnames=_KEY_RESPONSE_FIELDNAMES)
+        _key_writer_ref[0].writeheader()
+        _key_file_ref[0].flush()
+        _key_file_path_ref[0] = path
+    except Exception as e:
+        print(f"Warning: Could not open key-response file for incremental writes: {e}", file=sys.stderr)
+        _key_file_ref[0] = _key_writer_ref[0] = None
+        return
+    _write_key_responses()
+
+def _close_key_responses():
+    """Write releases seen since the last press and close the key-response CSV (call at session end)."""
+    if _key_file_ref[0] is None:
+        return
+    _write_key_responses()
+    try:
+        _key_file_ref[0].close()
+    except Exception:
         pass
+    _key_file_ref[0] = _key_writer_ref[0] = None
+    print(f"✓ Key responses saved to {_key_file_path_ref[0]} ({len(_key_responses)} presses)")
+
+# =========================
+#  CEDRUS RESPONSE PAD
+# =========================
+# RESPONSE_PAD=cedrus adds a Cedrus response pad (RB-x40 etc., via pyxid2) as a response device for the switch/stay
+# decision, the localizer yes/no question and a discretized slider. Each screen resets the pad's RT timer at onset;
+# the pad time-stamps presses on its own millisecond clock, so RTs skip the OS input stack. Session times are the
+# timer-reset time (time.time() right after the reset command) plus the pad RT.
+_response_pad_mode = os.environ.get('RESPONSE_PAD', '').strip().lower()
+_pad_choice_keys = [int(k) for k in os.environ.get('RESPONSE_PAD_CHOICE_KEYS', '0,1').split(',')]  # left (STAY / YES), right (SWITCH / NO)
+_pad_slider_keys = [int(k) for k in os.environ.get('RESPONSE_PAD_SLIDER_KEYS', '0,1,2,3,4,5').split(',')]  # OLD ... NEW, evenly spaced
+_pad_submit_key = int(os.environ.get('RESPONSE_PAD_SUBMIT_KEY', '6'))
+_response_pad_ref = [None]  # pyxid2 device
+_pad_t0 = [None]  # time.time() when the pad RT timer was last reset
+_pad_reset_pending = [False]  # Screen-onset reset deferred because a Cedrus scan held the lock; done on the next poll
+
+def _start_response_pad():
+    """Open the first Cedrus response device if RESPONSE_PAD=cedrus. Returns True if the pad is in use.
+    Uses the pad found by TTL discovery (same enumeration), so the pad is never handed to the TTL backend."""
+    if _response_pad_mode != 'cedrus' or _response_pad_ref[0] is not None:
+        return _response_pad_ref[0] is not None
+    _start_ttl_discovery()
+    _ttl_discovery_done.wait(_ttl_discovery_wait_s)
+    pads = [_cedrus_pad_found[0]] if _cedrus_pad_found[0] is not None else []
+    _cedrus_pad_found[0] = None
+    if not pads:
+        try:
+            pads = _scan_cedrus_devices()[1]
+        except Exception as e:
+            print(f"⚠ Could not enumerate Cedrus devices for the response pad: {e}", file=sys.stderr)
+    if not pads:
+        print("⚠ RESPONSE_PAD=cedrus but no Cedrus response pad found - responses use touch/keyboard only", file=sys.stderr)
+        sys.stderr.flush()
+        return False
+    _response_pad_ref[0] = pads[0]
+    print(f"✓ Response pad: {pads[0]} (choices {_pad_choice_keys}, slider {_pad_slider_keys}, submit {_pad_submit_key})", file=sys.stderr)
+    sys.stderr.flush()
+    return True
+
+def _clear_response_pad(pad):
+    """Drop queued presses and zero the pad's RT timer (caller holds _cedrus_scan_lock)."""
+    _pad_reset_pending[0] = False
     try:
-        core.quit()
+        pad.clear_response_queue()
+        pad.reset_rt_timer()
+        _pad_t0[0] = time.time()
+    except Exception as e:
+        print(f"⚠ Response pad reset failed: {e}", file=sys.stderr)
+        _pad_t0[0] = None
+
+def _reset_response_pad():
+    """Call at response-screen onset: drop queued presses and zero the pad's RT timer. Never waits for a Cedrus
+    scan: if one holds the lock, the reset is retried by the next _next_pad_press poll (session times stay right,
+    as they are the reset time plus the pad RT)."""
+    pad = _response_pad_ref[0]
+    if pad is None:
+        return
+    _pad_t0[0] = None
+    if not _cedrus_scan_lock.acquire(blocking=False):
+        _pad_reset_pending[0] = True
+        return
+    try:
+        _clear_response_pad(pad)
+    finally:
+        _cedrus_scan_lock.release()
+
+def _next_pad_press(keys):
+    """Next press of one of keys since the last reset, as (key, rt, t) - rt on the pad clock, t = session time. Else None."""
+    pad = _response_pad_ref[0]
+    if pad is None or (_pad_t0[0] is None and not _pad_reset_pending[0]):
+        return None
+    if not _cedrus_scan_lock.acquire(blocking=False):
+        return None  # Watchdog re-scan in progress: presses stay buffered (with their pad RT) until the next poll
+    try:
+        if _pad_reset_pending[0]:
+            _clear_response_pad(pad)
+            if _pad_t0[0] is None:
+                return None
+        pad.poll_for_response()
+        while pad.has_response():
+            r = pad.get_next_response()
+            if r.get('pressed') and r.get('key') in keys:
+                rt = r['time'] / 1000.0
+                t = _pad_t0[0] + rt
+                return (r['key'], rt, t)
+            pad.poll_for_response()
+    except Exception as e:
+        print(f"⚠ Response pad read failed: {e}", file=sys.stderr)
+    finally:
+        _cedrus_scan_lock.release()
+    return None
+
+# =========================
+#  SCREEN ENGINE
+# =========================
+# Button screens (instructions, partner introductions and switches) declare their layers (stims or draw functions),
+# their CONTINUE button and their photodiode events; run_button_screen() owns the shared response loop. The frame is
+# drawn and flipped only when something changes - onset, the response flash, a TTL event queued elsewhere that needs
+# a flip to go out, or the window being exposed/resized. In between, the last frame stays on screen and the loop only
+# services input, stepping one refresh period at a time instead of re-rendering an identical frame every 10 ms.
+_screen_dirty = [False]  # Set by the window's expose/resize handlers: contents must be redrawn
+_exit_button_stims = [None]  # (rect, label) shared by every engine screen, created on first use
+
+def _draw_layers(layers):
+    """Draw layers in order. A layer is a stim (anything with .draw()) or a zero-argument draw function; None is skipped."""
+    for layer in layers:
+        if layer is None:
+            continue
+        if hasattr(layer, 'draw'):
+            layer.draw()
+        else:
+            layer()
+
+def _frame_period():
+    """Refresh period of the main window (measured by PsychoPy when available, else 60 Hz)."""
+    try:
+        period = float(getattr(win, 'monitorFramePeriod', None))
+    except (TypeError, ValueError):
+        period = None
+    return period if period and 0.002 < period < 0.05 else 1.0 / 60.0
+
+def _exit_button_layers():
+    if _exit_button_stims[0] is None:
+        _exit_button_stims[0] = (
+            visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height'),
+            _text("Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height'),
+        )
+    return list(_exit_button_stims[0])
+
+def run_button_screen(layers, button, onset_event="instruction_onset", response_event="instruction_continue", tap_pause=0.2):
+    """Show a static screen (layers + Exit button) until its CONTINUE button is tapped, or Space (touch mode backup) /
+    Return (keyboard mode) is pressed. Escape or Exit quits. Photodiode flashes at onset and at the response."""
+    layers = list(layers) + _exit_button_layers()
+    draw_content = lambda: _draw_layers(layers)
+    hits = HitRegistry().add_exit().add_button('continue', button)
+    response_key = 'space' if USE_TOUCH_SCREEN else 'return'
+    mouse_screen = event.Mouse(win=win)
+    mouse_screen.setVisible(True)
+    
+    _do_photodiode_flash(draw_content, event_type=onset_event)  # Onset: black (TTL), white
+    _clear_input_events()  # Taps from the previous screen must not count here
+    _screen_dirty[0] = False
+    tap_state = {'mouse': mouse_screen, 'last': None}
+    try:
+        pos = mouse_screen.getPos()
+        tap_state['last'] = (float(pos[0]), float(pos[1]))
     except:
         pass
-    exit(1)
+    idle_step = _frame_period()
+    
+    while True:
+        try:
+            # Draw on change only: the frame on screen is still valid unless the window lost it or a TTL is waiting for a flip
+            if _screen_dirty[0] or _photodiode_signal_next_flip[0]:
+                _screen_dirty[0] = False
+                draw_content()
+                win.flip()
+            if USE_TOUCH_SCREEN:
+                hit = _next_hit(hits, tap_state)
+                if hit is not None:
+                    if hit[0] == 'exit':
+                        core.quit()
+                    elif hit[0] == 'continue':
+                        _do_photodiode_flash(draw_content, event_type=response_event)  # Participant response: black (TTL), white
+                        core.wait(tap_pause)
+                        break
+                    continue  # Drain any further queued taps before idling
+            timed_keys = _get_keys_timed([response_key, 'escape'])
+            if _first_key_time(timed_keys, 'escape') is not None:
+                core.quit()
+            key_time = _first_key_time(timed_keys, response_key)
+            if key_time is not None:
+                if not USE_TOUCH_SCREEN:
+                    _log_key_response(response_event, response_key, key_time)
+                _do_photodiode_flash(draw_content, event_type=response_event)  # Participant response: black (TTL), white
+                break
+        except (AttributeError, RuntimeError, ValueError, TypeError) as e:
+            print(f"Warning: Error in button screen loop: {e}", file=sys.stderr)
+        _input_wait(idle_step)
+    
+    mouse_screen.setVisible(False)
+    event.clearEvents()
 
-def get_log_directory():
-    """Get the directory for log files - always saves to ../LOG_FILES"""
-    log_dir = "../LOG_FILES"
-    # Create directory if it doesn't exist
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    return log_dir
+# =========================
+#  STATIC LAYER CACHE
+# =========================
+# On the slider, partner-rating and switch/stay screens only the handle (and button highlights) change between
+# frames. _static_layers() renders everything else once per trial into a BufferImageStim, so each frame is one
+# textured quad plus the dynamic stims. STATIC_LAYER_CACHE=0 draws the layers individually instead.
+_static_layer_cache = [os.environ.get('STATIC_LAYER_CACHE', '1') != '0']
 
-def is_test_participant(participant_id):
-    """Check if participant ID contains 'test' (case-insensitive)"""
-    if participant_id is None:
-        return False
-    return "test" in participant_id.lower()
+def _static_layers(layers):
+    """Capture layers (stims, drawn in order; None skipped) into one buffered image and return its draw function.
+    Falls back to drawing the layers one by one if capture is off or fails (the first failure turns it off)."""
+    layers = [layer for layer in layers if layer is not None]
+    if _static_layer_cache[0] and layers:
+        try:
+            return visual.BufferImageStim(win, stim=layers).draw  # Renders to the back buffer, reads it back, clears it
+        except Exception as e:
+            _static_layer_cache[0] = False
+            print(f"⚠ Static layer capture unavailable ({e}) - drawing response screens layer by layer", file=sys.stderr)
+    return lambda: _draw_layers(layers)
 
 # =========================
-#  HELPER FUNCTIONS
+#  TEXT RENDER CACHE
 # =========================
-def safe_wait(duration):
-    """Wrapper for core.wait() that handles macOS event dispatch errors (e.g. NSTrackingArea/NSConcreteNotification has no attribute 'type')"""
+# visual.TextStim lays out glyphs and builds its texture when it is created, so building one right before a timed
+# flip puts that work on the critical path. _text() returns a cached stim per (string, style, wrap width) and only
+# renders strings it has not seen; _warm_text_cache() renders the fixed strings (labels, alerts, every possible trial
+# outcome) at startup. Cached stims are shared: callers may move them (pos is applied on every call) but must not
+# change their text or style.
+_text_cache = OrderedDict()  # key -> visual.TextStim, least recently used first
+_TEXT_CACHE_MAX = 256
+_TEXT_DEFAULT_HEIGHT = 0.04*0.75*1.35
+
+def _text(text, color='black', height=_TEXT_DEFAULT_HEIGHT, pos=(0, 0), wrapWidth=None, units=None):
+    """Cached visual.TextStim for this string and style, placed at pos."""
+    key = (text, str(color), round(float(height), 6), wrapWidth, units)
+    stim = _text_cache.get(key)
+    if stim is None:
+        kwargs = {}
+        if wrapWidth is not None:
+            kwargs['wrapWidth'] = wrapWidth
+        if units is not None:
+            kwargs['units'] = units
+        stim = visual.TextStim(win, text=text, color=color, height=height, pos=pos, **kwargs)
+        _text_cache[key] = stim
+        if len(_text_cache) > _TEXT_CACHE_MAX:
+            _text_cache.popitem(last=False)
+    else:
+        _text_cache.move_to_end(key)
+        stim.pos = pos
+    return stim
+
+# Fixed instruction and intro texts, shared by the screens that show them and _warm_text_cache()
+_WELCOME_TEXT_1 = ("Greetings!\n\n"
+                   "You've just joined Amy's photography studio. She's preparing images for an upcoming exhibition.\n\n"
+                   "Carly, her assistant, will walk you through a short practice to get familiar with the task.")
+_WELCOME_TEXT_2 = ("Before you begin the real work, you'll complete a short training round to get familiar with the process.\n\n"
+                   "For now, simply memorize the shapes you're about to see. Continue when you're ready to get started!")
+_AMY_INTRO_TEXT = ("Work with Amy to sort this collection.\n\n"
+                   "Sometimes she goes first, sometimes you do.")
+_STUDY_COMPLETE_TEXT = ("STUDYING COLLECTION IMAGES COMPLETE!\n\n"
+                        "Now switching to the sorting phase.\n\n"
+                        "You will see MORE images again and rate them with {partner_name}.")
+_TRAINING_COMPLETE_TEXT = ("Training complete!\n\n"
+                           "Now we'll begin the actual work.\n\n")
+_TASK_OVERVIEW_TEXT = ("Task Overview:\n"
+                       "Remember which photos belong in each collection.\n\n"
+                       "Rate each image: OLD (belongs) or NEW (doesn't belong).\n"
+                       "{slider_instruction}")
+_SLIDER_INSTRUCTION_KEYS = "Press LEFT/RIGHT arrow keys repeatedly (holding won't work), then Return to submit."
+_SLIDER_INSTRUCTION_TOUCH = "Click on the slider, then SUBMIT."
+_WORKING_WITH_AMY_TEXT = ("Working with Amy:\n"
+                          "Amy will also rate each photo. You can STAY with your answer or SWITCH to hers.\n\n"
+                          "You can switch even if you both agree, to match her confidence level.")
+_SCORING_TEXT = ("Scoring:\n"
+                 "Confidence matters. An in-house curator scores based on accuracy and confidence.\n\n"
+                 "10 collections, 10 images each. Time limit per decision.")
+_BREAK_TEXT = ("Great job!\n\n"
+               "Take a short break.\n\n")
+_NUM_BLOCKS = 10
+
+def _task_overview_text():
+    return _TASK_OVERVIEW_TEXT.format(slider_instruction=_SLIDER_INSTRUCTION_TOUCH if USE_TOUCH_SCREEN else _SLIDER_INSTRUCTION_KEYS)
+
+def _warm_text_cache():
+    """Render every fixed string once (and draw it, so the texture is on the GPU) before the task starts."""
+    t0 = time.time()
+    fixed = [
+        dict(text="CONTINUE"), dict(text="CONTINUE", height=0.04*1.35),
+        dict(text="Exit", color='darkred', height=0.025, units='height'),
+        dict(text="Time's up! A random answer was selected. This will be logged as an invalid trial.", color='red', height=0.06*0.75*1.35),
+        dict(text="Time's up! A random decision was selected.", color='red', height=0.06*1.35),
+        dict(text="Please select an answer first.", color='red'),
+    ]
+    for correct in (True, False):
+        for tenths in range(11):
+            outcome_text, outcome_color = _outcome_message(correct, tenths / 10.0)
+            fixed.append(dict(text=outcome_text, color=outcome_color, height=0.06*1.35, wrapWidth=1.4))
+    # Instruction screens (show_instructions), intro screens (wait_for_button / run_button_screen), block summary header
+    instructions = [(_STUDY_COMPLETE_TEXT.format(partner_name=name), 'darkblue') for name in ("Amy", "Jen")]
+    instructions += [(_TRAINING_COMPLETE_TEXT, 'darkgreen'), (_task_overview_text(), 'darkred'),
+                     (_WORKING_WITH_AMY_TEXT, 'darkred'), (_SCORING_TEXT, 'darkred'), (_BREAK_TEXT, 'darkgreen')]
+    for text, header_color in instructions:
+        fixed.extend(spec for spec in _instruction_specs(text, header_color=header_color) if spec)
+    fixed += [dict(text=_WELCOME_TEXT_1, wrapWidth=1.2), dict(text=_WELCOME_TEXT_2, wrapWidth=1.2),
+              dict(text=_AMY_INTRO_TEXT, wrapWidth=1.2), dict(text="Amy")]
+    fixed += [dict(text=f"Collection {n} Complete!", wrapWidth=1.2) for n in range(1, _NUM_BLOCKS + 1)]
     try:
-        core.wait(duration)
-    except AttributeError as e:
-        err_str = str(e)
-        # Known macOS/pyglet Cocoa event dispatch issues - skip and continue
-        if ("type" in err_str and ("ObjCInstance" in err_str or "NSConcreteNotification" in err_str or "NSTrackingArea" in err_str)):
-            pass
-        else:
-            raise
-    except Exception:
-        # Ignore other non-critical wait errors
-        pass
+        for spec in fixed:
+            _text(**spec).draw()
+        win.clearBuffer()  # Drawn only to upload the textures; nothing is flipped
+        print(f"✓ Text cache: {len(fixed)} fixed strings rendered in {(time.time() - t0) * 1000:.0f} ms")
+    except Exception as e:
+        print(f"⚠ Text cache warm-up incomplete: {e}", file=sys.stderr)
 
 def wait_for_button(redraw_func=None, button_text="CONTINUE", button_y=None):
     """Wait for button click/touch or Return key - button should be included in redraw_func. button_y: optional y position for button (default -0.4*0.6)."""
-    mouse = event.Mouse(win=win)
-    mouse.setVisible(True)
-    
     if button_y is None:
         button_y = -0.4*0.6
     display_button_text = button_text
@@ -1421,143 +3385,24 @@ def wait_for_button(redraw_func=None, button_text="CONTINUE", button_y=None):
         lineColor='black',
         pos=(0, button_y)
     )
-    continue_text = visual.TextStim(
-        win,
-        text=display_button_text,
-        color='black',
-        height=0.04*0.75*1.35,  # Reduced to ensure text fits within button
-        pos=(0, button_y)
-    )
-    
-    exit_btn = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
-    exit_text = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
+    continue_text = _text(display_button_text, height=0.04*0.75*1.35, pos=(0, button_y))  # Reduced to ensure text fits within button
     
-    # Draw initial screen once (button should be included in redraw_func). Photodiode: black then white.
-    first_draw_done = [False]  # List for closure
-    def draw_content():
+    def draw_instructions():
         if redraw_func:
             try:
                 redraw_func()
             except:
                 pass
-        continue_button.draw()
-        continue_text.draw()
-        exit_btn.draw()
-        exit_text.draw()
-    def draw_screen():
-        if not first_draw_done[0]:
-            _do_photodiode_flash(draw_content, event_type="instruction_onset")  # Instruction/continue onset: black (TTL), white
-            first_draw_done[0] = True
-        else:
-            draw_content()
-            win.flip()
-    
-    draw_screen()
-    
-    clicked = False
-    
-    if USE_TOUCH_SCREEN:
-        # Use keyboard method (position-change detection) for touch screens
-        mouserec = mouse.getPos()
-        try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-        except:
-            mouserec_x, mouserec_y = 0.0, 0.0
-        
-        while not clicked:
-            try:
-                mouseloc = mouse.getPos()
-                try:
-                    mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-                except:
-                    mouseloc_x, mouseloc_y = 0.0, 0.0
-                
-                # Check if mouse position has changed (touch moved) - keyboard method
-                if mouseloc_x != mouserec_x or mouseloc_y != mouseloc_y:
-                    # Position has changed - check if touch is within button using position calculation
-                    try:
-                        button_pos = continue_button.pos
-                        if hasattr(button_pos, '__len__') and len(button_pos) >= 2:
-                            button_x, button_y = float(button_pos[0]), float(button_pos[1])
-                        else:
-                            button_x, button_y = 0.0, button_y  # Use same y as button creation
-                    except (TypeError, ValueError):
-                        button_x, button_y = 0.0, button_y
-                    
-                    try:
-                        button_width = float(continue_button.width)
-                        button_height = float(continue_button.height)
-                    except (TypeError, ValueError):
-                        button_width, button_height = 0.3*0.75, 0.1*0.75
-                    
-                    # For touch screens, use larger hit area (at least button size, or larger)
-                    hit_margin_x = max(button_width * 0.5, 0.08)
-                    hit_margin_y = max(button_height * 0.5, 0.04)
-                    
-                    on_button = (button_x - button_width/2 - hit_margin_x <= mouseloc_x <= button_x + button_width/2 + hit_margin_x and
-                                button_y - button_height/2 - hit_margin_y <= mouseloc_y <= button_y + button_height/2 + hit_margin_y)
-                    on_exit = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                              EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                    
-                    if on_exit:
-                        core.quit()
-                    elif on_button:
-                        _do_photodiode_flash(draw_content, event_type="instruction_continue")  # Participant response: black (TTL), white
-                        core.wait(0.2)
-                        clicked = True
-                        break
-                    
-                    # Update recorded position
-                    mouserec = mouse.getPos()
-                    try:
-                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                    except:
-                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                
-                # Redraw once per iteration (avoids double-flip that could cause flicker)
-                draw_screen()
-                core.wait(0.016)  # ~60 Hz polling
-            except Exception:
-                pass
-            
-            # Safe event.getKeys() handling
-            try:
-                keys = event.getKeys(keyList=['space', 'escape'], timeStamped=False)
-                if keys:
-                    if 'space' in keys:
-                        _do_photodiode_flash(draw_content, event_type="instruction_continue")  # Participant response: black (TTL), white
-                        clicked = True
-                        break
-                    elif 'escape' in keys:
-                        core.quit()
-            except (AttributeError, Exception):
-                pass
-    else:
-        # Keyboard mode: wait for Return key press (no mouse)
-        while not clicked:
-            draw_screen()
-            try:
-                keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
-                if keys:
-                    if 'return' in keys:
-                        _do_photodiode_flash(draw_content, event_type="instruction_continue")  # Participant response: black (TTL), white
-                        clicked = True
-                        break
-                    elif 'escape' in keys:
-                        core.quit()
-            except (AttributeError, Exception):
-                pass
-            safe_wait(0.01)
     
-    mouse.setVisible(False)
-    event.clearEvents()
+    run_button_screen([draw_instructions, continue_button, continue_text], continue_button,
+                      onset_event="instruction_onset", response_event="instruction_continue")
 
 def wait_for_space(redraw_func=None):
     """Wait for button click (replaces space key press)"""
     wait_for_button(redraw_func=redraw_func)
 
-def show_instructions(text, header_color='darkblue', body_color='black', header_size=0.07*1.35, body_size=0.045*1.35):
-    """Show instructions with formatted header and body text, with continue button"""
+def _instruction_specs(text, header_color='darkblue', body_color='black', header_size=0.07*1.35, body_size=0.045*1.35):
+    """_text() arguments for an instruction screen: (header spec or None, body spec). Shared with _warm_text_cache()."""
     # Split text into lines
     lines = text.split('\n')
     
@@ -1587,36 +3432,29 @@ def show_instructions(text, header_color='darkblue', body_color='black', header_
     
     body_text = '\n'.join(body_lines)
     
-    # Create header text stim (larger, colored) - position lower to avoid top overlap
+    # Header text (larger, colored) - position lower to avoid top overlap
     if header_text:
-        header_stim = visual.TextStim(
-            win, 
-            text=header_text, 
-            color=header_color, 
-            height=header_size, 
-            pos=(0, 0.25),
-            wrapWidth=1.5
-        )
+        header_spec = dict(text=header_text, color=header_color, height=header_size, pos=(0, 0.25), wrapWidth=1.5)
     else:
-        header_stim = None
+        header_spec = None
     
-    # Create body text stim - adjust position to leave room for button
+    # Body text - adjust position to leave room for button
     # Calculate approximate text height to avoid overlap
     body_lines = len(body_text.split('\n'))
     estimated_text_height = body_lines * body_size * 1.2  # Approximate line spacing
     # Position body text lower to avoid header overlap and leave room for button
-    body_y_pos = 0.0 if header_stim else 0.15
+    body_y_pos = 0.0 if header_spec else 0.15
     if estimated_text_height > 0.5:  # If text is very long, move it down more
-        body_y_pos = -0.05 if header_stim else 0.1
-    
-    body_stim = visual.TextStim(
-        win, 
-        text=body_text, 
-        color=body_color, 
-        height=body_size, 
-        pos=(0, body_y_pos),
-        wrapWidth=1.5
-    )
+        body_y_pos = -0.05 if header_spec else 0.1
+    
+    body_spec = dict(text=body_text, color=body_color, height=body_size, pos=(0, body_y_pos), wrapWidth=1.5)
+    return header_spec, body_spec
+
+def show_instructions(text, header_color='darkblue', body_color='black', header_size=0.07*1.35, body_size=0.045*1.35):
+    """Show instructions with formatted header and body text, with continue button"""
+    header_spec, body_spec = _instruction_specs(text, header_color, body_color, header_size, body_size)
+    header_stim = _text(**header_spec) if header_spec else None
+    body_stim = _text(**body_spec)
     
     # Create continue button - positioned higher for better balance with text
     continue_button = visual.Rect(
@@ -1627,140 +3465,13 @@ def show_instructions(text, header_color='darkblue', body_color='black', header_
         lineColor='black',
         pos=(0, -0.25)
     )
-    _cont_text = "CONTINUE"
-    continue_text = visual.TextStim(
-        win,
-        text=_cont_text,
-        color='black',
-        height=0.04*1.35,  # Reduced to ensure text fits within button
-        pos=(0, -0.25)
-    )
-    
-    # Exit button for consistency with other instruction screens
-    exit_btn = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
-    exit_text = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
-    
-    def redraw():
-        if header_stim:
-            header_stim.draw()
-        body_stim.draw()
-        continue_button.draw()
-        continue_text.draw()
-        exit_btn.draw()
-        exit_text.draw()
-        win.flip()
-    
-    # Draw initial screen with photodiode flash (instruction onset)
-    _do_photodiode_flash(redraw, event_type="instruction_onset")
+    continue_text = _text("CONTINUE", height=0.04*1.35, pos=(0, -0.25))  # Reduced to ensure text fits within button
     
-    # Wait for button click
-    mouse_btn = event.Mouse(win=win)
-    mouse_btn.setVisible(True)
-    clicked = False
-    last_hover_state = None
-    
-    if USE_TOUCH_SCREEN:
-        # Use keyboard method (position-change detection) for touch screens
-        mouserec = mouse_btn.getPos()
-        try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-        except:
-            mouserec_x, mouserec_y = 0.0, 0.0
-        
-        while not clicked:
-            try:
-                mouseloc = mouse_btn.getPos()
-                try:
-                    mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-                except:
-                    mouseloc_x, mouseloc_y = 0.0, 0.0
-                
-                # Check if mouse position has changed (touch moved) - keyboard method
-                if mouseloc_x == mouserec_x and mouseloc_y == mouserec_y:
-                    # Position hasn't changed, just redraw
-                    redraw()
-                else:
-                    # Position has changed - check if touch is within button using position calculation
-                    try:
-                        button_pos = continue_button.pos
-                        if hasattr(button_pos, '__len__') and len(button_pos) >= 2:
-                            button_x, button_y = float(button_pos[0]), float(button_pos[1])
-                        else:
-                            button_x, button_y = 0.0, -0.25  # Fallback to match button position
-                    except (TypeError, ValueError):
-                        button_x, button_y = 0.0, -0.25
-                    
-                    try:
-                        button_width = float(continue_button.width)
-                        button_height = float(continue_button.height)
-                    except (TypeError, ValueError):
-                        button_width, button_height = 0.3, 0.1
-                    
-                    # For touch screens, use larger hit area (at least button size, or larger)
-                    hit_margin_x = max(button_width * 0.5, 0.08)
-                    hit_margin_y = max(button_height * 0.5, 0.04)
-                    
-                    on_exit = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                              EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                    on_button = (button_x - button_width/2 - hit_margin_x <= mouseloc_x <= button_x + button_width/2 + hit_margin_x and
-                                button_y - button_height/2 - hit_margin_y <= mouseloc_y <= button_y + button_height/2 + hit_margin_y)
-                    
-                    if on_exit:
-                        core.quit()
-                    elif on_button:
-                        _do_photodiode_flash(redraw, event_type="instruction_continue")
-                        core.wait(0.2)
-                        clicked = True
-                        break
-                    
-                    # Update recorded position
-                    mouserec = mouse_btn.getPos()
-                    try:
-                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                    except:
-                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                
-                # Redraw every frame
-                redraw()
-            except (AttributeError, Exception):
-                pass
-            
-            # Check for space key as backup
-            try:
-                keys = event.getKeys(keyList=['space', 'escape'], timeStamped=False)
-                if keys and 'space' in keys:
-                    _do_photodiode_flash(redraw, event_type="instruction_continue")
-                    clicked = True
-                    break
-                elif keys and 'escape' in keys:
-                    core.quit()
-            except (AttributeError, Exception):
-                pass
-            
-            safe_wait(0.01)
-    else:
-        # Keyboard mode: wait for Return key press
-        while not clicked:
-            redraw()
-            try:
-                keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
-                if keys:
-                    if 'return' in keys:
-                        _do_photodiode_flash(redraw, event_type="instruction_continue")
-                        clicked = True
-                        break
-                    elif 'escape' in keys:
-                        core.quit()
-            except (AttributeError, Exception):
-                pass
-            safe_wait(0.01)
-    
-    mouse_btn.setVisible(False)
-    event.clearEvents()
+    run_button_screen([header_stim, body_stim, continue_button, continue_text], continue_button)
 
 def show_fixation(duration=1.0, return_onset=False, return_offset_trigger=False, onset_event_type=None, offset_event_type=None):
     """Show fixation for duration. Photodiode stays white at baseline; flashes black (TTL) then white at onset and offset."""
-    _do_photodiode_flash(lambda: fixation.draw(), event_type=onset_event_type)  # Onset: black (TTL), white – quick flash, back to white
+    _do_photodiode_flash(_timed_draw('fixation')(fixation.draw), event_type=onset_event_type)  # Onset: black (TTL), white – quick flash, back to white
     onset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
     core.wait(duration)
     _do_photodiode_flash(lambda: _blank_rect.draw() if _blank_rect is not None else None, event_type=offset_event_type)  # Offset: black (TTL), white – quick flash
@@ -1771,6 +3482,8 @@ def show_fixation(duration=1.0, return_onset=False, return_offset_trigger=False,
 
 def get_participant_id():
     """Get participant ID from PsychoPy screen input with on-screen keyboard for touch screens"""
+    if _RENDER_BENCHMARK:
+        return "benchmark_test"  # Test ID: no session data files are written
     global PHOTODIODE_ACTIVE
     PHOTODIODE_ACTIVE = False  # Exclude name entry from photodiode
     input_id = ""
@@ -1819,65 +3532,82 @@ def get_participant_id():
                     lineColor='black',
                     pos=(x_pos, y_pos)
                 )
-                button_text = visual.TextStim(
-                    win,
-                    text=char.upper(),
-                    color='black',
-                    height=0.04*0.75*1.35,
-                    pos=(x_pos, y_pos)
-                )
+                button_text = _text(char.upper(), height=0.04*0.75*1.35, pos=(x_pos, y_pos))
                 keyboard_buttons.append((button, button_text, char))
         
         # Special buttons: Backspace, Continue (positioned between input and keyboard)
         special_y = 0.05*0.6  # Position between input (0.25) and keyboard start (-0.15)
         backspace_button = visual.Rect(win, width=0.3*0.75, height=0.1*0.75*1.35, fillColor='lightcoral', lineColor='black', lineWidth=2*0.75, pos=(-0.25*0.6, special_y))
-        backspace_text = visual.TextStim(win, text="BACKSPACE", color='black', height=0.025*0.75*1.35, pos=(-0.25*0.6, special_y))
+        backspace_text = _text("BACKSPACE", height=0.025*0.75*1.35, pos=(-0.25*0.6, special_y))
         
         continue_button = visual.Rect(win, width=0.3*0.75, height=0.1*0.75*1.35, fillColor='lightgreen', lineColor='black', lineWidth=2*0.75, pos=(0.25*0.6, special_y))
-        continue_text = visual.TextStim(win, text="CONTINUE", color='black', height=0.025*0.75*1.35, pos=(0.25*0.6, special_y))
+        continue_text = _text("CONTINUE", height=0.025*0.75*1.35, pos=(0.25*0.6, special_y))
         exit_btn = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
-        exit_text = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
+        exit_text = _text("Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
+        
+        # The whole keyboard (keys, BACKSPACE, CONTINUE, Exit) is rendered once into one texture; a press is shown by a
+        # highlight overlay drawn over that key, so a frame is one textured quad + prompt + typed text
+        draw_keyboard = _static_layers([stim for button, button_text, _ in keyboard_buttons for stim in (button, button_text)]
+                                       + [backspace_button, backspace_text, continue_button, continue_text, exit_btn, exit_text])
+        key_highlight = visual.Rect(win, width=0.3*0.75, height=0.1*0.75*1.35, fillColor='red', lineColor='black', lineWidth=2*0.75, opacity=0.6)
+        highlight_on = [False]
+        
+        # Hit areas registered once: exit first, letter keys with a small margin (no overlap), special buttons with a larger one
+        id_hits = HitRegistry().add_exit()
+        for button, button_text, char in keyboard_buttons:
+            id_hits.add('key:' + char, button.pos, button.width, button.height, 0.01, 0.01)
+        id_hits.add('backspace', backspace_button.pos, backspace_button.width, backspace_button.height, 0.05, 0.05)
+        id_hits.add('continue', continue_button.pos, continue_button.width, continue_button.height, 0.05, 0.05)
     
     # Key list for keyboard input (non-touch)
     key_list = ['return', 'backspace', 'space'] + [chr(i) for i in range(97, 123)] + [chr(i) for i in range(65, 91)] + [chr(i) for i in range(48, 58)]
     
+    # Prompt is set once; the typed text is re-rendered only when it changes
+    if USE_TOUCH_SCREEN:
+        id_prompt.text = "Enter your first name and last initial with no spaces/capitals:"
+    else:
+        id_prompt.text = "Enter your first name and last initial with no spaces/capitals:\n\nHit Enter when done."
+    shown_id = [None]
+    
     def redraw():
-        if USE_TOUCH_SCREEN:
-            id_prompt.text = "Enter your first name and last initial with no spaces/capitals:"
-        else:
-            id_prompt.text = "Enter your first name and last initial with no spaces/capitals:\n\nHit Enter when done."
-        input_display.text = f"{input_id}_"
+        if shown_id[0] != input_id:
+            input_display.text = f"{input_id}_"
+            shown_id[0] = input_id
         
+        if USE_TOUCH_SCREEN:
+            draw_keyboard()  # Full-window quad: drawn first, text goes on top
+            if highlight_on[0]:
+                key_highlight.draw()
         id_prompt.draw()
         input_display.draw()
         
-        if USE_TOUCH_SCREEN:
-            for button, button_text, _ in keyboard_buttons:
-                button.draw()
-                button_text.draw()
-            backspace_button.draw()
-            backspace_text.draw()
-            continue_button.draw()
-            continue_text.draw()
-            exit_btn.draw()
-            exit_text.draw()
-        
         win.flip()
     
+    def flash_key(button, seconds):
+        """Briefly show the highlight overlay over button (replaces recolouring the prerendered key)."""
+        key_highlight.pos = button.pos
+        highlight_on[0] = True
+        redraw()
+        core.wait(seconds)
+        highlight_on[0] = False
+        redraw()
+    
     # Initial redraw to ensure buttons are visible
     redraw()
     event.clearEvents()
     
-    # POSITION-CHANGE DETECTION: Store initial mouse position
-    mouserec = mouse.getPos()
-    try:
-        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-    except:
-        mouserec_x, mouserec_y = 0.0, 0.0
+    minRT = 0.05  # Minimum time between accepted taps (reduced for faster response)
     
-    minRT = 0.05  # Minimum response time (reduced for faster response)
-    clock = core.Clock()
-    clock.reset()
+    if USE_TOUCH_SCREEN:
+        # Queued taps (with arrival times) resolved against the key table
+        _clear_input_events()
+        tap_state = {'mouse': mouse, 'last': None}
+        try:
+            mouserec = mouse.getPos()
+            tap_state['last'] = (float(mouserec[0]), float(mouserec[1]))
+        except:
+            pass
+        last_accept = time.time()
     
     while True:
         # Check for escape key FIRST, before any processing
@@ -1889,145 +3619,27 @@ def get_participant_id():
             pass
         
         if USE_TOUCH_SCREEN:
-            mouseloc = mouse.getPos()
-            try:
-                mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-            except:
-                mouseloc_x, mouseloc_y = 0.0, 0.0
-            
-            t = clock.getTime()
-            clicked = False
-            
-            # Check if mouse position has changed (touch moved)
-            if mouseloc_x == mouserec_x and mouseloc_y == mouserec_y:
-                # Position hasn't changed, just redraw
-                redraw()
-            else:
-                # Position has changed - check if touch is within any button using position calculation
-                # Check Exit button FIRST (top-right, always clickable)
-                on_exit = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                          EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                if on_exit:
+            done = False
+            hit = _next_hit(id_hits, tap_state)
+            while hit is not None and not done:
+                widget, _, _, tap_time = hit
+                if widget == 'exit':
                     core.quit()  # Exit always responsive (no minRT)
-                # Check keyboard buttons - use smaller hit margin to prevent overlap
-                hit_margin_keyboard = 0.01  # Small margin to prevent overlap between keyboard buttons
-                if not on_exit:
-                    for button, button_text, char in keyboard_buttons:
-                        try:
-                            button_x, button_y = button.pos
-                            button_width, button_height = button.width, button.height
-                        except:
-                            continue
-                        
-                        # Use exact button bounds with minimal margin to prevent overlap
-                        on_button = (button_x - button_width/2 - hit_margin_keyboard <= mouseloc_x <= button_x + button_width/2 + hit_margin_keyboard and
-                                     button_y - button_height/2 - hit_margin_keyboard <= mouseloc_y <= button_y + button_height/2 + hit_margin_keyboard)
-                        
-                        if on_button:
-                            if t > minRT:  # Minimum time has passed
-                                input_id += char
-                                # No color change in touch screen mode
-                                if not USE_TOUCH_SCREEN:
-                                    button.fillColor = 'lightgreen'
-                                redraw()
-                                core.wait(0.05)
-                                if not USE_TOUCH_SCREEN:
-                                    button.fillColor = 'lightgray'
-                                redraw()
-                                clicked = True
-                                mouserec = mouse.getPos()  # Update reference position
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                                clock.reset()  # Reset timer
-                                break
-                            else:
-                                mouserec = mouse.getPos()  # Update reference position
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                
-                if not clicked:
-                    # Check backspace button using position calculation - larger margin for special buttons
-                    hit_margin_special = 0.05
-                    try:
-                        button_x, button_y = backspace_button.pos
-                        button_width, button_height = backspace_button.width, backspace_button.height
-                    except:
-                        button_x, button_y = 0.0, 0.0
-                        button_width, button_height = 0.3*0.75, 0.1*0.75
-                    
-                    on_backspace = (button_x - button_width/2 - hit_margin_special <= mouseloc_x <= button_x + button_width/2 + hit_margin_special and
-                                    button_y - button_height/2 - hit_margin_special <= mouseloc_y <= button_y + button_height/2 + hit_margin_special)
-                    
-                    if on_backspace:
-                        if t > minRT:
-                            input_id = input_id[:-1] if input_id else ""
-                            backspace_button.fillColor = 'red'
-                            redraw()
-                            core.wait(0.05)
-                            backspace_button.fillColor = 'lightcoral'
-                            redraw()
-                            clicked = True
-                            mouserec = mouse.getPos()
-                            try:
-                                mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                            except:
-                                mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                            clock.reset()
-                        else:
-                            mouserec = mouse.getPos()
-                            try:
-                                mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                            except:
-                                mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                
-                if not clicked:
-                    # Check continue button using position calculation - larger margin for special buttons
-                    try:
-                        button_x, button_y = continue_button.pos
-                        button_width, button_height = continue_button.width, continue_button.height
-                    except:
-                        button_x, button_y = 0.0, 0.0
-                        button_width, button_height = 0.3, 0.1
-                    
-                    on_continue = (button_x - button_width/2 - hit_margin_special <= mouseloc_x <= button_x + button_width/2 + hit_margin_special and
-                                    button_y - button_height/2 - hit_margin_special <= mouseloc_y <= button_y + button_height/2 + hit_margin_special)
-                    
-                    if on_continue:
-                        if t > minRT:
-                            if input_id.strip():
-                                # No color change in touch screen mode
-                                if not USE_TOUCH_SCREEN:
-                                    continue_button.fillColor = 'green'
-                                redraw()
-                                core.wait(0.05)
-                                mouse.setVisible(False)
-                                event.clearEvents()
-                                break  # Break from loop, will return below
-                            else:
-                                # No color change in touch screen mode
-                                if not USE_TOUCH_SCREEN:
-                                    continue_button.fillColor = 'red'
-                                redraw()
-                                core.wait(0.1)
-                                if not USE_TOUCH_SCREEN:
-                                    continue_button.fillColor = 'lightgreen'
-                                redraw()
-                                mouserec = mouse.getPos()
-                                try:
-                                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                                except:
-                                    mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                                clock.reset()
-                        else:
-                            mouserec = mouse.getPos()
-                            try:
-                                mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                            except:
-                                mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
+                elif widget is not None and tap_time - last_accept > minRT:
+                    last_accept = tap_time
+                    if widget.startswith('key:'):
+                        input_id += widget[4:]  # No highlight on letter keys in touch screen mode
+                    elif widget == 'backspace':
+                        input_id = input_id[:-1] if input_id else ""
+                        flash_key(backspace_button, 0.05)
+                    elif widget == 'continue' and input_id.strip():
+                        core.wait(0.05)
+                        mouse.setVisible(False)
+                        event.clearEvents()
+                        done = True
+                hit = _next_hit(id_hits, tap_state) if not done else None
+            if done:
+                break  # Break from loop, will return below
             
             # Redraw every frame
             redraw()
@@ -2036,7 +3648,6 @@ def get_participant_id():
                 keys = event.getKeys(keyList=['space', 'escape'], timeStamped=False)
                 if keys:
                     if 'space' in keys:
-                        clicked = True
                         break
                     elif 'escape' in keys:
                         core.quit()
@@ -2051,7 +3662,7 @@ def get_participant_id():
                 pass
             # Clear events AFTER checking keys
             event.clearEvents()
-            safe_wait(0.001)  # Very fast polling
+            _input_wait(0.001)  # Very fast polling
         else:
             # Click/mouse mode: keyboard input only
             keys = event.getKeys(keyList=key_list + ['escape'], timeStamped=False)
@@ -2077,42 +3688,192 @@ def get_participant_id():
     # Photodiode stays off during name entry; run_experiment enables it after name for every screen/stimulus/response
     return input_id.strip() or "P001"
 
+# =========================
+#  TEXTURE REGISTRY
+# =========================
+# One ImageStim (one GL texture) per (path, size), shared by every presentation: partner avatars at each switch,
+# practice shapes across trials, and a studied image when it returns in recognition. acquire() returns the
+# cached stim (pos reset to centre; callers only move images) and counts a reference. release() drops it.
+# Textures with no references stay cached. When the estimated texture memory (4 bytes per source pixel) exceeds
+# TEXTURE_BUDGET_MB (default 256), unreferenced ones are evicted, least recently used first.
+
+class TextureRegistry:
+    """Refcounted LRU cache of ImageStims keyed by (path, size)."""
+    def __init__(self, budget_mb):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> [stim, refs, nbytes], least recently used first
+        self._keys = {}  # id(stim) -> key
+
+    def acquire(self, path, size=None, maintain_aspect_ratio=False, render=None):
+        """Shared ImageStim for path. size in window units; maintain_aspect_ratio scales width to the file's aspect.
+        render: optional function returning an in-memory image array (H, W, 3, -1..1) to use instead of the file."""
+        key = (os.path.abspath(path), 'aspect' if maintain_aspect_ratio else tuple(size))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            entry[0].pos = (0, 0)
+            entry[1] += 1
+            self.hits += 1
+            return entry[0]
+        if render is not None:
+            image = render()
+            img_height, img_width = image.shape[:2]
+        else:
+            from PIL import Image as PILImage
+            with PILImage.open(path) as img:  # Header only: dimensions for the aspect ratio and the memory estimate
+                img_width, img_height = img.size
+            image = path
+        if maintain_aspect_ratio:
+            size = (size[1] * img_width / img_height, size[1])
+        stim = visual.ImageStim(win, image=image, size=size)
+        self._entries[key] = [stim, 1, img_width * img_height * 4]
+        self._keys[id(stim)] = key
+        self.total_bytes += img_width * img_height * 4
+        self.misses += 1
+        self._evict()
+        return stim
+
+    def release(self, stim):
+        """Drop one reference to a stim from acquire() (others are ignored)."""
+        entry = self._entries.get(self._keys.get(id(stim)))
+        if entry is not None and entry[1] > 0:
+            entry[1] -= 1
+            self._evict()
+
+    def _evict(self):
+        if self.total_bytes <= self.budget_bytes:
+            return
+        for key in [k for k, e in self._entries.items() if e[1] == 0]:
+            stim, _, nbytes = self._entries.pop(key)
+            del self._keys[id(stim)]
+            self.total_bytes -= nbytes  # Texture is freed when the last reference to the stim goes
+            if self.total_bytes <= self.budget_bytes:
+                break
+
+_textures = TextureRegistry(float(os.environ.get('TEXTURE_BUDGET_MB', '256')))
+
 def load_image_stimulus(image_path, maintain_aspect_ratio=False):
-    """Load an image stimulus
+    """Load an image stimulus from the texture registry (release it with _textures.release when done)
     
     Args:
         image_path: Path to image file
         maintain_aspect_ratio: If True, maintain aspect ratio (for partner images like Amy.png, Jen.png)
     """
+    if image_path in _generated_stimuli:
+        # Practice/placeholder shape: rendered in memory on first use (0.3, 35% bigger)
+        return _textures.acquire(image_path, size=(0.3*1.35, 0.3*1.35), render=lambda: _render_generated(image_path))
     if os.path.exists(image_path):
-        if maintain_aspect_ratio:
-            # Load image to get dimensions
-            from PIL import Image as PILImage
-            img = PILImage.open(image_path)
-            img_width, img_height = img.size
-            
-            # Calculate size maintaining aspect ratio
-            # Use height as reference (0.3) and scale width proportionally
-            aspect_ratio = img_width / img_height
-            height = 0.3 * 1.35  # 35% bigger
-            width = height * aspect_ratio
-            
-            return visual.ImageStim(win, image=image_path, size=(width, height))
-        else:
-            return visual.ImageStim(win, image=image_path, size=(0.3*1.35, 0.3*1.35))  # 35% bigger
+        # Height 0.3, 35% bigger; aspect-ratio images scale width to the file's proportions
+        return _textures.acquire(image_path, size=(0.3*1.35, 0.3*1.35), maintain_aspect_ratio=maintain_aspect_ratio)
     else:
         # Fallback: colored rectangle
         return visual.Rect(win, size=(0.3, 0.3), fillColor='gray', lineColor='black')
 
+# =========================
+#  SLIDER TRAJECTORY
+# =========================
+# get_slider_response stores one sample per frame (time, pointer x/y, button mask, handle value) in a preallocated
+# array('d') ring buffer - five float stores per frame, no allocation. When the slider screen ends the samples are
+# handed off, and save_data_incremental appends them to recognition_slider_trajectory_*.bin (little-endian float64,
+# _TRAJ_FIELDS per sample) with one row per trial in the matching *_index.csv (byte offset and sample count).
+# Each trajectory is keyed by (phase, block, trial) and written only with the trial row of the same key, so an
+# aborted trial (slider finished but no row saved, or the reverse) never shifts later entries onto the wrong trial.
+_TRAJ_FIELDS = ('t', 'x', 'y', 'buttons', 'value')  # buttons: bitmask 1=left, 2=middle, 4=right
+_TRAJ_STRIDE = len(_TRAJ_FIELDS)
+_traj_capacity = int(os.environ.get('SLIDER_TRAJECTORY_CAPACITY', '2048'))  # Samples per slider; 7 s at 144 Hz = 1008
+_traj_buf = array('d', bytes(8 * _TRAJ_STRIDE * _traj_capacity))
+_traj_count = [0]  # Samples recorded for the current slider (ring wraps past capacity; oldest are dropped)
+_traj_pending = {}  # (phase, block, trial) -> (samples, dropped) of the finished slider awaiting its trial row
+_traj_file_ref = [None]  # Binary trajectory file (opened on first flush)
+_traj_index_ref = [None]  # (file, csv.DictWriter) for the index
+_TRAJ_INDEX_FIELDNAMES = ['phase', 'block', 'trial', 'byte_offset', 'n_samples', 'dropped_samples']
+
+def _traj_record(t, x, y, buttons, value):
+    """Store one frame sample in the ring buffer."""
+    i = (_traj_count[0] % _traj_capacity) * _TRAJ_STRIDE
+    buf = _traj_buf
+    buf[i] = t
+    buf[i + 1] = x
+    buf[i + 2] = y
+    buf[i + 3] = buttons
+    buf[i + 4] = value
+    _traj_count[0] += 1
+
+def _traj_finish(key):
+    """Queue the current slider's samples (oldest first) under key = (phase, block, trial) and reset the ring.
+    A slider from an earlier trial still pending never got its row saved: it is dropped, so the queue stays bounded."""
+    n = _traj_count[0]
+    kept = min(n, _traj_capacity)
+    start = ((n - kept) % _traj_capacity) * _TRAJ_STRIDE
+    end = start + kept * _TRAJ_STRIDE
+    if end <= len(_traj_buf):
+        samples = _traj_buf[start:end]
+    else:
+        samples = _traj_buf[start:] + _traj_buf[:end - len(_traj_buf)]
+    _traj_pending.clear()
+    _traj_pending[key] = (samples, n - kept)
+    _traj_count[0] = 0
+
+def _flush_slider_trajectories(trial_rows, participant_id):
+    """Write the pending trajectory of each trial row with the same (phase, block, trial) key (called from
+    save_data_incremental, between trials)."""
+    for row in trial_rows:
+        entry = _traj_pending.pop((row.get('phase'), row.get('block'), row.get('trial')), None)
+        if entry is None:
+            continue
+        samples, dropped = entry
+        try:
+            if _traj_file_ref[0] is None:
+                ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+                base = os.path.join(get_log_directory(), f"recognition_slider_trajectory_{participant_id}_{ts}")
+                _traj_file_ref[0] = open(base + ".bin", 'wb')
+                index_file = open(base + "_index.csv", 'w', newline='')
+                writer = csv.DictWriter(index_file, fieldnames=_TRAJ_INDEX_FIELDNAMES)
+                writer.writeheader()
+                _traj_index_ref[0] = (index_file, writer)
+            f = _traj_file_ref[0]
+            offset = f.tell()
+            if sys.byteorder != 'little':
+                samples.byteswap()
+            samples.tofile(f)
+            f.flush()
+            index_file, writer = _traj_index_ref[0]
+            writer.writerow({'phase': row.get('phase'), 'block': row.get('block'), 'trial': row.get('trial'),
+                             'byte_offset': offset, 'n_samples': len(samples) // _TRAJ_STRIDE, 'dropped_samples': dropped})
+            index_file.flush()
+            for synced in (f, index_file):  # Same durability as the trial and TTL CSVs
+                try:
+                    os.fsync(synced.fileno())
+                except (AttributeError, OSError):
+                    pass
+        except Exception as e:
+            print(f"⚠ Could not write slider trajectory: {e}", file=sys.stderr)
+
+def _close_slider_trajectories():
+    """Close the trajectory files at the end of the session."""
+    try:
+        if _traj_file_ref[0] is not None:
+            _traj_file_ref[0].close()
+            _traj_file_ref[0] = None
+        if _traj_index_ref[0] is not None:
+            _traj_index_ref[0][0].close()
+            _traj_index_ref[0] = None
+    except Exception as e:
+        print(f"⚠ Could not close slider trajectory files: {e}", file=sys.stderr)
+
 # =========================
 #  SLIDER FOR OLD-NEW RATING
 # =========================
 SLIDER_Y_POS_PRACTICE = -0.35*0.6
 SLIDER_Y_POS_ACTUAL = -0.42*0.6   # Slightly lower for actual task
 
-def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_num=None, max_trials=10, timeout=7.0):
+def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_num=None, max_trials=10, timeout=7.0, traj_key=None):
     """Get slider response from participant using slider with submit button
-    Works with both touch screen and mouse input - click/tap anywhere on the slider line to set value"""
+    Works with both touch screen and mouse input - click/tap anywhere on the slider line to set value
+    traj_key: (phase, block, trial) of the trial row the slider trajectory is saved with"""
     # Create slider visual elements; use lower position for actual task (trial_num set), higher for practice
     slider_y_pos = SLIDER_Y_POS_ACTUAL if trial_num is not None else SLIDER_Y_POS_PRACTICE
     slider_line = visual.Line(
@@ -2156,26 +3917,25 @@ def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_
     exit_btn = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
     exit_text = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
     
+    # Everything except the handle and the submit button (its colour tracks has_moved) is static for the trial
+    draw_slider_static = _static_layers([image_stim, trial_text if trial_num is not None else None, prompt,
+                                         slider_line, old_label, new_label, exit_btn, exit_text])
+    
+    @_timed_draw('slider')
     def draw_slider_content():
-        if image_stim:
-            image_stim.draw()
-        if trial_num is not None:
-            trial_text.draw()
-        prompt.draw()
-        slider_line.draw()
-        old_label.draw()
-        new_label.draw()
+        draw_slider_static()
         slider_handle.draw()
         submit_button.draw()
         submit_text.draw()
-        exit_btn.draw()
-        exit_text.draw()
     
     mouse.setVisible(True)
     event.clearEvents()  # Discard any keys pressed during fixation/image (e.g. leftover Return from previous screen)
 
     slider_value = 0.5  # Start at center (0.5)
     start_time = time.time()
+    _reset_response_pad()  # Pad RT timer starts with the slider screen
+    if _pad_t0[0] is not None:
+        start_time = _pad_t0[0]  # Same origin, so slider_rt is the pad-clock RT
     slider_commit_time = None
     slider_commit_trigger = None  # Photodiode/TTL timestamp when participant submits (for CSV)
     slider_stop_time = None  # Time when slider value is set (clicked)
@@ -2187,13 +3947,20 @@ def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_
     mouse_pos = (0, 0)  # Initialize mouse position
     mouse_buttons = [False, False, False]  # Initialize mouse buttons
 
-    # For touch screens, use position-change detection
+    # For touch screens, taps come from the input queue (position-change detection if it is unavailable)
+    _clear_input_events()
+    tap_state = {'mouse': mouse, 'last': None}
     if USE_TOUCH_SCREEN:
-        mouserec = mouse.getPos()
         try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
+            mouserec = mouse.getPos()
+            tap_state['last'] = (float(mouserec[0]), float(mouserec[1]))
         except:
-            mouserec_x, mouserec_y = 0.0, 0.0
+            pass
+    _traj_count[0] = 0  # Fresh trajectory for this slider
+    # Hit areas: slider line (within 0.05*0.75 of its y), submit button with larger touch margins
+    slider_hits = (HitRegistry().add_exit()
+                   .add('slider', (0, slider_y_pos), 0.8*0.6, 2 * 0.05*0.75)
+                   .add_button('submit', submit_button))
     
     while True:
         # Check timeout
@@ -2209,13 +3976,8 @@ def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_
             slider_commit_time = time.time()
             
             # Show timeout alert (photodiode at onset and offset)
-            timeout_alert = visual.TextStim(
-                win,
-                    text="Time's up! A random answer was selected. This will be logged as an invalid trial.",
-                color='red',
-                height=0.06*0.75*1.35,
-                pos=(0, 0)
-            )
+            timeout_alert = _text("Time's up! A random answer was selected. This will be logged as an invalid trial.",
+                                  color='red', height=0.06*0.75*1.35, pos=(0, 0))
             def draw_timeout_alert():
                 if image_stim:
                     image_stim.draw()
@@ -2242,33 +4004,50 @@ def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_
             # Keep using previous mouse state instead of defaulting
             core.wait(0.02)  # Slightly longer wait to let system recover
         
-        # Check if clicking/tapping on slider line (mouse mode allows dragging, touch screen uses tap-to-set)
-        on_slider_line = abs(mouse_pos[1] - slider_y_pos) < 0.05*0.75  # Within 0.05 of slider line y-position
-        on_slider_x_range = -0.4*0.6 <= mouse_pos[0] <= 0.4*0.6  # Within slider x range
+        # Cedrus response pad: slider keys jump to evenly spaced positions (OLD ... NEW), submit key commits
+        pad_press = _next_pad_press(_pad_slider_keys + [_pad_submit_key])
+        if pad_press is not None:
+            pad_key, _, pad_time = pad_press
+            if pad_key == _pad_submit_key:
+                if has_moved:
+                    _log_key_response("participant_commit_trigger", f"pad{pad_key}", pad_time)
+                    _do_photodiode_flash(draw_slider_content, event_type="participant_commit_trigger")
+                    slider_commit_time = pad_time  # Pad-clock time of the submit press
+                    slider_commit_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+                    break
+            else:
+                _log_key_response("slider_move", f"pad{pad_key}", pad_time)
+                slider_value = _pad_slider_keys.index(pad_key) / float(max(1, len(_pad_slider_keys) - 1))
+                slider_handle.pos = (-0.4*0.6 + (slider_value * 0.8*0.6), slider_y_pos)
+                if slider_decision_onset_time is None:
+                    slider_decision_onset_time = pad_time
+                slider_click_times.append(pad_time)
+                if abs(slider_value - 0.5) > 0.01:
+                    has_moved = True
+                    slider_stop_time = pad_time
         
         if USE_TOUCH_SCREEN:
-            # Position-change detection for touch screens (NO minimum RT delay for task responses)
-            try:
-                mouseloc_x, mouseloc_y = float(mouse_pos[0]), float(mouse_pos[1])
-            except:
-                mouseloc_x, mouseloc_y = 0.0, 0.0
-            
-            # Check if position has changed
-            if mouseloc_x != mouserec_x or mouseloc_y != mouserec_y:
+            # Queued taps for touch screens (NO minimum RT delay for task responses); each tap carries its arrival time
+            committed = False
+            while not committed:
+                tap = _next_tap(tap_state)
+                if tap is None:
+                    break
+                mouseloc_x, mouseloc_y, tap_time = tap
+                # A tap near the bottom of the slider line can also reach the (enlarged) submit area - both apply
+                widgets = slider_hits.hit_all(mouseloc_x, mouseloc_y)
                 # Check Exit button FIRST (top-right, always clickable)
-                on_exit = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                          EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                if on_exit:
+                if 'exit' in widgets:
                     core.quit()
-                # Position changed - check if touch is on slider line
-                elif on_slider_line and on_slider_x_range:
+                # Tap - check if touch is on slider line
+                elif 'slider' in widgets:
                     # Touched on slider line - set value based on x position
                     x_pos = max(-0.4*0.6, min(0.4*0.6, mouseloc_x))
                     slider_value = (x_pos + 0.4*0.6) / (0.8*0.6)  # Map -0.4*0.6 to 0.4*0.6 -> 0 to 1
                     slider_handle.pos = (x_pos, slider_y_pos)
                     
                     # Record decision onset time (first click on slider bar)
-                    click_time = time.time()
+                    click_time = tap_time
                     if slider_decision_onset_time is None:
                         slider_decision_onset_time = click_time  # First click = decision onset
                     slider_click_times.append(click_time)  # Log all clicks
@@ -2278,35 +4057,16 @@ def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_
                         has_moved = True
                         slider_stop_time = click_time  # Record when value was set immediately
                 
-                # Check if submit button is touched (keyboard method - respond immediately on position change)
-                submit_x, submit_y = submit_button.pos
-                submit_width, submit_height = submit_button.width, submit_button.height
-                # For touch screens, use larger hit area (at least button size, or larger)
-                if USE_TOUCH_SCREEN:
-                    submit_hit_margin_x = max(submit_width * 0.5, 0.08)
-                    submit_hit_margin_y = max(submit_height * 0.5, 0.04)
-                else:
-                    submit_hit_margin_x = 0.0
-                    submit_hit_margin_y = 0.0
-                
-                submit_clicked = (submit_x - submit_width/2 - submit_hit_margin_x <= mouseloc_x <= submit_x + submit_width/2 + submit_hit_margin_x and
-                               submit_y - submit_height/2 - submit_hit_margin_y <= mouseloc_y <= submit_y + submit_height/2 + submit_hit_margin_y)
-                
-                if submit_clicked:
+                # Check if submit button is touched (respond immediately to the tap)
+                if 'submit' in widgets:
                     if has_moved:
                         _do_photodiode_flash(draw_slider_content, event_type="participant_commit_trigger")  # Participant response: black (TTL), white
-                        slider_commit_time = time.time()  # Record immediately, no delay
+                        slider_commit_time = tap_time  # Arrival time of the submitting tap
                         slider_commit_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-                        break
+                        committed = True
                     else:
                         # Show message: "please select an answer first"
-                        error_message = visual.TextStim(
-                            win,
-                            text="Please select an answer first.",
-                            color='red',
-                            height=0.04*0.75*1.35,
-                            pos=(0, slider_y_pos - 0.2)
-                        )
+                        error_message = _text("Please select an answer first.", color='red', pos=(0, slider_y_pos - 0.2))
                         # Draw everything with error message
                         if image_stim:
                             image_stim.draw()
@@ -2322,32 +4082,29 @@ def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_
                         error_message.draw()
                         win.flip()
                         core.wait(1.0)  # Show error message for 1 second
+                        _clear_input_events()  # Ignore taps made while the message was up
                         # Continue loop (don't break)
-                
-                # Update recorded position
-                mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
+            if committed:
+                break
             
         else:
-            # Keyboard: left/right to move slider (press repeatedly; holding keys won't work)
+            # Keyboard: left/right to move slider (each press is one step; holding keys won't work)
             try:
-                keys = event.getKeys(keyList=['left', 'right', 'return', 'escape'])
-                if keys:
-                    if 'escape' in keys:
+                timed_keys = _get_keys_timed(['left', 'right', 'return', 'escape'])
+                committed = False
+                for key, key_time in timed_keys:
+                    if key == 'escape':
                         core.quit()
-                    if 'return' in keys:
+                    elif key == 'return':
                         if has_moved:
                             _do_photodiode_flash(draw_slider_content, event_type="participant_commit_trigger")
-                            slider_commit_time = time.time()
+                            slider_commit_time = key_time  # Arrival time of the Return press
+                            _log_key_response("participant_commit_trigger", 'return', key_time)
                             slider_commit_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+                            committed = True
                             break
                         else:
-                            error_message = visual.TextStim(
-                                win,
-                                text="Please select an answer first.",
-                                color='red',
-                                height=0.04*0.75*1.35,
-                                pos=(0, slider_y_pos - 0.2)
-                            )
+                            error_message = _text("Please select an answer first.", color='red', pos=(0, slider_y_pos - 0.2))
                             if image_stim:
                                 image_stim.draw()
                             if trial_num is not None:
@@ -2362,29 +4119,25 @@ def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_
                             error_message.draw()
                             win.flip()
                             core.wait(1.0)
-                    step = 0.05
-                    if 'left' in keys:
-                        slider_value = max(0.0, slider_value - step)
-                        x_pos = -0.4*0.6 + (slider_value * 0.8*0.6)
-                        slider_handle.pos = (x_pos, slider_y_pos)
-                        key_time = time.time()
-                        if slider_decision_onset_time is None:
-                            slider_decision_onset_time = key_time
-                        slider_click_times.append(key_time)
-                        if abs(slider_value - 0.5) > 0.01:
-                            has_moved = True
-                            slider_stop_time = key_time
-                    if 'right' in keys:
-                        slider_value = min(1.0, slider_value + step)
+                            _clear_input_events()
+                            break
+                    else:
+                        step = 0.05
+                        if key == 'left':
+                            slider_value = max(0.0, slider_value - step)
+                        else:
+                            slider_value = min(1.0, slider_value + step)
                         x_pos = -0.4*0.6 + (slider_value * 0.8*0.6)
                         slider_handle.pos = (x_pos, slider_y_pos)
-                        key_time = time.time()
                         if slider_decision_onset_time is None:
                             slider_decision_onset_time = key_time
                         slider_click_times.append(key_time)
+                        _log_key_response("slider_move", key, key_time)
                         if abs(slider_value - 0.5) > 0.01:
                             has_moved = True
                             slider_stop_time = key_time
+                if committed:
+                    break
             except (AttributeError, Exception):
                 pass
         
@@ -2401,6 +4154,8 @@ def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_
         # Draw everything (photodiode/TTL only on submit, not on slider movements)
         draw_slider_content()
         win.flip()
+        _traj_record(time.time(), mouse_pos[0], mouse_pos[1],
+                     (1 if mouse_buttons[0] else 0) | (2 if mouse_buttons[1] else 0) | (4 if mouse_buttons[2] else 0), slider_value)
         
         # Check for escape (with error handling)
         try:
@@ -2415,9 +4170,11 @@ def get_slider_response(prompt_text="Rate your memory:", image_stim=None, trial_
             # Ignore event errors, just continue
             pass
         
-        core.wait(0.01)
+        _input_wait(0.01)
     
     mouse.setVisible(False)
+    _traj_record(slider_commit_time or time.time(), mouse_pos[0], mouse_pos[1], 0, slider_value)  # Final (committed) value
+    _traj_finish(traj_key)
     slider_rt = slider_commit_time - start_time if slider_commit_time else timeout
     
     # For mouse/computer version, if decision onset wasn't set, set it to slider_stop_time
@@ -2564,11 +4321,12 @@ def run_study_phase(studied_images, block_num, participant_id=None, study_file=N
         
         # Load and display image (fixation offset handled by show_fixation; image onset: black then white)
         img_stim = load_image_stimulus(img_path)
-        _do_photodiode_flash(lambda: img_stim.draw(), event_type="study_image_onset_trigger")
+        _do_photodiode_flash(_timed_draw('study_image')(img_stim.draw), event_type="study_image_onset_trigger")
         study_image_onset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
         core.wait(image_duration)  # Show each image for 1 second
         _do_photodiode_flash(lambda: _blank_rect.draw() if _blank_rect is not None else None, event_type="study_image_offset_trigger")  # Image offset: black (TTL), white
         study_image_offset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+        _textures.release(img_stim)  # Stays cached for its recognition trial unless the budget needs the memory
         
         row = {
             "block": block_num,
@@ -2647,7 +4405,7 @@ def run_recognition_trial(trial_num, block_num, studied_image_path, is_studied,
     
     # Pre-trial fixation (0.5s) then image; photodiode flashes at fixation onset/offset, image onset/offset
     recognition_fixation_onset_trigger, recognition_fixation_offset_trigger = show_fixation(0.5, return_onset=True, return_offset_trigger=True, onset_event_type="recognition_fixation_onset_trigger", offset_event_type="recognition_fixation_offset_trigger")
-    _do_photodiode_flash(lambda: img_stim.draw(), event_type="recognition_image_onset_trigger")  # Image onset: black (TTL), white
+    _do_photodiode_flash(_timed_draw('recognition_image')(img_stim.draw), event_type="recognition_image_onset_trigger")  # Image onset: black (TTL), white
     recognition_image_onset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
     core.wait(1.0)  # Show image for 1 second
     _do_photodiode_flash(lambda: _blank_rect.draw() if _blank_rect is not None else None, event_type="recognition_image_offset_trigger")  # Image offset: black (TTL), white
@@ -2658,7 +4416,8 @@ def run_recognition_trial(trial_num, block_num, studied_image_path, is_studied,
     if participant_first:
         # P1: Participant responds first (image stays on screen)
         participant_value, participant_rt, participant_commit_time, participant_slider_timeout, participant_slider_stop_time, participant_slider_decision_onset_time, participant_slider_click_times, participant_commit_trigger = get_slider_response(
-            "Rate your memory: OLD or NEW?", image_stim=img_stim, trial_num=trial_num, max_trials=max_trials, timeout=7.0
+            "Rate your memory: OLD or NEW?", image_stim=img_stim, trial_num=trial_num, max_trials=max_trials, timeout=7.0,
+            traj_key=("recognition", block_num, trial_num)
         )
         
         # P2: Partner responds (show animated slider)
@@ -2667,7 +4426,7 @@ def run_recognition_trial(trial_num, block_num, studied_image_path, is_studied,
         
         # Animate partner's slider tapping and clicking submit
         ai_decision_time = time.time()
-        ai_slider_display_time, ai_final_slider_display_time, partner_rating_onset_trigger, partner_rating_complete_trigger, partner_slider_settled_trigger = show_animated_partner_slider(ai_confidence, ai_rt, image_stim=img_stim, partner_name=partner_name, slider_y_pos=SLIDER_Y_POS_ACTUAL)
+        ai_slider_display_time, ai_final_slider_display_time, partner_rating_onset_trigger, partner_rating_complete_trigger, partner_slider_settled_trigger, partner_schedule_times = show_animated_partner_slider(ai_confidence, ai_rt, image_stim=img_stim, partner_name=partner_name, slider_y_pos=SLIDER_Y_POS_ACTUAL)
         
         # Go straight to switch/stay screen (question + image + scores + buttons all at once)
         # Switch/Stay decision (keep image on screen, show euclidean distance)
@@ -2749,11 +4508,12 @@ def run_recognition_trial(trial_num, block_num, studied_image_path, is_studied,
         
         # Animate partner's slider tapping and clicking submit
         ai_decision_time = time.time()
-        ai_slider_display_time, ai_final_slider_display_time, partner_rating_onset_trigger, partner_rating_complete_trigger, partner_slider_settled_trigger = show_animated_partner_slider(ai_confidence, ai_rt, image_stim=img_stim, partner_name=partner_name, slider_y_pos=SLIDER_Y_POS_ACTUAL)
+        ai_slider_display_time, ai_final_slider_display_time, partner_rating_onset_trigger, partner_rating_complete_trigger, partner_slider_settled_trigger, partner_schedule_times = show_animated_partner_slider(ai_confidence, ai_rt, image_stim=img_stim, partner_name=partner_name, slider_y_pos=SLIDER_Y_POS_ACTUAL)
         
         # P1: Participant responds (image stays on screen)
         participant_value, participant_rt, participant_commit_time, participant_slider_timeout, participant_slider_stop_time, participant_slider_decision_onset_time, participant_slider_click_times, participant_commit_trigger = get_slider_response(
-            "Rate your memory: OLD or NEW?", image_stim=img_stim, trial_num=trial_num, max_trials=max_trials, timeout=7.0
+            "Rate your memory: OLD or NEW?", image_stim=img_stim, trial_num=trial_num, max_trials=max_trials, timeout=7.0,
+            traj_key=("recognition", block_num, trial_num)
         )
         
         # Go straight to switch/stay screen (question + image + scores + buttons all at once)
@@ -2830,16 +4590,20 @@ def run_recognition_trial(trial_num, block_num, studied_image_path, is_studied,
             "block_duration_minutes": None  # Will be set by update_block_timing_in_csv
         }
     
+    trial_data.update(partner_schedule_times)  # Partner animation: intended vs achieved tap/settle/submit
+    
     # Show outcome
     # Calculate points based on euclidean distance (passed to show_trial_outcome)
     points_earned, outcome_trigger = show_trial_outcome(final_answer, correct_answer, switch_decision, used_ai_answer, total_points=total_points)
     trial_data["outcome_trigger"] = outcome_trigger
     trial_data["points_earned"] = points_earned  # Keep CSV field name for compatibility
+    _textures.release(img_stim)
     
     return trial_data, points_earned
 
 def show_animated_partner_slider(partner_value, partner_rt, image_stim=None, partner_name="Amy", slider_y_pos=None):
-    """Animate partner's slider tapping (not sliding) and clicking submit. slider_y_pos must match get_slider_response (use SLIDER_Y_POS_ACTUAL for actual task)."""
+    """Animate partner's slider tapping (not sliding) and clicking submit. slider_y_pos must match get_slider_response (use SLIDER_Y_POS_ACTUAL for actual task).
+    The last return value is a dict of intended vs achieved tap/settle/submit times for the recognition CSV."""
     if slider_y_pos is None:
         slider_y_pos = SLIDER_Y_POS_PRACTICE
     # Create slider visualization
@@ -2877,36 +4641,8 @@ def show_animated_partner_slider(partner_value, partner_rt, image_stim=None, par
     # Calculate target position
     target_x = -0.4*0.6 + (partner_value * 0.8*0.6)  # Target position
     
-    # Wait for most of RT (70%) before showing the tap
-    # This maintains RT distribution while showing tap instead of slide
-    wait_before_tap = partner_rt * 0.7
-    elapsed_wait = 0.0
-    start_time = time.time()
-    
-    def draw_partner_rating_screen():
-        if image_stim:
-            image_stim.draw()
-        partner_text.draw()
-        slider_line.draw()
-        old_label.draw()
-        new_label.draw()
-        submit_button.draw()
-        submit_text.draw()
-    
-    # Show slider without handle - "[Partner] is rating..." (AI starts making decision) - photodiode/TTL at onset
-    _do_photodiode_flash(draw_partner_rating_screen, event_type="partner_rating_onset")
-    partner_rating_onset_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-    
-    while elapsed_wait < wait_before_tap:
-        draw_partner_rating_screen()
-        win.flip()
-        
-        elapsed_wait = time.time() - start_time
-        if elapsed_wait < wait_before_tap:
-            core.wait(0.05)
-    
-    # Show tap animation: create a tap indicator (ripple/highlight) at tap position
-    tap_time = time.time()
+    # Image, scale line and OLD/NEW labels stay put for the whole animation: one cached layer
+    draw_partner_static = _static_layers([image_stim, slider_line, old_label, new_label])
     tap_indicator = visual.Circle(
         win,
         radius=0.03,
@@ -2916,118 +4652,118 @@ def show_animated_partner_slider(partner_value, partner_rt, image_stim=None, par
         pos=(target_x, slider_y_pos),
         opacity=0.8
     )
-    
-    # Show tap effect: ripple appears briefly at tap position
-    for i in range(3):
-        # Tap indicator grows and fades
-        tap_indicator.radius = 0.03 + (i * 0.01)
-        tap_indicator.opacity = 0.8 - (i * 0.3)
-        
-        if image_stim:
-            image_stim.draw()
-        partner_text.draw()
-        slider_line.draw()
-        old_label.draw()
-        new_label.draw()
-        tap_indicator.draw()  # Show tap indicator
-        submit_button.draw()
-        submit_text.draw()
-        win.flip()
-        
-        core.wait(0.05)  # Quick tap animation
-    
-    # Handle appears at target position (tap completed) - AI has settled on decision, before submit
     partner_handle.pos = (target_x, slider_y_pos)
-    slider_display_time = time.time()  # Time when handle appears at final position
-
-    def draw_partner_slider_settled():
-        if image_stim:
-            image_stim.draw()
-        partner_text.draw()
-        slider_line.draw()
-        old_label.draw()
-        new_label.draw()
-        partner_handle.draw()
-        submit_button.draw()
-        submit_text.draw()
-    _do_photodiode_flash(draw_partner_slider_settled, event_type="partner_slider_settled_trigger")
-    partner_slider_settled_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-
-    # Brief visual feedback: handle appears with slight highlight
-    for i in range(2):
-        # Make handle slightly larger/brighten to show tap completion
-        partner_handle.fillColor = 'lightblue' if i == 0 else 'blue'
-        partner_handle.radius = 0.025 if i == 0 else 0.02
-        
-        if image_stim:
-            image_stim.draw()
-        partner_text.draw()
-        slider_line.draw()
-        old_label.draw()
-        new_label.draw()
-        partner_handle.draw()
-        submit_button.draw()
-        submit_text.draw()
-        win.flip()
-        
-        core.wait(0.1)
+    rating_label = "OLD" if partner_value < 0.5 else "NEW"
     
-    # Wait remaining RT time before submit
-    remaining_rt = partner_rt - (time.time() - start_time)
-    if remaining_rt > 0:
-        core.wait(remaining_rt)
-    
-    # Animate clicking submit button (highlight button)
-    final_slider_display_time = time.time()  # Time when submit button is clicked
-    for i in range(3):
-        submit_button.fillColor = 'darkgray'
-        if image_stim:
-            image_stim.draw()
+    def draw_rating():
+        draw_partner_static()
         partner_text.draw()
-        slider_line.draw()
-        old_label.draw()
-        new_label.draw()
-        partner_handle.draw()
         submit_button.draw()
         submit_text.draw()
-        win.flip()
-        
-        core.wait(0.1)
-        
-        submit_button.fillColor = 'lightgray'
-        if image_stim:
-            image_stim.draw()
+    
+    def draw_ripple(i):
+        def draw():
+            # Tap indicator grows and fades
+            tap_indicator.radius = 0.03 + (i * 0.01)
+            tap_indicator.opacity = 0.8 - (i * 0.3)
+            draw_partner_static()
+            partner_text.draw()
+            tap_indicator.draw()
+            submit_button.draw()
+            submit_text.draw()
+        return draw
+    
+    def draw_handle(handle_color='blue', handle_radius=0.02, submit_color='lightgreen'):
+        def draw():
+            partner_handle.fillColor = handle_color
+            partner_handle.radius = handle_radius
+            submit_button.fillColor = submit_color
+            draw_partner_static()
+            partner_text.draw()
+            partner_handle.draw()
+            submit_button.draw()
+            submit_text.draw()
+        return draw
+    
+    def draw_complete():
+        if partner_text.text != f"{partner_name} rates: {rating_label}":
+            partner_text.text = f"{partner_name} rates: {rating_label}"
+        partner_handle.fillColor = 'blue'
+        partner_handle.radius = 0.02
+        draw_partner_static()
         partner_text.draw()
-        slider_line.draw()
-        old_label.draw()
-        new_label.draw()
         partner_handle.draw()
-        submit_button.draw()
-        submit_text.draw()
-        win.flip()
-        core.wait(0.1)
     
-    # Show final result briefly - photodiode when partner's rating text appears
-    if partner_value < 0.5:
-        label = "OLD"
-    else:
-        label = "NEW"
-    partner_text.text = f"{partner_name} rates: {label}"
+    # Frame schedule at the measured refresh rate, frame 0 = rating onset. Tap at 70% of the RT (keeps the RT
+    # distribution while showing a tap instead of a slide), 3-step ripple, handle settles, submit click at the RT.
+    # Each photodiode frame is followed by a baseline frame, so the flash lasts exactly one frame.
+    period = _frame_period()
+    ripple_frames = max(1, int(round(0.05 / period)))
+    blink_frames = max(1, int(round(0.1 / period)))
+    tap_frame = max(2, int(round(partner_rt * 0.7 / period)))
+    settle_frame = tap_frame + 3 * ripple_frames
+    submit_frame = max(int(round(partner_rt / period)), settle_frame + 1 + 2 * blink_frames)
+    complete_frame = submit_frame + 6 * blink_frames
+    end_frame = complete_frame + int(round(0.5 / period))
+    schedule = [  # (frame, draw, TTL event type, timing mark)
+        (0, draw_rating, "partner_rating_onset", 'onset'),
+        (1, draw_rating, None, None),
+    ]
+    schedule += [(tap_frame + i * ripple_frames, draw_ripple(i), None, 'tap' if i == 0 else None) for i in range(3)]
+    schedule += [
+        (settle_frame, draw_handle(), "partner_slider_settled_trigger", 'settle'),  # AI has settled on its decision
+        (settle_frame + 1, draw_handle('lightblue', 0.025), None, None),  # Brief highlight: tap completed
+        (settle_frame + 1 + blink_frames, draw_handle(), None, None),
+    ]
+    for c in range(3):  # Submit click: button blinks dark/light
+        schedule.append((submit_frame + 2 * c * blink_frames, draw_handle(submit_color='darkgray'), None, 'submit' if c == 0 else None))
+        schedule.append((submit_frame + (2 * c + 1) * blink_frames, draw_handle(submit_color='lightgray'), None, None))
+    schedule += [
+        (complete_frame, draw_complete, "partner_rating_complete", 'complete'),
+        (complete_frame + 1, draw_complete, None, None),
+    ]
     
-    def draw_partner_rating_complete():
-        if image_stim:
-            image_stim.draw()
-        partner_text.draw()
-        slider_line.draw()
-        old_label.draw()
-        new_label.draw()
-        partner_handle.draw()
+    timed_partner_draw = _timed_draw('partner_slider')
+    achieved = {}
+    t0 = None
+    for frame, draw, ttl_event, mark in schedule:
+        if t0 is not None:
+            remaining = t0 + frame * period - time.time()
+            if remaining > 0:
+                core.wait(remaining)
+        if ttl_event:
+            _queue_ttl_event(ttl_event)
+        timed_partner_draw(draw)()
+        prev_ttl = _last_photodiode_ttl_timestamp[0]
+        win.flip()
+        flip_time = time.time()
+        if t0 is None:
+            t0 = flip_time
+        if mark:
+            ttl_time = _last_photodiode_ttl_timestamp[0]
+            achieved[mark] = ttl_time if ttl_event and ttl_time is not None and ttl_time != prev_ttl else flip_time
+    remaining = t0 + end_frame * period - time.time()
+    if remaining > 0:
+        core.wait(remaining)
+    
+    intended = {mark: t0 + frame * period for frame, _, _, mark in schedule if mark}
+    schedule_times = {
+        "ai_tap_intended_time": intended['tap'],
+        "ai_tap_display_time": achieved['tap'],
+        "ai_slider_intended_time": intended['settle'],
+        "ai_final_slider_intended_time": intended['submit'],
+    }
+    late = [f"{m} {1000.0 * (achieved[m] - intended[m]):+.1f}ms" for m in ('tap', 'settle', 'submit') if abs(achieved[m] - intended[m]) > period]
+    if late:
+        print(f"⚠ Partner animation off schedule by more than one frame: {', '.join(late)}", file=sys.stderr)
     
-    _do_photodiode_flash(draw_partner_rating_complete, event_type="partner_rating_complete")
-    partner_rating_complete_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-    core.wait(0.5)
+    partner_rating_onset_trigger = achieved['onset']
+    slider_display_time = achieved['settle']  # Time when handle appears at final position
+    partner_slider_settled_trigger = achieved['settle']
+    final_slider_display_time = achieved['submit']  # Time when submit button is clicked
+    partner_rating_complete_trigger = achieved['complete']
     
-    return slider_display_time, final_slider_display_time, partner_rating_onset_trigger, partner_rating_complete_trigger, partner_slider_settled_trigger
+    return slider_display_time, final_slider_display_time, partner_rating_onset_trigger, partner_rating_complete_trigger, partner_slider_settled_trigger, schedule_times
 
 def show_both_responses(participant_value, partner_value, participant_first, partner_name="Amy", slider_y_pos=None, image_stim=None):
     """Show both participant and partner responses with sliders. slider_y_pos must match get_slider_response (use SLIDER_Y_POS_ACTUAL for actual task). Draws image if provided so scores don't appear before the image."""
@@ -3185,28 +4921,16 @@ def get_switch_stay_decision(image_stim=None, participant_value=None, partner_va
     exit_btn = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
     exit_text = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
     
-    def draw_switch_stay_content():
-        decision_prompt.draw()
-        if image_stim:
-            image_stim.pos = (0, SWITCH_STAY_CONTENT_OFFSET)
-            image_stim.draw()
-        slider_line.draw()
-        old_label.draw()
-        new_label.draw()
-        if participant_value is not None and p_label_text is not None:
-            p_label_text.draw()
-        if partner_value is not None and a_label_text is not None:
-            a_label_text.draw()
-        if participant_value is not None and p_dot is not None:
-            p_dot.draw()
-        if partner_value is not None and a_dot is not None:
-            a_dot.draw()
-        stay_button.draw()
-        stay_text.draw()
-        switch_button.draw()
-        switch_text.draw()
-        exit_btn.draw()
-        exit_text.draw()
+    if image_stim:
+        image_stim.pos = (0, SWITCH_STAY_CONTENT_OFFSET)
+    # Nothing on this screen changes while it waits for the decision: the whole frame is one cached layer
+    draw_switch_stay_content = _timed_draw('switch_stay')(_static_layers([
+        decision_prompt, image_stim, slider_line, old_label, new_label,
+        p_label_text if participant_value is not None else None,
+        a_label_text if partner_value is not None else None,
+        p_dot if participant_value is not None else None,
+        a_dot if partner_value is not None else None,
+        stay_button, stay_text, switch_button, switch_text, exit_btn, exit_text]))
     
     mouse.setVisible(True)
     decision_onset_time = None  # Will be set when screen first appears
@@ -3222,13 +4946,16 @@ def get_switch_stay_decision(image_stim=None, participant_value=None, partner_va
     mouse_pos = (0, 0)  # Initialize mouse position
     mouse_buttons = [False, False, False]  # Initialize mouse buttons
     
-    # For touch screens, use keyboard method (position-change detection)
+    # For touch screens, taps come from the input queue (position-change detection if it is unavailable)
+    _clear_input_events()
+    tap_state = {'mouse': mouse, 'last': None}
+    ss_hits = HitRegistry().add_exit().add_button('stay', stay_button).add_button('switch', switch_button)  # Registered once per screen
     if USE_TOUCH_SCREEN:
-        mouserec = mouse.getPos()
         try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
+            mouserec = mouse.getPos()
+            tap_state['last'] = (float(mouserec[0]), float(mouserec[1]))
         except:
-            mouserec_x, mouserec_y = 0.0, 0.0
+            pass
     
     while True:
         # Check timeout (only after screen has appeared)
@@ -3242,13 +4969,8 @@ def get_switch_stay_decision(image_stim=None, participant_value=None, partner_va
                 timed_out = True
                 
                 # Show timeout alert (photodiode at onset and offset)
-                timeout_alert = visual.TextStim(
-                    win,
-                    text="Time's up! A random decision was selected.",
-                    color='red',
-                    height=0.06*1.35,
-                    pos=(0, -0.35)  # Lower to avoid overlap with buttons
-                )
+                timeout_alert = _text("Time's up! A random decision was selected.", color='red', height=0.06*1.35,
+                                      pos=(0, -0.35))  # Lower to avoid overlap with buttons
                 def draw_timeout_alert_switch_stay():
                     decision_prompt.draw()
                     if image_stim:
@@ -3310,117 +5032,73 @@ def get_switch_stay_decision(image_stim=None, participant_value=None, partner_va
                 except:
                     pass
         
+        # Cedrus response pad: left choice key = STAY, right = SWITCH; RT from the pad's own clock
+        pad_press = _next_pad_press(_pad_choice_keys) if start_time is not None else None
+        if pad_press is not None:
+            pad_key, pad_rt, pad_time = pad_press
+            _log_key_response("switch_stay_response_trigger", f"pad{pad_key}", pad_time)
+            _do_photodiode_flash(draw_switch_stay_content, event_type="switch_stay_response_trigger")  # Participant response: black (TTL), white
+            decision_response_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+            decision = "stay" if pad_key == _pad_choice_keys[0] else "switch"
+            decision_rt = pad_rt
+            decision_commit_time = pad_time
+            break
+        
         if USE_TOUCH_SCREEN:
-            # Use keyboard method (position-change detection) for touch screens
-            # Check if mouse position has changed (touch moved)
-            if mouse_x == mouserec_x and mouse_y == mouserec_y:
-                # Position hasn't changed, just continue (will redraw below)
-                pass
-            else:
-                # Position changed - check if touch is within buttons using position calculation
-                # Check Exit button FIRST (top-right, always clickable)
-                on_exit = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouse_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                          EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouse_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                if on_exit:
+            # Queued taps for touch screens; RT runs to the tap's arrival time (only once the screen is up)
+            decided = False
+            while start_time is not None and not decided:
+                hit = _next_hit(ss_hits, tap_state)
+                if hit is None:
+                    break
+                widget, mouse_x, mouse_y, tap_time = hit
+                if widget == 'exit':
                     core.quit()
-                # Check stay button
-                try:
-                    stay_pos = stay_button.pos
-                    if hasattr(stay_pos, '__len__') and len(stay_pos) >= 2:
-                        stay_x, stay_y = float(stay_pos[0]), float(stay_pos[1])
-                    else:
-                        _by = 0.10 if (slider_y_pos <= SLIDER_Y_POS_ACTUAL + 0.005) else 0.14
-                        stay_x, stay_y = -0.25*0.6, slider_y_pos - _by
-                except (TypeError, ValueError, AttributeError):
-                    _by = 0.10 if (slider_y_pos <= SLIDER_Y_POS_ACTUAL + 0.005) else 0.14
-                    stay_x, stay_y = -0.25*0.6, slider_y_pos - _by
-                
-                try:
-                    stay_width = float(stay_button.width) if stay_button.width else 0.2*0.75
-                    stay_height = float(stay_button.height) if stay_button.height else 0.06*0.75
-                except (TypeError, ValueError, AttributeError):
-                    stay_width, stay_height = 0.2*0.75, 0.08*0.75
-                
-                stay_hit_margin_x = max(stay_width * 0.5, 0.08)
-                stay_hit_margin_y = max(stay_height * 0.5, 0.04)
-                
-                stay_clicked = (stay_x - stay_width/2 - stay_hit_margin_x <= mouse_x <= stay_x + stay_width/2 + stay_hit_margin_x and
-                               stay_y - stay_height/2 - stay_hit_margin_y <= mouse_y <= stay_y + stay_height/2 + stay_hit_margin_y)
-                
-                # Check switch button
-                try:
-                    switch_pos = switch_button.pos
-                    if hasattr(switch_pos, '__len__') and len(switch_pos) >= 2:
-                        switch_x, switch_y = float(switch_pos[0]), float(switch_pos[1])
-                    else:
-                        _by = 0.10 if (slider_y_pos <= SLIDER_Y_POS_ACTUAL + 0.005) else 0.14
-                        switch_x, switch_y = 0.28*0.6, slider_y_pos - _by
-                except (TypeError, ValueError, AttributeError):
-                    _by = 0.10 if (slider_y_pos <= SLIDER_Y_POS_ACTUAL + 0.005) else 0.14
-                    switch_x, switch_y = 0.28*0.6, slider_y_pos - _by
-                
-                try:
-                    switch_width = float(switch_button.width) if switch_button.width else 0.2*0.75
-                    switch_height = float(switch_button.height) if switch_button.height else 0.06*0.75
-                except (TypeError, ValueError, AttributeError):
-                    switch_width, switch_height = 0.2*0.75, 0.08*0.75
-                
-                switch_hit_margin_x = max(switch_width * 0.5, 0.08)
-                switch_hit_margin_y = max(switch_height * 0.5, 0.04)
-                
-                switch_clicked = (switch_x - switch_width/2 - switch_hit_margin_x <= mouse_x <= switch_x + switch_width/2 + switch_hit_margin_x and
-                                 switch_y - switch_height/2 - switch_hit_margin_y <= mouse_y <= switch_y + switch_height/2 + switch_hit_margin_y)
+                stay_clicked = widget == 'stay'
+                switch_clicked = widget == 'switch'
                 
                 if stay_clicked:
                     _do_photodiode_flash(draw_switch_stay_content, event_type="switch_stay_response_trigger")  # Participant response: black (TTL), white
                     decision_response_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
                     decision = "stay"
-                    decision_rt = time.time() - start_time
-                    decision_commit_time = time.time()
-                    break
+                    decision_rt = tap_time - start_time
+                    decision_commit_time = tap_time
+                    decided = True
                 elif switch_clicked:
                     _do_photodiode_flash(draw_switch_stay_content, event_type="switch_stay_response_trigger")  # Participant response: black (TTL), white
                     decision_response_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
                     decision = "switch"
-                    decision_rt = time.time() - start_time
-                    decision_commit_time = time.time()
-                    break
-                
-                # Update recorded position
-                mouserec = mouse.getPos()
-                try:
-                    mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                except:
-                    mouserec_x, mouserec_y = mouse_x, mouse_y
+                    decision_rt = tap_time - start_time
+                    decision_commit_time = tap_time
+                    decided = True
+            if decided:
+                break
         else:
-            # Keyboard mode: LEFT = STAY, RIGHT = SWITCH
+            # Keyboard mode: LEFT = STAY, RIGHT = SWITCH (RT runs to the key's arrival time)
             try:
-                keys = event.getKeys(keyList=['left', 'right', 'escape'])
-                if keys:
-                    if 'escape' in keys:
+                timed_keys = _get_keys_timed(['left', 'right', 'escape']) if start_time is not None else []
+                if timed_keys:
+                    if _first_key_time(timed_keys, 'escape') is not None:
                         core.quit()
-                    if 'left' in keys:
-                        _do_photodiode_flash(draw_switch_stay_content, event_type="switch_stay_response_trigger")  # Participant response: black (TTL), white
-                        decision_response_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-                        decision = "stay"
-                        decision_rt = time.time() - start_time
-                        decision_commit_time = time.time()
-                        break
-                    if 'right' in keys:
-                        _do_photodiode_flash(draw_switch_stay_content, event_type="switch_stay_response_trigger")  # Participant response: black (TTL), white
-                        decision_response_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
-                        decision = "switch"
-                        decision_rt = time.time() - start_time
-                        decision_commit_time = time.time()
-                        break
+                    key, key_time = next((k, t) for k, t in timed_keys if k in ('left', 'right'))
+                    _do_photodiode_flash(draw_switch_stay_content, event_type="switch_stay_response_trigger")  # Participant response: black (TTL), white
+                    decision_response_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
+                    decision = "stay" if key == 'left' else "switch"
+                    decision_rt = key_time - start_time
+                    decision_commit_time = key_time
+                    _log_key_response("switch_stay_response_trigger", key, key_time)
+                    break
             except (AttributeError, Exception):
                 pass
         
-        # Draw everything in correct order
+        # Draw on change only (as run_button_screen): the screen is static until the decision, so after onset it is
+        # redrawn only when the window lost its contents or a TTL is waiting for a flip
         if switch_stay_first_flip:
             _do_photodiode_flash(draw_switch_stay_content, event_type="switch_stay_trigger")  # Switch/stay onset: black (TTL), white
+            _screen_dirty[0] = False
             switch_stay_first_flip = False
-        else:
+        elif _screen_dirty[0] or _photodiode_signal_next_flip[0]:
+            _screen_dirty[0] = False
             draw_switch_stay_content()
             win.flip()
         
@@ -3428,6 +5106,8 @@ def get_switch_stay_decision(image_stim=None, participant_value=None, partner_va
         if first_draw:
             decision_onset_time = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
             start_time = time.time()  # Start timing from when screen appears
+            _clear_input_events()  # Responses count from screen onset
+            _reset_response_pad()
             first_draw = False
         
         # Check for escape (with error handling)
@@ -3443,180 +5123,54 @@ def get_switch_stay_decision(image_stim=None, participant_value=None, partner_va
             # Ignore event errors, just continue
             pass
         
-        core.wait(0.01)
+        _input_wait(0.01)
     
     mouse.setVisible(False)
     return decision, decision_rt, decision_commit_time, timed_out, decision_onset_time, decision_response_trigger
 
 def show_ready_to_start_screen(block_num, total_blocks=10):
     """Show 'ready to start sorting?' screen before each block with collections remaining count"""
-    collections_remaining = total_blocks - block_num + 1
-    
-    ready_text = visual.TextStim(
-        win,
-        text=f"Ready to start sorting?\n\n"
-             f"{collections_remaining} collection{'s' if collections_remaining > 1 else ''} remaining",
-        color='black',
-        height=0.06*0.75*1.35,
-        pos=(0, 0.3),  # Move higher to avoid overlap with larger images
-        wrapWidth=1.2
-    )
-    
-    # Create begin button
-    begin_button = visual.Rect(
-        win,
-        width=0.3*0.75,
-        height=0.1*0.75*1.35,
-        fillColor='lightblue',
-        lineColor='black',
-        pos=(0, -0.4*0.6)  # Moved away from edge for better clickability
-    )
-    begin_text = visual.TextStim(
-        win,
-        text="BEGIN",
-        color='black',
-        height=0.04*0.75*1.35,  # Reduced to ensure text fits within button
-        pos=(0, -0.4*0.6)  # Moved away from edge for better clickability
-    )
-    exit_btn = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
-    exit_text = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
-    
-    # Draw initial screen (photodiode flash at onset)
-    def redraw():
-        ready_text.draw()
-        begin_button.draw()
-        begin_text.draw()
-        exit_btn.draw()
-        exit_text.draw()
-        win.flip()
-    
-    first_draw = [True]
-    def draw_screen():
-        if first_draw[0]:
-            _do_photodiode_flash(redraw, event_type="instruction_onset")
-            first_draw[0] = False
-        else:
-            redraw()
-    
-    draw_screen()
-    
-    # Wait for button click - use same pattern as other touch screen buttons
-    mouse_btn = event.Mouse(win=win)
-    mouse_btn.setVisible(True)
-    clicked = False
-    last_hover_state = None
-    
-    if USE_TOUCH_SCREEN:
-        # Use keyboard method (position-change detection) for touch screens
-        mouserec = mouse_btn.getPos()
-        try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-        except:
-            mouserec_x, mouserec_y = 0.0, 0.0
-        
-        while not clicked:
-            try:
-                mouseloc = mouse_btn.getPos()
-                try:
-                    mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-                except:
-                    mouseloc_x, mouseloc_y = 0.0, 0.0
-                
-                # Check if mouse position has changed (touch moved) - keyboard method
-                if mouseloc_x == mouserec_x and mouseloc_y == mouserec_y:
-                    # Position hasn't changed, just redraw
-                    draw_screen()
-                else:
-                    # Position has changed - check if touch is within button using position calculation
-                    try:
-                        button_pos = begin_button.pos
-                        if hasattr(button_pos, '__len__') and len(button_pos) >= 2:
-                            button_x, button_y = float(button_pos[0]), float(button_pos[1])
-                        else:
-                            button_x, button_y = 0.0, -0.4*0.6  # Updated to match new button position
-                    except (TypeError, ValueError):
-                        button_x, button_y = 0.0, -0.35*0.6
-                    
-                    try:
-                        button_width = float(begin_button.width)
-                        button_height = float(begin_button.height)
-                    except (TypeError, ValueError):
-                        button_width, button_height = 0.3*0.75, 0.1*0.75
-                    
-                    hit_margin_x = max(button_width * 0.5, 0.08)
-                    hit_margin_y = max(button_height * 0.5, 0.04)
-                    
-                    on_exit = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                              EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                    on_button = (button_x - button_width/2 - hit_margin_x <= mouseloc_x <= button_x + button_width/2 + hit_margin_x and
-                                button_y - button_height/2 - hit_margin_y <= mouseloc_y <= button_y + button_height/2 + hit_margin_y)
-                    
-                    if on_exit:
-                        core.quit()
-                    elif on_button:
-                        _do_photodiode_flash(redraw, event_type="instruction_continue")
-                        core.wait(0.2)
-                        clicked = True
-                        break
-                    
-                    # Update recorded position
-                    mouserec = mouse_btn.getPos()
-                    try:
-                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                    except:
-                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                
-                # Redraw every frame
-                draw_screen()
-            except (AttributeError, Exception):
-                pass
-            
-            try:
-                keys = event.getKeys(keyList=['space', 'escape'], timeStamped=False)
-                if keys and 'space' in keys:
-                    _do_photodiode_flash(redraw, event_type="instruction_continue")
-                    clicked = True
-                    break
-                elif 'escape' in keys:
-                    core.quit()
-            except (AttributeError, Exception):
-                pass
-            
-            safe_wait(0.01)
-    else:
-        # Keyboard mode: wait for Return key
-        while not clicked:
-            draw_screen()
-            try:
-                keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
-                if keys:
-                    if 'return' in keys:
-                        _do_photodiode_flash(redraw, event_type="instruction_continue")
-                        clicked = True
-                        break
-                    if 'escape' in keys:
-                        core.quit()
-            except (AttributeError, Exception):
-                pass
-            safe_wait(0.01)
+    collections_remaining = total_blocks - block_num + 1
     
-    mouse_btn.setVisible(False)
-    event.clearEvents()
+    ready_text = visual.TextStim(
+        win,
+        text=f"Ready to start sorting?\n\n"
+             f"{collections_remaining} collection{'s' if collections_remaining > 1 else ''} remaining",
+        color='black',
+        height=0.06*0.75*1.35,
+        pos=(0, 0.3),  # Move higher to avoid overlap with larger images
+        wrapWidth=1.2
+    )
+    
+    # Create begin button
+    begin_button = visual.Rect(
+        win,
+        width=0.3*0.75,
+        height=0.1*0.75*1.35,
+        fillColor='lightblue',
+        lineColor='black',
+        pos=(0, -0.4*0.6)  # Moved away from edge for better clickability
+    )
+    begin_text = visual.TextStim(
+        win,
+        text="BEGIN",
+        color='black',
+        height=0.04*0.75*1.35,  # Reduced to ensure text fits within button
+        pos=(0, -0.4*0.6)  # Moved away from edge for better clickability
+    )
+    
+    run_button_screen([ready_text, begin_button, begin_text], begin_button)
 
 def show_block_summary(block_num, total_points, max_points):
     """Show block summary with curator scoring"""
     # Show actual points out of max_points (rounded to 1 decimal place for display, full precision maintained in logged data)
     total_points_rounded = round(total_points, 1)
     
-    summary_text = visual.TextStim(
-        win,
-        text=f"Collection {block_num} Complete!\n\n"
-             f"The in-house curator scored this collection {total_points_rounded:.1f} points out of a total of {int(max_points)} points!",
-        color='black',
-        height=0.04*0.75*1.35,
-        pos=(0, 0.1),
-        wrapWidth=1.2
-    )
+    # Fixed header (warmed at startup) and score line as two cached stims, laid out like the former single text
+    summary_header = _text(f"Collection {block_num} Complete!", pos=(0, 0.16), wrapWidth=1.2)
+    summary_score = _text(
+        f"The in-house curator scored this collection {total_points_rounded:.1f} points out of a total of {int(max_points)} points!",
+        pos=(0, 0.06), wrapWidth=1.2)
     
     # Create continue button
     continue_button = visual.Rect(
@@ -3627,17 +5181,13 @@ def show_block_summary(block_num, total_points, max_points):
         lineColor='black',
         pos=(0, -0.4)  # Moved away from edge for better clickability
     )
-    continue_text = visual.TextStim(
-        win,
-        text="CONTINUE",
-        color='black',
-        height=0.04*1.35,  # Reduced to ensure text fits within button
-        pos=(0, -0.4)  # Moved away from edge for better clickability
-    )
+    continue_text = _text("CONTINUE", height=0.04*1.35, pos=(0, -0.4))  # Moved away from edge for better clickability
     
     # Draw initial screen
+    @_timed_draw('block_summary')
     def draw_block_summary_content():
-        summary_text.draw()
+        summary_header.draw()
+        summary_score.draw()
         continue_button.draw()
         continue_text.draw()
     _do_photodiode_flash(draw_block_summary_content, event_type="block_summary_onset")  # Block summary onset: black (TTL), white
@@ -3649,66 +5199,37 @@ def show_block_summary(block_num, total_points, max_points):
     last_hover_state = None
     
     if USE_TOUCH_SCREEN:
-        # Use keyboard method (position-change detection) for touch screens
-        mouserec = mouse_btn.getPos()
+        # Queued taps resolved against the screen's hit areas (larger touch margins around the button)
+        _clear_input_events()
+        tap_state = {'mouse': mouse_btn, 'last': None}
         try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
+            mouserec = mouse_btn.getPos()
+            tap_state['last'] = (float(mouserec[0]), float(mouserec[1]))
         except:
-            mouserec_x, mouserec_y = 0.0, 0.0
+            pass
+        hits = HitRegistry().add_button('continue', continue_button)
         
         while not clicked:
             try:
-                mouseloc = mouse_btn.getPos()
-                try:
-                    mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-                except:
-                    mouseloc_x, mouseloc_y = 0.0, 0.0
-                
-                # Check if mouse position has changed (touch moved) - keyboard method
-                if mouseloc_x == mouserec_x and mouseloc_y == mouserec_y:
-                    # Position hasn't changed, just redraw
-                    summary_text.draw()
+                hit = _next_hit(hits, tap_state)
+                if hit is None:
+                    # No tap, just redraw
+                    summary_header.draw()
+                    summary_score.draw()
                     continue_button.draw()
                     continue_text.draw()
                     win.flip()
                 else:
-                    # Position has changed - check if touch is within button using position calculation
-                    try:
-                        button_pos = continue_button.pos
-                        if hasattr(button_pos, '__len__') and len(button_pos) >= 2:
-                            button_x, button_y = float(button_pos[0]), float(button_pos[1])
-                        else:
-                            button_x, button_y = 0.0, -0.4  # Updated to match new button position
-                    except (TypeError, ValueError):
-                        button_x, button_y = 0.0, -0.35
-                    
-                    try:
-                        button_width = float(continue_button.width)
-                        button_height = float(continue_button.height)
-                    except (TypeError, ValueError):
-                        button_width, button_height = 0.3, 0.1
-                    
-                    hit_margin_x = max(button_width * 0.5, 0.08)
-                    hit_margin_y = max(button_height * 0.5, 0.04)
-                    
-                    on_button = (button_x - button_width/2 - hit_margin_x <= mouseloc_x <= button_x + button_width/2 + hit_margin_x and
-                                button_y - button_height/2 - hit_margin_y <= mouseloc_y <= button_y + button_height/2 + hit_margin_y)
-                    
-                    if on_button:
+                    widget = hit[0]
+                    if widget == 'continue':
                         _do_photodiode_flash(draw_block_summary_content, event_type="block_summary_continue")  # Participant response: black (TTL), white
                         core.wait(0.2)
                         clicked = True
                         break
-                    
-                    # Update recorded position
-                    mouserec = mouse_btn.getPos()
-                    try:
-                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                    except:
-                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
                 
                 # Redraw every frame
-                summary_text.draw()
+                summary_header.draw()
+                summary_score.draw()
                 continue_button.draw()
                 continue_text.draw()
                 win.flip()
@@ -3730,14 +5251,17 @@ def show_block_summary(block_num, total_points, max_points):
     else:
         # Keyboard mode: wait for Return key
         while not clicked:
-            summary_text.draw()
+            summary_header.draw()
+            summary_score.draw()
             continue_button.draw()
             continue_text.draw()
             win.flip()
             try:
-                keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
+                timed_keys = _get_keys_timed(['return', 'escape'])
+                keys = [k for k, _ in timed_keys]
                 if keys:
                     if 'return' in keys:
+                        _log_key_response("block_summary_continue", 'return', _first_key_time(timed_keys, 'return'))
                         _do_photodiode_flash(draw_block_summary_content, event_type="block_summary_continue")  # Participant response: black (TTL), white
                         clicked = True
                         break
@@ -3825,6 +5349,11 @@ def show_leaderboard(participant_id, total_points):
     # Use wait_for_button with lower button position to avoid overlap with leaderboard text
     wait_for_button(redraw_func=redraw, button_y=-0.4)
 
+def _outcome_message(participant_accuracy, points_rounded):
+    """Outcome screen text and colour for a trial (points already rounded to 1 decimal place)."""
+    outcome_text, color = ("Correct", 'green') if participant_accuracy else ("Incorrect", 'red')
+    return (f"{outcome_text}.\n\nThe in-house curator scored this image: {points_rounded:.1f} points based on image & your confidence.", color)
+
 def show_trial_outcome(final_answer, correct_answer, switch_decision, used_ai_answer, total_points=0):
     """Show trial outcome with points based on euclidean distance"""
     # Calculate correctness points based on euclidean distance from correct answer
@@ -3838,18 +5367,11 @@ def show_trial_outcome(final_answer, correct_answer, switch_decision, used_ai_an
     # Determine if answer is correct (within 0.5 of correct answer)
     participant_accuracy = euclidean_distance < 0.5
     
-    if participant_accuracy:
-        outcome_text = "Correct"
-        color = 'green'
-    else:
-        outcome_text = "Incorrect"
-        color = 'red'
-    
-    # Show outcome with curator scoring (display rounded to 1 decimal place)
+    # Show outcome with curator scoring (display rounded to 1 decimal place); all 22 variants are prerendered at startup
     # Photodiode flash, TTL trigger, and CSV write at outcome onset (both touch-screen and keyboard modes)
-    outcome_text_full = f"{outcome_text}.\n\nThe in-house curator scored this image: {correctness_points_rounded:.1f} points based on image & your confidence."
-    outcome_stim = visual.TextStim(win, text=outcome_text_full, color=color, height=0.06*1.35, pos=(0, 0), wrapWidth=1.4)
-    _do_photodiode_flash(lambda: outcome_stim.draw(), event_type="outcome_trigger")
+    outcome_text_full, color = _outcome_message(participant_accuracy, correctness_points_rounded)
+    outcome_stim = _text(outcome_text_full, color=color, height=0.06*1.35, pos=(0, 0), wrapWidth=1.4)
+    _do_photodiode_flash(_timed_draw('outcome')(outcome_stim.draw), event_type="outcome_trigger")
     outcome_trigger = _last_photodiode_ttl_timestamp[0] if _last_photodiode_ttl_timestamp[0] is not None else time.time()
     core.wait(2.0)  # Show for 2.0 seconds (increased from 1.5)
     
@@ -3889,9 +5411,7 @@ def run_block(block_num, studied_images, block_start_participant_first, ai_colla
     
     # Transition screen: switching to recognition phase
     show_instructions(
-        "STUDYING COLLECTION IMAGES COMPLETE!\n\n"
-        "Now switching to the sorting phase.\n\n"
-        f"You will see MORE images again and rate them with {partner_name}.",
+        _STUDY_COMPLETE_TEXT.format(partner_name=partner_name),
         header_color='darkblue',
         body_color='black'
     )
@@ -4073,7 +5593,9 @@ def save_data_incremental(all_study_data, all_trial_data, participant_id,
     # Skip saving if test participant
     if is_test_participant(participant_id):
         print(f"⚠ Test participant detected - skipping file save")
+        _traj_pending.clear()
         return None, None
+    _flush_slider_trajectories(all_trial_data, participant_id)  # Between trials, outside the response window
     
     if study_file is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -4081,6 +5603,10 @@ def save_data_incremental(all_study_data, all_trial_data, participant_id,
         study_file = os.path.join(log_dir, f"recognition_study_{participant_id}_{timestamp}.csv")
         trial_file = os.path.join(log_dir, f"recognition_trials_{participant_id}_{timestamp}.csv")
     
+    # Station-calibrated photon time next to every raw *_trigger column (blank if station not calibrated)
+    all_study_data = [_add_calibrated_trigger_columns(row) for row in all_study_data]
+    all_trial_data = [_add_calibrated_trigger_columns(row) for row in all_trial_data]
+    
     # Save study data
     if all_study_data and len(all_study_data) > 0:
         file_exists = os.path.exists(study_file)
@@ -4171,23 +5697,31 @@ def run_experiment():
         event.clearEvents()
     except Exception as e:
         print(f"Warning: Error clearing events at start: {e}", file=sys.stderr)
+    _install_input_queue(win)  # Time-stamped touch/key events for response screens
+    
+    _run_station_preflight(win, "social_recognition_memory_task", STIMULI_DIR)  # Experimenter-facing health check
     
     # Name entry first (like localizer) - photodiode off during name entry only
     participant_id = get_participant_id()
     PHOTODIODE_ACTIVE = True  # Enable photodiode for every screen change/stimulus/response from here on (like localizer)
     _probe_ttl_at_startup()  # Initialize TTL backend and log status for Blackrock
+    _setup_station_calibration(win)  # Per-station latency offsets for calibrated timestamp columns
+    _warm_text_cache()  # Labels, alerts and trial outcomes rendered before the first timed screen
+    _warm_up_gpu(win, STIMULI_DIR)  # Shader/texture/glyph costs paid on hidden frames before the first timed screen
     experiment_start_time = time.time()
-    # Open TTL file for incremental writes (one row per event)
+    # Open TTL and key-response files for incremental writes (one row per event)
     if not is_test_participant(participant_id):
         try:
             _ts = datetime.now().strftime("%Y%m%d_%H%M%S")
             log_dir = get_log_directory()
             ttl_file = os.path.join(log_dir, f"recognition_ttl_events_{participant_id}_{_ts}.csv")
             _ttl_file_path_ref[0] = ttl_file
-            _ttl_file_ref[0] = open(ttl_file, 'w', newline='')
-            _ttl_writer_ref[0] = csv.DictWriter(_ttl_file_ref[0], fieldnames=['timestamp', 'event_type'])
-            _ttl_writer_ref[0].writeheader()
-            _ttl_file_ref[0].flush()
+            with _ttl_log_lock:  # Watchdog thread may log a reconnect row at any time
+                _ttl_file_ref[0] = open(ttl_file, 'w', newline='')
+                _ttl_writer_ref[0] = csv.DictWriter(_ttl_file_ref[0], fieldnames=_TTL_FIELDNAMES)
+                _ttl_writer_ref[0].writeheader()
+                _ttl_file_ref[0].flush()
+            _open_key_responses(os.path.join(log_dir, f"recognition_key_responses_{participant_id}_{_ts}.csv"))
         except Exception as e:
             print(f"Warning: Could not open TTL file for incremental writes: {e}", file=sys.stderr)
     
@@ -4245,24 +5779,23 @@ def run_experiment():
     clicked = False
     
     if USE_TOUCH_SCREEN:
-        # Use keyboard method (position-change detection) for touch screens
-        mouserec = mouse.getPos()
+        # Queued touch events (position-change detection when the queue is unavailable)
+        _clear_input_events()
+        tap_state = {'mouse': mouse, 'last': None}
         try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
+            mouserec = mouse.getPos()
+            tap_state['last'] = (float(mouserec[0]), float(mouserec[1]))
         except:
-            mouserec_x, mouserec_y = 0.0, 0.0
+            pass
         
+        begin_hits = HitRegistry().add_exit().add_button('begin', start_button)
         while not clicked:
             try:
-                mouseloc = mouse.getPos()
-                try:
-                    mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-                except:
-                    mouseloc_x, mouseloc_y = 0.0, 0.0
+                tap = _next_tap(tap_state)
                 
-                # Check if mouse position has changed (touch moved) - keyboard method
-                if mouseloc_x == mouserec_x and mouseloc_y == mouserec_y:
-                    # Position hasn't changed, just redraw
+                # Taps are queued with their arrival time
+                if tap is None:
+                    # No tap, just redraw
                     start_screen.draw()
                     start_button.draw()
                     start_button_text.draw()
@@ -4270,30 +5803,9 @@ def run_experiment():
                     exit_text.draw()
                     win.flip()
                 else:
-                    # Position has changed - check if touch is within button using position calculation
-                    on_exit = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                              EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                    try:
-                        button_pos = start_button.pos
-                        if hasattr(button_pos, '__len__') and len(button_pos) >= 2:
-                            button_x, button_y = float(button_pos[0]), float(button_pos[1])
-                        else:
-                            button_x, button_y = 0.0, -0.3*0.6
-                    except (TypeError, ValueError):
-                        button_x, button_y = 0.0, -0.3*0.6
-                    
-                    try:
-                        button_width = float(start_button.width)
-                        button_height = float(start_button.height)
-                    except (TypeError, ValueError):
-                        button_width, button_height = 0.3*0.75, 0.1*0.75
-                    
-                    # For touch screens, use larger hit area (at least button size, or larger)
-                    hit_margin_x = max(button_width * 0.5, 0.08)
-                    hit_margin_y = max(button_height * 0.5, 0.04)
-                    
-                    on_button = (button_x - button_width/2 - hit_margin_x <= mouseloc_x <= button_x + button_width/2 + hit_margin_x and
-                                button_y - button_height/2 - hit_margin_y <= mouseloc_y <= button_y + button_height/2 + hit_margin_y)
+                    widget = begin_hits.hit(tap[0], tap[1])
+                    on_exit = widget == 'exit'
+                    on_button = widget == 'begin'
                     
                     if on_exit:
                         core.quit()
@@ -4302,13 +5814,6 @@ def run_experiment():
                         core.wait(0.2)
                         clicked = True
                         break
-                    
-                    # Update recorded position
-                    mouserec = mouse.getPos()
-                    try:
-                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                    except:
-                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
             except (AttributeError, RuntimeError, ValueError, TypeError) as e:
                 print(f"Warning: Error in begin button loop: {e}", file=sys.stderr)
             
@@ -4324,7 +5829,7 @@ def run_experiment():
             except (AttributeError, RuntimeError):
                 pass
             
-            core.wait(0.01)
+            _input_wait(0.01)
     else:
         # Keyboard mode: wait for Return key
         while not clicked:
@@ -4335,9 +5840,11 @@ def run_experiment():
             exit_text.draw()
             win.flip()
             try:
-                keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
+                timed_keys = _get_keys_timed(['return', 'escape'])
+                keys = [k for k, _ in timed_keys]
                 if keys:
                     if 'return' in keys:
+                        _log_key_response("begin_click", 'return', _first_key_time(timed_keys, 'return'))
                         _do_photodiode_flash(draw_start_content, event_type="begin_click")  # BEGIN pressed: black (TTL), white
                         clicked = True
                         break
@@ -4345,7 +5852,7 @@ def run_experiment():
                         core.quit()
             except (AttributeError, Exception):
                 pass
-            core.wait(0.01)
+            _input_wait(0.01)
     
     mouse.setVisible(False)
     event.clearEvents()
@@ -4378,16 +5885,7 @@ def run_experiment():
         print(f"Warning: Amy.png not found at {carly_image_path}", file=sys.stderr)
     
     # Show first welcome screen with Carly's picture (Amy's assistant, practice only; same image as Amy)
-    welcome_text_1 = visual.TextStim(
-        win,
-        text="Greetings!\n\n"
-             "You've just joined Amy's photography studio. She's preparing images for an upcoming exhibition.\n\n"
-             "Carly, her assistant, will walk you through a short practice to get familiar with the task.",
-        color='black',
-        height=0.04*0.75*1.35,  # Reduced to ensure buttons are visually larger
-        pos=(0, 0.25),  # Moved down for better spacing with image
-        wrapWidth=1.2
-    )
+    welcome_text_1 = _text(_WELCOME_TEXT_1, pos=(0, 0.25), wrapWidth=1.2)  # Moved down for better spacing with image
     
     # Create custom button for this screen (positioned bottom right to avoid icon overlap)
     continue_button_welcome = visual.Rect(
@@ -4405,164 +5903,21 @@ def run_experiment():
         height=0.04*0.75*1.35,  # Reduced to ensure text fits within button
         pos=(0.4, -0.3)  # Bottom right, moved up to avoid dock
     )
-    exit_btn = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
-    exit_text = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
-    
-    def redraw_welcome_1():
-        welcome_text_1.draw()  # Draw text first
-        if carly_image:
-            carly_image.draw()
-        continue_button_welcome.draw()
-        continue_text_welcome.draw()
-        exit_btn.draw()
-        exit_text.draw()
-    
-    # Custom wait for button with custom button position
-    mouse = event.Mouse(win=win)
-    mouse.setVisible(True)
-    
-    first_draw_welcome1 = [True]
-    def draw_screen():
-        if first_draw_welcome1[0]:
-            _do_photodiode_flash(redraw_welcome_1, event_type="welcome_onset")  # First instruction onset: black (TTL), white
-            first_draw_welcome1[0] = False
-        else:
-            redraw_welcome_1()
-            win.flip()
-    
-    draw_screen()
-    
-    clicked = False
-    
-    if USE_TOUCH_SCREEN:
-        # Use keyboard method (position-change detection) for touch screens
-        mouserec = mouse.getPos()
-        try:
-            mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-        except:
-            mouserec_x, mouserec_y = 0.0, 0.0
-        
-        while not clicked:
-            try:
-                mouseloc = mouse.getPos()
-                try:
-                    mouseloc_x, mouseloc_y = float(mouseloc[0]), float(mouseloc[1])
-                except:
-                    mouseloc_x, mouseloc_y = 0.0, 0.0
-                
-                # Check if mouse position has changed (touch moved) - keyboard method
-                if mouseloc_x == mouserec_x and mouseloc_y == mouserec_y:
-                    # Position hasn't changed, just redraw
-                    draw_screen()
-                else:
-                    # Position has changed - check if touch is within button using position calculation
-                    button_x, button_y = 0.4, -0.3  # Updated to match button position
-                    button_width, button_height = 0.3*0.75, 0.1*0.75
-                    hit_margin_x = max(button_width * 0.5, 0.08)
-                    hit_margin_y = max(button_height * 0.5, 0.04)
-                    
-                    on_exit = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                              EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                    on_button = (button_x - button_width/2 - hit_margin_x <= mouseloc_x <= button_x + button_width/2 + hit_margin_x and
-                                button_y - button_height/2 - hit_margin_y <= mouseloc_y <= button_y + button_height/2 + hit_margin_y)
-                    
-                    if on_exit:
-                        core.quit()
-                    elif on_button:
-                        _do_photodiode_flash(redraw_welcome_1, event_type="motor_response")  # Motor response: black (TTL), white
-                        core.wait(0.2)
-                        clicked = True
-                        break
-                    
-                    # Update recorded position
-                    mouserec = mouse.getPos()
-                    try:
-                        mouserec_x, mouserec_y = float(mouserec[0]), float(mouserec[1])
-                    except:
-                        mouserec_x, mouserec_y = mouseloc_x, mouseloc_y
-                
-                # Redraw every frame
-                draw_screen()
-            except (AttributeError, Exception):
-                pass
-            
-            try:
-                keys = event.getKeys(keyList=['space', 'escape'], timeStamped=False)
-                if keys:
-                    if 'space' in keys:
-                        _do_photodiode_flash(redraw_welcome_1, event_type="motor_response")  # Motor response: black (TTL), white
-                        clicked = True
-                        break
-                    elif 'escape' in keys:
-                        core.quit()
-            except (AttributeError, Exception):
-                pass
-            
-            core.wait(0.01)
-    else:
-        # Keyboard mode: wait for Return key
-        while not clicked:
-            draw_screen()
-            try:
-                keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
-                if keys:
-                    if 'return' in keys:
-                        _do_photodiode_flash(redraw_welcome_1, event_type="motor_response")  # Motor response: black (TTL), white
-                        clicked = True
-                        break
-                    elif 'escape' in keys:
-                        core.quit()
-            except (AttributeError, Exception):
-                pass
-            core.wait(0.01)
     
-    mouse.setVisible(False)
-    event.clearEvents()
+    run_button_screen([welcome_text_1, carly_image, continue_button_welcome, continue_text_welcome], continue_button_welcome,
+                      onset_event="welcome_onset", response_event="motor_response")  # First instruction onset / motor response
+    _textures.release(carly_image)  # Screen done: stays cached unless the budget needs the memory
     
     # Show second welcome screen (no image, just text)
-    welcome_text_2 = visual.TextStim(
-        win,
-        text="Before you begin the real work, you'll complete a short training round to get familiar with the process.\n\n"
-             "For now, simply memorize the shapes you're about to see. Continue when you're ready to get started!",
-        color='black',
-        height=0.04*0.75*1.35,  # Reduced to ensure buttons are visually larger
-        pos=(0, 0.0),
-        wrapWidth=1.2
-    )
+    welcome_text_2 = _text(_WELCOME_TEXT_2, pos=(0, 0.0), wrapWidth=1.2)
     
     def redraw_welcome_2():
         welcome_text_2.draw()
     
     wait_for_button(redraw_func=redraw_welcome_2)
     
-    # Generate practice shapes as placeholder stimuli (IMAGE_1, IMAGE_2, IMAGE_3)
-    # Green circle
-    img = Image.new('RGB', (200, 200), color='lightgray')
-    draw = ImageDraw.Draw(img)
-    draw.ellipse([20, 20, 180, 180], fill='green', outline='black', width=3)
-    green_circle_path = os.path.join(PLACEHOLDER_DIR, "IMAGE_1.png")
-    img.save(green_circle_path)
-    
-    # Red circle
-    img = Image.new('RGB', (200, 200), color='lightgray')
-    draw = ImageDraw.Draw(img)
-    draw.ellipse([20, 20, 180, 180], fill='red', outline='black', width=3)
-    red_circle_path = os.path.join(PLACEHOLDER_DIR, "IMAGE_2.png")
-    img.save(red_circle_path)
-    
-    # Blue circle (for encoding/sequential presentation)
-    img = Image.new('RGB', (200, 200), color='lightgray')
-    draw = ImageDraw.Draw(img)
-    draw.ellipse([20, 20, 180, 180], fill='blue', outline='black', width=3)
-    blue_circle_path = os.path.join(PLACEHOLDER_DIR, "IMAGE_3_CIRCLE.png")
-    img.save(blue_circle_path)
-    
-    # Blue square (for trial 3 recognition - it's NEW, not seen before)
-    img = Image.new('RGB', (200, 200), color='lightgray')
-    draw = ImageDraw.Draw(img)
-    draw.rectangle([20, 20, 180, 180], fill='blue', outline='black', width=3)
-    blue_square_path = os.path.join(PLACEHOLDER_DIR, "IMAGE_3.png")
-    img.save(blue_square_path)
+    # Practice shapes (IMAGE_1, IMAGE_2, IMAGE_3 circle for encoding, IMAGE_3 square as the trial-3 NEW item), in memory
+    green_circle_path, red_circle_path, blue_circle_path, blue_square_path = register_practice_shapes(PLACEHOLDER_DIR)
     
     # Show shapes sequentially with fixations (like study phase)
     # Use default size from load_image_stimulus (0.3, 0.3) and position (0, 0) to match regular task
@@ -4574,6 +5929,7 @@ def run_experiment():
     _do_photodiode_flash(lambda: green_circle.draw(), event_type="practice_image_onset")
     core.wait(1.5)  # Show for 1.5 seconds
     _do_photodiode_flash(lambda: _blank_rect.draw() if _blank_rect is not None else None, event_type="practice_image_offset")
+    _textures.release(green_circle)
     
     # Show red circle
     show_fixation(0.5, onset_event_type="practice_fixation_onset", offset_event_type="practice_fixation_offset")
@@ -4583,6 +5939,7 @@ def run_experiment():
     _do_photodiode_flash(lambda: red_circle.draw(), event_type="practice_image_onset")
     core.wait(1.5)  # Show for 1.5 seconds
     _do_photodiode_flash(lambda: _blank_rect.draw() if _blank_rect is not None else None, event_type="practice_image_offset")
+    _textures.release(red_circle)
     
     # Show blue circle (for encoding - last shape in sequential presentation)
     show_fixation(0.5, onset_event_type="practice_fixation_onset", offset_event_type="practice_fixation_offset")
@@ -4592,6 +5949,7 @@ def run_experiment():
     _do_photodiode_flash(lambda: blue_circle_encoding.draw(), event_type="practice_image_onset")
     core.wait(1.5)  # Show for 1.5 seconds
     _do_photodiode_flash(lambda: _blank_rect.draw() if _blank_rect is not None else None, event_type="practice_image_offset")
+    _textures.release(blue_circle_encoding)
     
     
     # Don't set position/size - use defaults from load_image_stimulus (0, 0) and (0.3, 0.3) to match regular task
@@ -4634,7 +5992,8 @@ def run_experiment():
     )
     participant_value_t1, participant_rt_t1, participant_commit_time_t1, participant_slider_timeout_t1, participant_slider_stop_time_t1, participant_slider_decision_onset_time_t1, participant_slider_click_times_t1, participant_commit_trigger_t1 = get_slider_response(
         _practice_t1_prompt,
-        image_stim=green_circle, trial_num=None, max_trials=3, timeout=999999.0  # No timeout in practice, no trial number display
+        image_stim=green_circle, trial_num=None, max_trials=3, timeout=999999.0,  # No timeout in practice, no trial number display
+        traj_key=("recognition", 0, 1)
     )
     
     # Show outcome for trial 1
@@ -4708,6 +6067,7 @@ def run_experiment():
     practice_trials.append(trial_data_t1)
     if participant_id:
         study_file, trial_file = save_data_incremental([], [trial_data_t1], participant_id, study_file=study_file, trial_file=trial_file)
+    _textures.release(green_circle)  # Practice trial done (fallback shapes are not registry stims and are ignored)
     
     # Show red circle
     recognition_fixation_onset_trigger_t2, recognition_fixation_offset_trigger_t2 = show_fixation(0.5, return_onset=True, return_offset_trigger=True, onset_event_type="recognition_fixation_onset_trigger", offset_event_type="recognition_fixation_offset_trigger")
@@ -4748,10 +6108,9 @@ def run_experiment():
     
     # Show AI rating (Carly in practice)
     try:
-        ai_slider_display_time_t2, ai_final_slider_display_time_t2, partner_rating_onset_trigger_t2, partner_rating_complete_trigger_t2, partner_slider_settled_trigger_t2 = show_animated_partner_slider(ai_confidence_t2, ai_rt_t2, image_stim=red_circle, partner_name="Carly")
+        ai_slider_display_time_t2, ai_final_slider_display_time_t2, partner_rating_onset_trigger_t2, partner_rating_complete_trigger_t2, partner_slider_settled_trigger_t2, _ = show_animated_partner_slider(ai_confidence_t2, ai_rt_t2, image_stim=red_circle, partner_name="Carly")
     except Exception as e:
         print(f"Warning: Error in show_animated_partner_slider: {e}", file=sys.stderr)
-        import traceback
         traceback.print_exc(file=sys.stderr)
         # Continue anyway - just skip the animation
         ai_slider_display_time_t2 = time.time()
@@ -4763,7 +6122,8 @@ def run_experiment():
     # Participant rates
     participant_value_t2, participant_rt_t2, participant_commit_time_t2, participant_slider_timeout_t2, participant_slider_stop_time_t2, participant_slider_decision_onset_time_t2, participant_slider_click_times_t2, participant_commit_trigger_t2 = get_slider_response(
         "Rate your memory: OLD or NEW?",
-        image_stim=red_circle, trial_num=None, max_trials=3, timeout=999999.0  # No timeout in practice, no trial number display
+        image_stim=red_circle, trial_num=None, max_trials=3, timeout=999999.0,  # No timeout in practice, no trial number display
+        traj_key=("recognition", 0, 2)
     )
     
     # Show outcome for trial 2
@@ -4838,6 +6198,7 @@ def run_experiment():
     practice_trials.append(trial_data_t2)
     if participant_id:
         study_file, trial_file = save_data_incremental([], [trial_data_t2], participant_id, study_file=study_file, trial_file=trial_file)
+    _textures.release(red_circle)
     
     # Show message: "now, work with your partner." (Carly in practice)
     work_with_partner_text = visual.TextStim(win, text="Now, work with Carly.", 
@@ -4866,7 +6227,8 @@ def run_experiment():
     # Trial 3: Full trial with participant, AI, switch/stay
     # Don't set position/size - use defaults from load_image_stimulus (0, 0) and (0.3, 0.3)
     participant_value_t3, participant_rt_t3, participant_commit_time_t3, participant_slider_timeout_t3, participant_slider_stop_time_t3, participant_slider_decision_onset_time_t3, participant_slider_click_times_t3, participant_commit_trigger_t3 = get_slider_response(
-        "Rate your memory: OLD or NEW?", image_stim=blue_square, trial_num=None, max_trials=3, timeout=999999.0  # No timeout in practice, no trial number display
+        "Rate your memory: OLD or NEW?", image_stim=blue_square, trial_num=None, max_trials=3, timeout=999999.0,  # No timeout in practice, no trial number display
+        traj_key=("recognition", 0, 3)
     )
     
     # AI rates (selects OLD but not very confident - euclidean distance of 0.4 from left) - it's actually NEW (square), so AI is Incorrect (Carly in practice)
@@ -4875,10 +6237,9 @@ def run_experiment():
     ai_correct_t3 = False  # It's actually NEW (square), but Carly rates it as OLD (0.4), so AI is Incorrect
     ground_truth_t3 = 1.0  # NEW
     try:
-        ai_slider_display_time_t3, ai_final_slider_display_time_t3, partner_rating_onset_trigger_t3, partner_rating_complete_trigger_t3, partner_slider_settled_trigger_t3 = show_animated_partner_slider(ai_confidence_t3, ai_rt_t3, image_stim=blue_square, partner_name="Carly")
+        ai_slider_display_time_t3, ai_final_slider_display_time_t3, partner_rating_onset_trigger_t3, partner_rating_complete_trigger_t3, partner_slider_settled_trigger_t3, _ = show_animated_partner_slider(ai_confidence_t3, ai_rt_t3, image_stim=blue_square, partner_name="Carly")
     except Exception as e:
         print(f"Warning: Error in show_animated_partner_slider: {e}", file=sys.stderr)
-        import traceback
         traceback.print_exc(file=sys.stderr)
         # Continue anyway - just skip the animation
         ai_slider_display_time_t3 = time.time()
@@ -4976,51 +6337,35 @@ def run_experiment():
     practice_trials.append(trial_data_t3)
     if participant_id:
         study_file, trial_file = save_data_incremental([], [trial_data_t3], participant_id, study_file=study_file, trial_file=trial_file)
+    _textures.release(blue_square)
     
     show_instructions(
-        "Training complete!\n\n"
-        "Now we'll begin the actual work.\n\n",
+        _TRAINING_COMPLETE_TEXT,
         header_color='darkgreen',
         body_color='black'
     )
     
     # Rules reminder before starting the actual game - split into 3 pages for better readability
-    _slider_instruction = "Press LEFT/RIGHT arrow keys repeatedly (holding won't work), then Return to submit." if not USE_TOUCH_SCREEN else "Click on the slider, then SUBMIT."
     show_instructions(
-        "Task Overview:\n"
-        "Remember which photos belong in each collection.\n\n"
-        "Rate each image: OLD (belongs) or NEW (doesn't belong).\n"
-        + _slider_instruction,
+        _task_overview_text(),
         header_color='darkred',
         body_color='black'
     )
     
     show_instructions(
-        "Working with Amy:\n"
-        "Amy will also rate each photo. You can STAY with your answer or SWITCH to hers.\n\n"
-        "You can switch even if you both agree, to match her confidence level.",
+        _WORKING_WITH_AMY_TEXT,
         header_color='darkred',
         body_color='black'
     )
 
     show_instructions(
-        "Scoring:\n"
-        "Confidence matters. An in-house curator scores based on accuracy and confidence.\n\n"
-        "10 collections, 10 images each. Time limit per decision.",
+        _SCORING_TEXT,
         header_color='darkred',
         body_color='black'
     )
 
     # Show Amy's introduction before the first collection
-    amy_intro_text = visual.TextStim(
-        win,
-        text="Work with Amy to sort this collection.\n\n"
-             "Sometimes she goes first, sometimes you do.",
-        color='black',
-        height=0.04*0.75*1.35,  # Reduced to ensure buttons are visually larger
-        pos=(0, 0.2),  # Adjusted position for better spacing
-        wrapWidth=1.2
-    )
+    amy_intro_text = _text(_AMY_INTRO_TEXT, pos=(0, 0.2), wrapWidth=1.2)  # Adjusted position for better spacing
     
     # Load and display Amy's picture (maintain aspect ratio)
     amy_path = os.path.join(STIMULI_DIR, "Amy.png")
@@ -5035,13 +6380,7 @@ def run_experiment():
         print(f"Warning: Amy.png not found at {amy_path}", file=sys.stderr)
     
     # Label for Amy's image (first time shown before experimental blocks) - below image
-    amy_intro_label = visual.TextStim(
-        win,
-        text="Amy",
-        color='black',
-        height=0.04*0.75*1.35,
-        pos=(0, -0.2)  # Below the image
-    )
+    amy_intro_label = _text("Amy", pos=(0, -0.2))  # Below the image
     
     # Create custom button for this screen (positioned bottom right to avoid icon overlap)
     continue_button_amy_intro = visual.Rect(
@@ -5059,116 +6398,8 @@ def run_experiment():
         height=0.04*0.75*1.35,  # Reduced to ensure text fits within button
         pos=(0.4, -0.3)  # Bottom right, moved up to avoid dock
     )
-    exit_btn_amy = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
-    exit_text_amy = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
-    
-    def redraw_amy_intro():
-        amy_intro_text.draw()  # Draw text first
-        if amy_intro_image:
-            amy_intro_image.draw()
-        continue_button_amy_intro.draw()
-        continue_text_amy_intro.draw()
-        exit_btn_amy.draw()
-        exit_text_amy.draw()
-    
-    # Custom wait for button with custom button position
-    mouse_amy_intro = event.Mouse(win=win)
-    mouse_amy_intro.setVisible(True)
-    
-    first_draw_amy_intro = [True]
-    clicked_amy_intro = False
-    def draw_screen_amy_intro():
-        if first_draw_amy_intro[0]:
-            _do_photodiode_flash(redraw_amy_intro, event_type="instruction_onset")
-            first_draw_amy_intro[0] = False
-        else:
-            redraw_amy_intro()
-            win.flip()
-    
-    if USE_TOUCH_SCREEN:
-        # Use keyboard method (position-change detection) for touch screens
-        mouserec_amy_intro = mouse_amy_intro.getPos()
-        try:
-            mouserec_x_amy_intro, mouserec_y_amy_intro = float(mouserec_amy_intro[0]), float(mouserec_amy_intro[1])
-        except:
-            mouserec_x_amy_intro, mouserec_y_amy_intro = 0.0, 0.0
-        
-        while not clicked_amy_intro:
-            try:
-                mouseloc_amy_intro = mouse_amy_intro.getPos()
-                try:
-                    mouseloc_x_amy_intro, mouseloc_y_amy_intro = float(mouseloc_amy_intro[0]), float(mouseloc_amy_intro[1])
-                except:
-                    mouseloc_x_amy_intro, mouseloc_y_amy_intro = 0.0, 0.0
-                
-                # Check if mouse position has changed (touch moved) - keyboard method
-                if mouseloc_x_amy_intro == mouserec_x_amy_intro and mouseloc_y_amy_intro == mouserec_y_amy_intro:
-                    # Position hasn't changed, just redraw
-                    draw_screen_amy_intro()
-                else:
-                    # Position has changed - check if touch is within button using position calculation
-                    button_x_amy_intro, button_y_amy_intro = 0.4, -0.3  # Updated to match button position
-                    button_width_amy_intro, button_height_amy_intro = 0.3*0.75, 0.1*0.75
-                    hit_margin_amy_intro_x = max(button_width_amy_intro * 0.5, 0.08)
-                    hit_margin_amy_intro_y = max(button_height_amy_intro * 0.5, 0.04)
-                    
-                    on_exit_amy = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x_amy_intro <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                                  EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y_amy_intro <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                    on_button_amy_intro = (button_x_amy_intro - button_width_amy_intro/2 - hit_margin_amy_intro_x <= mouseloc_x_amy_intro <= button_x_amy_intro + button_width_amy_intro/2 + hit_margin_amy_intro_x and
-                                          button_y_amy_intro - button_height_amy_intro/2 - hit_margin_amy_intro_y <= mouseloc_y_amy_intro <= button_y_amy_intro + button_height_amy_intro/2 + hit_margin_amy_intro_y)
-                    
-                    if on_exit_amy:
-                        core.quit()
-                    elif on_button_amy_intro:
-                        _do_photodiode_flash(redraw_amy_intro, event_type="instruction_continue")
-                        core.wait(0.2)
-                        clicked_amy_intro = True
-                        break
-                    
-                    # Update recorded position
-                    mouserec_amy_intro = mouse_amy_intro.getPos()
-                    try:
-                        mouserec_x_amy_intro, mouserec_y_amy_intro = float(mouserec_amy_intro[0]), float(mouserec_amy_intro[1])
-                    except:
-                        mouserec_x_amy_intro, mouserec_y_amy_intro = mouseloc_x_amy_intro, mouseloc_y_amy_intro
-                
-                # Redraw every frame
-                draw_screen_amy_intro()
-                core.wait(0.01)
-            except Exception as e:
-                print(f"Error in button wait: {e}", file=sys.stderr)
-                core.wait(0.01)
-            
-            try:
-                keys = event.getKeys(keyList=['space', 'escape'], timeStamped=False)
-                if keys:
-                    if 'space' in keys:
-                        _do_photodiode_flash(redraw_amy_intro, event_type="instruction_continue")
-                        clicked_amy_intro = True
-                        break
-                    elif 'escape' in keys:
-                        core.quit()
-            except (AttributeError, Exception):
-                pass
-    else:
-        # Keyboard mode: wait for Return key
-        while not clicked_amy_intro:
-            draw_screen_amy_intro()
-            try:
-                keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
-                if keys:
-                    if 'return' in keys:
-                        _do_photodiode_flash(redraw_amy_intro, event_type="instruction_continue")
-                        clicked_amy_intro = True
-                        break
-                    elif 'escape' in keys:
-                        core.quit()
-            except (AttributeError, Exception):
-                pass
-            core.wait(0.01)
-    
-    mouse_amy_intro.setVisible(False)
-    event.clearEvents()
+    run_button_screen([amy_intro_text, amy_intro_image, continue_button_amy_intro, continue_text_amy_intro], continue_button_amy_intro)
+    _textures.release(amy_intro_image)
     
     # Experimental blocks (10 blocks, 10 trials each)
     all_study_data = []
@@ -5203,6 +6434,8 @@ def run_experiment():
         previous_partner_reliable = None  # None for first block
         
         for block_num in range(1, 11):
+            if _RENDER_BENCHMARK and block_num > int(os.environ.get('RENDER_BENCHMARK_BLOCKS', '1')):
+                break  # Render benchmark: a few blocks cover every screen type
             # Use pre-assigned stimuli for this block (ensures 2 per category, no repeats)
             selected_indices = stimulus_assignments[block_num - 1]
             # Use real stimuli paths instead of placeholders
@@ -5264,16 +6497,6 @@ def run_experiment():
                             pos=(0.4, -0.3)  # Bottom right, moved up to avoid dock
                         )
                         
-                        def redraw_jen():
-                            switch_text.draw()  # Draw text first
-                            if jen_image:
-                                jen_image.draw()
-                            if jen_label is not None:
-                                jen_label.draw()
-                            continue_button_jen.draw()
-                            continue_text_jen.draw()
-                        
-                        button_x, button_y = 0.4, -0.3  # Updated to match button position
                         continue_button = continue_button_jen
                         continue_text = continue_text_jen
                         
@@ -5320,14 +6543,6 @@ def run_experiment():
                             pos=(0.4, -0.3)  # Bottom right, moved up to avoid dock
                         )
                         
-                        def redraw_jen():
-                            switch_text.draw()  # Draw text first
-                            if jen_image:
-                                jen_image.draw()
-                            continue_button_jen_continue.draw()
-                            continue_text_jen_continue.draw()
-                        
-                        button_x, button_y = 0.4, -0.3
                         continue_button = continue_button_jen_continue
                         continue_text = continue_text_jen_continue
                     else:
@@ -5337,113 +6552,11 @@ def run_experiment():
                         jen_label = None
                         continue_button = None
                         continue_text = None
-                        button_x, button_y = 0, 0
                     
                     # Only show Jen screen if we have valid text (Block 4 or Block 8)
                     if switch_text is not None:
-                        exit_btn_jen = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
-                        exit_text_jen = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
-                    
-                        # Custom wait for button with custom button position
-                        mouse = event.Mouse(win=win)
-                        mouse.setVisible(True)
-                        
-                        def draw_jen_content():
-                            redraw_jen()
-                            exit_btn_jen.draw()
-                            exit_text_jen.draw()
-                        
-                        def draw_screen():
-                            draw_jen_content()
-                            win.flip()
-                        
-                        _do_photodiode_flash(draw_jen_content, event_type="instruction_onset")
-                        
-                        clicked = False
-                        
-                        if USE_TOUCH_SCREEN:
-                            # Use keyboard method (position-change detection) for touch screens
-                            mouserec_jen = mouse.getPos()
-                            try:
-                                mouserec_x_jen, mouserec_y_jen = float(mouserec_jen[0]), float(mouserec_jen[1])
-                            except:
-                                mouserec_x_jen, mouserec_y_jen = 0.0, 0.0
-                            
-                            while not clicked:
-                                try:
-                                    mouseloc_jen = mouse.getPos()
-                                    try:
-                                        mouseloc_x_jen, mouseloc_y_jen = float(mouseloc_jen[0]), float(mouseloc_jen[1])
-                                    except:
-                                        mouseloc_x_jen, mouseloc_y_jen = 0.0, 0.0
-                                    
-                                    # Check if mouse position has changed (touch moved) - keyboard method
-                                    if mouseloc_x_jen == mouserec_x_jen and mouseloc_y_jen == mouserec_y_jen:
-                                        # Position hasn't changed, just redraw
-                                        draw_screen()
-                                    else:
-                                        # Position has changed - check if touch is within button using position calculation
-                                        button_width, button_height = 0.3*0.75, 0.1*0.75
-                                        hit_margin_x = max(button_width * 0.5, 0.08)
-                                        hit_margin_y = max(button_height * 0.5, 0.04)
-                                        
-                                        on_exit_jen = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x_jen <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                                                      EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y_jen <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                                        on_button = (button_x - button_width/2 - hit_margin_x <= mouseloc_x_jen <= button_x + button_width/2 + hit_margin_x and
-                                                    button_y - button_height/2 - hit_margin_y <= mouseloc_y_jen <= button_y + button_height/2 + hit_margin_y)
-                                        
-                                        if on_exit_jen:
-                                            core.quit()
-                                        elif on_button:
-                                            _do_photodiode_flash(draw_jen_content, event_type="instruction_continue")
-                                            core.wait(0.2)
-                                            clicked = True
-                                            break
-                                        
-                                        # Update recorded position
-                                        mouserec_jen = mouse.getPos()
-                                        try:
-                                            mouserec_x_jen, mouserec_y_jen = float(mouserec_jen[0]), float(mouserec_jen[1])
-                                        except:
-                                            mouserec_x_jen, mouserec_y_jen = mouseloc_x_jen, mouseloc_y_jen
-                                    
-                                    # Redraw every frame
-                                    draw_screen()
-                                except (AttributeError, Exception):
-                                    pass
-                                
-                                try:
-                                    keys = event.getKeys(keyList=['space', 'escape'], timeStamped=False)
-                                    if keys:
-                                        if 'space' in keys:
-                                            _do_photodiode_flash(draw_jen_content, event_type="instruction_continue")
-                                            clicked = True
-                                            break
-                                        elif 'escape' in keys:
-                                            core.quit()
-                                except (AttributeError, Exception):
-                                    pass
-                                
-                                core.wait(0.01)
-                        else:
-                            # Keyboard mode: wait for Return key
-                            while not clicked:
-                                draw_screen()
-                                try:
-                                    keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
-                                    if keys:
-                                        if 'return' in keys:
-                                            _do_photodiode_flash(draw_jen_content, event_type="instruction_continue")
-                                            clicked = True
-                                            break
-                                        elif 'escape' in keys:
-                                            core.quit()
-                                except (AttributeError, Exception):
-                                    pass
-                                core.wait(0.01)
-                        
-                        mouse.setVisible(False)
-                        event.clearEvents()
+                        run_button_screen([switch_text, jen_image, jen_label, continue_button, continue_text], continue_button)
+                        _textures.release(jen_image)
                     
                 elif not previous_partner_reliable and current_partner_reliable:
                     # Switched from Jen (unreliable) to Amy (reliable)
@@ -5487,114 +6600,9 @@ def run_experiment():
                             height=0.04*0.75*1.35,  # Reduced to ensure text fits within button
                             pos=(0.4, -0.3)  # Bottom right, moved up to avoid dock
                         )
-                        exit_btn_amy_return = visual.Rect(win, width=0.12, height=0.04, fillColor=[0.95, 0.85, 0.85], lineColor='darkred', pos=EXIT_BTN_POS, lineWidth=1, units='height')
-                        exit_text_amy_return = visual.TextStim(win, text="Exit", color='darkred', height=0.025, pos=EXIT_BTN_POS, units='height')
-                        
-                        def redraw_amy():
-                            switch_text.draw()  # Draw text first
-                            if amy_image:
-                                amy_image.draw()
-                            continue_button_amy_return.draw()
-                            continue_text_amy_return.draw()
-                            exit_btn_amy_return.draw()
-                            exit_text_amy_return.draw()
                         
-                        # Custom wait for button with custom button position
-                        mouse_amy_return = event.Mouse(win=win)
-                        mouse_amy_return.setVisible(True)
-                        
-                        def draw_screen_amy_return():
-                            redraw_amy()
-                            win.flip()
-                        
-                        _do_photodiode_flash(redraw_amy, event_type="instruction_onset")
-                        
-                        clicked_amy_return = False
-                        
-                        if USE_TOUCH_SCREEN:
-                            # Use keyboard method (position-change detection) for touch screens
-                            mouserec_amy_return = mouse_amy_return.getPos()
-                            try:
-                                mouserec_x_amy_return, mouserec_y_amy_return = float(mouserec_amy_return[0]), float(mouserec_amy_return[1])
-                            except:
-                                mouserec_x_amy_return, mouserec_y_amy_return = 0.0, 0.0
-                            
-                            while not clicked_amy_return:
-                                try:
-                                    mouseloc_amy_return = mouse_amy_return.getPos()
-                                    try:
-                                        mouseloc_x_amy_return, mouseloc_y_amy_return = float(mouseloc_amy_return[0]), float(mouseloc_amy_return[1])
-                                    except:
-                                        mouseloc_x_amy_return, mouseloc_y_amy_return = 0.0, 0.0
-                                    
-                                    # Check if mouse position has changed (touch moved) - keyboard method
-                                    if mouseloc_x_amy_return == mouserec_x_amy_return and mouseloc_y_amy_return == mouserec_y_amy_return:
-                                        # Position hasn't changed, just redraw
-                                        draw_screen_amy_return()
-                                    else:
-                                        # Position has changed - check if touch is within button using position calculation
-                                        button_x_amy_return, button_y_amy_return = 0.4, -0.3  # Updated to match button position
-                                        button_width_amy_return, button_height_amy_return = 0.3*0.75, 0.1*0.75
-                                        hit_margin_amy_return_x = max(button_width_amy_return * 0.5, 0.08)
-                                        hit_margin_amy_return_y = max(button_height_amy_return * 0.5, 0.04)
-                                        
-                                        on_exit_amy_return = (EXIT_BTN_POS[0] - 0.06 - EXIT_HIT_MARGIN <= mouseloc_x_amy_return <= EXIT_BTN_POS[0] + 0.06 + EXIT_HIT_MARGIN and
-                                                            EXIT_BTN_POS[1] - 0.02 - EXIT_HIT_MARGIN <= mouseloc_y_amy_return <= EXIT_BTN_POS[1] + 0.02 + EXIT_HIT_MARGIN)
-                                        on_button_amy_return = (button_x_amy_return - button_width_amy_return/2 - hit_margin_amy_return_x <= mouseloc_x_amy_return <= button_x_amy_return + button_width_amy_return/2 + hit_margin_amy_return_x and
-                                                                button_y_amy_return - button_height_amy_return/2 - hit_margin_amy_return_y <= mouseloc_y_amy_return <= button_y_amy_return + button_height_amy_return/2 + hit_margin_amy_return_y)
-                                        
-                                        if on_exit_amy_return:
-                                            core.quit()
-                                        elif on_button_amy_return:
-                                            _do_photodiode_flash(redraw_amy, event_type="instruction_continue")
-                                            core.wait(0.2)
-                                            clicked_amy_return = True
-                                            break
-                                        
-                                        # Update recorded position
-                                        mouserec_amy_return = mouse_amy_return.getPos()
-                                        try:
-                                            mouserec_x_amy_return, mouserec_y_amy_return = float(mouserec_amy_return[0]), float(mouserec_amy_return[1])
-                                        except:
-                                            mouserec_x_amy_return, mouserec_y_amy_return = mouseloc_x_amy_return, mouseloc_y_amy_return
-                                    
-                                    # Redraw every frame
-                                    draw_screen_amy_return()
-                                    core.wait(0.01)
-                                except Exception as e:
-                                    print(f"Error in button wait: {e}", file=sys.stderr)
-                                    core.wait(0.01)
-                            
-                            try:
-                                keys = event.getKeys(keyList=['space', 'escape'], timeStamped=False)
-                                if keys:
-                                    if 'space' in keys:
-                                        _do_photodiode_flash(redraw_amy, event_type="instruction_continue")
-                                        clicked_amy_return = True
-                                        break
-                                    elif 'escape' in keys:
-                                        core.quit()
-                            except (AttributeError, Exception):
-                                pass
-                        else:
-                            # Keyboard mode: wait for Return key
-                            while not clicked_amy_return:
-                                draw_screen_amy_return()
-                                try:
-                                    keys = event.getKeys(keyList=['return', 'escape'], timeStamped=False)
-                                    if keys:
-                                        if 'return' in keys:
-                                            _do_photodiode_flash(redraw_amy, event_type="instruction_continue")
-                                            clicked_amy_return = True
-                                            break
-                                        elif 'escape' in keys:
-                                            core.quit()
-                                except (AttributeError, Exception):
-                                    pass
-                                core.wait(0.01)
-                        
-                        mouse_amy_return.setVisible(False)
-                        event.clearEvents()
+                        run_button_screen([switch_text, amy_image, continue_button_amy_return, continue_text_amy_return], continue_button_amy_return)
+                        _textures.release(amy_image)
                     else:
                         switch_text = None
                     
@@ -5636,15 +6644,12 @@ def run_experiment():
             # Break between blocks
             if block_num < 10:
                 show_instructions(
-                    f"Great job!\n\n"
-                    "Take a short break.\n\n"
-                    "",
+                    _BREAK_TEXT,
                     header_color='darkgreen',
                     body_color='black'
                 )
     except Exception as e:
         print(f"Error in experimental blocks: {e}")
-        import traceback
         traceback.print_exc()
         # Show error message to user
         show_instructions(
@@ -5697,24 +6702,30 @@ def run_experiment():
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         log_dir = get_log_directory()
         summary_file = os.path.join(log_dir, f"recognition_summary_{participant_id}_{timestamp}.csv")
+        draw_timing = _draw_timing_summary(win)  # Per-screen CPU/GPU draw cost vs frame budget
+        print(f"  Textures: {_textures.misses} loaded, {_textures.hits} reused, {_textures.total_bytes / 1048576:.0f} MB cached")
         with open(summary_file, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['participant_id', 'experiment_start_time', 'experiment_end_time', 'total_task_time_seconds', 'total_task_time_minutes'])
+            writer = csv.DictWriter(f, fieldnames=['participant_id', 'experiment_start_time', 'experiment_end_time', 'total_task_time_seconds', 'total_task_time_minutes', 'ttl_coalesced_flips', 'ttl_coalesced_events'] + list(draw_timing))
             writer.writeheader()
             writer.writerow({
+                **draw_timing,
                 'participant_id': participant_id,
                 'experiment_start_time': experiment_start_time,
                 'experiment_end_time': experiment_end_time,
                 'total_task_time_seconds': total_task_time,
-                'total_task_time_minutes': total_task_time / 60.0
+                'total_task_time_minutes': total_task_time / 60.0,
+                'ttl_coalesced_flips': _ttl_coalesced_flips[0],
+                'ttl_coalesced_events': _ttl_coalesced_events[0]
             })
         print(f"✓ Summary data saved to {summary_file}")
         print(f"  Total task time: {total_task_time/60:.2f} minutes ({total_task_time:.1f} seconds)")
         # Close TTL file (written incrementally throughout experiment)
         if _ttl_file_ref[0] is not None:
             try:
-                _ttl_file_ref[0].close()
-                _ttl_file_ref[0] = None
-                _ttl_writer_ref[0] = None
+                with _ttl_log_lock:
+                    _ttl_file_ref[0].close()
+                    _ttl_file_ref[0] = None
+                    _ttl_writer_ref[0] = None
                 ttl_count = len(_ttl_events)
                 if _ttl_file_path_ref[0]:
                     print(f"✓ TTL events saved incrementally to {_ttl_file_path_ref[0]} ({ttl_count} triggers)")
@@ -5725,23 +6736,66 @@ def run_experiment():
             try:
                 ttl_file = os.path.join(log_dir, f"recognition_ttl_events_{participant_id}_{timestamp}.csv")
                 with open(ttl_file, 'w', newline='') as f:
-                    writer = csv.DictWriter(f, fieldnames=['timestamp', 'event_type'])
+                    writer = csv.DictWriter(f, fieldnames=_TTL_FIELDNAMES)
                     writer.writeheader()
                     for ev in _ttl_events:
                         row = dict(ev)
-                        if isinstance(row.get('timestamp'), (int, float)):
-                            row['timestamp'] = f"{row['timestamp']:.9f}"
+                        for col in _TTL_TIME_COLUMNS:
+                            if isinstance(row.get(col), (int, float)):
+                                row[col] = f"{row[col]:.9f}"
                         writer.writerow(row)
                 print(f"✓ TTL events saved to {ttl_file} ({len(_ttl_events)} triggers)")
             except Exception as e:
                 print(f"⚠ Could not save TTL events: {e}", file=sys.stderr)
+        _close_key_responses()
+        _close_slider_trajectories()
     else:
         print(f"⚠ Test participant detected - skipping summary file save")
         print(f"  Total task time: {total_task_time/60:.2f} minutes ({total_task_time:.1f} seconds)")
+    if _ttl_coalesced_flips[0]:
+        print(f"  TTL: {_ttl_coalesced_flips[0]} flip(s) carried multiple events ({_ttl_coalesced_events[0]} extra event(s) sent as pulse trains)")
+    _report_ttl_reconnect_gaps()  # Experimenter console only
+    _report_ttl_health()
+# =========================
+#  SESSION
+# =========================
+# Everything above is importable without a display. A Session brings up PsychoPy, the exception hook, TTL
+# discovery, the input-method screen, the main window (with the photodiode/TTL flip wrapper) and the basic stimuli,
+# in that order, and close() releases the window and PsychoPy. Tests and analysis tools simply never open one.
+class Session:
+    """Display and hardware for one run of the task; nothing is created until open()."""
+    def __init__(self):
+        self.win = None
+
+    def open(self):
+        _import_psychopy()
+        sys.excepthook = exception_handler
+        _start_ttl_discovery()  # Enumerate TTL devices on a background thread while the input-method screen is up
+        register_placeholder_stimuli(100, PLACEHOLDER_DIR)  # In memory: no files are generated or checked
+        _open_main_window()
+        _create_basic_visual_elements()
+        self.win = win
+        return self
+
+    def close(self):
+        """Close the window exactly once and quit PsychoPy."""
+        if self.win is not None:
+            try:
+                self.win.close()
+            except Exception:
+                pass
+            self.win = None
+        if core is not None:
+            try:
+                core.quit()
+            except:
+                pass
+
 # =========================
 #  RUN EXPERIMENT
 # =========================
 if __name__ == "__main__":
+    session = Session().open()
     # Only run experiment if window was successfully created
     print(f"Checking window status before running experiment: win = {win}")
     print(f"Checking basic elements: instr={instr}, fixation={fixation}, mouse={mouse}")
@@ -5784,17 +6838,6 @@ if __name__ == "__main__":
         print("\nExperiment interrupted by user.")
     except Exception as e:
         print(f"\nError: {e}")
-        import traceback
         traceback.print_exc()
     finally:
-        # Close window exactly once in finally block
-        if win is not None:
-            try:
-                win.close()
-            except Exception:
-                pass
-        try:
-            core.quit()
-        except:
-            pass
-
+        session.close()